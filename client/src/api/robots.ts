@@ -1,11 +1,35 @@
-import apiClient from './client'
-import type { Robot, RobotDetail, RobotListResponse, RobotStatus, RobotUpdate } from '@/types'
+import apiClient, { API_URL } from './client'
+import type {
+  DownsampleMode,
+  FleetSummary,
+  MetricSeries,
+  Robot,
+  RobotDetail,
+  RobotLive,
+  RobotListResponse,
+  RobotStatus,
+  RobotUpdate,
+  SearchMode,
+  TotalMode,
+} from '@/types'
 
 export interface RobotListParams {
   status?: RobotStatus
   search?: string
+  search_mode?: SearchMode
+  cursor?: string
   skip?: number
   limit?: number
+  total_mode?: TotalMode
+}
+
+export interface MetricSeriesParams {
+  measurement: string
+  field: string
+  range?: string
+  step?: string
+  points?: number
+  downsample?: DownsampleMode
 }
 
 export const robotsApi = {
@@ -14,11 +38,30 @@ export const robotsApi = {
     return response.data
   },
 
+  async summary(): Promise<FleetSummary> {
+    const response = await apiClient.get<FleetSummary>('/robots/summary')
+    return response.data
+  },
+
+  // FastAPI ждёт повторяющиеся ids=1&ids=2, а не ids[]=1
+  async live(ids: number[], metrics?: string[]): Promise<RobotLive[]> {
+    const response = await apiClient.get<{ robots: RobotLive[] }>('/robots/live', {
+      params: { ids, metrics },
+      paramsSerializer: { indexes: null },
+    })
+    return response.data.robots
+  },
+
   async get(id: number): Promise<RobotDetail> {
     const response = await apiClient.get<RobotDetail>(`/robots/${id}`)
     return response.data
   },
 
+  async metrics(id: number, params: MetricSeriesParams): Promise<MetricSeries> {
+    const response = await apiClient.get<MetricSeries>(`/robots/${id}/metrics`, { params })
+    return response.data
+  },
+
   async update(id: number, data: RobotUpdate): Promise<Robot> {
     const response = await apiClient.patch<Robot>(`/robots/${id}`, data)
     return response.data
@@ -32,4 +75,10 @@ export const robotsApi = {
     const response = await apiClient.post<Robot>(`/robots/${id}/heartbeat`)
     return response.data
   },
+
+  // EventSource не передаёт заголовки, поэтому токен идёт в query
+  events(): EventSource {
+    const token = localStorage.getItem('access_token') || ''
+    return new EventSource(`${API_URL}/robots/events?access_token=${encodeURIComponent(token)}`)
+  },
 }
@@ -1,14 +1,35 @@
 import { defineStore } from 'pinia'
 import { ref, computed } from 'vue'
 import { robotsApi, type RobotListParams } from '@/api/robots'
-import type { Robot, RobotDetail, RobotUpdate, RobotStatus } from '@/types'
+import type {
+  FleetSummary,
+  Robot,
+  RobotDetail,
+  RobotEvent,
+  RobotLive,
+  RobotUpdate,
+  RobotStatus,
+} from '@/types'
+
+// Окно, в которое пачка событий даёт не больше одного запроса
+const EVENT_REFRESH_DELAY_MS = 500
 
 export const useRobotsStore = defineStore('robots', () => {
   const robots = ref<Robot[]>([])
   const currentRobot = ref<RobotDetail | null>(null)
-  const total = ref(0)
+  const total = ref<number | null>(0)
+  const nextCursor = ref<string | null>(null)
   const loading = ref(false)
   const error = ref<string | null>(null)
+  const lastParams = ref<RobotListParams | undefined>()
+  const summary = ref<FleetSummary | null>(null)
+  const live = ref<Record<number, RobotLive>>({})
+  // Дашборд работает только со сводкой, список не загружает
+  let listLoaded = false
+  let eventSource: EventSource | null = null
+  let summaryRefresh: number | undefined
+  let listRefresh: number | undefined
+  let eventSubscribers = 0
 
   const activeRobots = computed(() => 
     robots.value.filter(r => r.status === 'active')
@@ -32,12 +53,15 @@ export const useRobotsStore = defineStore('robots', () => {
   })
 
   async function fetchRobots(params?: RobotListParams) {
+    lastParams.value = params
+    listLoaded = true
     loading.value = true
     error.value = null
     try {
       const response = await robotsApi.list(params)
       robots.value = response.robots
       total.value = response.total
+      nextCursor.value = response.next_cursor
     } catch (e: unknown) {
       const err = e as { response?: { data?: { detail?: string } } }
       error.value = err.response?.data?.detail || 'Ошибка загрузки роботов'
@@ -46,6 +70,72 @@ export const useRobotsStore = defineStore('robots', () => {
     }
   }
 
+  // Следующая страница по курсору; total уже известен, повторно не считаем
+  async function fetchMoreRobots() {
+    if (!nextCursor.value) return
+    loading.value = true
+    error.value = null
+    try {
+      const response = await robotsApi.list({
+        ...lastParams.value,
+        cursor: nextCursor.value,
+        total_mode: 'none',
+      })
+      robots.value = [...robots.value, ...response.robots]
+      nextCursor.value = response.next_cursor
+    } catch (e: unknown) {
+      const err = e as { response?: { data?: { detail?: string } } }
+      error.value = err.response?.data?.detail || 'Ошибка загрузки роботов'
+    } finally {
+      loading.value = false
+    }
+  }
+
+  // Текущие метрики роботов из списка; без данных — просто нет записи
+  async function fetchLive(metrics?: string[]) {
+    const ids = robots.value.map(r => r.id)
+    if (ids.length === 0) return
+    try {
+      const items = await robotsApi.live(ids, metrics)
+      live.value = Object.fromEntries(items.map(item => [item.robot_id, item]))
+    } catch {
+      // Колонки метрик вспомогательные, ошибку списка не показываем
+    }
+  }
+
+  async function fetchSummary() {
+    try {
+      summary.value = await robotsApi.summary()
+    } catch (e: unknown) {
+      const err = e as { response?: { data?: { detail?: string } } }
+      error.value = err.response?.data?.detail || 'Ошибка загрузки сводки'
+    }
+  }
+
+  // Пачка событий подряд — один запрос сводки
+  function scheduleSummaryRefresh() {
+    clearTimeout(summaryRefresh)
+    summaryRefresh = window.setTimeout(fetchSummary, EVENT_REFRESH_DELAY_MS)
+  }
+
+  // Не сбрасываем таймер: при потоке событий список всё равно обновится раз в окно
+  function scheduleListRefresh() {
+    if (!listLoaded || listRefresh !== undefined) return
+    listRefresh = window.setTimeout(() => {
+      listRefresh = undefined
+      fetchRobots(lastParams.value)
+    }, EVENT_REFRESH_DELAY_MS)
+  }
+
+  // Порядок списка от статуса не зависит: чужой робот попадает на страницу,
+  // только если он новый, привязан или теперь подходит под фильтр статуса
+  function couldEnterList(event: RobotEvent) {
+    if (event.type === 'paired') return true
+    if (event.type !== 'status') return false
+    if (event.previous_status === null) return true
+    return !!lastParams.value?.status && event.status === lastParams.value.status
+  }
+
   async function fetchRobot(id: number) {
     loading.value = true
     error.value = null
@@ -87,7 +177,8 @@ export const useRobotsStore = defineStore('robots', () => {
     try {
       await robotsApi.delete(id)
       robots.value = robots.value.filter(r => r.id !== id)
-      total.value--
+      if (total.value !== null) total.value--
+      if (summary.value) scheduleSummaryRefresh()
       if (currentRobot.value?.id === id) {
         currentRobot.value = null
       }
@@ -104,19 +195,75 @@ export const useRobotsStore = defineStore('robots', () => {
     currentRobot.value = null
   }
 
+  function applyEvent(event: RobotEvent) {
+    if (summary.value && event.type !== 'last_seen') {
+      scheduleSummaryRefresh()
+    }
+    if (event.type === 'resync') {
+      scheduleListRefresh()
+      return
+    }
+
+    const patch: Partial<Robot> = {}
+    if (event.status) patch.status = event.status
+    if (event.last_seen_at) patch.last_seen_at = event.last_seen_at
+    if (event.type === 'paired') patch.owner_id = event.owner_id
+
+    const index = robots.value.findIndex(r => r.id === event.robot_id)
+    const filteredOut = !!lastParams.value?.status && !!patch.status && patch.status !== lastParams.value.status
+    if (index !== -1 && filteredOut) {
+      scheduleListRefresh()
+    } else if (index !== -1) {
+      robots.value[index] = { ...robots.value[index], ...patch }
+    } else if (couldEnterList(event)) {
+      scheduleListRefresh()
+    }
+    if (currentRobot.value?.id === event.robot_id) {
+      currentRobot.value = { ...currentRobot.value, ...patch }
+    }
+  }
+
+  // Подписки считаются, чтобы смена страниц не закрывала общий поток
+  function subscribeEvents() {
+    eventSubscribers++
+    if (eventSource) return
+    eventSource = robotsApi.events()
+    const handler = (message: MessageEvent<string>) => applyEvent(JSON.parse(message.data))
+    for (const type of ['status', 'last_seen', 'paired', 'resync']) {
+      eventSource.addEventListener(type, handler as EventListener)
+    }
+  }
+
+  function unsubscribeEvents() {
+    eventSubscribers = Math.max(0, eventSubscribers - 1)
+    if (eventSubscribers > 0) return
+    eventSource?.close()
+    eventSource = null
+    clearTimeout(listRefresh)
+    listRefresh = undefined
+  }
+
   return {
     robots,
     currentRobot,
     total,
+    nextCursor,
+    summary,
+    live,
     loading,
     error,
     activeRobots,
     pendingRobots,
     robotsByStatus,
     fetchRobots,
+    fetchMoreRobots,
+    fetchSummary,
+    fetchLive,
     fetchRobot,
     updateRobot,
     deleteRobot,
     clearCurrent,
+    subscribeEvents,
+    unsubscribeEvents,
   }
 })
@@ -30,9 +30,64 @@ export interface RobotDetail extends Robot {
   influxdb_token: string | null
 }
 
+export interface FleetSummary {
+  total: number
+  by_status: Record<RobotStatus, number>
+  by_architecture: Record<Architecture, number>
+  by_owner: { owner_id: number | null; count: number }[]
+}
+
+export type TotalMode = 'exact' | 'estimate' | 'none'
+
+export type SearchMode = 'substring' | 'fuzzy'
+
 export interface RobotListResponse {
   robots: Robot[]
-  total: number
+  total: number | null
+  next_cursor: string | null
+}
+
+export interface LiveMetric {
+  value: number
+  time: string
+}
+
+export interface RobotLive {
+  robot_id: number
+  updated_at: string | null
+  metrics: Record<string, LiveMetric>
+}
+
+export type DownsampleMode = 'mean' | 'lttb' | 'minmax'
+
+export interface MetricPoint {
+  time: string
+  value: number | null
+  min?: number | null
+  max?: number | null
+}
+
+export interface MetricSeries {
+  robot_id: number
+  measurement: string
+  field: string
+  start: string
+  end: string
+  step: number
+  downsample: DownsampleMode
+  points: MetricPoint[]
+}
+
+export type RobotEventType = 'status' | 'last_seen' | 'paired' | 'resync'
+
+export interface RobotEvent {
+  type: RobotEventType
+  robot_id: number
+  owner_id: number | null
+  status: RobotStatus | null
+  previous_status: RobotStatus | null
+  last_seen_at: string | null
+  occurred_at: string
 }
 
 export interface TokenResponse {
@@ -12,7 +12,7 @@ from sqlalchemy.ext.asyncio import async_engine_from_config
 from alembic import context
 from app.config import get_settings
 from app.database import Base
-from app.models import PairCode, Robot, User  # noqa: F401
+from app.models import PairCode, Robot, RobotStatusEvent, User  # noqa: F401
 
 config = context.config
 settings = get_settings()
@@ -67,6 +67,11 @@ async def run_async_migrations() -> None:
 
 def run_migrations_online() -> None:
     """Run migrations in 'online' mode."""
+    # A caller that already holds a connection (the query plan tests) passes it in
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        do_run_migrations(connection)
+        return
     asyncio.run(run_async_migrations())
 
 
@@ -0,0 +1,78 @@
+"""Add robot_status_events partitioned by month
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-19
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+revision: str = "003"
+down_revision: str | None = "002"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "robot_status_events",
+        sa.Column("id", sa.BigInteger(), sa.Identity(), nullable=False),
+        sa.Column("occurred_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("robot_id", sa.Integer(), nullable=False),
+        sa.Column(
+            "status",
+            postgresql.ENUM(
+                "pending", "active", "inactive", "error", name="robot_status", create_type=False
+            ),
+            nullable=False,
+        ),
+        sa.Column(
+            "previous_status",
+            postgresql.ENUM(
+                "pending", "active", "inactive", "error", name="robot_status", create_type=False
+            ),
+            nullable=True,
+        ),
+        # Ключ секционирования обязан входить в первичный ключ
+        sa.PrimaryKeyConstraint("id", "occurred_at"),
+        postgresql_partition_by="RANGE (occurred_at)",
+    )
+    op.create_index(
+        "ix_robot_status_events_robot_id_occurred_at",
+        "robot_status_events",
+        ["robot_id", "occurred_at"],
+    )
+
+    # Секции на текущий и два следующих месяца; дальше их создаёт фоновая задача
+    op.execute(
+        """
+        DO $$
+        DECLARE
+            month_start timestamp := date_trunc('month', now() AT TIME ZONE 'UTC');
+            bound_from timestamp;
+        BEGIN
+            FOR i IN 0..2 LOOP
+                bound_from := month_start + make_interval(months => i);
+                EXECUTE format(
+                    'CREATE TABLE IF NOT EXISTS %I PARTITION OF robot_status_events '
+                    'FOR VALUES FROM (%L) TO (%L)',
+                    'robot_status_events_' || to_char(bound_from, 'YYYY"_"MM'),
+                    to_char(bound_from, 'YYYY-MM-DD') || ' 00:00:00+00',
+                    to_char(bound_from + interval '1 month', 'YYYY-MM-DD') || ' 00:00:00+00'
+                );
+            END LOOP;
+        END $$;
+        """
+    )
+
+
+def downgrade() -> None:
+    # Секции удаляются вместе с родительской таблицей
+    op.drop_index("ix_robot_status_events_robot_id_occurred_at", table_name="robot_status_events")
+    op.drop_table("robot_status_events")
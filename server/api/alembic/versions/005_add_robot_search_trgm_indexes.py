@@ -0,0 +1,47 @@
+"""Add pg_trgm GIN indexes for robot search
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-19
+
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+revision: str = "005"
+down_revision: str | None = "004"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+TRGM_COLUMNS = ("name", "hostname", "description")
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    # Индексы обслуживают ILIKE '%q%', similarity (%) и word_similarity (%>)
+    with op.get_context().autocommit_block():
+        for column in TRGM_COLUMNS:
+            op.create_index(
+                f"ix_robots_{column}_trgm",
+                "robots",
+                [column],
+                postgresql_using="gin",
+                postgresql_ops={column: "gin_trgm_ops"},
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for column in TRGM_COLUMNS:
+            op.drop_index(
+                f"ix_robots_{column}_trgm",
+                table_name="robots",
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
+    # Расширение оставляем: им могут пользоваться другие объекты БД
@@ -0,0 +1,71 @@
+"""Add composite and partial indexes for hot robot and pair code queries
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-19
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision: str = "006"
+down_revision: str | None = "005"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+# (имя, таблица, колонки, условие частичного индекса)
+INDEXES: tuple[tuple[str, str, list[str], str | None], ...] = (
+    # Список роботов пользователя: owner_id = ? ORDER BY created_at DESC, id DESC
+    ("ix_robots_owner_id_created_at_id", "robots", ["owner_id", "created_at", "id"], None),
+    # Список с фильтром по статусу (админ видит всех)
+    ("ix_robots_status_created_at_id", "robots", ["status", "created_at", "id"], None),
+    # Авторизация приёма метрик по токену робота
+    (
+        "ix_robots_influxdb_token",
+        "robots",
+        ["influxdb_token"],
+        "influxdb_token IS NOT NULL",
+    ),
+    # Поиск неактивных: status = 'active' AND last_seen_at < ?
+    ("ix_robots_active_last_seen_at", "robots", ["last_seen_at"], "status = 'active'"),
+    # Очистка брошенных роботов
+    (
+        "ix_robots_pending_unowned_created_at",
+        "robots",
+        ["created_at"],
+        "status = 'pending' AND owner_id IS NULL",
+    ),
+    # Истечение кодов привязки: status = 'pending' AND expires_at < ?
+    ("ix_pair_codes_pending_expires_at", "pair_codes", ["expires_at"], "status = 'pending'"),
+    # Внешний ключ на robots: проверка ожидающих кодов и удаление вместе с роботом
+    ("ix_pair_codes_robot_id", "pair_codes", ["robot_id"], None),
+)
+
+
+def upgrade() -> None:
+    # CONCURRENTLY не блокирует запись, но не работает внутри транзакции
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                postgresql_where=sa.text(where) if where else None,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(
+                name,
+                table_name=table,
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
@@ -0,0 +1,113 @@
+"""Add alert rules and their checkpointed state
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-19
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+revision: str = "007"
+down_revision: str | None = "006"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE TYPE alert_condition AS ENUM ('gt', 'gte', 'lt', 'lte')")
+    op.execute("CREATE TYPE alert_scope AS ENUM ('robot', 'owner', 'fleet')")
+    op.execute("CREATE TYPE alert_status AS ENUM ('pending', 'firing')")
+
+    op.create_table(
+        "alert_rules",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("name", sa.String(length=255), nullable=False),
+        sa.Column("metric", sa.String(length=255), nullable=False),
+        sa.Column(
+            "condition",
+            postgresql.ENUM("gt", "gte", "lt", "lte", name="alert_condition", create_type=False),
+            nullable=False,
+        ),
+        sa.Column("threshold", sa.Float(), nullable=False),
+        sa.Column("duration_seconds", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column(
+            "scope",
+            postgresql.ENUM("robot", "owner", "fleet", name="alert_scope", create_type=False),
+            nullable=False,
+        ),
+        sa.Column("robot_id", sa.Integer(), nullable=True),
+        sa.Column("owner_id", sa.Integer(), nullable=True),
+        sa.Column("enabled", sa.Boolean(), nullable=False, server_default="true"),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.ForeignKeyConstraint(
+            ["robot_id"], ["robots.id"], name="fk_alert_rules_robot_id_robots", ondelete="CASCADE"
+        ),
+        sa.ForeignKeyConstraint(
+            ["owner_id"], ["users.id"], name="fk_alert_rules_owner_id_users", ondelete="CASCADE"
+        ),
+        sa.CheckConstraint(
+            "(scope = 'robot' AND robot_id IS NOT NULL)"
+            " OR (scope = 'owner' AND owner_id IS NOT NULL AND robot_id IS NULL)"
+            " OR (scope = 'fleet' AND owner_id IS NULL AND robot_id IS NULL)",
+            name="ck_alert_rules_scope",
+        ),
+        sa.CheckConstraint("duration_seconds >= 0", name="ck_alert_rules_duration"),
+    )
+    op.create_index("ix_alert_rules_robot_id", "alert_rules", ["robot_id"])
+    op.create_index("ix_alert_rules_owner_id", "alert_rules", ["owner_id"])
+
+    op.create_table(
+        "alert_rule_states",
+        sa.Column("rule_id", sa.Integer(), nullable=False),
+        sa.Column("robot_id", sa.Integer(), nullable=False),
+        sa.Column(
+            "status",
+            postgresql.ENUM("pending", "firing", name="alert_status", create_type=False),
+            nullable=False,
+        ),
+        sa.Column("active_since", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("fired_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("value", sa.Float(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("rule_id", "robot_id"),
+        sa.ForeignKeyConstraint(
+            ["rule_id"],
+            ["alert_rules.id"],
+            name="fk_alert_rule_states_rule_id_alert_rules",
+            ondelete="CASCADE",
+        ),
+        sa.ForeignKeyConstraint(
+            ["robot_id"],
+            ["robots.id"],
+            name="fk_alert_rule_states_robot_id_robots",
+            ondelete="CASCADE",
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("alert_rule_states")
+    op.drop_index("ix_alert_rules_owner_id", table_name="alert_rules")
+    op.drop_index("ix_alert_rules_robot_id", table_name="alert_rules")
+    op.drop_table("alert_rules")
+    op.execute("DROP TYPE alert_status")
+    op.execute("DROP TYPE alert_scope")
+    op.execute("DROP TYPE alert_condition")
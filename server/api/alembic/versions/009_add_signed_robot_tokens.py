@@ -0,0 +1,41 @@
+"""Add signed robot token metadata and revocation marker
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-19
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision: str = "009"
+down_revision: str | None = "008"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    # Колонки без значений по умолчанию: добавление не переписывает таблицу.
+    # Существующие роботы остаются со старыми токенами в influxdb_token
+    op.add_column("robots", sa.Column("token_key_version", sa.SmallInteger(), nullable=True))
+    op.add_column("robots", sa.Column("token_issued_at", sa.DateTime(timezone=True), nullable=True))
+    op.add_column(
+        "robots", sa.Column("token_not_before", sa.DateTime(timezone=True), nullable=True)
+    )
+    op.create_index(
+        "ix_robots_token_not_before",
+        "robots",
+        ["token_not_before"],
+        postgresql_where=sa.text("token_not_before IS NOT NULL"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_robots_token_not_before", table_name="robots")
+    op.drop_column("robots", "token_not_before")
+    op.drop_column("robots", "token_issued_at")
+    op.drop_column("robots", "token_key_version")
@@ -0,0 +1,89 @@
+"""Replace plaintext legacy robot tokens with a unique SHA-256 digest
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-19
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision: str = "010"
+down_revision: str | None = "009"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+# Строк за одну транзакцию заполнения: короткие блокировки, без долгой транзакции
+BACKFILL_BATCH_SIZE = 1000
+
+BACKFILL_BATCH = sa.text(
+    """
+    UPDATE robots
+    SET influxdb_token_digest = sha256(convert_to(influxdb_token, 'UTF8')),
+        influxdb_token = NULL
+    WHERE id IN (
+        SELECT id FROM robots
+        WHERE influxdb_token IS NOT NULL
+        ORDER BY id
+        LIMIT :batch_size
+    )
+    """
+)
+
+
+def upgrade() -> None:
+    op.add_column("robots", sa.Column("influxdb_token_digest", sa.LargeBinary(), nullable=True))
+    op.create_check_constraint(
+        "ck_robots_influxdb_token_digest_length",
+        "robots",
+        "octet_length(influxdb_token_digest) = 32",
+    )
+
+    # CONCURRENTLY и пачки с отдельными коммитами не работают внутри транзакции
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        while bind.execute(BACKFILL_BATCH, {"batch_size": BACKFILL_BATCH_SIZE}).rowcount:
+            pass
+
+        op.create_index(
+            "ix_robots_influxdb_token_digest",
+            "robots",
+            ["influxdb_token_digest"],
+            unique=True,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.drop_index(
+            "ix_robots_influxdb_token",
+            table_name="robots",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+
+    op.drop_column("robots", "influxdb_token")
+
+
+def downgrade() -> None:
+    # Открытые токены не восстановить: роботам со старыми токенами нужен перевыпуск
+    op.add_column("robots", sa.Column("influxdb_token", sa.Text(), nullable=True))
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_robots_influxdb_token",
+            "robots",
+            ["influxdb_token"],
+            postgresql_where=sa.text("influxdb_token IS NOT NULL"),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.drop_index(
+            "ix_robots_influxdb_token_digest",
+            table_name="robots",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+    op.drop_constraint("ck_robots_influxdb_token_digest_length", "robots", type_="check")
+    op.drop_column("robots", "influxdb_token_digest")
@@ -7,7 +7,9 @@
 from collections.abc import AsyncGenerator
 
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.sql.expression import ClauseElement, Executable
 
 from app.config import get_settings
 
@@ -39,6 +41,24 @@ class Base(DeclarativeBase):
     """Базовый класс для ORM моделей."""
 
 
+class Explain(Executable, ClauseElement):
+    """
+    EXPLAIN (FORMAT JSON) для произвольного запроса SQLAlchemy.
+
+    Параметры запроса передаются как bind-параметры, без подстановки в текст.
+    """
+
+    inherit_cache = False
+
+    def __init__(self, statement: Executable) -> None:
+        self.statement = statement
+
+
+@compiles(Explain, "postgresql")
+def _compile_explain(element: Explain, compiler, **kw) -> str:
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     """Dependency для получения сессии БД."""
     async with async_session_maker() as session:
@@ -2,49 +2,58 @@
 Зависимости FastAPI для аутентификации и авторизации.
 """
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import JWTError, jwt
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import get_settings
 from app.database import get_db
-from app.models import User, UserRole
+from app.models import UserRole
+from app.services.user_cache import CurrentUser, user_cache
 
 settings = get_settings()
 security = HTTPBearer()
 
 
+def decode_access_token(token: str) -> int | None:
+    """Id пользователя из access токена или None, если токен невалиден."""
+    try:
+        payload = jwt.decode(
+            token,
+            settings.jwt_secret_key,
+            algorithms=[settings.jwt_algorithm],
+        )
+    except JWTError:
+        return None
+
+    user_id = payload.get("sub")
+    if not isinstance(user_id, str) or not user_id.isdigit() or payload.get("type") != "access":
+        return None
+    return int(user_id)
+
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: AsyncSession = Depends(get_db),
-) -> User:
-    """Получает текущего пользователя из JWT токена."""
+) -> CurrentUser:
+    """
+    Получает текущего пользователя из JWT токена.
+
+    Пользователь берётся из кэша процесса (`app.services.user_cache`),
+    запрос в БД выполняется не чаще раза в `USER_CACHE_TTL_SECONDS`.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Невалидный токен авторизации",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
-    token = credentials.credentials
-
-    try:
-        payload = jwt.decode(
-            token,
-            settings.jwt_secret_key,
-            algorithms=[settings.jwt_algorithm],
-        )
-        user_id: str = payload.get("sub")
-        token_type: str = payload.get("type")
-
-        if user_id is None or token_type != "access":
-            raise credentials_exception
-    except JWTError:
+    user_id = decode_access_token(credentials.credentials)
+    if user_id is None:
         raise credentials_exception
 
-    result = await db.execute(select(User).where(User.id == int(user_id)))
-    user = result.scalar_one_or_none()
+    user = await user_cache.get(db, user_id)
 
     if user is None:
         raise credentials_exception
@@ -58,9 +67,34 @@ async def get_current_user(
     return user
 
 
+async def get_current_user_for_stream(
+    credentials: HTTPAuthorizationCredentials | None = Depends(HTTPBearer(auto_error=False)),
+    access_token: str | None = Query(None, description="JWT access токен (для EventSource)"),
+    db: AsyncSession = Depends(get_db),
+) -> CurrentUser:
+    """
+    Получает текущего пользователя для потоковых эндпоинтов.
+
+    EventSource в браузере не умеет передавать заголовки,
+    поэтому токен допускается и в query-параметре `access_token`.
+    """
+    token = credentials.credentials if credentials else access_token
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Не передан токен авторизации",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    return await get_current_user(
+        HTTPAuthorizationCredentials(scheme="Bearer", credentials=token),
+        db,
+    )
+
+
 async def get_current_active_user(
-    current_user: User = Depends(get_current_user),
-) -> User:
+    current_user: CurrentUser = Depends(get_current_user),
+) -> CurrentUser:
     """Проверяет, что пользователь активен."""
     if not current_user.is_active:
         raise HTTPException(
@@ -71,8 +105,8 @@ async def get_current_active_user(
 
 
 async def get_current_admin(
-    current_user: User = Depends(get_current_user),
-) -> User:
+    current_user: CurrentUser = Depends(get_current_user),
+) -> CurrentUser:
     """Проверяет, что пользователь — администратор."""
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(
@@ -88,26 +122,15 @@ def get_optional_current_user():
     async def _get_optional_user(
         credentials: HTTPAuthorizationCredentials | None = Depends(HTTPBearer(auto_error=False)),
         db: AsyncSession = Depends(get_db),
-    ) -> User | None:
+    ) -> CurrentUser | None:
         if credentials is None:
             return None
 
-        try:
-            payload = jwt.decode(
-                credentials.credentials,
-                settings.jwt_secret_key,
-                algorithms=[settings.jwt_algorithm],
-            )
-            user_id: str = payload.get("sub")
-            token_type: str = payload.get("type")
-
-            if user_id is None or token_type != "access":
-                return None
-        except JWTError:
+        user_id = decode_access_token(credentials.credentials)
+        if user_id is None:
             return None
 
-        result = await db.execute(select(User).where(User.id == int(user_id)))
-        user = result.scalar_one_or_none()
+        user = await user_cache.get(db, user_id)
 
         if user is None or not user.is_active:
             return None
@@ -7,15 +7,33 @@ WolfpackCloud Monitoring API — сервис привязки и управле
 from contextlib import asynccontextmanager
 from typing import Any
 
-from fastapi import FastAPI, Request, status
+from fastapi import Depends, FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import __version__
 from app.config import get_settings
-from app.database import init_db
-from app.routers import auth_router, metrics_router, pairing_router, robots_router
-from app.schemas import ErrorResponse, HealthResponse
+from app.database import get_db, init_db
+from app.routers import (
+    alerts_router,
+    auth_router,
+    metrics_router,
+    pairing_router,
+    robots_router,
+    telemetry_router,
+    webhooks_router,
+)
+from app.schemas import ErrorResponse, HealthResponse, LeaderResponse
+from app.services.alerts import alert_engine
+from app.services.anomalies import anomaly_detector
+from app.services.external_auth import external_auth
+from app.services.leader import leader_elector
+from app.services.liveness import liveness_tracker
+from app.services.passwords import password_hasher
+from app.services.robot_tokens import robot_tokens
+from app.services.status_history import status_history_recorder
+from app.services.webhooks import webhook_dispatcher
 from app.tasks import start_scheduler, stop_scheduler
 
 settings = get_settings()
@@ -26,10 +44,28 @@ async def lifespan(_app: FastAPI):
     """Lifecycle события приложения."""
     # Startup
     await init_db()
+    await status_history_recorder.start()
+    await liveness_tracker.start()
+    await robot_tokens.start()
+    await anomaly_detector.start()
+    await alert_engine.start()
+    await webhook_dispatcher.start()
+    await external_auth.start()
+    await leader_elector.start()
     start_scheduler()
     yield
     # Shutdown
     stop_scheduler()
+    await leader_elector.stop()
+    await external_auth.stop()
+    # Последнее сведение алертов объявляет переходы — до остановки рассылки
+    await alert_engine.stop()
+    await webhook_dispatcher.stop()
+    await robot_tokens.stop()
+    await anomaly_detector.stop()
+    await liveness_tracker.stop()
+    await status_history_recorder.stop()
+    password_hasher.shutdown()
 
 
 app = FastAPI(
@@ -85,10 +121,14 @@ async def global_exception_handler(_request: Request, _exc: Exception) -> JSONRe
 
 
 # Подключение роутеров
+app.include_router(alerts_router)
 app.include_router(auth_router)
 app.include_router(metrics_router)
 app.include_router(pairing_router)
+# До robots_router: иначе /api/robots/live совпадёт с /api/robots/{robot_id}
+app.include_router(telemetry_router)
 app.include_router(robots_router)
+app.include_router(webhooks_router)
 
 
 # Health check
@@ -109,6 +149,22 @@ async def health_check() -> dict[str, Any]:
     }
 
 
+@app.get(
+    "/health/leader",
+    response_model=LeaderResponse,
+    tags=["system"],
+    summary="Лидер фоновых задач",
+    description="Показывает, какой процесс сейчас выполняет периодические задачи.",
+)
+async def leader_status(db: AsyncSession = Depends(get_db)) -> dict[str, Any]:
+    """Возвращает информацию о лидерстве."""
+    return {
+        "instance_id": leader_elector.instance_id,
+        "is_leader": leader_elector.is_leader,
+        "leader": await leader_elector.current_leader(db),
+    }
+
+
 # Root endpoint
 @app.get(
     "/",
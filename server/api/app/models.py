@@ -1,13 +1,33 @@
 """
 SQLAlchemy ORM модели.
 
-Определяет структуру таблиц для хранения информации о пользователях, роботах и кодах привязки.
+Определяет структуру таблиц для хранения информации о пользователях, роботах, кодах привязки,
+истории статусов роботов, правилах алертов и вебхуках.
 """
 
 import enum
 from datetime import datetime
 
-from sqlalchemy import Boolean, DateTime, Enum, ForeignKey, Integer, String, Text, func
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    CheckConstraint,
+    DateTime,
+    Enum,
+    Float,
+    ForeignKey,
+    Identity,
+    Index,
+    Integer,
+    LargeBinary,
+    PrimaryKeyConstraint,
+    SmallInteger,
+    String,
+    Text,
+    func,
+    text,
+)
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
@@ -45,6 +65,38 @@ class PairCodeStatus(enum.StrEnum):
     EXPIRED = "expired"
 
 
+class AlertCondition(enum.StrEnum):
+    """Условие срабатывания правила алерта."""
+
+    GT = "gt"
+    GTE = "gte"
+    LT = "lt"
+    LTE = "lte"
+
+
+class AlertScope(enum.StrEnum):
+    """Область действия правила алерта."""
+
+    ROBOT = "robot"
+    OWNER = "owner"
+    FLEET = "fleet"
+
+
+class AlertStatus(enum.StrEnum):
+    """Состояние алерта по роботу."""
+
+    PENDING = "pending"
+    FIRING = "firing"
+
+
+class WebhookDeliveryStatus(enum.StrEnum):
+    """Состояние доставки уведомления на вебхук."""
+
+    PENDING = "pending"
+    DELIVERED = "delivered"
+    DEAD = "dead"
+
+
 class User(Base):
     """Модель пользователя."""
 
@@ -79,6 +131,46 @@ class Robot(Base):
     """Модель робота."""
 
     __tablename__ = "robots"
+    __table_args__ = (
+        # Keyset-пагинация списка: ORDER BY created_at DESC, id DESC
+        Index("ix_robots_created_at_id", "created_at", "id"),
+        Index("ix_robots_owner_id_created_at_id", "owner_id", "created_at", "id"),
+        Index("ix_robots_status_created_at_id", "status", "created_at", "id"),
+        # Авторизация приёма метрик по токену старого формата
+        Index("ix_robots_influxdb_token_digest", "influxdb_token_digest", unique=True),
+        CheckConstraint(
+            "octet_length(influxdb_token_digest) = 32",
+            name="ck_robots_influxdb_token_digest_length",
+        ),
+        # Список отзыва токенов
+        Index(
+            "ix_robots_token_not_before",
+            "token_not_before",
+            postgresql_where=text("token_not_before IS NOT NULL"),
+        ),
+        # Поиск неактивных роботов
+        Index(
+            "ix_robots_active_last_seen_at",
+            "last_seen_at",
+            postgresql_where=text("status = 'active'"),
+        ),
+        # Очистка брошенных роботов
+        Index(
+            "ix_robots_pending_unowned_created_at",
+            "created_at",
+            postgresql_where=text("status = 'pending' AND owner_id IS NULL"),
+        ),
+        # Триграммный поиск (расширение pg_trgm)
+        *(
+            Index(
+                f"ix_robots_{column}_trgm",
+                column,
+                postgresql_using="gin",
+                postgresql_ops={column: "gin_trgm_ops"},
+            )
+            for column in ("name", "hostname", "description")
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     name: Mapped[str] = mapped_column(String(255), nullable=False)
@@ -94,7 +186,13 @@ class Robot(Base):
         nullable=False,
         default=RobotStatus.PENDING,
     )
-    influxdb_token: Mapped[str | None] = mapped_column(Text)
+    # SHA-256 токена старого формата; подписанные токены не хранятся
+    # (app.services.robot_tokens)
+    influxdb_token_digest: Mapped[bytes | None] = mapped_column(LargeBinary)
+    token_key_version: Mapped[int | None] = mapped_column(SmallInteger)
+    token_issued_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    # Токены, выданные раньше, отозваны
+    token_not_before: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
     description: Mapped[str | None] = mapped_column(Text)
 
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
@@ -118,6 +216,15 @@ class PairCode(Base):
     """Модель кода привязки."""
 
     __tablename__ = "pair_codes"
+    __table_args__ = (
+        # Истечение кодов привязки
+        Index(
+            "ix_pair_codes_pending_expires_at",
+            "expires_at",
+            postgresql_where=text("status = 'pending'"),
+        ),
+        Index("ix_pair_codes_robot_id", "robot_id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     code: Mapped[str] = mapped_column(String(8), unique=True, nullable=False, index=True)
@@ -139,3 +246,199 @@ class PairCode(Base):
 
     def __repr__(self) -> str:
         return f"<PairCode(code={self.code}, status={self.status})>"
+
+
+class RobotStatusEvent(Base):
+    """
+    Запись истории статусов робота.
+
+    Таблица только на добавление, секционирована по месяцам по `occurred_at`.
+    Секции создаёт и удаляет `app.services.status_history`. Внешнего ключа
+    на robots нет: история переживает удаление робота.
+    """
+
+    __tablename__ = "robot_status_events"
+    __table_args__ = (
+        Index("ix_robot_status_events_robot_id_occurred_at", "robot_id", "occurred_at"),
+        {"postgresql_partition_by": "RANGE (occurred_at)"},
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, Identity(), primary_key=True)
+    occurred_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    robot_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    status: Mapped[RobotStatus] = mapped_column(
+        Enum(RobotStatus, name="robot_status", values_callable=lambda x: [e.value for e in x]),
+        nullable=False,
+    )
+    previous_status: Mapped[RobotStatus | None] = mapped_column(
+        Enum(RobotStatus, name="robot_status", values_callable=lambda x: [e.value for e in x]),
+    )
+
+    def __repr__(self) -> str:
+        return (
+            f"<RobotStatusEvent(robot_id={self.robot_id}, status={self.status}, "
+            f"occurred_at={self.occurred_at})>"
+        )
+
+
+class AlertRule(Base):
+    """
+    Правило алерта по метрике.
+
+    Срабатывает, когда значение метрики робота удовлетворяет условию
+    дольше `duration_seconds`. Область: один робот (`robot_id`), все роботы
+    владельца (`owner_id`) или весь парк. У правила робота `owner_id` —
+    владелец робота на момент создания: по нему проверяется доступ.
+    """
+
+    __tablename__ = "alert_rules"
+    __table_args__ = (
+        CheckConstraint(
+            "(scope = 'robot' AND robot_id IS NOT NULL)"
+            " OR (scope = 'owner' AND owner_id IS NOT NULL AND robot_id IS NULL)"
+            " OR (scope = 'fleet' AND owner_id IS NULL AND robot_id IS NULL)",
+            name="ck_alert_rules_scope",
+        ),
+        CheckConstraint("duration_seconds >= 0", name="ck_alert_rules_duration"),
+        Index("ix_alert_rules_robot_id", "robot_id"),
+        Index("ix_alert_rules_owner_id", "owner_id"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    name: Mapped[str] = mapped_column(String(255), nullable=False)
+    metric: Mapped[str] = mapped_column(String(255), nullable=False)
+    condition: Mapped[AlertCondition] = mapped_column(
+        Enum(
+            AlertCondition, name="alert_condition", values_callable=lambda x: [e.value for e in x]
+        ),
+        nullable=False,
+    )
+    threshold: Mapped[float] = mapped_column(Float, nullable=False)
+    duration_seconds: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    scope: Mapped[AlertScope] = mapped_column(
+        Enum(AlertScope, name="alert_scope", values_callable=lambda x: [e.value for e in x]),
+        nullable=False,
+    )
+    robot_id: Mapped[int | None] = mapped_column(ForeignKey("robots.id", ondelete="CASCADE"))
+    owner_id: Mapped[int | None] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
+    enabled: Mapped[bool] = mapped_column(Boolean, nullable=False, default=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+    def __repr__(self) -> str:
+        return f"<AlertRule(id={self.id}, metric={self.metric}, scope={self.scope})>"
+
+
+class AlertRuleState(Base):
+    """
+    Сохранённое состояние алерта: правило × робот.
+
+    Общее состояние воркеров API: каждый проверяет свои точки в памяти
+    (`app.services.alerts`) и периодически сводит изменения с таблицей.
+    `updated_at` — время последней точки, выполнившей условие.
+    """
+
+    __tablename__ = "alert_rule_states"
+    __table_args__ = (PrimaryKeyConstraint("rule_id", "robot_id"),)
+
+    rule_id: Mapped[int] = mapped_column(ForeignKey("alert_rules.id", ondelete="CASCADE"))
+    robot_id: Mapped[int] = mapped_column(ForeignKey("robots.id", ondelete="CASCADE"))
+    status: Mapped[AlertStatus] = mapped_column(
+        Enum(AlertStatus, name="alert_status", values_callable=lambda x: [e.value for e in x]),
+        nullable=False,
+    )
+    active_since: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    fired_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    value: Mapped[float] = mapped_column(Float, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+
+    def __repr__(self) -> str:
+        return (
+            f"<AlertRuleState(rule_id={self.rule_id}, robot_id={self.robot_id}, "
+            f"status={self.status})>"
+        )
+
+
+class WebhookEndpoint(Base):
+    """
+    Адрес, на который отправляются уведомления о событиях роботов.
+
+    Получает события роботов владельца (`owner_id`) или, если владелец
+    не задан, всего парка. Повторные попытки после ошибок откладываются
+    для адреса целиком: `failure_count` подряд неудачных отправок,
+    `retry_after` — не раньше какого момента пробовать снова.
+    """
+
+    __tablename__ = "webhook_endpoints"
+    __table_args__ = (Index("ix_webhook_endpoints_owner_id", "owner_id"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    owner_id: Mapped[int | None] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
+    url: Mapped[str] = mapped_column(String(2048), nullable=False)
+    secret: Mapped[str | None] = mapped_column(String(255))
+    enabled: Mapped[bool] = mapped_column(Boolean, nullable=False, default=True)
+
+    failure_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    retry_after: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    last_error: Mapped[str | None] = mapped_column(Text)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+    def __repr__(self) -> str:
+        return f"<WebhookEndpoint(id={self.id}, url={self.url}, enabled={self.enabled})>"
+
+
+class WebhookDelivery(Base):
+    """
+    Уведомление в очереди на отправку (outbox).
+
+    Строка создаётся на каждую пару «событие × адрес». Ожидающие
+    уведомления одного адреса отправляются одним запросом; исчерпавшие
+    попытки остаются в таблице со статусом DEAD до ручного повтора.
+    """
+
+    __tablename__ = "webhook_deliveries"
+    __table_args__ = (
+        Index("ix_webhook_deliveries_endpoint_id_id", "endpoint_id", "id"),
+        # Выборка очереди адреса
+        Index(
+            "ix_webhook_deliveries_pending",
+            "endpoint_id",
+            "id",
+            postgresql_where=text("status = 'pending'"),
+        ),
+        # Очистка старых записей
+        Index("ix_webhook_deliveries_created_at", "created_at"),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, Identity(), primary_key=True)
+    endpoint_id: Mapped[int] = mapped_column(
+        ForeignKey("webhook_endpoints.id", ondelete="CASCADE"), nullable=False
+    )
+    event_type: Mapped[str] = mapped_column(String(64), nullable=False)
+    payload: Mapped[dict] = mapped_column(JSONB, nullable=False)
+    status: Mapped[WebhookDeliveryStatus] = mapped_column(
+        Enum(
+            WebhookDeliveryStatus,
+            name="webhook_delivery_status",
+            values_callable=lambda x: [e.value for e in x],
+        ),
+        nullable=False,
+        default=WebhookDeliveryStatus.PENDING,
+    )
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    last_error: Mapped[str | None] = mapped_column(Text)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    delivered_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+
+    def __repr__(self) -> str:
+        return (
+            f"<WebhookDelivery(id={self.id}, endpoint_id={self.endpoint_id}, status={self.status})>"
+        )
@@ -0,0 +1,375 @@
+"""
+Сверка учёток пользователей с Grafana и Superset.
+
+`User.grafana_user_id` и `User.superset_user_id` остаются пустыми, если
+создание учётки при регистрации не удалось. Сверка за один проход
+выгружает списки пользователей обоих сервисов постранично, сравнивает их
+с таблицей `users` в памяти и исправляет расхождения:
+
+- `link` — учётка с email пользователя уже есть: сохраняется её id;
+- `create` — учётки нет: создаётся со случайным паролем (пароль
+  пользователя в открытом виде не хранится, его нужно задать заново);
+- `delete` — учётка деактивированного пользователя, а с `--delete-orphans`
+  и учётка, не принадлежащая ни одному пользователю; администраторы
+  сервисов не удаляются;
+- `unlink` — сохранённой учётки в сервисе больше нет, а пользователь
+  деактивирован: id стирается.
+
+Запросы к сервисам идут не более чем по `--concurrency` одновременно и не
+чаще `--rate` в секунду к каждому сервису. Изменения `users` записываются
+одним пакетным UPDATE в конце.
+
+Запуск из server/api (по умолчанию — только отчёт, без изменений):
+
+    python -m app.reconcile [--apply] [--delete-orphans] [--concurrency 8] [--rate 20]
+"""
+
+import argparse
+import asyncio
+import enum
+import logging
+import secrets
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from typing import TypeVar
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import async_session_factory
+from app.models import User
+from app.services.external_auth import (
+    ExternalAccount,
+    ExternalAuthService,
+    external_auth,
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+GRAFANA_PAGE_SIZE = 1000
+# Больше Superset (FAB_API_MAX_PAGE_SIZE по умолчанию) не отдаёт
+SUPERSET_PAGE_SIZE = 100
+
+
+class Service(enum.StrEnum):
+    """Внешний сервис с учётками пользователей."""
+
+    GRAFANA = "grafana"
+    SUPERSET = "superset"
+
+
+class ActionKind(enum.StrEnum):
+    """Исправление, найденное сверкой."""
+
+    LINK = "link"
+    CREATE = "create"
+    DELETE = "delete"
+    UNLINK = "unlink"
+
+
+@dataclass(frozen=True, slots=True)
+class LocalUser:
+    """Пользователь WolfpackCloud и его учётки во внешних сервисах."""
+
+    id: int
+    email: str
+    name: str
+    is_active: bool
+    grafana_user_id: int | None
+    superset_user_id: int | None
+
+    def external_id(self, service: Service) -> int | None:
+        """Сохранённый id учётки в сервисе."""
+        return self.grafana_user_id if service == Service.GRAFANA else self.superset_user_id
+
+
+@dataclass(frozen=True, slots=True)
+class Action:
+    """Одно исправление: что сделать с учёткой в сервисе."""
+
+    service: Service
+    kind: ActionKind
+    email: str
+    user_id: int | None = None
+    external_id: int | None = None
+
+
+@dataclass
+class ServiceReport:
+    """Итог сверки одного сервиса."""
+
+    service: Service
+    accounts: int = 0
+    actions: list[Action] = field(default_factory=list)
+    # Выполненные исправления (у create — с id созданной учётки) и неудавшиеся
+    applied: list[Action] = field(default_factory=list)
+    failed: list[Action] = field(default_factory=list)
+    # Список учёток не выгружен — сверка сервиса пропущена
+    error: str | None = None
+
+
+def plan_actions(
+    service: Service,
+    users: list[LocalUser],
+    accounts: list[ExternalAccount],
+    delete_orphans: bool = False,
+) -> list[Action]:
+    """
+    Сравнивает пользователей с учётками сервиса и возвращает исправления.
+
+    Учётка пользователя ищется по сохранённому id, затем по email.
+    """
+    by_id = {account.id: account for account in accounts}
+    by_email = {account.email: account for account in accounts if account.email}
+
+    actions: list[Action] = []
+    claimed: set[int] = set()
+    for user in users:
+        stored = user.external_id(service)
+        email = user.email.lower()
+        account = (by_id.get(stored) if stored is not None else None) or by_email.get(email)
+        if account is not None:
+            claimed.add(account.id)
+
+        if not user.is_active:
+            if account is not None and not account.admin:
+                actions.append(Action(service, ActionKind.DELETE, email, user.id, account.id))
+            elif stored is not None and account is None:
+                actions.append(Action(service, ActionKind.UNLINK, email, user.id, stored))
+            continue
+
+        if account is None:
+            actions.append(Action(service, ActionKind.CREATE, email, user.id))
+        elif account.id != stored:
+            actions.append(Action(service, ActionKind.LINK, email, user.id, account.id))
+
+    if delete_orphans:
+        actions.extend(
+            Action(service, ActionKind.DELETE, account.email, None, account.id)
+            for account in accounts
+            if account.id not in claimed and not account.admin
+        )
+    return actions
+
+
+class RateLimiter:
+    """Равномерно распределяет вызовы: не больше `rate` в секунду."""
+
+    def __init__(
+        self,
+        rate: float,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    ) -> None:
+        self._interval = 1.0 / rate
+        self._clock = clock
+        self._sleep = sleep
+        self._next = 0.0
+
+    async def acquire(self) -> None:
+        """Ждёт своего слота."""
+        now = self._clock()
+        slot = max(now, self._next)
+        self._next = slot + self._interval
+        if slot > now:
+            await self._sleep(slot - now)
+
+
+class Reconciler:
+    """Сверка учёток с ограничением параллельности и частоты запросов."""
+
+    def __init__(
+        self,
+        service: ExternalAuthService = external_auth,
+        concurrency: int = 8,
+        rate: float = 20.0,
+    ) -> None:
+        self._service = service
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._limiters = {s: RateLimiter(rate) for s in Service}
+
+    async def run(
+        self, db: AsyncSession, apply: bool = False, delete_orphans: bool = False
+    ) -> list[ServiceReport]:
+        """Сверяет оба сервиса; с `apply` применяет исправления и сохраняет id."""
+        users = await load_users(db)
+        reports = await asyncio.gather(
+            *(self._reconcile(service, users, apply, delete_orphans) for service in Service)
+        )
+
+        if apply:
+            rows = user_updates(reports)
+            if rows:
+                await db.execute(update(User), rows)
+                await db.commit()
+        return list(reports)
+
+    async def _reconcile(
+        self, service: Service, users: list[LocalUser], apply: bool, delete_orphans: bool
+    ) -> ServiceReport:
+        report = ServiceReport(service)
+        accounts = await self.list_accounts(service)
+        if accounts is None:
+            # По неполному списку нельзя ни создавать, ни удалять
+            report.error = "не удалось получить список пользователей"
+            return report
+
+        report.accounts = len(accounts)
+        report.actions = plan_actions(service, users, accounts, delete_orphans)
+        if not apply:
+            return report
+
+        names = {user.id: user.name for user in users}
+        results = await asyncio.gather(
+            *(self._apply(action, names.get(action.user_id, "")) for action in report.actions),
+            return_exceptions=True,
+        )
+        for action, result in zip(report.actions, results, strict=True):
+            if isinstance(result, Exception):
+                logger.warning("Reconcile %s failed: %r", action, result)
+                report.failed.append(action)
+            elif result is None:
+                report.failed.append(action)
+            else:
+                report.applied.append(result)
+        return report
+
+    async def list_accounts(self, service: Service) -> list[ExternalAccount] | None:
+        """Все учётки сервиса: первая страница даёт общее число, остальные — параллельно."""
+        if service == Service.GRAFANA:
+            first_page, page_size = 1, GRAFANA_PAGE_SIZE
+            fetch = self._service.grafana_users_page
+        else:
+            first_page, page_size = 0, SUPERSET_PAGE_SIZE
+            fetch = self._service.superset_users_page
+
+        first = await self._call(service, lambda: fetch(first_page, page_size))
+        if first is None:
+            return None
+        accounts, total = first
+        pages = -(-total // page_size)
+        rest = await asyncio.gather(
+            *(
+                self._call(service, lambda page=page: fetch(page, page_size))
+                for page in range(first_page + 1, first_page + pages)
+            )
+        )
+        for page in rest:
+            if page is None:
+                return None
+            accounts.extend(page[0])
+        # Страницы могли сдвинуться, пока шла выгрузка
+        return list({account.id: account for account in accounts}.values())
+
+    async def _apply(self, action: Action, name: str) -> Action | None:
+        """Выполняет исправление. Возвращает его (с id созданной учётки) или None при ошибке."""
+        grafana = action.service == Service.GRAFANA
+        if action.kind == ActionKind.CREATE:
+            create = (
+                self._service.create_grafana_user if grafana else self._service.create_superset_user
+            )
+            password = secrets.token_urlsafe(24)
+            external_id = await self._call(
+                action.service, lambda: create(action.email, password, name)
+            )
+            if external_id is None:
+                return None
+            return Action(action.service, action.kind, action.email, action.user_id, external_id)
+
+        if action.kind == ActionKind.DELETE:
+            delete = (
+                self._service.delete_grafana_user if grafana else self._service.delete_superset_user
+            )
+            if not await self._call(action.service, lambda: delete(action.external_id)):
+                return None
+        return action
+
+    async def _call(self, service: Service, request: Callable[[], Awaitable[T]]) -> T:
+        async with self._semaphore:
+            await self._limiters[service].acquire()
+            return await request()
+
+
+async def load_users(db: AsyncSession) -> list[LocalUser]:
+    """Все пользователи одним запросом."""
+    result = await db.execute(
+        select(
+            User.id,
+            User.email,
+            User.name,
+            User.is_active,
+            User.grafana_user_id,
+            User.superset_user_id,
+        ).order_by(User.id)
+    )
+    return [LocalUser(*row) for row in result]
+
+
+def user_updates(reports: list[ServiceReport]) -> list[dict]:
+    """Строки пакетного UPDATE users по применённым исправлениям."""
+    rows: dict[int, dict] = {}
+    for report in reports:
+        column = f"{report.service}_user_id"
+        for action in report.applied:
+            if action.user_id is None:
+                continue
+            row = rows.setdefault(action.user_id, {"id": action.user_id})
+            if action.kind in (ActionKind.LINK, ActionKind.CREATE):
+                row[column] = action.external_id
+            else:
+                row[column] = None
+    return list(rows.values())
+
+
+def format_report(reports: list[ServiceReport], apply: bool) -> str:
+    """Текстовый отчёт: итоги по сервисам и список исправлений."""
+    lines = []
+    for report in reports:
+        if report.error:
+            lines.append(f"{report.service}: пропущен — {report.error}")
+            continue
+        counts = dict.fromkeys(ActionKind, 0)
+        for action in report.actions:
+            counts[action.kind] += 1
+        summary = ", ".join(f"{kind} {count}" for kind, count in counts.items())
+        status = f"; применено {len(report.applied)}, ошибок {len(report.failed)}" if apply else ""
+        lines.append(f"{report.service}: учёток {report.accounts}; {summary}{status}")
+        failed = set(report.failed)
+        lines.extend(
+            f"  {action.kind:<6} user={action.user_id or '-'} "
+            f"external={action.external_id or '-'} {action.email}"
+            + (" — ошибка" if action in failed else "")
+            for action in report.actions
+        )
+    if not apply:
+        lines.append("Пробный прогон: изменения не применялись (--apply для применения).")
+    elif any(a.kind == ActionKind.CREATE for r in reports for a in r.applied):
+        lines.append("Созданным учёткам назначен случайный пароль: его нужно задать заново.")
+    return "\n".join(lines)
+
+
+async def main(args: argparse.Namespace) -> None:
+    reconciler = Reconciler(concurrency=args.concurrency, rate=args.rate)
+    try:
+        async with async_session_factory() as db:
+            reports = await reconciler.run(db, apply=args.apply, delete_orphans=args.delete_orphans)
+    finally:
+        await external_auth.stop()
+    print(format_report(reports, args.apply))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сверка учёток с Grafana и Superset")
+    parser.add_argument("--apply", action="store_true", help="Применить исправления")
+    parser.add_argument(
+        "--delete-orphans",
+        action="store_true",
+        help="Удалять учётки, не принадлежащие ни одному пользователю",
+    )
+    parser.add_argument("--concurrency", type=int, default=8, help="Одновременных запросов")
+    parser.add_argument("--rate", type=float, default=20.0, help="Запросов в секунду к сервису")
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(parser.parse_args()))
@@ -2,9 +2,20 @@
 Роутеры API.
 """
 
+from app.routers.alerts import router as alerts_router
 from app.routers.auth import router as auth_router
 from app.routers.metrics import router as metrics_router
 from app.routers.pairing import router as pairing_router
 from app.routers.robots import router as robots_router
+from app.routers.telemetry import router as telemetry_router
+from app.routers.webhooks import router as webhooks_router
 
-__all__ = ["auth_router", "metrics_router", "pairing_router", "robots_router"]
+__all__ = [
+    "alerts_router",
+    "auth_router",
+    "metrics_router",
+    "pairing_router",
+    "robots_router",
+    "telemetry_router",
+    "webhooks_router",
+]
@@ -0,0 +1,266 @@
+"""
+API эндпоинты алертов по метрикам.
+
+Правила хранятся в PostgreSQL, а проверяются при приёме метрик
+(`app.services.alerts`): изменения правил сразу попадают в индекс
+текущего процесса, остальные воркеры подхватывают их при синхронизации.
+Активные алерты отдаются из общей для воркеров таблицы `alert_rule_states`.
+"""
+
+from datetime import UTC, datetime
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_db
+from app.deps import get_current_user
+from app.models import AlertRule, AlertRuleState, AlertScope, Robot, UserRole
+from app.routers.robots import can_access_owner, can_access_robot
+from app.schemas import (
+    ActiveAlertListResponse,
+    ActiveAlertResponse,
+    AlertRuleCreate,
+    AlertRuleListResponse,
+    AlertRuleResponse,
+    AlertRuleUpdate,
+    ErrorResponse,
+)
+from app.services.alerts import SYNC_INTERVAL_SECONDS, alert_engine
+from app.services.live_metrics import TRACKED_SERIES
+from app.services.user_cache import CurrentUser
+
+router = APIRouter(prefix="/api/alerts", tags=["alerts"])
+
+
+async def get_accessible_rule(
+    rule_id: int, current_user: CurrentUser, db: AsyncSession
+) -> AlertRule:
+    """
+    Правило, к которому у пользователя есть доступ.
+
+    Raises:
+        HTTPException: 404 если правила нет, 403 если нет доступа
+    """
+    result = await db.execute(select(AlertRule).where(AlertRule.id == rule_id))
+    rule = result.scalar_one_or_none()
+
+    if not rule:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Правило не найдено",
+        )
+
+    if not can_access_owner(rule.owner_id, current_user):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Нет доступа к этому правилу",
+        )
+
+    return rule
+
+
+@router.get(
+    "",
+    response_model=ActiveAlertListResponse,
+    summary="Активные алерты",
+    description=f"""
+Алерты в ожидании (`pending`: условие выполняется, но меньше `duration_seconds`)
+и сработавшие (`firing`) по роботам, доступным пользователю.
+
+Читаются из общего для всех воркеров состояния, которое сводится
+раз в {SYNC_INTERVAL_SECONDS:.0f} с.
+    """,
+)
+async def list_active_alerts(
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> ActiveAlertListResponse:
+    """Возвращает активные алерты."""
+    query = (
+        select(AlertRuleState, AlertRule.name, AlertRule.metric)
+        .join(AlertRule, AlertRule.id == AlertRuleState.rule_id)
+        .join(Robot, Robot.id == AlertRuleState.robot_id)
+        .where(AlertRule.enabled)
+        .order_by(AlertRuleState.active_since.desc())
+    )
+    if current_user.role != UserRole.ADMIN:
+        query = query.where(Robot.owner_id == current_user.id)
+    result = await db.execute(query)
+
+    return ActiveAlertListResponse(
+        alerts=[
+            ActiveAlertResponse(
+                rule_id=state.rule_id,
+                rule_name=rule_name,
+                metric=metric,
+                robot_id=state.robot_id,
+                status=state.status,
+                value=state.value,
+                since=state.active_since,
+                fired_at=state.fired_at,
+            )
+            for state, rule_name, metric in result
+        ]
+    )
+
+
+@router.get(
+    "/rules",
+    response_model=AlertRuleListResponse,
+    summary="Правила алертов",
+    description="Правила пользователя; администратор видит все правила.",
+)
+async def list_alert_rules(
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> AlertRuleListResponse:
+    """Возвращает правила алертов."""
+    query = select(AlertRule).order_by(AlertRule.id)
+    if current_user.role != UserRole.ADMIN:
+        query = query.where(AlertRule.owner_id == current_user.id)
+    result = await db.execute(query)
+    return AlertRuleListResponse(
+        rules=[AlertRuleResponse.model_validate(rule) for rule in result.scalars()]
+    )
+
+
+@router.post(
+    "/rules",
+    response_model=AlertRuleResponse,
+    status_code=status.HTTP_201_CREATED,
+    responses={
+        400: {"model": ErrorResponse, "description": "Неверная метрика или область"},
+        403: {"model": ErrorResponse, "description": "Нет доступа к роботу или владельцу"},
+        404: {"model": ErrorResponse, "description": "Робот не найден"},
+    },
+    summary="Создание правила алерта",
+    description=f"""
+Правило срабатывает, когда значение метрики робота удовлетворяет условию
+(`gt`, `gte`, `lt`, `lte` относительно `threshold`) дольше `duration_seconds`.
+
+Область (`scope`): `robot` — один робот (`robot_id`), `owner` — все роботы
+владельца (`owner_id`, по умолчанию текущий пользователь), `fleet` — весь парк
+(только администратор).
+
+Проверяются метрики измерений: {", ".join(sorted(TRACKED_SERIES))}.
+Другие воркеры API подхватывают новое правило в течение
+{SYNC_INTERVAL_SECONDS:.0f} с.
+    """,
+)
+async def create_alert_rule(
+    data: AlertRuleCreate,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> AlertRuleResponse:
+    """Создаёт правило алерта."""
+    measurement = data.metric.split(".", 1)[0]
+    if measurement not in TRACKED_SERIES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Алерты по измерению {measurement} не поддерживаются",
+        )
+
+    robot_id = owner_id = None
+    if data.scope == AlertScope.ROBOT:
+        if data.robot_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Для правила робота нужен robot_id",
+            )
+        result = await db.execute(select(Robot).where(Robot.id == data.robot_id))
+        robot = result.scalar_one_or_none()
+        if not robot:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Робот не найден",
+            )
+        if not can_access_robot(robot, current_user):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Нет доступа к этому роботу",
+            )
+        robot_id, owner_id = robot.id, robot.owner_id
+    elif data.scope == AlertScope.OWNER:
+        owner_id = current_user.id if data.owner_id is None else data.owner_id
+        if not can_access_owner(owner_id, current_user):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Нет доступа к роботам этого владельца",
+            )
+    elif current_user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Правила для всего парка может создавать только администратор",
+        )
+
+    rule = AlertRule(
+        name=data.name,
+        metric=data.metric,
+        condition=data.condition,
+        threshold=data.threshold,
+        duration_seconds=data.duration_seconds,
+        scope=data.scope,
+        robot_id=robot_id,
+        owner_id=owner_id,
+        enabled=data.enabled,
+    )
+    db.add(rule)
+    await db.commit()
+    await db.refresh(rule)
+    alert_engine.set_rule(rule)
+
+    return AlertRuleResponse.model_validate(rule)
+
+
+@router.patch(
+    "/rules/{rule_id}",
+    response_model=AlertRuleResponse,
+    responses={
+        403: {"model": ErrorResponse, "description": "Нет доступа к правилу"},
+        404: {"model": ErrorResponse, "description": "Правило не найдено"},
+    },
+    summary="Обновление правила алерта",
+    description="Частичное обновление условия, порога, длительности или включённости правила.",
+)
+async def update_alert_rule(
+    rule_id: int,
+    update_data: AlertRuleUpdate,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> AlertRuleResponse:
+    """Обновляет правило алерта."""
+    rule = await get_accessible_rule(rule_id, current_user, db)
+
+    for field, value in update_data.model_dump(exclude_unset=True).items():
+        setattr(rule, field, value)
+
+    rule.updated_at = datetime.now(UTC)
+    await db.commit()
+    await db.refresh(rule)
+    alert_engine.set_rule(rule)
+
+    return AlertRuleResponse.model_validate(rule)
+
+
+@router.delete(
+    "/rules/{rule_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    responses={
+        403: {"model": ErrorResponse, "description": "Нет доступа к правилу"},
+        404: {"model": ErrorResponse, "description": "Правило не найдено"},
+    },
+    summary="Удаление правила алерта",
+    description="Удаляет правило вместе с состоянием его алертов.",
+)
+async def delete_alert_rule(
+    rule_id: int,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> None:
+    """Удаляет правило алерта."""
+    rule = await get_accessible_rule(rule_id, current_user, db)
+
+    await db.delete(rule)
+    await db.commit()
+    alert_engine.remove_rule(rule_id)
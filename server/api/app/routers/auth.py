@@ -8,7 +8,6 @@ from datetime import UTC, datetime, timedelta
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -23,22 +22,12 @@ from app.schemas import (
     UserLogin,
     UserResponse,
 )
+from app.services.passwords import PasswordHasherBusyError, password_hasher
+from app.services.user_cache import CurrentUser
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 settings = get_settings()
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Проверяет пароль."""
-    return pwd_context.verify(plain_password, hashed_password)
-
-
-def get_password_hash(password: str) -> str:
-    """Хэширует пароль."""
-    return pwd_context.hash(password)
-
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None) -> str:
     """Создаёт access токен."""
@@ -86,7 +75,7 @@ def create_refresh_token(data: dict, expires_delta: timedelta | None = None) ->
 #
 #     user = User(
 #         email=request.email.lower(),
-#         hashed_password=get_password_hash(request.password),
+#         hashed_password=await password_hasher.hash(request.password),
 #         name=request.name,
 #         role=UserRole.USER,
 #         is_active=True,
@@ -95,11 +84,7 @@ def create_refresh_token(data: dict, expires_delta: timedelta | None = None) ->
 #     await db.commit()
 #     await db.refresh(user)
 #
-#     ext_auth = ExternalAuthService(settings)
-#     grafana_id = await ext_auth.create_grafana_user(
-#         email=user.email, password=request.password, name=user.name
-#     )
-#     superset_id = await ext_auth.create_superset_user(
+#     grafana_id, superset_id = await external_auth.provision_user(
 #         email=user.email, password=request.password, name=user.name
 #     )
 #     if grafana_id is not None or superset_id is not None:
@@ -116,9 +101,15 @@ def create_refresh_token(data: dict, expires_delta: timedelta | None = None) ->
     response_model=TokenResponse,
     responses={
         401: {"model": ErrorResponse, "description": "Неверные учётные данные"},
+        429: {"model": ErrorResponse, "description": "Слишком много одновременных входов"},
     },
     summary="Вход в систему",
-    description="Аутентификация по email и паролю. Возвращает JWT токены.",
+    description="""
+Аутентификация по email и паролю. Возвращает JWT токены.
+
+Пароли проверяются в ограниченном пуле потоков; когда его очередь
+заполнена, запрос сразу получает 429 с заголовком `Retry-After`.
+    """,
 )
 async def login(
     request: UserLogin,
@@ -128,7 +119,18 @@ async def login(
     result = await db.execute(select(User).where(User.email == request.email.lower()))
     user = result.scalar_one_or_none()
 
-    if not user or not verify_password(request.password, user.hashed_password):
+    try:
+        valid = user is not None and await password_hasher.verify(
+            request.password, user.hashed_password
+        )
+    except PasswordHasherBusyError:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Слишком много попыток входа, повторите позже",
+            headers={"Retry-After": "1"},
+        )
+
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Неверный email или пароль",
@@ -222,7 +224,10 @@ async def refresh_tokens(
     description="Возвращает информацию о текущем авторизованном пользователе.",
 )
 async def get_me(
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
 ) -> UserResponse:
     """Возвращает текущего пользователя."""
-    return UserResponse.model_validate(current_user)
+    # В кэше авторизации только id, имя, роль и активность — профиль читается целиком
+    result = await db.execute(select(User).where(User.id == current_user.id))
+    return UserResponse.model_validate(result.scalar_one())
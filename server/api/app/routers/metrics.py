@@ -1,8 +1,9 @@
 """
 API эндпоинт для приёма метрик от роботов.
 
-Роботы отправляют метрики через этот эндпоинт с авторизацией по персональному токену.
-API проксирует данные в InfluxDB.
+Роботы отправляют метрики через этот эндпоинт с авторизацией по персональному токену
+(подписанному, см. `app.services.robot_tokens`, или старого формата). API проксирует
+данные в InfluxDB, проставляя каждой строке тег с id робота.
 """
 
 import gzip
@@ -10,13 +11,19 @@ from datetime import UTC, datetime
 
 import httpx
 from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, status
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import get_settings
 from app.database import get_db
 from app.models import Robot, RobotStatus
 from app.schemas import ErrorResponse
+from app.services.events import robot_event_bus
+from app.services.line_protocol import set_tag
+from app.services.live_metrics import live_metrics
+from app.services.liveness import liveness_tracker
+from app.services.metrics_query import ROBOT_ID_TAG
+from app.services.robot_queries import robot_by_token_query
+from app.services.robot_tokens import is_current_token, is_signed_token, robot_tokens
 
 router = APIRouter(prefix="/api/metrics", tags=["metrics"])
 settings = get_settings()
@@ -46,8 +53,18 @@ async def get_robot_by_token(
             detail="Токен не указан",
         )
 
-    result = await db.execute(select(Robot).where(Robot.influxdb_token == token))
-    robot = result.scalar_one_or_none()
+    if is_signed_token(token):
+        # Подпись и отзыв проверяются в памяти: поддельный или отозванный
+        # токен отклоняется без запроса в БД
+        claims = robot_tokens.verify(token)
+        robot = await db.get(Robot, claims.robot_id) if claims else None
+        # Строка робота всё равно нужна (статус, last_seen_at); по ней отзыв
+        # сверяется точно, не дожидаясь обновления списка в этом процессе
+        if robot is not None and not is_current_token(robot, claims):
+            robot = None
+    else:
+        result = await db.execute(robot_by_token_query(token))
+        robot = result.scalar_one_or_none()
 
     if not robot:
         raise HTTPException(
@@ -92,7 +109,7 @@ async def receive_metrics(
     1. Валидирует токен робота
     2. Читает тело запроса (InfluxDB Line Protocol)
     3. Распаковывает gzip если нужно
-    4. Пересылает в InfluxDB
+    4. Проставляет тег с id робота и пересылает в InfluxDB
     5. Обновляет last_seen_at робота
     """
     body = await request.body()
@@ -113,6 +130,11 @@ async def receive_metrics(
                 detail="Невалидные gzip данные",
             )
 
+    text = body.decode("utf-8", errors="replace")
+    # История и выгрузка выбирают точки по этому тегу: hostname задаёт сам
+    # робот и не уникален, а id берётся из токена
+    tagged = set_tag(text, ROBOT_ID_TAG, str(robot.id))
+
     influx_url = f"{settings.influxdb_url}/api/v2/write"
     params = {
         "org": settings.influxdb_org,
@@ -129,7 +151,7 @@ async def receive_metrics(
                     "Authorization": f"Token {settings.influxdb_token}",
                     "Content-Type": "text/plain; charset=utf-8",
                 },
-                content=body,
+                content=tagged.encode(),
                 timeout=10.0,
             )
 
@@ -146,5 +168,13 @@ async def receive_metrics(
 
     robot.last_seen_at = datetime.now(UTC)
     await db.commit()
+    live_metrics.ingest(
+        robot.id,
+        robot.owner_id,
+        text,
+        robot.last_seen_at.timestamp(),
+    )
+    liveness_tracker.touch(robot.id)
+    robot_event_bus.publish_last_seen(robot.id, robot.owner_id, robot.last_seen_at)
 
     return Response(status_code=status.HTTP_204_NO_CONTENT)
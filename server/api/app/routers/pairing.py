@@ -4,7 +4,6 @@ API эндпоинты для привязки роботов.
 Обеспечивает регистрацию роботов через 8-значный код и подтверждение привязки.
 """
 
-import secrets
 from datetime import UTC, datetime, timedelta
 
 from fastapi import APIRouter, Depends, HTTPException, status
@@ -15,7 +14,7 @@ from sqlalchemy.orm import selectinload
 from app.config import get_settings
 from app.database import get_db
 from app.deps import get_current_user
-from app.models import PairCode, PairCodeStatus, Robot, RobotStatus, User
+from app.models import PairCode, PairCodeStatus, Robot, RobotStatus
 from app.schemas import (
     ErrorResponse,
     PairCodeInfoResponse,
@@ -25,16 +24,15 @@ from app.schemas import (
     PairResponse,
     PairStatusResponse,
 )
+from app.services.events import robot_event_bus
+from app.services.liveness import liveness_tracker
+from app.services.robot_tokens import robot_tokens
+from app.services.user_cache import CurrentUser
 
 router = APIRouter(prefix="/api/pair", tags=["pairing"])
 settings = get_settings()
 
 
-def generate_influxdb_token() -> str:
-    """Генерирует токен для InfluxDB."""
-    return secrets.token_urlsafe(32)
-
-
 @router.post(
     "",
     response_model=PairResponse,
@@ -90,6 +88,7 @@ async def register_robot(
     )
     db.add(pair_code)
     await db.commit()
+    robot_event_bus.publish_status(robot.id, None, RobotStatus.PENDING, None)
 
     return PairResponse(
         robot_id=robot.id,
@@ -180,7 +179,7 @@ async def get_pair_status(
         return PairStatusResponse(
             status=pair_code.status,
             robot_id=robot.id,
-            robot_token=robot.influxdb_token,
+            robot_token=robot_tokens.token_for(robot),
             api_url=f"{settings.api_base_url}/api/metrics",
             message="Привязка подтверждена. Используйте токен для отправки метрик.",
         )
@@ -217,7 +216,7 @@ async def get_pair_status(
 async def confirm_pairing(
     code: str,
     request: PairConfirmRequest | None = None,
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ) -> PairConfirmResponse:
     """
@@ -226,7 +225,7 @@ async def confirm_pairing(
     После подтверждения:
     - Робот привязывается к текущему пользователю (owner_id)
     - Статус робота меняется на ACTIVE
-    - Генерируется токен InfluxDB для отправки метрик
+    - Выдаётся подписанный токен для отправки метрик
     - Код привязки помечается как CONFIRMED
     """
     result = await db.execute(
@@ -254,13 +253,11 @@ async def confirm_pairing(
             detail="Срок действия кода истёк",
         )
 
-    influxdb_token = generate_influxdb_token()
-
     robot = pair_code.robot
     if request and request.robot_name:
         robot.name = request.robot_name
     robot.status = RobotStatus.ACTIVE
-    robot.influxdb_token = influxdb_token
+    influxdb_token = robot_tokens.assign(robot, datetime.now(UTC))
     robot.last_seen_at = datetime.now(UTC)
     robot.owner_id = current_user.id
 
@@ -268,6 +265,8 @@ async def confirm_pairing(
     pair_code.confirmed_at = datetime.now(UTC)
 
     await db.commit()
+    liveness_tracker.touch(robot.id)
+    robot_event_bus.publish_paired(robot.id, current_user.id, robot.last_seen_at)
 
     return PairConfirmResponse(
         robot_id=robot.id,
@@ -4,76 +4,283 @@ API эндпоинты для управления роботами.
 CRUD операции над зарегистрированными роботами с разграничением доступа по пользователям.
 """
 
-from datetime import UTC, datetime
+import asyncio
+from collections.abc import AsyncIterator
+from datetime import UTC, datetime, timedelta
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy import func, select
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database import get_db
-from app.deps import get_current_user
-from app.models import Robot, RobotStatus, User, UserRole
+from app.deps import get_current_user, get_current_user_for_stream
+from app.models import Robot, RobotStatus, UserRole
 from app.schemas import (
     ErrorResponse,
+    FleetSummaryResponse,
+    FleetUptimeResponse,
     RobotDetailResponse,
     RobotListResponse,
     RobotResponse,
+    RobotTokenResponse,
     RobotUpdate,
+    RobotUptimeWindowResponse,
+    SearchMode,
+    TotalMode,
 )
+from app.services.alerts import alert_engine
+from app.services.anomalies import anomaly_detector
+from app.services.events import RobotEvent, robot_event_bus
+from app.services.fleet_summary import SUMMARY_CACHE_TTL_SECONDS, fleet_summary_cache
+from app.services.live_metrics import live_metrics
+from app.services.liveness import liveness_tracker
+from app.services.metrics_query import metrics_query_cache
+from app.services.robot_queries import (
+    build_robot_list_query,
+    count_estimate,
+    count_exact,
+    encode_cursor,
+    order_by_rank,
+    order_robot_page,
+)
+from app.services.robot_tokens import robot_tokens
+from app.services.uptime import load_fleet_uptime
+from app.services.user_cache import CurrentUser
 
 router = APIRouter(prefix="/api/robots", tags=["robots"])
 
+# Интервал комментариев keep-alive в SSE-потоке
+EVENTS_KEEPALIVE_SECONDS = 15.0
+# Задержка переподключения EventSource после обрыва
+EVENTS_RETRY_MILLISECONDS = 3000
 
-def can_access_robot(robot: Robot, user: User) -> bool:
-    """Проверяет, имеет ли пользователь доступ к роботу."""
+# Окно расчёта доступности по умолчанию и максимальное
+UPTIME_DEFAULT_WINDOW = timedelta(days=7)
+UPTIME_MAX_WINDOW = timedelta(days=366)
+
+
+def can_access_owner(owner_id: int | None, user: CurrentUser) -> bool:
+    """Проверяет, имеет ли пользователь доступ к роботам владельца."""
     if user.role == UserRole.ADMIN:
         return True
-    return robot.owner_id == user.id
+    return owner_id == user.id
+
+
+def can_access_robot(robot: Robot, user: CurrentUser) -> bool:
+    """Проверяет, имеет ли пользователь доступ к роботу."""
+    return can_access_owner(robot.owner_id, user)
+
+
+def resolve_uptime_window(
+    start: datetime | None, end: datetime | None
+) -> tuple[datetime, datetime]:
+    """Подставляет границы окна по умолчанию и проверяет их."""
+    end = end or datetime.now(UTC)
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=UTC)
+    start = start or end - UPTIME_DEFAULT_WINDOW
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=UTC)
+
+    if start >= end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Начало окна должно быть раньше конца",
+        )
+    if end - start > UPTIME_MAX_WINDOW:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Окно не может быть длиннее {UPTIME_MAX_WINDOW.days} дней",
+        )
+    return start, end
 
 
 @router.get(
     "",
     response_model=RobotListResponse,
+    responses={400: {"model": ErrorResponse, "description": "Некорректный курсор"}},
     summary="Список роботов",
-    description="Получение списка роботов текущего пользователя. Админ видит всех роботов.",
+    description="""
+Получение списка роботов текущего пользователя. Админ видит всех роботов.
+
+Для постраничного обхода передавайте `next_cursor` из предыдущего ответа в `cursor`:
+каждая страница стоит столько же, сколько первая. `skip` оставлен для совместимости.
+`total_mode=estimate` возвращает оценку количества по плану запроса, `none` — не считает его.
+
+`search_mode=fuzzy` ищет по триграммам в имени, hostname и описании: находит совпадения
+по префиксу и с опечатками и сортирует по сходству. В этом режиме страницы листаются через `skip`.
+    """,
 )
 async def list_robots(
     status_filter: RobotStatus | None = Query(
         None, alias="status", description="Фильтр по статусу"
     ),
     search: str | None = Query(None, description="Поиск по имени или hostname"),
-    skip: int = Query(0, ge=0, description="Пропустить записей"),
+    search_mode: SearchMode = Query(
+        SearchMode.SUBSTRING, description="Режим поиска: подстрока или нечёткий с ранжированием"
+    ),
+    cursor: str | None = Query(None, description="Курсор из next_cursor предыдущей страницы"),
+    skip: int = Query(0, ge=0, description="Пропустить записей (без курсора)"),
     limit: int = Query(50, ge=1, le=100, description="Максимум записей"),
-    current_user: User = Depends(get_current_user),
+    total_mode: TotalMode = Query(
+        TotalMode.EXACT, description="Подсчёт total: точно, оценкой по плану или без него"
+    ),
+    current_user: CurrentUser = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ) -> RobotListResponse:
     """Возвращает список роботов с фильтрацией по владельцу."""
-    query = select(Robot)
-
-    if current_user.role != UserRole.ADMIN:
-        query = query.where(Robot.owner_id == current_user.id)
-
-    if status_filter:
-        query = query.where(Robot.status == status_filter)
-
-    if search:
-        search_pattern = f"%{search}%"
-        query = query.where(
-            (Robot.name.ilike(search_pattern)) | (Robot.hostname.ilike(search_pattern))
+    if cursor is not None and skip:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Параметры cursor и skip нельзя использовать вместе",
         )
 
-    count_query = select(func.count()).select_from(query.subquery())
-    total_result = await db.execute(count_query)
-    total = total_result.scalar_one()
-
-    query = query.order_by(Robot.created_at.desc()).offset(skip).limit(limit)
+    fuzzy = bool(search) and search_mode == SearchMode.FUZZY
+    if fuzzy and cursor is not None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Нечёткий поиск не поддерживает cursor, используйте skip",
+        )
 
-    result = await db.execute(query)
+    query = build_robot_list_query(current_user, status_filter, search, fuzzy=fuzzy)
+
+    total = None
+    if total_mode == TotalMode.EXACT:
+        total = await count_exact(db, query)
+    elif total_mode == TotalMode.ESTIMATE:
+        total = await count_estimate(db, query)
+
+    if fuzzy:
+        page_query = order_by_rank(query, search)
+    else:
+        try:
+            page_query = order_robot_page(query, cursor)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Некорректный курсор",
+            ) from None
+
+    # Лишняя строка показывает, есть ли следующая страница
+    result = await db.execute(page_query.offset(skip).limit(limit + 1))
     robots = result.scalars().all()
+    has_more = len(robots) > limit
+    next_cursor = encode_cursor(robots[limit - 1]) if has_more and not fuzzy else None
 
     return RobotListResponse(
-        robots=[RobotResponse.model_validate(r) for r in robots],
+        robots=[RobotResponse.model_validate(r) for r in robots[:limit]],
         total=total,
+        next_cursor=next_cursor,
+    )
+
+
+@router.get(
+    "/summary",
+    response_model=FleetSummaryResponse,
+    summary="Сводка по роботам",
+    description=f"""
+Количество роботов по статусам, архитектурам и владельцам. Админ видит весь парк.
+Сводка кэшируется на {SUMMARY_CACHE_TTL_SECONDS:.0f} с. Смена статуса робота сбрасывает кэш
+воркера, в котором она произошла; другие воркеры API могут отдавать прежние
+числа до истечения этого времени.
+    """,
+)
+async def fleet_summary(
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> FleetSummaryResponse:
+    """Возвращает сводку по доступным пользователю роботам."""
+    owner_id = None if current_user.role == UserRole.ADMIN else current_user.id
+    summary = await fleet_summary_cache.get(db, owner_id)
+
+    return FleetSummaryResponse(
+        total=summary.total,
+        by_status=summary.by_status,
+        by_architecture=summary.by_architecture,
+        by_owner=[{"owner_id": owner, "count": count} for owner, count in summary.by_owner.items()],
+    )
+
+
+@router.get(
+    "/uptime",
+    response_model=FleetUptimeResponse,
+    responses={400: {"model": ErrorResponse, "description": "Некорректное окно"}},
+    summary="Доступность парка роботов",
+    description="""
+Доступность, MTBF и MTTR по каждому роботу и сводка по владельцам за окно
+`[start, end)`. По умолчанию — последние 7 дней. Админ видит весь парк.
+    """,
+)
+async def fleet_uptime(
+    start: datetime | None = Query(None, description="Начало окна"),
+    end: datetime | None = Query(None, description="Конец окна"),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> FleetUptimeResponse:
+    """Возвращает доступность роботов, доступных пользователю."""
+    start, end = resolve_uptime_window(start, end)
+    owner_id = None if current_user.role == UserRole.ADMIN else current_user.id
+    uptime = await load_fleet_uptime(db, start, end, owner_id=owner_id)
+
+    return FleetUptimeResponse(
+        start=start,
+        end=end,
+        availability=uptime.availability,
+        robots=uptime.robot_summaries(),
+        owners=uptime.owner_summaries(),
+    )
+
+
+@router.get(
+    "/events",
+    response_class=StreamingResponse,
+    responses={
+        200: {"content": {"text/event-stream": {}}, "description": "Поток событий"},
+        401: {"model": ErrorResponse, "description": "Требуется авторизация"},
+    },
+    summary="Поток событий роботов (SSE)",
+    description="""
+Server-Sent Events со сменами статуса (`status`), отметками активности (`last_seen`)
+и подтверждениями привязки (`paired`) доступных пользователю роботов.
+
+Событие `resync` означает, что клиент отстал и должен перечитать список роботов.
+Токен можно передать в заголовке `Authorization` или в параметре `access_token`.
+    """,
+)
+async def robot_events(
+    request: Request,
+    current_user: CurrentUser = Depends(get_current_user_for_stream),
+    db: AsyncSession = Depends(get_db),
+) -> StreamingResponse:
+    """Открывает SSE-поток событий роботов, отфильтрованный по владельцу."""
+    # Соединение с БД не нужно на всё время жизни потока
+    await db.close()
+
+    def event_filter(event: RobotEvent) -> bool:
+        return can_access_owner(event.owner_id, current_user)
+
+    queue = robot_event_bus.subscribe(event_filter)
+
+    async def stream() -> AsyncIterator[str]:
+        try:
+            yield f"retry: {EVENTS_RETRY_MILLISECONDS}\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=EVENTS_KEEPALIVE_SECONDS)
+                except TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                yield event.to_sse()
+        finally:
+            robot_event_bus.unsubscribe(queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
@@ -89,7 +296,7 @@ async def list_robots(
 )
 async def get_robot(
     robot_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ) -> RobotDetailResponse:
     """Возвращает информацию о роботе."""
@@ -108,7 +315,9 @@ async def get_robot(
             detail="Нет доступа к этому роботу",
         )
 
-    return RobotDetailResponse.model_validate(robot)
+    response = RobotDetailResponse.model_validate(robot)
+    response.influxdb_token = robot_tokens.token_for(robot)
+    return response
 
 
 @router.patch(
@@ -124,7 +333,7 @@ async def get_robot(
 async def update_robot(
     robot_id: int,
     update_data: RobotUpdate,
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ) -> RobotResponse:
     """Обновляет информацию о роботе."""
@@ -143,6 +352,7 @@ async def update_robot(
             detail="Нет доступа к этому роботу",
         )
 
+    previous_status = robot.status
     update_dict = update_data.model_dump(exclude_unset=True)
     for field, value in update_dict.items():
         setattr(robot, field, value)
@@ -151,6 +361,15 @@ async def update_robot(
     await db.commit()
     await db.refresh(robot)
 
+    if "status" in update_dict:
+        if robot.status == RobotStatus.ACTIVE:
+            liveness_tracker.touch(robot.id, robot.last_seen_at)
+        else:
+            liveness_tracker.forget(robot.id)
+        robot_event_bus.publish_status(
+            robot.id, robot.owner_id, robot.status, previous_status, robot.last_seen_at
+        )
+
     return RobotResponse.model_validate(robot)
 
 
@@ -166,7 +385,7 @@ async def update_robot(
 )
 async def delete_robot(
     robot_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ) -> None:
     """Удаляет робота."""
@@ -187,6 +406,13 @@ async def delete_robot(
 
     await db.delete(robot)
     await db.commit()
+    liveness_tracker.forget(robot_id)
+    robot_event_bus.forget(robot_id)
+    live_metrics.forget(robot_id)
+    anomaly_detector.forget(robot_id)
+    alert_engine.forget_robot(robot_id)
+    metrics_query_cache.forget(robot_id)
+    fleet_summary_cache.invalidate()
 
 
 @router.post(
@@ -201,7 +427,7 @@ async def delete_robot(
 )
 async def robot_heartbeat(
     robot_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ) -> RobotResponse:
     """Обновляет время последней активности робота."""
@@ -220,6 +446,7 @@ async def robot_heartbeat(
             detail="Нет доступа к этому роботу",
         )
 
+    previous_status = robot.status
     robot.last_seen_at = datetime.now(UTC)
     if robot.status == RobotStatus.INACTIVE:
         robot.status = RobotStatus.ACTIVE
@@ -227,4 +454,110 @@ async def robot_heartbeat(
     await db.commit()
     await db.refresh(robot)
 
+    if robot.status == RobotStatus.ACTIVE:
+        liveness_tracker.touch(robot.id)
+    robot_event_bus.publish_status(
+        robot.id, robot.owner_id, robot.status, previous_status, robot.last_seen_at
+    )
+    robot_event_bus.publish_last_seen(robot.id, robot.owner_id, robot.last_seen_at)
+
     return RobotResponse.model_validate(robot)
+
+
+@router.post(
+    "/{robot_id}/token",
+    response_model=RobotTokenResponse,
+    responses={
+        403: {"model": ErrorResponse, "description": "Нет доступа к роботу"},
+        404: {"model": ErrorResponse, "description": "Робот не найден"},
+    },
+    summary="Перевыпуск токена робота",
+    description="""
+Выдаёт роботу новый подписанный токен для отправки метрик. Прежний токен
+(в том числе старого формата) сразу перестаёт приниматься.
+    """,
+)
+async def reissue_robot_token(
+    robot_id: int,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> RobotTokenResponse:
+    """Перевыпускает токен робота и отзывает прежний."""
+    result = await db.execute(select(Robot).where(Robot.id == robot_id))
+    robot = result.scalar_one_or_none()
+
+    if not robot:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Робот не найден",
+        )
+
+    if not can_access_robot(robot, current_user):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Нет доступа к этому роботу",
+        )
+
+    token = robot_tokens.assign(robot, datetime.now(UTC))
+    await db.commit()
+    if robot.token_not_before is not None:
+        robot_tokens.revoke(robot.id, robot.token_not_before)
+
+    return RobotTokenResponse(
+        robot_id=robot.id,
+        influxdb_token=token,
+        message="Токен перевыпущен. Обновите его в конфигурации агента.",
+    )
+
+
+@router.get(
+    "/{robot_id}/uptime",
+    response_model=RobotUptimeWindowResponse,
+    responses={
+        400: {"model": ErrorResponse, "description": "Некорректное окно"},
+        403: {"model": ErrorResponse, "description": "Нет доступа к роботу"},
+        404: {"model": ErrorResponse, "description": "Робот не найден"},
+    },
+    summary="Доступность робота",
+    description="Доступность, MTBF и MTTR робота за окно `[start, end)`.",
+)
+async def robot_uptime(
+    robot_id: int,
+    start: datetime | None = Query(None, description="Начало окна"),
+    end: datetime | None = Query(None, description="Конец окна"),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> RobotUptimeWindowResponse:
+    """Возвращает показатели доступности робота."""
+    start, end = resolve_uptime_window(start, end)
+    result = await db.execute(select(Robot).where(Robot.id == robot_id))
+    robot = result.scalar_one_or_none()
+
+    if not robot:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Робот не найден",
+        )
+
+    if not can_access_robot(robot, current_user):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Нет доступа к этому роботу",
+        )
+
+    uptime = await load_fleet_uptime(db, start, end, robot_id=robot_id)
+    summaries = uptime.robot_summaries()
+    if not summaries:
+        # Робот зарегистрирован после конца окна
+        summaries = [
+            {
+                "robot_id": robot.id,
+                "owner_id": robot.owner_id,
+                "up_seconds": 0.0,
+                "down_seconds": 0.0,
+                "observed_seconds": 0.0,
+                "failures": 0,
+            }
+        ]
+
+    return RobotUptimeWindowResponse(start=start, end=end, **summaries[0])
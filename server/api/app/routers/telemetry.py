@@ -0,0 +1,498 @@
+"""
+API эндпоинты метрик роботов.
+
+Текущие значения отдаются из кэша последних значений, который наполняется
+при приёме метрик, — без запросов к InfluxDB. Там же, при приёме,
+ищутся аномалии. История запрашивается из
+InfluxDB с агрегацией на его стороне и кэшируется по закрытым окнам;
+по заголовку Accept она отдаётся в JSON или потоком Arrow IPC.
+"""
+
+import time
+from datetime import UTC, datetime
+
+import numpy as np
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.database import get_db
+from app.deps import get_current_user
+from app.models import Robot, UserRole
+from app.routers.robots import can_access_owner, can_access_robot
+from app.schemas import (
+    DownsampleMode,
+    ErrorResponse,
+    ExportFormat,
+    MetricAnomalyListResponse,
+    MetricAnomalyResponse,
+    MetricPoint,
+    RobotLiveListResponse,
+    RobotLiveResponse,
+    RobotMetricSeriesResponse,
+    RobotTopEntry,
+    RobotTopResponse,
+    TopOrder,
+)
+from app.services.anomalies import ANOMALY_HISTORY, anomaly_detector
+from app.services.arrow_format import (
+    ARROW_STREAM_MEDIA_TYPE,
+    accepts_arrow,
+    series_table,
+    to_ipc_stream,
+)
+from app.services.live_metrics import live_metrics
+from app.services.metrics_export import (
+    EXPORT_CHUNK_SECONDS,
+    encode_csv,
+    encode_parquet,
+    export_chunks,
+    export_window_end,
+    prepend,
+    read_export_window,
+)
+from app.services.metrics_query import (
+    DEFAULT_POINTS,
+    MAX_POINTS,
+    MAX_RANGE_SECONDS,
+    MAX_RAW_POINTS,
+    MIN_STEP_SECONDS,
+    NAME_PATTERN,
+    InfluxQueryError,
+    SeriesColumns,
+    align_window,
+    choose_step,
+    load_series,
+    parse_duration,
+)
+from app.services.user_cache import CurrentUser
+
+router = APIRouter(prefix="/api/robots", tags=["telemetry"])
+settings = get_settings()
+
+# Максимум роботов в одном запросе текущих значений
+LIVE_BULK_MAX_ROBOTS = 200
+
+# Максимум роботов в выборке по метрике
+TOP_MAX_ROBOTS = 100
+
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.CSV: "text/csv; charset=utf-8",
+    ExportFormat.PARQUET: "application/vnd.apache.parquet",
+}
+
+
+async def get_accessible_robot(robot_id: int, current_user: CurrentUser, db: AsyncSession) -> Robot:
+    """
+    Робот, к которому у пользователя есть доступ.
+
+    Raises:
+        HTTPException: 404 если робота нет, 403 если нет доступа
+    """
+    result = await db.execute(select(Robot).where(Robot.id == robot_id))
+    robot = result.scalar_one_or_none()
+
+    if not robot:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Робот не найден",
+        )
+
+    if not can_access_robot(robot, current_user):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Нет доступа к этому роботу",
+        )
+
+    return robot
+
+
+def resolve_series_step(range_seconds: int, step: str | None, points: int) -> int:
+    """Шаг окна: заданный явно или подобранный под число точек."""
+    if step is None:
+        return max(choose_step(range_seconds, points), MIN_STEP_SECONDS)
+
+    try:
+        step_seconds = parse_duration(step)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Неверный шаг. Пример: 30s, 5m, 1h",
+        )
+    if step_seconds < MIN_STEP_SECONDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Шаг не может быть меньше {MIN_STEP_SECONDS} секунд",
+        )
+    if range_seconds / step_seconds > MAX_POINTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Слишком мелкий шаг: больше {MAX_POINTS} точек",
+        )
+    return step_seconds
+
+
+def series_points(columns: SeriesColumns) -> list[MetricPoint]:
+    """Точки JSON-ответа из колонок истории."""
+    times = (columns.times / 1_000_000_000).tolist()
+    values = [None if np.isnan(value) else value for value in columns.values.tolist()]
+    if columns.min is None or columns.max is None:
+        return [
+            MetricPoint(time=datetime.fromtimestamp(timestamp, UTC), value=value)
+            for timestamp, value in zip(times, values, strict=True)
+        ]
+    return [
+        MetricPoint(time=datetime.fromtimestamp(timestamp, UTC), value=value, min=low, max=high)
+        for timestamp, value, low, high in zip(
+            times, values, columns.min.tolist(), columns.max.tolist(), strict=True
+        )
+    ]
+
+
+def live_response(robot_id: int, metrics: list[str] | None = None) -> RobotLiveResponse:
+    """Собирает ответ из кэша; без данных — пустой набор метрик."""
+    snapshot = live_metrics.get(robot_id, metrics)
+    if snapshot is None:
+        return RobotLiveResponse(robot_id=robot_id)
+    updated_at, values = snapshot
+    return RobotLiveResponse(
+        robot_id=robot_id,
+        updated_at=datetime.fromtimestamp(updated_at, UTC),
+        metrics={
+            name: {"value": value, "time": datetime.fromtimestamp(timestamp, UTC)}
+            for name, (value, timestamp) in values.items()
+        },
+    )
+
+
+@router.get(
+    "/live",
+    response_model=RobotLiveListResponse,
+    responses={400: {"model": ErrorResponse, "description": "Слишком много роботов"}},
+    summary="Текущие метрики нескольких роботов",
+    description=f"""
+Последние принятые значения метрик для списка роботов (до {LIVE_BULK_MAX_ROBOTS}).
+Роботы без данных или без доступа в ответ не попадают.
+Параметр `metrics` ограничивает набор метрик, например `cpu.usage_idle`
+(агент не отправляет `usage_active`, загрузка CPU — `100 - usage_idle`).
+    """,
+)
+async def live_metrics_bulk(
+    ids: list[int] = Query(..., description="ID роботов"),
+    metrics: list[str] | None = Query(None, description="Метрики «измерение.поле»"),
+    current_user: CurrentUser = Depends(get_current_user),
+) -> RobotLiveListResponse:
+    """Возвращает текущие значения метрик доступных пользователю роботов."""
+    if len(ids) > LIVE_BULK_MAX_ROBOTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Не больше {LIVE_BULK_MAX_ROBOTS} роботов за запрос",
+        )
+
+    return RobotLiveListResponse(
+        robots=[
+            live_response(robot_id, metrics)
+            for robot_id in dict.fromkeys(ids)
+            if robot_id in live_metrics
+            and can_access_owner(live_metrics.owner_of(robot_id), current_user)
+        ]
+    )
+
+
+@router.get(
+    "/top",
+    response_model=RobotTopResponse,
+    summary="Роботы с крайними значениями метрики",
+    description=f"""
+N роботов с наибольшим (`order=highest`) или наименьшим (`order=lowest`)
+текущим значением метрики, например `disk.free`. Самые загруженные по CPU —
+`metric=cpu.usage_idle&order=lowest`.
+Значения старше порога неактивности
+({settings.robot_inactivity_threshold_seconds} с) не учитываются.
+Отвечает из памяти API, без запросов к InfluxDB.
+    """,
+)
+async def top_robots(
+    metric: str = Query(..., description="Метрика «измерение.поле»"),
+    n: int = Query(20, ge=1, le=TOP_MAX_ROBOTS, description="Количество роботов"),
+    order: TopOrder = Query(TopOrder.HIGHEST, description="Направление выборки"),
+    current_user: CurrentUser = Depends(get_current_user),
+) -> RobotTopResponse:
+    """Возвращает роботов с наибольшими или наименьшими значениями метрики."""
+    entries = live_metrics.top(
+        metric,
+        n,
+        largest=order == TopOrder.HIGHEST,
+        owner_id=None if current_user.role == UserRole.ADMIN else current_user.id,
+        since=time.time() - settings.robot_inactivity_threshold_seconds,
+    )
+    return RobotTopResponse(
+        metric=metric,
+        order=order,
+        robots=[
+            RobotTopEntry(
+                robot_id=robot_id, value=value, time=datetime.fromtimestamp(timestamp, UTC)
+            )
+            for robot_id, value, timestamp in entries
+        ],
+    )
+
+
+@router.get(
+    "/anomalies",
+    response_model=MetricAnomalyListResponse,
+    summary="Аномалии метрик",
+    description=f"""
+Последние аномальные значения метрик роботов, от новых к старым.
+Значение аномально, если отклоняется от экспоненциально взвешенного среднего
+метрики больше чем на {settings.anomaly_z_threshold} стандартных отклонений;
+серия аномальных точек подряд даёт одну запись.
+Хранятся последние {ANOMALY_HISTORY} аномалий процесса API.
+    """,
+)
+async def metric_anomalies(
+    robot_id: int | None = Query(None, description="Только аномалии робота"),
+    limit: int = Query(100, ge=1, le=ANOMALY_HISTORY, description="Количество записей"),
+    current_user: CurrentUser = Depends(get_current_user),
+) -> MetricAnomalyListResponse:
+    """Возвращает последние аномалии метрик доступных пользователю роботов."""
+    anomalies = []
+    for anomaly in anomaly_detector.recent(robot_id):
+        if not can_access_owner(anomaly.owner_id, current_user):
+            continue
+        anomalies.append(
+            MetricAnomalyResponse(
+                robot_id=anomaly.robot_id,
+                metric=anomaly.metric,
+                value=anomaly.value,
+                expected=anomaly.expected,
+                zscore=anomaly.zscore,
+                time=datetime.fromtimestamp(anomaly.time, UTC),
+            )
+        )
+        if len(anomalies) == limit:
+            break
+    return MetricAnomalyListResponse(anomalies=anomalies)
+
+
+@router.get(
+    "/{robot_id}/live",
+    response_model=RobotLiveResponse,
+    responses={
+        403: {"model": ErrorResponse, "description": "Нет доступа к роботу"},
+        404: {"model": ErrorResponse, "description": "Робот не найден"},
+    },
+    summary="Текущие метрики робота",
+    description="Последние принятые значения метрик робота из кэша API.",
+)
+async def robot_live_metrics(
+    robot_id: int,
+    metrics: list[str] | None = Query(None, description="Метрики «измерение.поле»"),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> RobotLiveResponse:
+    """Возвращает текущие значения метрик робота."""
+    await get_accessible_robot(robot_id, current_user, db)
+    return live_response(robot_id, metrics)
+
+
+@router.get(
+    "/{robot_id}/metrics",
+    response_model=RobotMetricSeriesResponse,
+    responses={
+        200: {"content": {ARROW_STREAM_MEDIA_TYPE: {}}},
+        400: {"model": ErrorResponse, "description": "Неверные параметры запроса"},
+        403: {"model": ErrorResponse, "description": "Нет доступа к роботу"},
+        404: {"model": ErrorResponse, "description": "Робот не найден"},
+        502: {"model": ErrorResponse, "description": "Ошибка запроса к InfluxDB"},
+    },
+    summary="История метрики робота",
+    description=f"""
+Средние значения поля `field` измерения `measurement` по окнам шага `step`
+за последние `range` (например `1h`, `24h`, `7d`).
+
+Без `step` шаг подбирается так, чтобы в ответе было около `points` точек.
+Окна выровнены по сетке шага; окна без данных возвращаются с `value: null`.
+Не больше {MAX_POINTS} точек за запрос.
+
+Параметр `downsample`:
+- `mean` — средние по окнам считает InfluxDB (по умолчанию, кэшируется);
+- `lttb` — исходные точки прореживаются алгоритмом LTTB, форма и пики
+  ряда сохраняются, по одной точке на окно;
+- `minmax` — среднее, минимум и максимум по окнам (огибающая);
+- `none` — исходные точки без прореживания (до {MAX_RAW_POINTS}),
+  только в формате Arrow.
+
+С заголовком `Accept: {ARROW_STREAM_MEDIA_TYPE}` ответ отдаётся потоком
+Arrow IPC: колонки `time` (timestamp[ns, UTC]), `value` и для огибающей
+`min`/`max`; параметры запроса — в метаданных схемы.
+    """,
+)
+async def robot_metric_series(
+    robot_id: int,
+    measurement: str = Query(
+        ..., pattern=NAME_PATTERN.pattern, description="Измерение, например cpu"
+    ),
+    field: str = Query(
+        ..., pattern=NAME_PATTERN.pattern, description="Поле, например usage_active"
+    ),
+    range_: str = Query("1h", alias="range", description="Длительность: 15m, 24h, 7d"),
+    step: str | None = Query(None, description="Шаг окна: 30s, 5m, 1h"),
+    points: int = Query(DEFAULT_POINTS, ge=1, le=MAX_POINTS, description="Желаемое число точек"),
+    downsample: DownsampleMode = Query(DownsampleMode.MEAN, description="Способ прореживания"),
+    accept: str | None = Header(None),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> RobotMetricSeriesResponse | Response:
+    """Возвращает историю метрики робота в JSON или Arrow IPC."""
+    arrow = accepts_arrow(accept)
+    if downsample == DownsampleMode.NONE and not arrow:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Без прореживания история отдаётся только в формате {ARROW_STREAM_MEDIA_TYPE}",
+        )
+
+    try:
+        range_seconds = parse_duration(range_)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Неверный диапазон. Пример: 15m, 24h, 7d",
+        )
+    if range_seconds > MAX_RANGE_SECONDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Диапазон не может быть больше {MAX_RANGE_SECONDS // 86400} дней",
+        )
+    step_seconds = resolve_series_step(range_seconds, step, points)
+
+    robot = await get_accessible_robot(robot_id, current_user, db)
+
+    now = time.time()
+    start, end = align_window(range_seconds, step_seconds, now)
+    try:
+        columns = await load_series(
+            robot.id, measurement, field, start, end, step_seconds, downsample, now
+        )
+    except InfluxQueryError as e:
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"Ошибка запроса к InfluxDB: {e}",
+        )
+
+    if arrow:
+        table = series_table(
+            columns,
+            {
+                "robot_id": str(robot.id),
+                "measurement": measurement,
+                "field": field,
+                "start": datetime.fromtimestamp(start, UTC).isoformat(),
+                "end": datetime.fromtimestamp(end, UTC).isoformat(),
+                "step": str(step_seconds),
+                "downsample": downsample.value,
+            },
+        )
+        return Response(content=to_ipc_stream(table), media_type=ARROW_STREAM_MEDIA_TYPE)
+
+    return RobotMetricSeriesResponse(
+        robot_id=robot.id,
+        measurement=measurement,
+        field=field,
+        start=datetime.fromtimestamp(start, UTC),
+        end=datetime.fromtimestamp(end, UTC),
+        step=step_seconds,
+        downsample=downsample,
+        points=series_points(columns),
+    )
+
+
+@router.get(
+    "/{robot_id}/export",
+    responses={
+        200: {"content": {media_type: {} for media_type in EXPORT_MEDIA_TYPES.values()}},
+        400: {"model": ErrorResponse, "description": "Неверный интервал"},
+        403: {"model": ErrorResponse, "description": "Нет доступа к роботу"},
+        404: {"model": ErrorResponse, "description": "Робот не найден"},
+        502: {"model": ErrorResponse, "description": "Ошибка запроса к InfluxDB"},
+    },
+    summary="Выгрузка истории метрик робота",
+    description=f"""
+Все числовые метрики робота за `[from, to)` в CSV или Parquet, потоком.
+По умолчанию — от привязки робота до текущего момента.
+
+Колонки: `time`, `measurement`, `field`, `tags` (теги серии, `k=v,...`), `value`.
+История читается окнами по {EXPORT_CHUNK_SECONDS} с, память сервера не зависит
+от объёма выгрузки. Строки идут по возрастанию времени.
+
+Пустые промежутки истории пропускаются одним запросом к InfluxDB, поэтому
+ответ начинается сразу, даже если `from` попадает в долгий перерыв в данных.
+
+**Продолжение прерванной выгрузки:** возьмите время `T` последней полученной
+строки в наносекундах Unix, отбросьте у себя строки со временем `T` и
+запросите `from_ns=T` (`from` принимает не точнее микросекунд).
+Файл Parquet дописывается футером только в конце: прерванный файл
+не читается, его нужно запросить заново тем же `from`.
+    """,
+)
+async def export_robot_metrics(
+    robot_id: int,
+    from_: datetime | None = Query(None, alias="from", description="Начало (включительно)"),
+    from_ns: int | None = Query(
+        None, ge=0, description="Начало в наносекундах Unix (включительно), вместо from"
+    ),
+    to: datetime | None = Query(None, description="Конец (не включительно)"),
+    format_: ExportFormat = Query(ExportFormat.CSV, alias="format", description="Формат файла"),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> StreamingResponse:
+    """Отдаёт историю метрик робота потоком CSV или Parquet."""
+    robot = await get_accessible_robot(robot_id, current_user, db)
+
+    if from_ is not None and from_ns is not None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Укажите либо from, либо from_ns",
+        )
+    end = to or datetime.now(UTC)
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=UTC)
+    end_ns = int(end.timestamp()) * 1_000_000_000 + end.microsecond * 1000
+    if from_ns is not None:
+        start_ns = from_ns
+        start = datetime.fromtimestamp(from_ns // 1_000_000_000, UTC)
+    else:
+        start = from_ or robot.created_at
+        if start.tzinfo is None:
+            start = start.replace(tzinfo=UTC)
+        start_ns = int(start.timestamp()) * 1_000_000_000 + start.microsecond * 1000
+    if start_ns >= end_ns:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Начало выгрузки должно быть раньше конца",
+        )
+
+    # Первое окно читается до начала ответа: ошибка InfluxDB станет 502, а не обрывом.
+    # Дальше, в том числе поиск данных после пустого начала, — уже потоком
+    first_end = export_window_end(start_ns, end_ns)
+    try:
+        first = await read_export_window(robot.id, start_ns, first_end)
+    except InfluxQueryError as e:
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"Ошибка запроса к InfluxDB: {e}",
+        )
+    chunks = export_chunks(robot.id, first_end, end_ns, seek=first.num_rows == 0)
+
+    encode = encode_parquet if format_ == ExportFormat.PARQUET else encode_csv
+    filename = f"robot-{robot.id}-{start:%Y%m%dT%H%M%S}-{end:%Y%m%dT%H%M%S}.{format_.value}"
+    return StreamingResponse(
+        encode(prepend(first if first.num_rows else None, chunks)),
+        media_type=EXPORT_MEDIA_TYPES[format_],
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Export-Chunk-Seconds": str(EXPORT_CHUNK_SECONDS),
+        },
+    )
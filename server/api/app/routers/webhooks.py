@@ -0,0 +1,248 @@
+"""
+API эндпоинты вебхуков.
+
+Адреса хранятся в PostgreSQL; уведомления раскладываются по ним
+и отправляются фоновым диспетчером (`app.services.webhooks`).
+"""
+
+from datetime import UTC, datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_db
+from app.deps import get_current_user
+from app.models import UserRole, WebhookDelivery, WebhookDeliveryStatus, WebhookEndpoint
+from app.routers.robots import can_access_owner
+from app.schemas import (
+    ErrorResponse,
+    WebhookDeliveryListResponse,
+    WebhookDeliveryResponse,
+    WebhookEndpointCreate,
+    WebhookEndpointListResponse,
+    WebhookEndpointResponse,
+    WebhookEndpointUpdate,
+    WebhookRetryResponse,
+)
+from app.services.user_cache import CurrentUser
+from app.services.webhooks import SIGNATURE_HEADER
+
+router = APIRouter(prefix="/api/webhooks", tags=["webhooks"])
+
+
+async def get_accessible_endpoint(
+    endpoint_id: int, current_user: CurrentUser, db: AsyncSession
+) -> WebhookEndpoint:
+    """
+    Вебхук, к которому у пользователя есть доступ.
+
+    Raises:
+        HTTPException: 404 если вебхука нет, 403 если нет доступа
+    """
+    result = await db.execute(select(WebhookEndpoint).where(WebhookEndpoint.id == endpoint_id))
+    endpoint = result.scalar_one_or_none()
+
+    if not endpoint:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Вебхук не найден",
+        )
+
+    if not can_access_owner(endpoint.owner_id, current_user):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Нет доступа к этому вебхуку",
+        )
+
+    return endpoint
+
+
+@router.get(
+    "",
+    response_model=WebhookEndpointListResponse,
+    summary="Вебхуки",
+    description="Вебхуки пользователя; администратор видит все вебхуки.",
+)
+async def list_webhooks(
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> WebhookEndpointListResponse:
+    """Возвращает вебхуки."""
+    query = select(WebhookEndpoint).order_by(WebhookEndpoint.id)
+    if current_user.role != UserRole.ADMIN:
+        query = query.where(WebhookEndpoint.owner_id == current_user.id)
+    result = await db.execute(query)
+    return WebhookEndpointListResponse(
+        endpoints=[WebhookEndpointResponse.model_validate(e) for e in result.scalars()]
+    )
+
+
+@router.post(
+    "",
+    response_model=WebhookEndpointResponse,
+    status_code=status.HTTP_201_CREATED,
+    responses={
+        403: {"model": ErrorResponse, "description": "Вебхук парка может создать только админ"},
+    },
+    summary="Создание вебхука",
+    description=f"""
+На адрес отправляются `POST` с JSON: смены статуса роботов (`robot.status`),
+подтверждения привязки (`robot.paired`), срабатывание и снятие алертов
+(`alert.firing`, `alert.resolved`) — для роботов владельца или, с `fleet`,
+для всего парка.
+
+События за окно сбора уходят одним запросом (`kind: events`); если их
+много — например, при сетевой аварии, — сводкой по типам и статусам
+(`kind: digest`). С ключом `secret` тело подписывается HMAC-SHA256 в
+заголовке `{SIGNATURE_HEADER}: sha256=<hex>`.
+
+Ответ 2xx — доставлено; 5xx, 408, 429 и сетевые ошибки — повтор с
+экспоненциальной задержкой; остальные 4xx — уведомления сразу
+переводятся в `dead`.
+    """,
+)
+async def create_webhook(
+    data: WebhookEndpointCreate,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> WebhookEndpointResponse:
+    """Создаёт вебхук."""
+    if data.fleet and current_user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Вебхук для всего парка может создавать только администратор",
+        )
+
+    endpoint = WebhookEndpoint(
+        owner_id=None if data.fleet else current_user.id,
+        url=str(data.url),
+        secret=data.secret,
+        enabled=data.enabled,
+    )
+    db.add(endpoint)
+    await db.commit()
+    await db.refresh(endpoint)
+
+    return WebhookEndpointResponse.model_validate(endpoint)
+
+
+@router.patch(
+    "/{endpoint_id}",
+    response_model=WebhookEndpointResponse,
+    responses={
+        403: {"model": ErrorResponse, "description": "Нет доступа к вебхуку"},
+        404: {"model": ErrorResponse, "description": "Вебхук не найден"},
+    },
+    summary="Обновление вебхука",
+    description="Частичное обновление адреса, ключа или включённости. Сбрасывает задержку повтора.",
+)
+async def update_webhook(
+    endpoint_id: int,
+    update_data: WebhookEndpointUpdate,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> WebhookEndpointResponse:
+    """Обновляет вебхук."""
+    endpoint = await get_accessible_endpoint(endpoint_id, current_user, db)
+
+    for field, value in update_data.model_dump(exclude_unset=True).items():
+        setattr(endpoint, field, str(value) if field == "url" else value)
+
+    endpoint.failure_count = 0
+    endpoint.retry_after = None
+    endpoint.updated_at = datetime.now(UTC)
+    await db.commit()
+    await db.refresh(endpoint)
+
+    return WebhookEndpointResponse.model_validate(endpoint)
+
+
+@router.delete(
+    "/{endpoint_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    responses={
+        403: {"model": ErrorResponse, "description": "Нет доступа к вебхуку"},
+        404: {"model": ErrorResponse, "description": "Вебхук не найден"},
+    },
+    summary="Удаление вебхука",
+    description="Удаляет вебхук вместе с его очередью уведомлений.",
+)
+async def delete_webhook(
+    endpoint_id: int,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> None:
+    """Удаляет вебхук."""
+    endpoint = await get_accessible_endpoint(endpoint_id, current_user, db)
+
+    await db.delete(endpoint)
+    await db.commit()
+
+
+@router.get(
+    "/{endpoint_id}/deliveries",
+    response_model=WebhookDeliveryListResponse,
+    responses={
+        403: {"model": ErrorResponse, "description": "Нет доступа к вебхуку"},
+        404: {"model": ErrorResponse, "description": "Вебхук не найден"},
+    },
+    summary="Уведомления вебхука",
+    description="Последние уведомления вебхука; `status=dead` — не доставленные.",
+)
+async def list_webhook_deliveries(
+    endpoint_id: int,
+    delivery_status: WebhookDeliveryStatus | None = Query(None, alias="status"),
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> WebhookDeliveryListResponse:
+    """Возвращает уведомления вебхука, от новых к старым."""
+    await get_accessible_endpoint(endpoint_id, current_user, db)
+
+    query = (
+        select(WebhookDelivery)
+        .where(WebhookDelivery.endpoint_id == endpoint_id)
+        .order_by(WebhookDelivery.id.desc())
+        .limit(limit)
+    )
+    if delivery_status is not None:
+        query = query.where(WebhookDelivery.status == delivery_status)
+    result = await db.execute(query)
+    return WebhookDeliveryListResponse(
+        deliveries=[WebhookDeliveryResponse.model_validate(d) for d in result.scalars()]
+    )
+
+
+@router.post(
+    "/{endpoint_id}/deliveries/retry",
+    response_model=WebhookRetryResponse,
+    responses={
+        403: {"model": ErrorResponse, "description": "Нет доступа к вебхуку"},
+        404: {"model": ErrorResponse, "description": "Вебхук не найден"},
+    },
+    summary="Повтор недоставленных уведомлений",
+    description="Возвращает уведомления `dead` в очередь со сброшенным счётчиком попыток.",
+)
+async def retry_webhook_deliveries(
+    endpoint_id: int,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> WebhookRetryResponse:
+    """Ставит мёртвые уведомления вебхука в очередь заново."""
+    endpoint = await get_accessible_endpoint(endpoint_id, current_user, db)
+
+    result = await db.execute(
+        update(WebhookDelivery)
+        .where(
+            WebhookDelivery.endpoint_id == endpoint_id,
+            WebhookDelivery.status == WebhookDeliveryStatus.DEAD,
+        )
+        .values(status=WebhookDeliveryStatus.PENDING, attempts=0, last_error=None)
+        .execution_options(synchronize_session=False)
+    )
+    endpoint.failure_count = 0
+    endpoint.retry_after = None
+    await db.commit()
+
+    return WebhookRetryResponse(requeued=result.rowcount)
@@ -2,17 +2,31 @@
 Pydantic схемы для валидации запросов и ответов API.
 """
 
+import enum
 from datetime import datetime
 
-from pydantic import BaseModel, ConfigDict, EmailStr, Field
+from pydantic import AnyHttpUrl, BaseModel, ConfigDict, EmailStr, Field
 
-from app.models import Architecture, PairCodeStatus, RobotStatus, UserRole
+from app.models import (
+    AlertCondition,
+    AlertScope,
+    AlertStatus,
+    Architecture,
+    PairCodeStatus,
+    RobotStatus,
+    UserRole,
+    WebhookDeliveryStatus,
+)
 
 __all__ = [
+    "AlertCondition",
+    "AlertScope",
+    "AlertStatus",
     "Architecture",
     "PairCodeStatus",
     "RobotStatus",
     "UserRole",
+    "WebhookDeliveryStatus",
 ]
 
 
@@ -124,11 +138,199 @@ class RobotDetailResponse(RobotResponse):
     influxdb_token: str | None = Field(None, description="Токен InfluxDB (только для API)")
 
 
+class RobotTokenResponse(BaseModel):
+    """Ответ на перевыпуск токена робота."""
+
+    robot_id: int
+    influxdb_token: str
+    message: str
+
+
+class TotalMode(enum.StrEnum):
+    """Способ подсчёта общего количества в списке."""
+
+    EXACT = "exact"
+    ESTIMATE = "estimate"
+    NONE = "none"
+
+
+class SearchMode(enum.StrEnum):
+    """Режим поиска роботов."""
+
+    SUBSTRING = "substring"
+    FUZZY = "fuzzy"
+
+
 class RobotListResponse(BaseModel):
     """Схема списка роботов."""
 
     robots: list[RobotResponse]
+    total: int | None = Field(
+        None, description="Общее количество (оценка при total_mode=estimate, нет при none)"
+    )
+    next_cursor: str | None = Field(
+        None, description="Курсор следующей страницы; отсутствует на последней странице"
+    )
+
+
+class OwnerRobotCount(BaseModel):
+    """Количество роботов владельца."""
+
+    owner_id: int | None = None
+    count: int
+
+
+class FleetSummaryResponse(BaseModel):
+    """Сводка по парку роботов."""
+
     total: int
+    by_status: dict[RobotStatus, int]
+    by_architecture: dict[Architecture, int]
+    by_owner: list[OwnerRobotCount]
+
+
+class RobotUptimeResponse(BaseModel):
+    """Показатели доступности робота за окно."""
+
+    robot_id: int
+    owner_id: int | None = None
+    availability: float | None = Field(
+        None, description="Доля времени в ACTIVE от наблюдаемого времени (0..1)"
+    )
+    up_seconds: float = Field(..., description="Время в статусе ACTIVE")
+    down_seconds: float = Field(..., description="Время в статусах INACTIVE и ERROR")
+    observed_seconds: float = Field(..., description="Наблюдаемое время (без PENDING)")
+    failures: int = Field(..., description="Число переходов из ACTIVE в INACTIVE/ERROR")
+    mtbf_seconds: float | None = Field(None, description="Среднее время между отказами")
+    mttr_seconds: float | None = Field(None, description="Среднее время восстановления")
+
+
+class RobotUptimeWindowResponse(RobotUptimeResponse):
+    """Показатели доступности робота с границами окна."""
+
+    start: datetime
+    end: datetime
+
+
+class OwnerUptimeResponse(BaseModel):
+    """Сводная доступность роботов одного владельца."""
+
+    owner_id: int | None = None
+    robots: int
+    availability: float | None = None
+    up_seconds: float
+    observed_seconds: float
+
+
+class FleetUptimeResponse(BaseModel):
+    """Доступность парка роботов за окно."""
+
+    start: datetime
+    end: datetime
+    availability: float | None = Field(None, description="Доступность всего парка (0..1)")
+    robots: list[RobotUptimeResponse]
+    owners: list[OwnerUptimeResponse]
+
+
+class LiveMetricValue(BaseModel):
+    """Последнее значение метрики."""
+
+    value: float
+    time: datetime
+
+
+class RobotLiveResponse(BaseModel):
+    """Последние значения метрик робота."""
+
+    robot_id: int
+    updated_at: datetime | None = Field(None, description="Время последней принятой точки")
+    metrics: dict[str, LiveMetricValue] = Field(
+        default_factory=dict, description="Значения по ключу «измерение.поле»"
+    )
+
+
+class RobotLiveListResponse(BaseModel):
+    """Последние значения метрик нескольких роботов."""
+
+    robots: list[RobotLiveResponse]
+
+
+class DownsampleMode(enum.StrEnum):
+    """Способ прореживания истории метрики."""
+
+    MEAN = "mean"
+    LTTB = "lttb"
+    MINMAX = "minmax"
+    NONE = "none"
+
+
+class ExportFormat(enum.StrEnum):
+    """Формат выгрузки истории метрик."""
+
+    CSV = "csv"
+    PARQUET = "parquet"
+
+
+class MetricPoint(BaseModel):
+    """Точка истории метрики."""
+
+    time: datetime = Field(..., description="Начало окна или время исходной точки")
+    value: float | None = Field(None, description="Значение; null — точек в окне не было")
+    min: float | None = Field(None, description="Минимум в окне (minmax)")
+    max: float | None = Field(None, description="Максимум в окне (minmax)")
+
+
+class RobotMetricSeriesResponse(BaseModel):
+    """История метрики робота с агрегацией по окнам."""
+
+    robot_id: int
+    measurement: str
+    field: str
+    start: datetime
+    end: datetime
+    step: int = Field(..., description="Шаг окна в секундах")
+    downsample: DownsampleMode = DownsampleMode.MEAN
+    points: list[MetricPoint]
+
+
+class TopOrder(enum.StrEnum):
+    """Направление выборки роботов по метрике."""
+
+    HIGHEST = "highest"
+    LOWEST = "lowest"
+
+
+class RobotTopEntry(BaseModel):
+    """Робот и текущее значение метрики."""
+
+    robot_id: int
+    value: float
+    time: datetime
+
+
+class RobotTopResponse(BaseModel):
+    """Роботы с крайними значениями метрики."""
+
+    metric: str
+    order: TopOrder
+    robots: list[RobotTopEntry]
+
+
+class MetricAnomalyResponse(BaseModel):
+    """Аномальное значение метрики."""
+
+    robot_id: int
+    metric: str = Field(..., description="Метрика «измерение.поле»")
+    value: float
+    expected: float = Field(..., description="Значение базы на момент точки")
+    zscore: float = Field(..., description="Отклонение в стандартных отклонениях")
+    time: datetime
+
+
+class MetricAnomalyListResponse(BaseModel):
+    """Последние аномалии метрик."""
+
+    anomalies: list[MetricAnomalyResponse]
 
 
 # =============================================================================
@@ -204,6 +406,162 @@ class PairStatusResponse(BaseModel):
     message: str
 
 
+# =============================================================================
+# Схемы для алертов
+# =============================================================================
+
+METRIC_NAME_PATTERN = r"^[A-Za-z0-9_\-]+\.[A-Za-z0-9_\-]+$"
+
+
+class AlertRuleCreate(BaseModel):
+    """Схема создания правила алерта."""
+
+    name: str = Field(..., min_length=1, max_length=255)
+    metric: str = Field(
+        ..., max_length=255, pattern=METRIC_NAME_PATTERN, description="Метрика «измерение.поле»"
+    )
+    condition: AlertCondition = Field(..., description="Сравнение значения с порогом")
+    threshold: float
+    duration_seconds: int = Field(
+        0, ge=0, le=86400, description="Сколько условие должно держаться до срабатывания"
+    )
+    scope: AlertScope = Field(..., description="Робот, роботы владельца или весь парк")
+    robot_id: int | None = Field(None, description="Робот (для scope=robot)")
+    owner_id: int | None = Field(
+        None, description="Владелец (для scope=owner; по умолчанию — текущий пользователь)"
+    )
+    enabled: bool = True
+
+
+class AlertRuleUpdate(BaseModel):
+    """Схема обновления правила алерта (область не меняется)."""
+
+    name: str | None = Field(None, min_length=1, max_length=255)
+    condition: AlertCondition | None = None
+    threshold: float | None = None
+    duration_seconds: int | None = Field(None, ge=0, le=86400)
+    enabled: bool | None = None
+
+
+class AlertRuleResponse(BaseModel):
+    """Правило алерта."""
+
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    name: str
+    metric: str
+    condition: AlertCondition
+    threshold: float
+    duration_seconds: int
+    scope: AlertScope
+    robot_id: int | None = None
+    owner_id: int | None = None
+    enabled: bool
+    created_at: datetime
+    updated_at: datetime
+
+
+class AlertRuleListResponse(BaseModel):
+    """Список правил алертов."""
+
+    rules: list[AlertRuleResponse]
+
+
+class ActiveAlertResponse(BaseModel):
+    """Алерт в ожидании или сработавший."""
+
+    rule_id: int
+    rule_name: str
+    metric: str
+    robot_id: int
+    status: AlertStatus
+    value: float = Field(..., description="Последнее значение метрики")
+    since: datetime = Field(..., description="С какого момента выполняется условие")
+    fired_at: datetime | None = None
+
+
+class ActiveAlertListResponse(BaseModel):
+    """Активные алерты."""
+
+    alerts: list[ActiveAlertResponse]
+
+
+# =============================================================================
+# Схемы для вебхуков
+# =============================================================================
+
+
+class WebhookEndpointCreate(BaseModel):
+    """Схема создания вебхука."""
+
+    url: AnyHttpUrl = Field(..., description="Адрес, на который отправляются уведомления")
+    secret: str | None = Field(
+        None, min_length=16, max_length=255, description="Ключ подписи HMAC-SHA256 тела запроса"
+    )
+    fleet: bool = Field(
+        False, description="События всего парка (только администратор) вместо своих роботов"
+    )
+    enabled: bool = True
+
+
+class WebhookEndpointUpdate(BaseModel):
+    """Схема обновления вебхука."""
+
+    url: AnyHttpUrl | None = None
+    secret: str | None = Field(None, min_length=16, max_length=255)
+    enabled: bool | None = None
+
+
+class WebhookEndpointResponse(BaseModel):
+    """Вебхук (без ключа подписи)."""
+
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    url: str
+    owner_id: int | None = Field(None, description="Владелец; пусто — события всего парка")
+    enabled: bool
+    failure_count: int = Field(..., description="Неудачных отправок подряд")
+    retry_after: datetime | None = Field(None, description="Следующая попытка не раньше")
+    last_error: str | None = None
+    created_at: datetime
+    updated_at: datetime
+
+
+class WebhookEndpointListResponse(BaseModel):
+    """Список вебхуков."""
+
+    endpoints: list[WebhookEndpointResponse]
+
+
+class WebhookDeliveryResponse(BaseModel):
+    """Уведомление в очереди вебхука."""
+
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    event_type: str
+    payload: dict
+    status: WebhookDeliveryStatus
+    attempts: int
+    last_error: str | None = None
+    created_at: datetime
+    delivered_at: datetime | None = None
+
+
+class WebhookDeliveryListResponse(BaseModel):
+    """Уведомления вебхука, от новых к старым."""
+
+    deliveries: list[WebhookDeliveryResponse]
+
+
+class WebhookRetryResponse(BaseModel):
+    """Итог повторной постановки мёртвых уведомлений в очередь."""
+
+    requeued: int
+
+
 # =============================================================================
 # Общие схемы
 # =============================================================================
@@ -218,6 +576,14 @@ class HealthResponse(BaseModel):
     influxdb: str = "connected"
 
 
+class LeaderResponse(BaseModel):
+    """Схема ответа о лидере фоновых задач."""
+
+    instance_id: str = Field(..., description="Идентификатор текущего процесса (host:pid)")
+    is_leader: bool = Field(..., description="Выполняет ли текущий процесс фоновые задачи")
+    leader: str | None = Field(None, description="Идентификатор процесса-лидера")
+
+
 class ErrorResponse(BaseModel):
     """Схема ошибки."""
 
@@ -0,0 +1,638 @@
+"""
+Инкрементальная проверка правил алертов при приёме метрик.
+
+Правила из `alert_rules` компилируются в индекс «метрика → правила»,
+внутри метрики — по роботу, владельцу и парку. Движок подписан на кэш
+последних значений (`LiveMetricsCache.add_observer`): для каждой принятой
+точки проверяются только правила её метрики, относящиеся к её роботу, —
+стоимость растёт с числом точек, а не с произведением правил на парк.
+
+Каждый воркер проверяет точки, принятые им самим, и держит состояние
+«правило × робот» (ожидание и срабатывание) в памяти. Общее состояние
+воркеров — таблица `alert_rule_states`: раз в `SYNC_INTERVAL_SECONDS`
+воркер под advisory-блокировкой сводит свои изменения с ней (`settle`),
+а затем перечитывает её целиком, подхватывая то, что сделали другие
+воркеры, и правила. Переходы FIRING и RESOLVED объявляются слушателям
+только при сведении, когда меняется сохранённое состояние, поэтому
+один переход объявляется один раз, сколько бы воркеров его ни увидели.
+Срабатывание, снятое быстрее одного цикла, не объявляется.
+
+Алерт снимается, если по роботу нет точек дольше
+`ROBOT_INACTIVITY_THRESHOLD_SECONDS` или робот стал неактивным.
+"""
+
+import asyncio
+import contextlib
+import enum
+import logging
+import operator
+import time
+from collections import defaultdict
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+
+import numpy as np
+from sqlalchemy import delete, func, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.database import async_session_factory
+from app.models import (
+    AlertCondition,
+    AlertRule,
+    AlertRuleState,
+    AlertScope,
+    AlertStatus,
+    Robot,
+    RobotStatus,
+)
+from app.services.events import RobotEvent, RobotEventType, robot_event_bus
+from app.services.live_metrics import NO_OWNER, LiveMetricsCache, live_metrics
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Интервал сведения состояния с БД и перечитывания правил
+SYNC_INTERVAL_SECONDS = 15.0
+# Ключ advisory lock сведения состояния алертов ("WPA1")
+ALERT_STATE_LOCK_KEY = 0x57504131
+
+COMPARATORS: dict[AlertCondition, Callable[[float, float], bool]] = {
+    AlertCondition.GT: operator.gt,
+    AlertCondition.GTE: operator.ge,
+    AlertCondition.LT: operator.lt,
+    AlertCondition.LTE: operator.le,
+}
+
+AlertKey = tuple[int, int]
+
+
+class AlertEventType(enum.StrEnum):
+    """Переходы алерта, о которых сообщают слушателям."""
+
+    FIRING = "firing"
+    RESOLVED = "resolved"
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledRule:
+    """Включённое правило в виде, удобном для проверки."""
+
+    id: int
+    name: str
+    metric: str
+    condition: AlertCondition
+    threshold: float
+    duration: float
+    scope: AlertScope
+    robot_id: int | None
+    owner_id: int | None
+    compare: Callable[[float, float], bool]
+
+    @classmethod
+    def from_model(cls, rule: AlertRule) -> "CompiledRule":
+        return cls(
+            id=rule.id,
+            name=rule.name,
+            metric=rule.metric,
+            condition=rule.condition,
+            threshold=rule.threshold,
+            duration=float(rule.duration_seconds),
+            scope=rule.scope,
+            robot_id=rule.robot_id,
+            owner_id=rule.owner_id,
+            compare=COMPARATORS[rule.condition],
+        )
+
+    def applies_to(self, robot_id: int, owner_id: int | None) -> bool:
+        """Относится ли правило к роботу."""
+        if self.scope == AlertScope.ROBOT:
+            return self.robot_id == robot_id
+        if self.scope == AlertScope.OWNER:
+            return owner_id is not None and self.owner_id == owner_id
+        return True
+
+
+@dataclass(slots=True)
+class MetricRules:
+    """Правила одной метрики, разложенные по области действия."""
+
+    by_robot: dict[int, list[CompiledRule]] = field(default_factory=lambda: defaultdict(list))
+    by_owner: dict[int, list[CompiledRule]] = field(default_factory=lambda: defaultdict(list))
+    fleet: list[CompiledRule] = field(default_factory=list)
+
+    def add(self, rule: CompiledRule) -> None:
+        if rule.scope == AlertScope.ROBOT:
+            self.by_robot[rule.robot_id].append(rule)
+        elif rule.scope == AlertScope.OWNER:
+            self.by_owner[rule.owner_id].append(rule)
+        else:
+            self.fleet.append(rule)
+
+    def applicable(self, robot_id: int, owner_id: int) -> Iterator[CompiledRule]:
+        """Правила, относящиеся к роботу; `owner_id` — как в кэше (`NO_OWNER`)."""
+        yield from self.by_robot.get(robot_id, ())
+        yield from self.by_owner.get(owner_id, ())
+        yield from self.fleet
+
+
+@dataclass(slots=True)
+class ActiveAlert:
+    """Алерт в ожидании или сработавший: условие правила выполняется."""
+
+    rule_id: int
+    robot_id: int
+    owner_id: int | None
+    status: AlertStatus
+    since: float
+    value: float
+    fired_at: float | None = None
+    updated_at: float = 0.0
+
+
+@dataclass(frozen=True, slots=True)
+class Resolution:
+    """Снятие алерта процессом: условие перестало выполняться в момент `at`."""
+
+    at: float
+    value: float
+
+
+@dataclass(frozen=True, slots=True)
+class AlertEvent:
+    """Переход алерта: срабатывание или снятие."""
+
+    type: AlertEventType
+    rule: CompiledRule
+    robot_id: int
+    owner_id: int | None
+    value: float
+    time: float
+
+
+AlertListener = Callable[[AlertEvent], None]
+
+
+@dataclass(slots=True)
+class Settlement:
+    """Итог сведения изменений процесса с сохранённым состоянием."""
+
+    upserts: list[ActiveAlert] = field(default_factory=list)
+    deletes: list[AlertKey] = field(default_factory=list)
+    events: list[AlertEvent] = field(default_factory=list)
+
+
+class AlertEngine:
+    """Индекс правил и состояние алертов одного процесса."""
+
+    def __init__(
+        self,
+        cache: LiveMetricsCache,
+        sync_interval: float = SYNC_INTERVAL_SECONDS,
+        expire_after: float = settings.robot_inactivity_threshold_seconds,
+    ):
+        self._cache = cache
+        self._sync_interval = sync_interval
+        self._expire_after = expire_after
+        self._rules: dict[int, CompiledRule] = {}
+        self._index: dict[str, MetricRules] = {}
+        # Колонка кэша -> правила её метрики (None — правил нет)
+        self._column_rules: list[MetricRules | None] = []
+        self._has_rules = np.zeros(0, dtype=bool)
+        self._active: dict[AlertKey, ActiveAlert] = {}
+        self._dirty: set[AlertKey] = set()
+        self._resolved: dict[AlertKey, Resolution] = {}
+        self._listeners: list[AlertListener] = []
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def rules(self) -> dict[int, CompiledRule]:
+        """Включённые правила по id."""
+        return self._rules
+
+    def add_listener(self, listener: AlertListener) -> None:
+        """Регистрирует слушатель срабатываний и снятий."""
+        self._listeners.append(listener)
+
+    def load_rules(self, rules: Iterable[AlertRule]) -> None:
+        """Заменяет набор правил и перестраивает индекс."""
+        self._rules = {rule.id: CompiledRule.from_model(rule) for rule in rules if rule.enabled}
+        self._rebuild()
+
+    def set_rule(self, rule: AlertRule) -> None:
+        """Добавляет или обновляет правило (выключенное — удаляет)."""
+        if rule.enabled:
+            self._rules[rule.id] = CompiledRule.from_model(rule)
+        else:
+            self._rules.pop(rule.id, None)
+        self._rebuild()
+
+    def remove_rule(self, rule_id: int) -> None:
+        """Удаляет правило."""
+        if self._rules.pop(rule_id, None) is not None:
+            self._rebuild()
+
+    def active(self) -> list[tuple[ActiveAlert, CompiledRule]]:
+        """Алерты в ожидании и сработавшие, известные процессу, вместе с правилами."""
+        return [
+            (alert, self._rules[alert.rule_id])
+            for alert in self._active.values()
+            if alert.rule_id in self._rules
+        ]
+
+    def forget_robot(self, robot_id: int) -> None:
+        """Удаляет правила и состояние алертов робота (строки в БД удаляет каскад)."""
+        for key in [key for key in self._active if key[1] == robot_id]:
+            del self._active[key]
+            self._dirty.discard(key)
+            self._resolved.pop(key, None)
+        robot_rules = [rule.id for rule in self._rules.values() if rule.robot_id == robot_id]
+        if robot_rules:
+            for rule_id in robot_rules:
+                del self._rules[rule_id]
+            self._rebuild()
+
+    def observe(
+        self,
+        robot_id: int,
+        owner_id: int,
+        row: int,  # noqa: ARG002
+        columns: np.ndarray,
+        values: np.ndarray,
+        times: np.ndarray,
+    ) -> None:
+        """Проверяет правила по пакету точек робота (наблюдатель `LiveMetricsCache`)."""
+        if not self._rules:
+            return
+        if columns.max() >= len(self._has_rules):
+            self._map_columns()
+        hits = np.flatnonzero(self._has_rules[columns])
+        if not len(hits):
+            return
+        owner = None if owner_id == NO_OWNER else owner_id
+        for i in hits.tolist():
+            metric_rules = self._column_rules[columns[i]]
+            value, at = float(values[i]), float(times[i])
+            for rule in metric_rules.applicable(robot_id, owner_id):
+                self._evaluate(rule, robot_id, owner, value, at)
+
+    def on_robot_event(self, event: RobotEvent) -> None:
+        """Снимает алерты робота, ставшего неактивным (слушатель шины событий)."""
+        if event.type != RobotEventType.STATUS or event.status != RobotStatus.INACTIVE:
+            return
+        at = event.occurred_at.timestamp()
+        for key in [key for key in self._active if key[1] == event.robot_id]:
+            self._resolve(key, at)
+
+    def expire(self, now: float) -> int:
+        """
+        Снимает алерты, по которым нет точек дольше `expire_after`.
+
+        Returns:
+            Количество снятых алертов.
+        """
+        cutoff = now - self._expire_after
+        stale = [key for key, alert in self._active.items() if alert.updated_at < cutoff]
+        for key in stale:
+            # Момент снятия — последняя точка: более свежее состояние другого воркера уцелеет
+            self._resolve(key, self._active[key].updated_at)
+        return len(stale)
+
+    def _evaluate(
+        self, rule: CompiledRule, robot_id: int, owner_id: int | None, value: float, at: float
+    ) -> None:
+        key = (rule.id, robot_id)
+        alert = self._active.get(key)
+        if rule.compare(value, rule.threshold):
+            if alert is None:
+                alert = ActiveAlert(
+                    rule.id, robot_id, owner_id, AlertStatus.PENDING, since=at, value=value
+                )
+                self._active[key] = alert
+            alert.value = value
+            alert.updated_at = at
+            if alert.status == AlertStatus.PENDING and at - alert.since >= rule.duration:
+                alert.status = AlertStatus.FIRING
+                alert.fired_at = at
+            self._dirty.add(key)
+        elif alert is not None:
+            alert.value = value
+            self._resolve(key, at)
+
+    def _resolve(self, key: AlertKey, at: float) -> None:
+        alert = self._active.pop(key)
+        previous = self._resolved.get(key)
+        if previous is None or previous.at < at:
+            self._resolved[key] = Resolution(at, alert.value)
+        self._dirty.add(key)
+
+    def settle(
+        self,
+        dirty: set[AlertKey],
+        resolved: dict[AlertKey, Resolution],
+        stored: dict[AlertKey, ActiveAlert],
+    ) -> Settlement:
+        """
+        Сводит изменения процесса с сохранённым состоянием `stored`.
+
+        Снятие удаляет сохранённый алерт, если тот не обновлялся позже
+        (иначе робота видит другой воркер). Алерт процесса продолжает
+        сохранённый: берутся более раннее начало и срабатывание; если
+        сохранённый новее, процесс принимает его. Переход объявляется,
+        только когда меняет сохранённый статус.
+        """
+        settlement = Settlement()
+        for key in dirty:
+            state = stored.get(key)
+            rule = self._rules.get(key[0])
+            resolution = resolved.get(key)
+            if resolution is not None and state is not None and state.updated_at <= resolution.at:
+                if state.status == AlertStatus.FIRING and rule is not None:
+                    settlement.events.append(
+                        AlertEvent(
+                            AlertEventType.RESOLVED,
+                            rule,
+                            state.robot_id,
+                            state.owner_id,
+                            resolution.value,
+                            resolution.at,
+                        )
+                    )
+                settlement.deletes.append(key)
+                state = None
+
+            alert = self._active.get(key)
+            if alert is None or rule is None:
+                # Правило выключено или робот выпал из области
+                if state is not None and resolution is None:
+                    settlement.deletes.append(key)
+                continue
+            if state is not None and state.updated_at > alert.updated_at:
+                self._active[key] = state
+                continue
+
+            if state is not None:
+                alert.since = min(alert.since, state.since)
+                if state.status == AlertStatus.FIRING and alert.status == AlertStatus.PENDING:
+                    alert.status = AlertStatus.FIRING
+                    alert.fired_at = state.fired_at
+            if (
+                alert.status == AlertStatus.PENDING
+                and alert.updated_at - alert.since >= rule.duration
+            ):
+                alert.status = AlertStatus.FIRING
+                alert.fired_at = alert.updated_at
+            if alert.status == AlertStatus.FIRING and (
+                state is None or state.status != AlertStatus.FIRING
+            ):
+                settlement.events.append(
+                    AlertEvent(
+                        AlertEventType.FIRING,
+                        rule,
+                        alert.robot_id,
+                        alert.owner_id,
+                        alert.value,
+                        alert.fired_at or alert.updated_at,
+                    )
+                )
+            settlement.upserts.append(alert)
+        return settlement
+
+    def adopt(self, stored: dict[AlertKey, ActiveAlert]) -> None:
+        """
+        Принимает сохранённое состояние всех алертов.
+
+        Ключи, изменённые процессом после сведения, не трогаются; остальные
+        алерты, которых нет в таблице, сняты другим воркером.
+        """
+        for key in [key for key in self._active if key not in stored]:
+            if key not in self._dirty:
+                del self._active[key]
+        for key, state in stored.items():
+            if key in self._dirty or state.rule_id not in self._rules:
+                continue
+            local = self._active.get(key)
+            if local is None or state.updated_at >= local.updated_at:
+                self._active[key] = state
+
+    def _emit_all(self, events: list[AlertEvent]) -> None:
+        for event in events:
+            self._emit(event)
+
+    def _emit(self, event: AlertEvent) -> None:
+        logger.info(
+            "Alert %s: rule=%d robot=%d %s=%s",
+            event.type.value,
+            event.rule.id,
+            event.robot_id,
+            event.rule.metric,
+            event.value,
+        )
+        for listener in self._listeners:
+            try:
+                listener(event)
+            except Exception:
+                logger.exception("Alert listener failed")
+
+    def _rebuild(self) -> None:
+        index: dict[str, MetricRules] = defaultdict(MetricRules)
+        for rule in self._rules.values():
+            index[rule.metric].add(rule)
+        self._index = dict(index)
+        self._map_columns()
+
+        # Состояния удалённых правил и роботов, выпавших из области, снимаются
+        for key, alert in list(self._active.items()):
+            rule = self._rules.get(alert.rule_id)
+            if rule is None or not rule.applies_to(alert.robot_id, alert.owner_id):
+                del self._active[key]
+                self._dirty.add(key)
+
+    def _map_columns(self) -> None:
+        names = self._cache.metrics
+        self._column_rules = [self._index.get(name) for name in names]
+        self._has_rules = np.array([rules is not None for rules in self._column_rules], dtype=bool)
+
+    async def start(self) -> None:
+        """Загружает правила и состояние из БД и запускает цикл синхронизации."""
+        if self._task is not None:
+            return
+        try:
+            await self.restore()
+        except (SQLAlchemyError, OSError) as e:
+            logger.warning("Alert engine restore failed: %s", e)
+        self._task = asyncio.create_task(self._run(), name="alert-engine")
+        logger.info(
+            "Alert engine started: %d rules, %d active alerts", len(self._rules), len(self._active)
+        )
+
+    async def stop(self) -> None:
+        """Останавливает цикл и сохраняет состояние."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+        await self._checkpoint_safely()
+
+    async def restore(self) -> None:
+        """Читает правила и сохранённое состояние алертов."""
+        await self.reload_rules()
+        await self.refresh()
+
+    async def refresh(self) -> None:
+        """Перечитывает сохранённое состояние алертов (`adopt`)."""
+        async with self._lock:
+            async with async_session_factory() as session:
+                stored = await load_states(session)
+            self.adopt(stored)
+
+    async def checkpoint(self, session: AsyncSession | None = None) -> int:
+        """
+        Сводит изменившиеся с прошлого раза состояния с БД и объявляет переходы.
+
+        Сведение воркеров идёт по очереди под advisory-блокировкой транзакции.
+
+        Args:
+            session: Сессия, в которой сводить (по умолчанию — новая)
+
+        Returns:
+            Количество сведённых ключей.
+        """
+        if session is None:
+            async with async_session_factory() as session:
+                return await self.checkpoint(session)
+
+        async with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            resolved, self._resolved = self._resolved, {}
+            if not dirty:
+                return 0
+            try:
+                await session.execute(select(func.pg_advisory_xact_lock(ALERT_STATE_LOCK_KEY)))
+                stored = await load_states(session, dirty)
+                settlement = self.settle(dirty, resolved, stored)
+                await self._write(session, settlement)
+                await session.commit()
+            except BaseException:
+                self._dirty |= dirty
+                for key, resolution in resolved.items():
+                    self._resolved.setdefault(key, resolution)
+                raise
+        self._emit_all(settlement.events)
+        return len(dirty)
+
+    async def _write(self, session: AsyncSession, settlement: Settlement) -> None:
+        if settlement.deletes:
+            await session.execute(
+                delete(AlertRuleState).where(
+                    tuple_(AlertRuleState.rule_id, AlertRuleState.robot_id).in_(settlement.deletes)
+                )
+            )
+
+        alerts = settlement.upserts
+        if not alerts:
+            return
+        # Правило или робот могли быть удалены в другом процессе
+        rule_ids = set(
+            (
+                await session.execute(
+                    select(AlertRule.id).where(AlertRule.id.in_({a.rule_id for a in alerts}))
+                )
+            ).scalars()
+        )
+        robot_ids = set(
+            (
+                await session.execute(
+                    select(Robot.id).where(Robot.id.in_({a.robot_id for a in alerts}))
+                )
+            ).scalars()
+        )
+        rows = [
+            {
+                "rule_id": alert.rule_id,
+                "robot_id": alert.robot_id,
+                "status": alert.status,
+                "active_since": datetime.fromtimestamp(alert.since, UTC),
+                "fired_at": (
+                    datetime.fromtimestamp(alert.fired_at, UTC) if alert.fired_at else None
+                ),
+                "value": alert.value,
+                "updated_at": datetime.fromtimestamp(alert.updated_at, UTC),
+            }
+            for alert in alerts
+            if alert.rule_id in rule_ids and alert.robot_id in robot_ids
+        ]
+        if not rows:
+            return
+        statement = insert(AlertRuleState).values(rows)
+        await session.execute(
+            statement.on_conflict_do_update(
+                index_elements=["rule_id", "robot_id"],
+                set_={
+                    column: statement.excluded[column]
+                    for column in ("status", "active_since", "fired_at", "value", "updated_at")
+                },
+            )
+        )
+
+    async def reload_rules(self) -> None:
+        """Перечитывает правила из БД."""
+        async with async_session_factory() as session:
+            rules = (await session.execute(select(AlertRule))).scalars().all()
+        self.load_rules(rules)
+
+    async def _checkpoint_safely(self) -> None:
+        try:
+            await self.checkpoint()
+        except Exception as e:
+            logger.warning("Failed to checkpoint alert state (%d pending): %s", len(self._dirty), e)
+
+    async def _sync_safely(self) -> None:
+        expired = self.expire(time.time())
+        if expired:
+            logger.info("Expired %d alerts without recent points", expired)
+        await self._checkpoint_safely()
+        try:
+            await self.reload_rules()
+            await self.refresh()
+        except Exception as e:
+            logger.warning("Failed to reload alert rules and state: %s", e)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._sync_interval)
+            await self._sync_safely()
+
+
+async def load_states(
+    session: AsyncSession, keys: set[AlertKey] | None = None
+) -> dict[AlertKey, ActiveAlert]:
+    """Сохранённые алерты (все или по ключам `keys`)."""
+    query = select(AlertRuleState, Robot.owner_id).join(Robot, Robot.id == AlertRuleState.robot_id)
+    if keys is not None:
+        query = query.where(tuple_(AlertRuleState.rule_id, AlertRuleState.robot_id).in_(keys))
+    result = await session.execute(query)
+    return {
+        (state.rule_id, state.robot_id): ActiveAlert(
+            rule_id=state.rule_id,
+            robot_id=state.robot_id,
+            owner_id=owner_id,
+            status=state.status,
+            since=state.active_since.timestamp(),
+            value=state.value,
+            fired_at=state.fired_at.timestamp() if state.fired_at else None,
+            updated_at=state.updated_at.timestamp(),
+        )
+        for state, owner_id in result
+    }
+
+
+alert_engine = AlertEngine(live_metrics)
+live_metrics.add_observer(alert_engine.observe)
+robot_event_bus.add_listener(alert_engine.on_robot_event)
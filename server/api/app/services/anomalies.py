@@ -0,0 +1,348 @@
+"""
+Потоковое обнаружение аномалий в принятых метриках.
+
+Для каждой пары «робот, метрика» ведётся экспоненциально взвешенное
+среднее и дисперсия (EWMA). Новая точка сравнивается с ними до обновления:
+если отклонение больше `threshold` стандартных отклонений, точка
+считается аномальной. Записывается только переход в аномальное состояние —
+серия подряд идущих аномальных точек даёт одну запись.
+
+С сезонной базой дополнительно ведётся EWMA по часу суток (UTC): как
+только для часа накоплено достаточно точек, сравнение идёт с ним, так что
+ежедневные пики нагрузки не считаются аномалиями.
+
+Состояние хранится в массивах NumPy: строка кэша последних значений ×
+метрика детектора. Детектор подписан на `LiveMetricsCache.ingest`, но сам
+приём только складывает разобранные точки в буфер: пакет одного робота —
+это несколько чисел, и накладные расходы NumPy на нём дороже самих
+вычислений. Буфер обрабатывается векторно по всему парку каждые
+`FLUSH_INTERVAL_SECONDS` (фоновая задача, `start`/`stop`), раньше — если
+набралось `FLUSH_POINTS` точек, и перед каждым чтением результатов.
+
+Загрузку CPU агент не отправляет (`report_active = false`), поэтому
+наблюдается простой `cpu.usage_idle`: z-score симметричен, и всплеск
+нагрузки виден как провал простоя.
+"""
+
+import asyncio
+import contextlib
+import logging
+from collections import deque
+from collections.abc import Iterator
+from dataclasses import dataclass
+
+import numpy as np
+
+from app.config import get_settings
+from app.services.live_metrics import NO_OWNER, LiveMetricsCache, live_metrics
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Метрики под наблюдением и минимальное стандартное отклонение:
+# без нижней границы почти постоянный ряд даёт огромный z на любом шуме
+DETECTED_METRICS: dict[str, float] = {
+    "cpu.usage_idle": 2.0,
+    "mem.used_percent": 1.0,
+    "disk.used_percent": 0.5,
+    "swap.used_percent": 1.0,
+    "system.load1": 0.2,
+    "processes.total": 5.0,
+}
+
+# Вес новой точки в EWMA: около 50 последних точек
+ALPHA = 0.04
+# Сезонная база обновляется только в своём часе, поэтому быстрее
+SEASONAL_ALPHA = 0.1
+# Сколько точек нужно, прежде чем сравнивать с базой
+WARMUP_POINTS = 30
+# Сколько последних аномалий хранится
+ANOMALY_HISTORY = 1000
+# Как часто обрабатывается буфер принятых точек
+FLUSH_INTERVAL_SECONDS = 1.0
+# Сколько принятых точек копится до обработки вне очереди
+FLUSH_POINTS = 50_000
+
+_HOURS = 24
+_UNTRACKED = -1
+_INITIAL_ROBOTS = 64
+
+
+@dataclass(frozen=True)
+class Anomaly:
+    """Точка, отклонившаяся от базы."""
+
+    robot_id: int
+    owner_id: int | None
+    metric: str
+    value: float
+    expected: float
+    zscore: float
+    time: float
+
+
+class AnomalyDetector:
+    """EWMA z-score по всем роботам и метрикам из `DETECTED_METRICS`."""
+
+    def __init__(
+        self,
+        cache: LiveMetricsCache,
+        threshold: float = 4.0,
+        seasonal: bool = False,
+        initial_robots: int = _INITIAL_ROBOTS,
+        flush_interval: float = FLUSH_INTERVAL_SECONDS,
+    ) -> None:
+        self.threshold = threshold
+        self.seasonal = seasonal
+        self._cache = cache
+        self._flush_interval = flush_interval
+        self._task: asyncio.Task | None = None
+        self._metrics = list(DETECTED_METRICS)
+        self._min_std = np.array([DETECTED_METRICS[name] for name in self._metrics])
+        # Колонка кэша -> колонка детектора
+        self._column_map = np.full(0, _UNTRACKED, dtype=np.int64)
+        self._anomalies: deque[Anomaly] = deque(maxlen=ANOMALY_HISTORY)
+        self._pending: list[tuple[int, int, int, np.ndarray, np.ndarray, np.ndarray]] = []
+        self._pending_points = 0
+        self._allocate(initial_robots)
+
+    def _allocate(self, rows: int) -> None:
+        shape = (rows, len(self._metrics))
+        self._row_robot = np.full(rows, NO_OWNER, dtype=np.int64)
+        self._count = np.zeros(shape)
+        self._mean = np.zeros(shape)
+        self._var = np.zeros(shape)
+        self._flagged = np.zeros(shape, dtype=bool)
+        if self.seasonal:
+            self._season_count = np.zeros((*shape, _HOURS))
+            self._season_mean = np.zeros((*shape, _HOURS))
+            self._season_var = np.zeros((*shape, _HOURS))
+
+    def observe(
+        self,
+        robot_id: int,
+        owner_id: int,
+        row: int,
+        columns: np.ndarray,
+        values: np.ndarray,
+        times: np.ndarray,
+    ) -> None:
+        """Ставит пакет точек робота в очередь (наблюдатель `LiveMetricsCache`)."""
+        self._pending.append((robot_id, owner_id, row, columns, values, times))
+        self._pending_points += len(columns)
+        if self._pending_points >= FLUSH_POINTS:
+            self.flush()
+
+    async def start(self) -> None:
+        """Запускает периодическую обработку буфера."""
+        if self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run(), name="anomaly-detector")
+        logger.info("Anomaly detector started: flush every %ss", self._flush_interval)
+
+    async def stop(self) -> None:
+        """Останавливает обработку и разбирает остаток буфера."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+        self.flush()
+        logger.info("Anomaly detector stopped")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Anomaly detector flush failed")
+
+    def flush(self) -> None:
+        """Обрабатывает накопленные точки."""
+        if not self._pending:
+            return
+        pending, self._pending, self._pending_points = self._pending, [], 0
+
+        sizes = [len(chunk[3]) for chunk in pending]
+        columns = np.concatenate([chunk[3] for chunk in pending])
+        if columns.max() >= len(self._column_map):
+            self._extend_column_map()
+        metric_idx = self._column_map[columns]
+        tracked = np.flatnonzero(metric_idx != _UNTRACKED)
+        if not len(tracked):
+            return
+
+        metric_idx = metric_idx[tracked]
+        robot_ids = np.repeat([chunk[0] for chunk in pending], sizes)[tracked]
+        owner_ids = np.repeat([chunk[1] for chunk in pending], sizes)[tracked]
+        rows = np.repeat([chunk[2] for chunk in pending], sizes)[tracked]
+        values = np.concatenate([chunk[4] for chunk in pending])[tracked]
+        times = np.concatenate([chunk[5] for chunk in pending])[tracked]
+
+        if rows.max() >= len(self._row_robot):
+            self._grow(max(int(rows.max()) + 1, len(self._row_robot) * 2))
+        # Строка кэша досталась другому роботу — его база начинается с нуля.
+        # Если за один буфер строка сменила робота, точки прежнего отбрасываются
+        reassigned = self._row_robot[rows] != robot_ids
+        if reassigned.any():
+            self._reset(rows[reassigned])
+            self._row_robot[rows[reassigned]] = robot_ids[reassigned]
+            keep = self._row_robot[rows] == robot_ids
+            robot_ids, owner_ids, rows = robot_ids[keep], owner_ids[keep], rows[keep]
+            metric_idx, values, times = metric_idx[keep], values[keep], times[keep]
+
+        # Точки одной серии обрабатываются по порядку: в k-м проходе — k-я
+        # точка каждой серии. Внутри серии буфер уже упорядочен по времени
+        series = rows * len(self._metrics) + metric_idx
+        order = np.argsort(series, kind="stable")
+        group_starts = np.r_[0, np.flatnonzero(np.diff(series[order])) + 1]
+        group_sizes = np.diff(np.r_[group_starts, len(order)])
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order)) - np.repeat(group_starts, group_sizes)
+        by_rank = np.argsort(rank, kind="stable")
+        for batch in np.split(by_rank, np.cumsum(np.bincount(rank))[:-1]):
+            self._update(
+                robot_ids[batch],
+                owner_ids[batch],
+                rows[batch],
+                metric_idx[batch],
+                values[batch],
+                times[batch],
+            )
+
+    def _update(
+        self,
+        robot_ids: np.ndarray,
+        owner_ids: np.ndarray,
+        rows: np.ndarray,
+        metric_idx: np.ndarray,
+        x: np.ndarray,
+        times: np.ndarray,
+    ) -> None:
+        """Шаг по точкам разных серий (пары «строка, метрика» не повторяются)."""
+        count = self._count[rows, metric_idx]
+        mean = self._mean[rows, metric_idx]
+        var = self._var[rows, metric_idx]
+        min_std = self._min_std[metric_idx]
+
+        diff = x - mean
+        expected = mean
+        zscore = diff / np.maximum(np.sqrt(var), min_std)
+        ready = count >= WARMUP_POINTS
+
+        if self.seasonal:
+            hour = (times // 3600).astype(np.int64) % _HOURS
+            s_count = self._season_count[rows, metric_idx, hour]
+            s_mean = self._season_mean[rows, metric_idx, hour]
+            s_var = self._season_var[rows, metric_idx, hour]
+            s_diff = x - s_mean
+            s_ready = s_count >= WARMUP_POINTS
+            expected = np.where(s_ready, s_mean, expected)
+            zscore = np.where(s_ready, s_diff / np.maximum(np.sqrt(s_var), min_std), zscore)
+            ready |= s_ready
+            s_mean, s_var = _ewma(s_mean, s_var, s_count, s_diff, SEASONAL_ALPHA)
+            self._season_mean[rows, metric_idx, hour] = s_mean
+            self._season_var[rows, metric_idx, hour] = s_var
+            self._season_count[rows, metric_idx, hour] = s_count + 1
+
+        self._mean[rows, metric_idx], self._var[rows, metric_idx] = _ewma(
+            mean, var, count, diff, ALPHA
+        )
+        self._count[rows, metric_idx] = count + 1
+
+        anomalous = ready & (np.abs(zscore) > self.threshold)
+        was_flagged = self._flagged[rows, metric_idx]
+        self._flagged[rows, metric_idx] = anomalous
+        for i in np.flatnonzero(anomalous & ~was_flagged).tolist():
+            owner_id = int(owner_ids[i])
+            self._anomalies.append(
+                Anomaly(
+                    robot_id=int(robot_ids[i]),
+                    owner_id=None if owner_id == NO_OWNER else owner_id,
+                    metric=self._metrics[metric_idx[i]],
+                    value=float(x[i]),
+                    expected=float(expected[i]),
+                    zscore=float(zscore[i]),
+                    time=float(times[i]),
+                )
+            )
+
+    def recent(self, robot_id: int | None = None) -> Iterator[Anomaly]:
+        """Записанные аномалии, от новых к старым."""
+        self.flush()
+        for anomaly in reversed(self._anomalies):
+            if robot_id is None or anomaly.robot_id == robot_id:
+                yield anomaly
+
+    def is_flagged(self, robot_id: int, metric: str) -> bool:
+        """Находится ли метрика робота сейчас в аномальном состоянии."""
+        self.flush()
+        rows = np.flatnonzero(self._row_robot == robot_id)
+        if not len(rows) or metric not in DETECTED_METRICS:
+            return False
+        return bool(self._flagged[rows[0], self._metrics.index(metric)])
+
+    def forget(self, robot_id: int) -> None:
+        """Удаляет состояние и аномалии робота."""
+        self.flush()
+        self._reset(np.flatnonzero(self._row_robot == robot_id))
+        self._anomalies = deque(
+            (anomaly for anomaly in self._anomalies if anomaly.robot_id != robot_id),
+            maxlen=ANOMALY_HISTORY,
+        )
+
+    def clear(self) -> None:
+        """Сбрасывает всё состояние."""
+        self._pending, self._pending_points = [], 0
+        self._anomalies.clear()
+        self._allocate(len(self._row_robot))
+
+    def _reset(self, rows: np.ndarray) -> None:
+        for name in self._state_arrays():
+            getattr(self, name)[rows] = NO_OWNER if name == "_row_robot" else 0
+
+    def _extend_column_map(self) -> None:
+        names = self._cache.metrics
+        column_map = np.full(len(names), _UNTRACKED, dtype=np.int64)
+        for column, name in enumerate(names):
+            if name in DETECTED_METRICS:
+                column_map[column] = self._metrics.index(name)
+        self._column_map = column_map
+
+    def _state_arrays(self) -> list[str]:
+        names = ["_row_robot", "_count", "_mean", "_var", "_flagged"]
+        if self.seasonal:
+            names += ["_season_count", "_season_mean", "_season_var"]
+        return names
+
+    def _grow(self, rows: int) -> None:
+        old_rows = len(self._row_robot)
+        old = {name: getattr(self, name) for name in self._state_arrays()}
+        self._allocate(rows)
+        for name, array in old.items():
+            getattr(self, name)[:old_rows] = array
+
+
+def _ewma(
+    mean: np.ndarray, var: np.ndarray, count: np.ndarray, diff: np.ndarray, alpha: float
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Шаг EWMA среднего и дисперсии по отклонению `diff` новой точки.
+
+    Пока точек меньше `1/alpha`, вес новой точки — `1/(count+1)`, то есть
+    считаются обычные среднее и дисперсия: первая точка задаёт среднее,
+    и база не тянется к начальному нулю.
+    """
+    weight = np.maximum(alpha, 1.0 / (count + 1))
+    increment = weight * diff
+    return mean + increment, (1 - weight) * (var + diff * increment)
+
+
+anomaly_detector = AnomalyDetector(
+    live_metrics,
+    threshold=settings.anomaly_z_threshold,
+    seasonal=settings.anomaly_seasonal_baseline,
+)
+live_metrics.add_observer(anomaly_detector.observe)
@@ -0,0 +1,47 @@
+"""
+Ответы в формате Apache Arrow IPC.
+
+Клиенты, которые передают `Accept: application/vnd.apache.arrow.stream`,
+получают историю метрик в виде типизированных колонок: таблица собирается
+из массивов NumPy без промежуточных объектов на строку и читается,
+например, `pyarrow.ipc.open_stream(...).read_pandas()`.
+
+Буферы сжимаются zstd: регулярные метки времени сжимаются в разы,
+а pyarrow, polars и R arrow распаковывают их прозрачно.
+"""
+
+import numpy as np
+import pyarrow as pa
+
+from app.services.metrics_query import SeriesColumns
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+_WRITE_OPTIONS = pa.ipc.IpcWriteOptions(compression="zstd")
+
+
+def accepts_arrow(accept: str | None) -> bool:
+    """Клиент просит поток Arrow IPC в заголовке Accept."""
+    if not accept:
+        return False
+    return any(part.split(";")[0].strip() == ARROW_STREAM_MEDIA_TYPE for part in accept.split(","))
+
+
+def series_table(columns: SeriesColumns, metadata: dict[str, str]) -> pa.Table:
+    """Таблица `time`, `value` (и `min`, `max` для огибающей); NaN становится null."""
+    arrays = {
+        "time": pa.array(columns.times, type=pa.timestamp("ns", tz="UTC")),
+        "value": pa.array(columns.values, mask=np.isnan(columns.values)),
+    }
+    if columns.min is not None and columns.max is not None:
+        arrays["min"] = pa.array(columns.min)
+        arrays["max"] = pa.array(columns.max)
+    return pa.table(arrays).replace_schema_metadata(metadata)
+
+
+def to_ipc_stream(table: pa.Table) -> bytes:
+    """Сериализует таблицу в поток Arrow IPC."""
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema, options=_WRITE_OPTIONS) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
@@ -0,0 +1,101 @@
+"""
+Прореживание временных рядов для графиков.
+
+Largest-Triangle-Three-Buckets (LTTB) выбирает из каждой корзины точку,
+образующую наибольший треугольник с уже выбранной точкой предыдущей корзины
+и средним следующей, — форма ряда и пики сохраняются. Огибающая min/max
+отдаёт по окну среднее, минимум и максимум.
+
+Проход по корзинам последовательный (выбор зависит от предыдущей точки),
+но внутри корзины всё считается векторно, так что стоимость линейна
+по числу исходных точек, а цикл Python — по числу точек ответа.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+
+def lttb(times: np.ndarray, values: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Индексы точек, отобранных LTTB.
+
+    Args:
+        times: Время точек по возрастанию.
+        values: Значения точек.
+        threshold: Сколько точек оставить (включая первую и последнюю).
+
+    Returns:
+        Возрастающий массив индексов длиной `min(threshold, len(times))`.
+    """
+    size = len(times)
+    if threshold >= size:
+        return np.arange(size)
+    if threshold < 3:
+        return np.array([0, size - 1], dtype=np.int64)[: max(threshold, 0)]
+
+    x = times.astype(np.float64)
+    y = values.astype(np.float64)
+    # Границы корзин для всех точек, кроме первой и последней
+    edges = np.linspace(1, size - 1, threshold - 1).astype(np.int64)
+    edges[-1] = size - 1
+
+    # Средние корзин считаются сразу для всех: они нужны как третья вершина
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[1:-1], edges[:-1] - 1) / counts
+    mean_y = np.add.reduceat(y[1:-1], edges[:-1] - 1) / counts
+    mean_x = np.append(mean_x, x[-1])
+    mean_y = np.append(mean_y, y[-1])
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, size - 1
+    a = 0
+    for bucket in range(threshold - 2):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        cx, cy = mean_x[bucket + 1], mean_y[bucket + 1]
+        ax, ay = x[a], y[a]
+        area = np.abs((ax - cx) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (cy - ay))
+        a = lo + int(np.argmax(area))
+        selected[bucket + 1] = a
+    return selected
+
+
+@dataclass(frozen=True)
+class Envelope:
+    """Огибающая по окнам: только окна, в которых были точки."""
+
+    starts: np.ndarray
+    mean: np.ndarray
+    min: np.ndarray
+    max: np.ndarray
+
+
+def minmax_envelope(
+    times: np.ndarray, values: np.ndarray, start: int, step: int, windows: int
+) -> Envelope:
+    """
+    Среднее, минимум и максимум по окнам `[start + i*step, start + (i+1)*step)`.
+
+    Args:
+        times: Время точек по возрастанию (в единицах `start` и `step`).
+        values: Значения точек.
+    """
+    edges = start + step * np.arange(windows + 1)
+    bounds = np.searchsorted(times, edges)
+    counts = np.diff(bounds)
+    present = counts > 0
+    if not present.any():
+        empty = np.empty(0)
+        return Envelope(starts=empty.astype(np.int64), mean=empty, min=empty, max=empty)
+
+    offsets = bounds[:-1][present]
+    lo, hi = offsets[0], bounds[-1]
+    # reduceat по непустым окнам; точки вне диапазона отрезаны заранее
+    segment = values[lo:hi]
+    offsets = offsets - lo
+    return Envelope(
+        starts=edges[:-1][present],
+        mean=np.add.reduceat(segment, offsets) / counts[present],
+        min=np.minimum.reduceat(segment, offsets),
+        max=np.maximum.reduceat(segment, offsets),
+    )
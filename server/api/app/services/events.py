@@ -0,0 +1,201 @@
+"""
+Внутрипроцессная шина событий роботов.
+
+Все изменения статуса, отметки активности и подтверждения привязки
+публикуются здесь один раз и раздаются подписчикам: SSE-стримам клиентов
+(через ограниченные очереди) и внутренним слушателям (через колбэки).
+
+События не покидают процесс: при нескольких воркерах каждый из них
+раздаёт только то, что произошло в нём самом.
+"""
+
+import asyncio
+import enum
+import json
+import logging
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+
+from app.models import RobotStatus
+
+logger = logging.getLogger(__name__)
+
+# Как часто (не чаще) публиковать отметку активности одного робота
+LAST_SEEN_PUBLISH_INTERVAL_SECONDS = 15.0
+# Размер очереди одного подписчика
+SUBSCRIBER_QUEUE_SIZE = 256
+
+
+class RobotEventType(enum.StrEnum):
+    """Типы событий роботов."""
+
+    STATUS = "status"
+    LAST_SEEN = "last_seen"
+    PAIRED = "paired"
+    RESYNC = "resync"
+
+
+@dataclass(frozen=True, slots=True)
+class RobotEvent:
+    """Событие робота."""
+
+    type: RobotEventType
+    robot_id: int
+    owner_id: int | None
+    status: RobotStatus | None = None
+    previous_status: RobotStatus | None = None
+    last_seen_at: datetime | None = None
+    occurred_at: datetime = field(default_factory=lambda: datetime.now(UTC))
+
+    def to_dict(self) -> dict:
+        """Сериализует событие в JSON-совместимый словарь."""
+        return {
+            "type": self.type.value,
+            "robot_id": self.robot_id,
+            "owner_id": self.owner_id,
+            "status": self.status.value if self.status else None,
+            "previous_status": self.previous_status.value if self.previous_status else None,
+            "last_seen_at": self.last_seen_at.isoformat() if self.last_seen_at else None,
+            "occurred_at": self.occurred_at.isoformat(),
+        }
+
+    def to_sse(self) -> str:
+        """Форматирует событие для text/event-stream."""
+        return f"event: {self.type.value}\ndata: {json.dumps(self.to_dict())}\n\n"
+
+
+EventFilter = Callable[[RobotEvent], bool]
+EventListener = Callable[[RobotEvent], None]
+
+
+class RobotEventBus:
+    """
+    Издатель событий роботов с раздачей подписчикам.
+
+    Публикация синхронная и не блокирует: события кладутся в очереди
+    подписчиков через put_nowait. Если подписчик не успевает читать,
+    его очередь очищается и в неё кладётся событие RESYNC — клиент
+    должен перечитать состояние целиком.
+    """
+
+    def __init__(
+        self,
+        queue_size: int = SUBSCRIBER_QUEUE_SIZE,
+        last_seen_interval: float = LAST_SEEN_PUBLISH_INTERVAL_SECONDS,
+    ) -> None:
+        self._queue_size = queue_size
+        self._last_seen_interval = last_seen_interval
+        self._subscribers: dict[asyncio.Queue[RobotEvent], EventFilter] = {}
+        self._listeners: list[EventListener] = []
+        self._last_seen_published: dict[int, float] = {}
+
+    @property
+    def subscriber_count(self) -> int:
+        """Количество активных подписчиков."""
+        return len(self._subscribers)
+
+    def subscribe(self, event_filter: EventFilter) -> asyncio.Queue[RobotEvent]:
+        """Создаёт очередь подписчика, получающую события, прошедшие фильтр."""
+        queue: asyncio.Queue[RobotEvent] = asyncio.Queue(maxsize=self._queue_size)
+        self._subscribers[queue] = event_filter
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue[RobotEvent]) -> None:
+        """Удаляет подписчика."""
+        self._subscribers.pop(queue, None)
+
+    def add_listener(self, listener: EventListener) -> None:
+        """Регистрирует внутренний слушатель всех событий."""
+        self._listeners.append(listener)
+
+    def publish(self, event: RobotEvent) -> None:
+        """Раздаёт событие слушателям и подписчикам."""
+        for listener in self._listeners:
+            try:
+                listener(event)
+            except Exception:
+                logger.exception("Robot event listener failed: %s", listener)
+
+        for queue, event_filter in self._subscribers.items():
+            if not event_filter(event):
+                continue
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self._resync(queue, event)
+
+    def publish_status(
+        self,
+        robot_id: int,
+        owner_id: int | None,
+        status: RobotStatus,
+        previous_status: RobotStatus | None,
+        last_seen_at: datetime | None = None,
+    ) -> None:
+        """Публикует смену статуса робота."""
+        if status == previous_status:
+            return
+        self.publish(
+            RobotEvent(
+                type=RobotEventType.STATUS,
+                robot_id=robot_id,
+                owner_id=owner_id,
+                status=status,
+                previous_status=previous_status,
+                last_seen_at=last_seen_at,
+            )
+        )
+
+    def publish_paired(self, robot_id: int, owner_id: int, last_seen_at: datetime) -> None:
+        """Публикует подтверждение привязки робота."""
+        self.publish(
+            RobotEvent(
+                type=RobotEventType.PAIRED,
+                robot_id=robot_id,
+                owner_id=owner_id,
+                status=RobotStatus.ACTIVE,
+                previous_status=RobotStatus.PENDING,
+                last_seen_at=last_seen_at,
+            )
+        )
+
+    def publish_last_seen(
+        self, robot_id: int, owner_id: int | None, last_seen_at: datetime
+    ) -> None:
+        """Публикует отметку активности, не чаще раза в интервал на робота."""
+        now = time.monotonic()
+        published = self._last_seen_published
+        if now - published.get(robot_id, -self._last_seen_interval) < self._last_seen_interval:
+            return
+        # Словарь упорядочен по времени публикации: устаревшие записи — в начале
+        while published:
+            oldest = next(iter(published))
+            if now - published[oldest] < self._last_seen_interval:
+                break
+            del published[oldest]
+        published[robot_id] = now
+        self.publish(
+            RobotEvent(
+                type=RobotEventType.LAST_SEEN,
+                robot_id=robot_id,
+                owner_id=owner_id,
+                last_seen_at=last_seen_at,
+            )
+        )
+
+    def forget(self, robot_id: int) -> None:
+        """Сбрасывает состояние троттлинга удалённого робота."""
+        self._last_seen_published.pop(robot_id, None)
+
+    @staticmethod
+    def _resync(queue: asyncio.Queue[RobotEvent], event: RobotEvent) -> None:
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(
+            RobotEvent(type=RobotEventType.RESYNC, robot_id=event.robot_id, owner_id=None)
+        )
+
+
+robot_event_bus = RobotEventBus()
@@ -3,24 +3,136 @@
 
 При регистрации в WolfpackCloud автоматически создаёт учётки с теми же
 логином/паролем и ролью Editor (Grafana) / Gamma (Superset).
+
+HTTP-клиенты к обоим сервисам живут всё время работы приложения
+(`start`/`stop` в lifespan) и держат пул соединений. Сессия Superset —
+access token, CSRF-токен (он привязан к cookie сессии в клиенте) и id роли
+Gamma — получается один раз и переиспользуется до истечения токена; на
+401 или просроченный CSRF она сбрасывается, и запрос повторяется один раз.
+Учётки в Grafana и Superset создаются параллельно (`provision_user`).
 """
 
+import asyncio
 import logging
-from typing import TYPE_CHECKING
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
 
 import httpx
+from jose import JWTError, jwt
 
-if TYPE_CHECKING:
-    from app.config import Settings
+from app.config import Settings, get_settings
 
 logger = logging.getLogger(__name__)
 
+GRAFANA_TIMEOUT_SECONDS = 10.0
+SUPERSET_TIMEOUT_SECONDS = 15.0
+# Соединений в пуле к каждому сервису
+MAX_CONNECTIONS = 10
+# Сессия Superset обновляется заранее, чтобы токен не истёк посреди запроса
+SUPERSET_SESSION_REFRESH_MARGIN_SECONDS = 30.0
+# Время жизни сессии, если в access token нет exp
+SUPERSET_SESSION_FALLBACK_TTL_SECONDS = 300.0
+# id роли Gamma в стандартной установке Superset, если список ролей недоступен
+SUPERSET_DEFAULT_GAMMA_ROLE_ID = 4
+
+
+@dataclass(frozen=True, slots=True)
+class SupersetSession:
+    """Авторизованная сессия администратора Superset."""
+
+    access_token: str
+    csrf_token: str
+    # Момент по монотонным часам, после которого сессию нужно обновить
+    expires_at: float
+
+    @property
+    def headers(self) -> dict[str, str]:
+        """Заголовки авторизованного изменяющего запроса."""
+        return {
+            "Authorization": f"Bearer {self.access_token}",
+            "X-CSRFToken": self.csrf_token,
+        }
+
+
+def token_lifetime(access_token: str) -> float:
+    """Сколько секунд осталось жить JWT Superset (по exp, без проверки подписи)."""
+    try:
+        exp = jwt.get_unverified_claims(access_token).get("exp")
+    except JWTError:
+        exp = None
+    if not isinstance(exp, int | float):
+        return SUPERSET_SESSION_FALLBACK_TTL_SECONDS
+    return exp - time.time()
+
+
+@dataclass(frozen=True, slots=True)
+class ExternalAccount:
+    """Учётка пользователя в Grafana или Superset."""
+
+    id: int
+    email: str
+    login: str
+    # Администратор сервиса: такие учётки сверка не удаляет
+    admin: bool
+
+
+def grafana_login(email: str) -> str:
+    """Логин Grafana, под которым создаётся учётка пользователя."""
+    return email.split("@")[0] if "@" in email else email
+
+
+def superset_username(email: str) -> str:
+    """Имя пользователя Superset (уникальное, из email)."""
+    return email.replace("@", "_").replace(".", "_")
+
 
 class ExternalAuthService:
     """Создание и удаление учёток в Grafana и Superset."""
 
-    def __init__(self, settings: "Settings") -> None:
+    def __init__(
+        self,
+        settings: Settings,
+        transport: httpx.AsyncBaseTransport | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
         self._settings = settings
+        self._transport = transport
+        self._clock = clock
+        self._grafana: httpx.AsyncClient | None = None
+        self._superset: httpx.AsyncClient | None = None
+        self._session: SupersetSession | None = None
+        self._session_lock = asyncio.Lock()
+        self._gamma_role_id: int | None = None
+
+    async def start(self) -> None:
+        """Открывает пулы соединений к Grafana и Superset."""
+        self._grafana_client()
+        self._superset_client()
+
+    async def stop(self) -> None:
+        """Закрывает пулы соединений и забывает сессию Superset."""
+        for client in (self._grafana, self._superset):
+            if client is not None:
+                await client.aclose()
+        self._grafana = None
+        self._superset = None
+        self._session = None
+
+    async def provision_user(
+        self, email: str, password: str, name: str
+    ) -> tuple[int | None, int | None]:
+        """
+        Создаёт учётки пользователя в Grafana и Superset параллельно.
+
+        Returns:
+            ID в Grafana и ID в Superset; None — учётку создать не удалось.
+        """
+        grafana_id, superset_id = await asyncio.gather(
+            self.create_grafana_user(email, password, name),
+            self.create_superset_user(email, password, name),
+        )
+        return grafana_id, superset_id
 
     async def create_grafana_user(self, email: str, password: str, name: str) -> int | None:
         """
@@ -29,69 +141,52 @@ class ExternalAuthService:
         Returns:
             ID пользователя в Grafana или None при ошибке.
         """
-        url = f"{self._settings.grafana_url.rstrip('/')}/api/admin/users"
-        auth = (
-            self._settings.grafana_admin_user,
-            self._settings.grafana_admin_password,
-        )
-        login = email.split("@")[0] if "@" in email else email
-
         payload = {
             "name": name,
             "email": email,
-            "login": login,
+            "login": grafana_login(email),
             "password": password,
             "OrgId": 1,
         }
 
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                resp = await client.post(
-                    url,
-                    json=payload,
-                    auth=auth,
+            resp = await self._grafana_client().post("/api/admin/users", json=payload)
+            if resp.status_code != 200:
+                logger.warning(
+                    "Grafana create user failed: %s %s",
+                    resp.status_code,
+                    resp.text,
                 )
-                if resp.status_code != 200:
-                    logger.warning(
-                        "Grafana create user failed: %s %s",
-                        resp.status_code,
-                        resp.text,
-                    )
-                    return None
-
-                data = resp.json()
-                user_id = data.get("id")
-                if not user_id:
-                    logger.warning("Grafana response missing user id: %s", data)
-                    return None
-
-                await self._set_grafana_org_role(int(user_id), "Editor", auth)
-                return int(user_id)
+                return None
+
+            data = resp.json()
+            user_id = data.get("id")
+            if not user_id:
+                logger.warning("Grafana response missing user id: %s", data)
+                return None
+
+            await self._set_grafana_org_role(int(user_id), "Editor")
+            return int(user_id)
 
         except httpx.RequestError as e:
             logger.warning("Grafana request failed: %s", e)
             return None
 
-    async def _set_grafana_org_role(self, user_id: int, role: str, auth: tuple[str, str]) -> bool:
+    async def _set_grafana_org_role(self, user_id: int, role: str) -> bool:
         """Устанавливает роль пользователя в организации (org 1)."""
-        url = f"{self._settings.grafana_url.rstrip('/')}/api/orgs/1/users/{user_id}"
-
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                resp = await client.patch(
-                    url,
-                    json={"role": role},
-                    auth=auth,
+            resp = await self._grafana_client().patch(
+                f"/api/orgs/1/users/{user_id}", json={"role": role}
+            )
+            if resp.status_code != 200:
+                logger.warning(
+                    "Grafana set role failed for user %s: %s %s",
+                    user_id,
+                    resp.status_code,
+                    resp.text,
                 )
-                if resp.status_code != 200:
-                    logger.warning(
-                        "Grafana set role failed for user %s: %s %s",
-                        user_id,
-                        resp.status_code,
-                        resp.text,
-                    )
-                    return False
-                return True
+                return False
+            return True
         except httpx.RequestError as e:
             logger.warning("Grafana set role request failed: %s", e)
             return False
@@ -103,62 +198,103 @@ class ExternalAuthService:
         Returns:
             ID пользователя в Superset или None при ошибке.
         """
-        base = self._settings.superset_url.rstrip("/")
-        username = email.replace("@", "_").replace(".", "_")  # уникальный username
+        username = superset_username(email)
 
         try:
-            async with httpx.AsyncClient(timeout=15.0) as client:
-                token = await self._get_superset_token(client, base)
-                if not token:
-                    return None
-
-                csrf = await self._get_superset_csrf(client, base, token)
-                if not csrf:
-                    return None
-
-                headers = {
-                    "Authorization": f"Bearer {token}",
-                    "X-CSRFToken": csrf,
-                    "Content-Type": "application/json",
-                }
-
-                gamma_role_id = await self._get_superset_gamma_role_id(client, base, token)
-
-                payload = {
-                    "username": username,
-                    "email": email,
-                    "password": password,
-                    "first_name": name or username,
-                    "last_name": "",
-                    "roles": [gamma_role_id] if gamma_role_id else [4],
-                    "active": True,
-                }
-
-                resp = await client.post(
-                    f"{base}/api/v1/security/users/",
-                    json=payload,
-                    headers=headers,
+            session = await self._superset_session()
+            if session is None:
+                return None
+
+            payload = {
+                "username": username,
+                "email": email,
+                "password": password,
+                "first_name": name or username,
+                "last_name": "",
+                "roles": [self._gamma_role_id or SUPERSET_DEFAULT_GAMMA_ROLE_ID],
+                "active": True,
+            }
+
+            resp = await self._superset_request("POST", "/api/v1/security/users/", json=payload)
+            if resp is None:
+                return None
+
+            if resp.status_code not in (200, 201):
+                logger.warning(
+                    "Superset create user failed: %s %s",
+                    resp.status_code,
+                    resp.text,
                 )
+                return None
 
-                if resp.status_code not in (200, 201):
-                    logger.warning(
-                        "Superset create user failed: %s %s",
-                        resp.status_code,
-                        resp.text,
-                    )
-                    return None
-
-                data = resp.json()
-                return data.get("id")
+            data = resp.json()
+            return data.get("id")
 
         except httpx.RequestError as e:
             logger.warning("Superset request failed: %s", e)
             return None
 
-    async def _get_superset_token(self, client: httpx.AsyncClient, base: str) -> str | None:
+    async def _superset_request(self, method: str, url: str, **kwargs) -> httpx.Response | None:
+        """
+        Запрос от имени администратора Superset.
+
+        Если сессия оказалась недействительной (401 или просроченный CSRF),
+        она обновляется и запрос повторяется один раз. None — войти не удалось.
+        """
+        for attempt in range(2):
+            session = await self._superset_session()
+            if session is None:
+                return None
+            resp = await self._superset_client().request(
+                method, url, headers=session.headers, **kwargs
+            )
+            if attempt or not self._session_rejected(resp):
+                return resp
+            self._invalidate_session(session)
+        return resp
+
+    @staticmethod
+    def _session_rejected(resp: httpx.Response) -> bool:
+        if resp.status_code == 401:
+            return True
+        return resp.status_code == 400 and "csrf" in resp.text.lower()
+
+    def _invalidate_session(self, session: SupersetSession) -> None:
+        # Сессию мог уже обновить параллельный запрос — её не трогаем
+        if self._session is session:
+            self._session = None
+
+    async def _superset_session(self) -> SupersetSession | None:
+        """Действующая сессия Superset; при необходимости входит заново (один вход на всех)."""
+        session = self._session
+        if session is not None and self._clock() < session.expires_at:
+            return session
+
+        async with self._session_lock:
+            session = self._session
+            if session is not None and self._clock() < session.expires_at:
+                return session
+
+            client = self._superset_client()
+            token = await self._get_superset_token(client)
+            if not token:
+                return None
+
+            csrf = await self._get_superset_csrf(client, token)
+            if not csrf:
+                return None
+
+            if self._gamma_role_id is None:
+                self._gamma_role_id = await self._get_superset_gamma_role_id(client, token)
+
+            lifetime = token_lifetime(token) - SUPERSET_SESSION_REFRESH_MARGIN_SECONDS
+            self._session = SupersetSession(token, csrf, self._clock() + max(lifetime, 0.0))
+            return self._session
+
+    async def _get_superset_token(self, client: httpx.AsyncClient) -> str | None:
         """Получает JWT токен Superset."""
         resp = await client.post(
-            f"{base}/api/v1/security/login",
+            "/api/v1/security/login",
             json={
                 "username": self._settings.superset_admin_username,
                 "password": self._settings.superset_admin_password,
@@ -170,23 +306,23 @@ class ExternalAuthService:
             return None
         return resp.json().get("access_token")
 
-    async def _get_superset_csrf(
-        self, client: httpx.AsyncClient, base: str, token: str
-    ) -> str | None:
+    async def _get_superset_csrf(self, client: httpx.AsyncClient, token: str) -> str | None:
         """Получает CSRF токен Superset."""
-        client.headers["Authorization"] = f"Bearer {token}"
-        resp = await client.get(f"{base}/api/v1/security/csrf_token/")
+        resp = await client.get(
+            "/api/v1/security/csrf_token/", headers={"Authorization": f"Bearer {token}"}
+        )
         if resp.status_code != 200:
             logger.warning("Superset CSRF failed: %s %s", resp.status_code, resp.text)
             return None
         return resp.json().get("result")
 
     async def _get_superset_gamma_role_id(
-        self, client: httpx.AsyncClient, base: str, token: str
+        self, client: httpx.AsyncClient, token: str
     ) -> int | None:
         """Получает ID роли Gamma в Superset."""
-        client.headers["Authorization"] = f"Bearer {token}"
-        resp = await client.get(f"{base}/api/v1/security/roles/")
+        resp = await client.get(
+            "/api/v1/security/roles/", headers={"Authorization": f"Bearer {token}"}
+        )
         if resp.status_code != 200:
             return None
         for role in resp.json().get("result", []):
@@ -194,32 +330,113 @@ class ExternalAuthService:
                 return role.get("id")
         return None
 
+    async def grafana_users_page(
+        self, page: int, per_page: int
+    ) -> tuple[list[ExternalAccount], int] | None:
+        """
+        Страница пользователей Grafana (нумерация с 1).
+
+        Returns:
+            Учётки страницы и общее количество или None при ошибке.
+        """
+        try:
+            resp = await self._grafana_client().get(
+                "/api/users/search", params={"perpage": per_page, "page": page}
+            )
+        except httpx.RequestError as e:
+            logger.warning("Grafana list users failed: %s", e)
+            return None
+        if resp.status_code != 200:
+            logger.warning("Grafana list users failed: %s %s", resp.status_code, resp.text)
+            return None
+        data = resp.json()
+        accounts = [
+            ExternalAccount(
+                id=int(user["id"]),
+                email=(user.get("email") or "").lower(),
+                login=user.get("login") or "",
+                admin=bool(user.get("isAdmin"))
+                or user.get("login") == self._settings.grafana_admin_user,
+            )
+            for user in data.get("users", [])
+        ]
+        return accounts, int(data.get("totalCount", len(accounts)))
+
+    async def superset_users_page(
+        self, page: int, page_size: int
+    ) -> tuple[list[ExternalAccount], int] | None:
+        """
+        Страница пользователей Superset (нумерация с 0).
+
+        Returns:
+            Учётки страницы и общее количество или None при ошибке.
+        """
+        try:
+            resp = await self._superset_request(
+                "GET",
+                "/api/v1/security/users/",
+                params={
+                    "q": f"(order_column:id,order_direction:asc,page:{page},page_size:{page_size})"
+                },
+            )
+        except httpx.RequestError as e:
+            logger.warning("Superset list users failed: %s", e)
+            return None
+        if resp is None or resp.status_code != 200:
+            if resp is not None:
+                logger.warning("Superset list users failed: %s %s", resp.status_code, resp.text)
+            return None
+        data = resp.json()
+        accounts = [
+            ExternalAccount(
+                id=int(user["id"]),
+                email=(user.get("email") or "").lower(),
+                login=user.get("username") or "",
+                admin=user.get("username") == self._settings.superset_admin_username
+                or any(role.get("name") == "Admin" for role in user.get("roles") or []),
+            )
+            for user in data.get("result", [])
+        ]
+        return accounts, int(data.get("count", len(accounts)))
+
     async def delete_grafana_user(self, user_id: int) -> bool:
         """Удаляет пользователя из Grafana."""
-        url = f"{self._settings.grafana_url.rstrip('/')}/api/admin/users/{user_id}"
-        auth = (
-            self._settings.grafana_admin_user,
-            self._settings.grafana_admin_password,
-        )
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                resp = await client.delete(url, auth=auth)
-                return resp.status_code in (200, 404)
+            resp = await self._grafana_client().delete(f"/api/admin/users/{user_id}")
+            return resp.status_code in (200, 404)
         except httpx.RequestError as e:
             logger.warning("Grafana delete user failed: %s", e)
             return False
 
     async def delete_superset_user(self, user_id: int) -> bool:
         """Удаляет пользователя из Superset."""
-        base = self._settings.superset_url.rstrip("/")
         try:
-            async with httpx.AsyncClient(timeout=15.0) as client:
-                token = await self._get_superset_token(client, base)
-                if not token:
-                    return False
-                client.headers["Authorization"] = f"Bearer {token}"
-                resp = await client.delete(f"{base}/api/v1/security/users/{user_id}")
-                return resp.status_code in (200, 204, 404)
+            resp = await self._superset_request("DELETE", f"/api/v1/security/users/{user_id}")
+            return resp is not None and resp.status_code in (200, 204, 404)
         except httpx.RequestError as e:
             logger.warning("Superset delete user failed: %s", e)
             return False
+
+    def _grafana_client(self) -> httpx.AsyncClient:
+        if self._grafana is None:
+            self._grafana = httpx.AsyncClient(
+                base_url=self._settings.grafana_url.rstrip("/"),
+                auth=(self._settings.grafana_admin_user, self._settings.grafana_admin_password),
+                timeout=GRAFANA_TIMEOUT_SECONDS,
+                limits=httpx.Limits(max_connections=MAX_CONNECTIONS),
+                transport=self._transport,
+            )
+        return self._grafana
+
+    def _superset_client(self) -> httpx.AsyncClient:
+        if self._superset is None:
+            self._superset = httpx.AsyncClient(
+                base_url=self._settings.superset_url.rstrip("/"),
+                timeout=SUPERSET_TIMEOUT_SECONDS,
+                limits=httpx.Limits(max_connections=MAX_CONNECTIONS),
+                transport=self._transport,
+            )
+        return self._superset
+
+
+external_auth = ExternalAuthService(get_settings())
@@ -0,0 +1,114 @@
+"""
+Сводка по парку роботов.
+
+Количество роботов по статусам, архитектурам и владельцам считается
+одним запросом с GROUPING SETS и кэшируется на короткое время.
+Кэш сбрасывается при любом событии смены статуса или привязки из
+шины событий. Шина работает внутри процесса, поэтому сразу изменения
+видит только воркер, в котором они произошли; остальные воркеры
+отдают прежнюю сводку до истечения `SUMMARY_CACHE_TTL_SECONDS`.
+"""
+
+import time
+from dataclasses import dataclass, field
+
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Architecture, Robot, RobotStatus
+from app.services.events import RobotEvent, RobotEventType, robot_event_bus
+
+# Время жизни закэшированной сводки
+SUMMARY_CACHE_TTL_SECONDS = 10.0
+
+# Биты GROUPING(status, architecture, owner_id): 1 — колонка свёрнута
+_BY_STATUS = 0b011
+_BY_ARCHITECTURE = 0b101
+_BY_OWNER = 0b110
+_TOTAL = 0b111
+
+
+@dataclass
+class FleetSummary:
+    """Количество роботов в разрезах."""
+
+    total: int = 0
+    by_status: dict[RobotStatus, int] = field(default_factory=lambda: dict.fromkeys(RobotStatus, 0))
+    by_architecture: dict[Architecture, int] = field(
+        default_factory=lambda: dict.fromkeys(Architecture, 0)
+    )
+    by_owner: dict[int | None, int] = field(default_factory=dict)
+
+
+async def query_fleet_summary(db: AsyncSession, owner_id: int | None = None) -> FleetSummary:
+    """
+    Считает сводку одним сгруппированным запросом.
+
+    Args:
+        db: Сессия БД.
+        owner_id: Только роботы владельца; None — весь парк.
+    """
+    query = select(
+        Robot.status,
+        Robot.architecture,
+        Robot.owner_id,
+        func.grouping(Robot.status, Robot.architecture, Robot.owner_id),
+        func.count(),
+    ).group_by(
+        func.grouping_sets(
+            tuple_(Robot.status),
+            tuple_(Robot.architecture),
+            tuple_(Robot.owner_id),
+            tuple_(),
+        )
+    )
+    if owner_id is not None:
+        query = query.where(Robot.owner_id == owner_id)
+
+    summary = FleetSummary()
+    for status, architecture, owner, grouping, count in await db.execute(query):
+        if grouping == _TOTAL:
+            summary.total = count
+        elif grouping == _BY_STATUS:
+            summary.by_status[status] = count
+        elif grouping == _BY_ARCHITECTURE:
+            summary.by_architecture[architecture] = count
+        elif grouping == _BY_OWNER:
+            summary.by_owner[owner] = count
+    return summary
+
+
+class FleetSummaryCache:
+    """Кэш сводок с TTL по области видимости (весь парк или владелец)."""
+
+    def __init__(self, ttl_seconds: float = SUMMARY_CACHE_TTL_SECONDS) -> None:
+        self._ttl = ttl_seconds
+        self._entries: dict[int | None, tuple[float, FleetSummary]] = {}
+        self._generation = 0
+
+    async def get(self, db: AsyncSession, owner_id: int | None = None) -> FleetSummary:
+        """Возвращает сводку из кэша или пересчитывает её."""
+        now = time.monotonic()
+        entry = self._entries.get(owner_id)
+        if entry is not None and now - entry[0] < self._ttl:
+            return entry[1]
+        generation = self._generation
+        summary = await query_fleet_summary(db, owner_id)
+        # Сброс во время запроса: результат мог устареть, не кэшируем его
+        if generation == self._generation:
+            self._entries[owner_id] = (now, summary)
+        return summary
+
+    def invalidate(self) -> None:
+        """Сбрасывает все закэшированные сводки."""
+        self._generation += 1
+        self._entries.clear()
+
+    def on_event(self, event: RobotEvent) -> None:
+        """Слушатель шины: сбрасывает кэш при смене статуса или привязке."""
+        if event.type in (RobotEventType.STATUS, RobotEventType.PAIRED):
+            self.invalidate()
+
+
+fleet_summary_cache = FleetSummaryCache()
+robot_event_bus.add_listener(fleet_summary_cache.on_event)
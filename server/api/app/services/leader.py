@@ -0,0 +1,135 @@
+"""
+Выбор лидера для фоновых задач на advisory lock PostgreSQL.
+
+Каждый воркер uvicorn (и каждая реплика) держит отдельное соединение
+и пытается взять сессионный advisory lock. Периодические задачи
+выполняет только владелец блокировки. Блокировка живёт, пока живо
+соединение, поэтому при падении лидера PostgreSQL освобождает её сам,
+а остальные процессы подхватывают лидерство на следующей попытке.
+"""
+
+import asyncio
+import contextlib
+import logging
+import os
+import socket
+
+import asyncpg
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Ключ advisory lock планировщика ("WPC1"); меньше 2^31, поэтому в pg_locks classid = 0
+SCHEDULER_LOCK_KEY = 0x57504331
+# Интервал продления аренды и попыток захвата
+LEASE_RENEW_INTERVAL_SECONDS = 5.0
+# Таймаут запроса продления: не уложились — слагаем лидерство
+LEASE_RENEW_TIMEOUT_SECONDS = 3.0
+
+# Keepalive на стороне сервера, чтобы блокировка пропавшего лидера освобождалась быстро
+_KEEPALIVE_SETTINGS = {
+    "tcp_keepalives_idle": "10",
+    "tcp_keepalives_interval": "5",
+    "tcp_keepalives_count": "3",
+}
+
+
+class LeaderElector:
+    """Лидерство процесса по сессионной advisory-блокировке."""
+
+    def __init__(self, lock_key: int, renew_interval: float = LEASE_RENEW_INTERVAL_SECONDS) -> None:
+        self.lock_key = lock_key
+        self.instance_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._renew_interval = renew_interval
+        self._conn: asyncpg.Connection | None = None
+        self._is_leader = False
+        self._task: asyncio.Task | None = None
+
+    @property
+    def is_leader(self) -> bool:
+        """Является ли текущий процесс лидером."""
+        return self._is_leader
+
+    async def start(self) -> None:
+        """Запускает цикл захвата и продления блокировки."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="leader-elector")
+
+    async def stop(self) -> None:
+        """Останавливает цикл и освобождает блокировку."""
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        if self._conn is not None and not self._conn.is_closed():
+            with contextlib.suppress(asyncpg.PostgresError, OSError):
+                if self._is_leader:
+                    await self._conn.execute("SELECT pg_advisory_unlock($1)", self.lock_key)
+                await self._conn.close(timeout=LEASE_RENEW_TIMEOUT_SECONDS)
+        self._conn = None
+        self._set_leader(False)
+
+    async def current_leader(self, db: AsyncSession) -> str | None:
+        """Возвращает идентификатор процесса, который держит блокировку."""
+        result = await db.execute(
+            text(
+                "SELECT a.application_name FROM pg_locks l "
+                "JOIN pg_stat_activity a ON a.pid = l.pid "
+                "WHERE l.locktype = 'advisory' AND l.granted "
+                "AND l.classid = 0 AND l.objid = :key AND l.objsubid = 1"
+            ),
+            {"key": self.lock_key},
+        )
+        return result.scalar_one_or_none()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self._step()
+            except (asyncpg.PostgresError, OSError, TimeoutError) as e:
+                logger.warning("Leader lease check failed: %s", e)
+                await self._drop_connection()
+            await asyncio.sleep(self._renew_interval)
+
+    async def _step(self) -> None:
+        if self._conn is None or self._conn.is_closed():
+            self._set_leader(False)
+            self._conn = await asyncpg.connect(
+                settings.asyncpg_dsn,
+                timeout=LEASE_RENEW_TIMEOUT_SECONDS,
+                server_settings={"application_name": self.instance_id[:63], **_KEEPALIVE_SETTINGS},
+            )
+
+        if self._is_leader:
+            await self._conn.fetchval("SELECT 1", timeout=LEASE_RENEW_TIMEOUT_SECONDS)
+            return
+
+        acquired = await self._conn.fetchval(
+            "SELECT pg_try_advisory_lock($1)",
+            self.lock_key,
+            timeout=LEASE_RENEW_TIMEOUT_SECONDS,
+        )
+        self._set_leader(bool(acquired))
+
+    async def _drop_connection(self) -> None:
+        self._set_leader(False)
+        if self._conn is not None:
+            self._conn.terminate()
+            self._conn = None
+
+    def _set_leader(self, is_leader: bool) -> None:
+        if is_leader != self._is_leader:
+            logger.info(
+                "Instance %s %s scheduler leadership",
+                self.instance_id,
+                "acquired" if is_leader else "lost",
+            )
+        self._is_leader = is_leader
+
+
+leader_elector = LeaderElector(SCHEDULER_LOCK_KEY)
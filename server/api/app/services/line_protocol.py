@@ -0,0 +1,178 @@
+"""
+Разбор InfluxDB Line Protocol.
+
+Нужен API, чтобы видеть значения метрик, которые проходят через приём
+без обращения к InfluxDB. Разбираются только числовые поля; строковые
+и логические пропускаются. Приём проставляет строкам серверные теги
+(`set_tag`) перед записью в InfluxDB. Синтаксис:
+
+    measurement[,tag=value...] field=value[,field=value...] [timestamp]
+"""
+
+from collections.abc import Container, Iterator
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True, slots=True)
+class Point:
+    """Точка Line Protocol с числовыми полями."""
+
+    measurement: str
+    tags: dict[str, str]
+    fields: dict[str, float]
+    timestamp_ns: int | None
+
+
+def _split(text: str, separator: str) -> list[str]:
+    """Делит строку по разделителю, учитывая экранирование и кавычки."""
+    if "\\" not in text and '"' not in text:
+        return text.split(separator)
+
+    parts = []
+    current: list[str] = []
+    quoted = False
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if char == "\\" and i + 1 < len(text):
+            current.append(text[i : i + 2])
+            i += 2
+            continue
+        if char == '"':
+            quoted = not quoted
+        elif char == separator and not quoted:
+            parts.append("".join(current))
+            current = []
+            i += 1
+            continue
+        current.append(char)
+        i += 1
+    parts.append("".join(current))
+    return parts
+
+
+def _unescape(text: str) -> str:
+    if "\\" not in text:
+        return text
+    return text.replace("\\,", ",").replace("\\ ", " ").replace("\\=", "=").replace("\\\\", "\\")
+
+
+def _parse_number(raw: str) -> float | None:
+    if not raw or raw[0] == '"':
+        return None
+    if raw[-1] in "iu":
+        raw = raw[:-1]
+    try:
+        return float(raw)
+    except ValueError:
+        # Логические значения (t, true, F, ...) не храним
+        return None
+
+
+def _measurement_of(line: str) -> str:
+    end = len(line)
+    for separator in (",", " "):
+        index = line.find(separator)
+        while index > 0 and line[index - 1] == "\\":
+            index = line.find(separator, index + 1)
+        if index != -1:
+            end = min(end, index)
+    return _unescape(line[:end])
+
+
+def _series_end(line: str) -> int:
+    index = line.find(" ")
+    while index > 0 and line[index - 1] == "\\":
+        index = line.find(" ", index + 1)
+    return index
+
+
+def _escape_tag(text: str) -> str:
+    return text.replace("\\", "\\\\").replace(",", "\\,").replace("=", "\\=").replace(" ", "\\ ")
+
+
+def set_tag(body: str, key: str, value: str) -> str:
+    """
+    Проставляет тег `key=value` каждой строке пакета.
+
+    Тег с тем же ключом, пришедший в строке, заменяется: значение задаёт
+    принимающая сторона, а не отправитель. Комментарии и строки без набора
+    полей остаются как есть — их отклонит InfluxDB.
+    """
+    tag = f"{_escape_tag(key)}={_escape_tag(value)}"
+    prefix = f"{_escape_tag(key)}="
+    lines = []
+    for line in body.splitlines():
+        stripped = line.strip()
+        end = _series_end(stripped) if stripped and stripped[0] != "#" else -1
+        if end <= 0:
+            lines.append(line)
+            continue
+        measurement, *tags = _split(stripped[:end], ",")
+        tags = [item for item in tags if not item.startswith(prefix)]
+        lines.append(",".join([measurement, *tags, tag]) + stripped[end:])
+    return "\n".join(lines)
+
+
+def parse_line(line: str) -> Point | None:
+    """Разбирает одну строку. Возвращает None для комментариев и некорректных строк."""
+    line = line.strip()
+    if not line or line[0] == "#":
+        return None
+
+    sections = _split(line, " ")
+    sections = [section for section in sections if section]
+    if len(sections) not in (2, 3):
+        return None
+
+    series, field_set = sections[0], sections[1]
+    key_parts = _split(series, ",")
+    measurement = _unescape(key_parts[0])
+    if not measurement:
+        return None
+
+    tags = {}
+    for tag in key_parts[1:]:
+        key, separator, value = tag.partition("=")
+        if not separator:
+            return None
+        tags[_unescape(key)] = _unescape(value)
+
+    fields = {}
+    for field in _split(field_set, ","):
+        key, separator, value = field.partition("=")
+        if not separator:
+            return None
+        number = _parse_number(value)
+        if number is not None:
+            fields[_unescape(key)] = number
+
+    timestamp = None
+    if len(sections) == 3:
+        try:
+            timestamp = int(sections[2])
+        except ValueError:
+            return None
+
+    return Point(measurement=measurement, tags=tags, fields=fields, timestamp_ns=timestamp)
+
+
+def parse_lines(body: str, measurements: Container[str] | None = None) -> Iterator[Point]:
+    """
+    Разбирает пакет строк.
+
+    Args:
+        body: Текст в формате Line Protocol.
+        measurements: Если задано — разбирать только эти измерения,
+            остальные строки пропускаются без полного разбора.
+    """
+    for line in body.splitlines():
+        if measurements is not None:
+            stripped = line.lstrip()
+            if not stripped or stripped[0] == "#":
+                continue
+            if _measurement_of(stripped) not in measurements:
+                continue
+        point = parse_line(line)
+        if point is not None:
+            yield point
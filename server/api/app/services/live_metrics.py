@@ -0,0 +1,306 @@
+"""
+Кэш последних значений метрик роботов.
+
+Обновляется при приёме метрик (`POST /api/metrics`): пакет Line Protocol
+разбирается, и для каждой пары «измерение.поле» запоминается последнее
+значение и его время. Хранение — двумерные массивы NumPy: строка на робота,
+колонка на метрику, поэтому срез одной метрики по всему парку — это
+колонка массива без обхода словарей.
+
+Для измерений с несколькими сериями на робота хранится одна каноническая
+серия: суммарный CPU (`cpu=cpu-total`) и корневой раздел (`path=/`).
+Кэш живёт в процессе: каждый воркер видит метрики, принятые им самим.
+
+Потребители, которым нужны все принятые точки (а не только последние
+значения), подписываются через `add_observer` и получают уже разобранный
+пакет в виде индексов колонок кэша.
+"""
+
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+
+import numpy as np
+
+from app.services.line_protocol import parse_lines
+
+# Измерения в кэше и тег канонической серии (None — серия одна)
+TRACKED_SERIES: dict[str, tuple[str, str] | None] = {
+    "cpu": ("cpu", "cpu-total"),
+    "disk": ("path", "/"),
+    "mem": None,
+    "swap": None,
+    "system": None,
+    "processes": None,
+}
+
+NO_OWNER = -1
+_INITIAL_ROBOTS = 64
+_INITIAL_METRICS = 64
+
+
+@dataclass(frozen=True)
+class MetricColumn:
+    """Срез одной метрики по всем строкам кэша."""
+
+    robot_ids: np.ndarray
+    owner_ids: np.ndarray
+    values: np.ndarray
+    times: np.ndarray
+
+
+# Наблюдатель приёма: (robot_id, owner_id, строка, колонки, значения, время).
+# Точки пакета упорядочены по времени и не старше сохранённых в кэше.
+IngestObserver = Callable[[int, int, int, np.ndarray, np.ndarray, np.ndarray], None]
+
+
+class LiveMetricsCache:
+    """Последние значения метрик по роботам в массивах NumPy."""
+
+    def __init__(
+        self, initial_robots: int = _INITIAL_ROBOTS, initial_metrics: int = _INITIAL_METRICS
+    ) -> None:
+        self._metric_index: dict[str, int] = {}
+        self._metric_names: list[str] = []
+        self._observers: list[IngestObserver] = []
+        self._robot_rows: dict[int, int] = {}
+        self._free_rows: list[int] = []
+        self._next_row = 0
+        self._values = np.full((initial_robots, initial_metrics), np.nan)
+        self._times = np.full((initial_robots, initial_metrics), np.nan)
+        self._row_robot = np.full(initial_robots, NO_OWNER, dtype=np.int64)
+        self._row_owner = np.full(initial_robots, NO_OWNER, dtype=np.int64)
+        self._row_updated = np.full(initial_robots, np.nan)
+
+    @property
+    def metrics(self) -> list[str]:
+        """Известные имена метрик."""
+        return list(self._metric_index)
+
+    def metric_name(self, column: int) -> str:
+        """Имя метрики по индексу колонки."""
+        return self._metric_names[column]
+
+    def add_observer(self, observer: IngestObserver) -> None:
+        """Подписывает на точки, принятые `ingest`."""
+        self._observers.append(observer)
+
+    def __contains__(self, robot_id: int) -> bool:
+        return robot_id in self._robot_rows
+
+    def __len__(self) -> int:
+        return len(self._robot_rows)
+
+    def ingest(
+        self,
+        robot_id: int,
+        owner_id: int | None,
+        body: str,
+        received_at: float | None = None,
+    ) -> int:
+        """
+        Обновляет кэш по пакету Line Protocol.
+
+        Точки без времени получают время приёма. Значение заменяется,
+        только если точка не старше уже сохранённой.
+
+        Returns:
+            Количество обновлённых значений.
+        """
+        received_at = time.time() if received_at is None else received_at
+        columns: list[int] = []
+        values: list[float] = []
+        times: list[float] = []
+        for point in parse_lines(body, TRACKED_SERIES):
+            canonical = TRACKED_SERIES[point.measurement]
+            if canonical is not None and point.tags.get(canonical[0]) != canonical[1]:
+                continue
+            timestamp = (
+                received_at if point.timestamp_ns is None else point.timestamp_ns / 1_000_000_000
+            )
+            for field, value in point.fields.items():
+                columns.append(self._column(f"{point.measurement}.{field}"))
+                values.append(value)
+                times.append(timestamp)
+
+        if not columns:
+            return 0
+
+        row = self._row(robot_id)
+        column_idx = np.asarray(columns, dtype=np.int64)
+        new_values = np.asarray(values)
+        new_times = np.asarray(times)
+        # Внутри пакета побеждает более поздняя точка
+        order = np.argsort(new_times, kind="stable")
+        column_idx, new_values, new_times = column_idx[order], new_values[order], new_times[order]
+
+        fresh = ~(self._times[row, column_idx] > new_times)
+        column_idx, new_values, new_times = column_idx[fresh], new_values[fresh], new_times[fresh]
+        owner = NO_OWNER if owner_id is None else owner_id
+        self._values[row, column_idx] = new_values
+        self._times[row, column_idx] = new_times
+        self._row_owner[row] = owner
+        if len(new_times):
+            self._row_updated[row] = np.fmax(self._row_updated[row], new_times[-1])
+            for observer in self._observers:
+                observer(robot_id, owner, row, column_idx, new_values, new_times)
+        return len(new_times)
+
+    def get(
+        self, robot_id: int, metrics: list[str] | None = None
+    ) -> tuple[float, dict[str, tuple[float, float]]] | None:
+        """
+        Последние значения метрик робота.
+
+        Returns:
+            Время последней точки и словарь «метрика → (значение, время)»
+            или None, если данных нет.
+        """
+        row = self._robot_rows.get(robot_id)
+        if row is None:
+            return None
+        names = self.metrics if metrics is None else metrics
+        result = {}
+        for name in names:
+            column = self._metric_index.get(name)
+            if column is None:
+                continue
+            timestamp = self._times[row, column]
+            if not np.isnan(timestamp):
+                result[name] = (float(self._values[row, column]), float(timestamp))
+        return float(self._row_updated[row]), result
+
+    def owner_of(self, robot_id: int) -> int | None:
+        """Владелец робота на момент последнего приёма метрик."""
+        row = self._robot_rows.get(robot_id)
+        if row is None:
+            return None
+        owner = int(self._row_owner[row])
+        return None if owner == NO_OWNER else owner
+
+    def column(self, metric: str) -> MetricColumn | None:
+        """Срез метрики по всем занятым строкам (без копирования значений)."""
+        column = self._metric_index.get(metric)
+        if column is None:
+            return None
+        rows = slice(0, self._next_row)
+        return MetricColumn(
+            robot_ids=self._row_robot[rows],
+            owner_ids=self._row_owner[rows],
+            values=self._values[rows, column],
+            times=self._times[rows, column],
+        )
+
+    def top(
+        self,
+        metric: str,
+        n: int,
+        *,
+        largest: bool = True,
+        owner_id: int | None = None,
+        since: float | None = None,
+    ) -> list[tuple[int, float, float]]:
+        """
+        N роботов с наибольшими (или наименьшими) значениями метрики.
+
+        Отбор через `argpartition` за линейное время по числу роботов,
+        сортируются только N отобранных.
+
+        Args:
+            metric: Метрика «измерение.поле».
+            n: Количество роботов.
+            largest: True — наибольшие значения, False — наименьшие.
+            owner_id: Только роботы владельца; None — все.
+            since: Отбросить значения старше этого времени (Unix time).
+
+        Returns:
+            Список (robot_id, значение, время) в порядке ранга.
+        """
+        column = self.column(metric)
+        if column is None or n <= 0:
+            return []
+
+        mask = ~np.isnan(column.times)
+        if since is not None:
+            mask &= column.times >= since
+        if owner_id is not None:
+            mask &= column.owner_ids == owner_id
+        rows = np.flatnonzero(mask)
+
+        keys = -column.values[rows] if largest else column.values[rows]
+        if len(rows) > n:
+            selected = np.argpartition(keys, n - 1)[:n]
+            rows, keys = rows[selected], keys[selected]
+        rows = rows[np.argsort(keys, kind="stable")]
+
+        return [
+            (int(robot_id), float(value), float(timestamp))
+            for robot_id, value, timestamp in zip(
+                column.robot_ids[rows], column.values[rows], column.times[rows], strict=True
+            )
+        ]
+
+    def forget(self, robot_id: int) -> None:
+        """Удаляет данные робота и освобождает строку."""
+        row = self._robot_rows.pop(robot_id, None)
+        if row is None:
+            return
+        self._values[row] = np.nan
+        self._times[row] = np.nan
+        self._row_robot[row] = NO_OWNER
+        self._row_owner[row] = NO_OWNER
+        self._row_updated[row] = np.nan
+        self._free_rows.append(row)
+
+    def clear(self) -> None:
+        """Очищает кэш."""
+        for robot_id in list(self._robot_rows):
+            self.forget(robot_id)
+
+    def _row(self, robot_id: int) -> int:
+        row = self._robot_rows.get(robot_id)
+        if row is not None:
+            return row
+        if self._free_rows:
+            row = self._free_rows.pop()
+        else:
+            row = self._next_row
+            self._next_row += 1
+            if row >= self._values.shape[0]:
+                self._grow(rows=self._values.shape[0] * 2)
+        self._robot_rows[robot_id] = row
+        self._row_robot[row] = robot_id
+        return row
+
+    def _column(self, metric: str) -> int:
+        column = self._metric_index.get(metric)
+        if column is None:
+            column = len(self._metric_index)
+            self._metric_index[metric] = column
+            self._metric_names.append(metric)
+            if column >= self._values.shape[1]:
+                self._grow(columns=self._values.shape[1] * 2)
+        return column
+
+    def _grow(self, rows: int | None = None, columns: int | None = None) -> None:
+        old_rows, old_columns = self._values.shape
+        rows = rows or old_rows
+        columns = columns or old_columns
+        values = np.full((rows, columns), np.nan)
+        times = np.full((rows, columns), np.nan)
+        values[:old_rows, :old_columns] = self._values
+        times[:old_rows, :old_columns] = self._times
+        self._values, self._times = values, times
+        if rows != old_rows:
+            self._row_robot = np.concatenate(
+                [self._row_robot, np.full(rows - old_rows, NO_OWNER, dtype=np.int64)]
+            )
+            self._row_owner = np.concatenate(
+                [self._row_owner, np.full(rows - old_rows, NO_OWNER, dtype=np.int64)]
+            )
+            self._row_updated = np.concatenate(
+                [self._row_updated, np.full(rows - old_rows, np.nan)]
+            )
+
+
+live_metrics = LiveMetricsCache()
@@ -0,0 +1,251 @@
+"""
+Отслеживание активности роботов на иерархическом timing wheel.
+
+Каждый приём метрик или heartbeat переносит дедлайн неактивности робота
+в колесе за O(1). Фоновый цикл раз в тик продвигает колесо, собирает
+роботов с истёкшим дедлайном и одним UPDATE помечает их неактивными.
+"""
+
+import asyncio
+import contextlib
+import logging
+import math
+import time
+from datetime import UTC, datetime, timedelta
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.config import get_settings
+from app.database import async_session_factory
+from app.models import Robot, RobotStatus
+from app.services.events import robot_event_bus
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+class TimingWheel:
+    """
+    Иерархическое колесо таймеров.
+
+    Уровень 0 хранит дедлайны с точностью до тика, каждый следующий уровень
+    покрывает в `slots` раз больший интервал. Записи верхних уровней
+    каскадно переносятся вниз, когда колесо доходит до их слота.
+    Постановка, перенос и отмена таймера выполняются за O(1).
+    """
+
+    def __init__(self, slots: int = 64, levels: int = 4) -> None:
+        self._slots = slots
+        self._levels = levels
+        self._wheels: list[list[set[int]]] = [[set() for _ in range(slots)] for _ in range(levels)]
+        self._entries: dict[int, tuple[int, int, int]] = {}
+        self._current = 0
+
+    @property
+    def current_tick(self) -> int:
+        """Последний обработанный тик."""
+        return self._current
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: int) -> bool:
+        return key in self._entries
+
+    def reset(self, tick: int) -> None:
+        """Очищает колесо и устанавливает текущий тик."""
+        for wheel in self._wheels:
+            for slot in wheel:
+                slot.clear()
+        self._entries.clear()
+        self._current = tick
+
+    def schedule(self, key: int, deadline_tick: int) -> None:
+        """Ставит (или переносит) таймер `key` на тик `deadline_tick`."""
+        self.cancel(key)
+        self._place(key, max(deadline_tick, self._current + 1))
+
+    def cancel(self, key: int) -> bool:
+        """Отменяет таймер. Возвращает True, если он существовал."""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        _, level, slot = entry
+        self._wheels[level][slot].discard(key)
+        return True
+
+    def advance(self, tick: int) -> list[int]:
+        """Продвигает колесо до тика `tick` включительно и возвращает истёкшие ключи."""
+        expired: list[int] = []
+        while self._current < tick:
+            self._current += 1
+            self._cascade()
+            bucket = self._wheels[0][self._current % self._slots]
+            for key in bucket:
+                del self._entries[key]
+            expired.extend(bucket)
+            bucket.clear()
+        return expired
+
+    def _place(self, key: int, deadline: int) -> None:
+        delta = deadline - self._current
+        span = self._slots
+        level = 0
+        while delta >= span and level < self._levels - 1:
+            span *= self._slots
+            level += 1
+        slot = (deadline // (span // self._slots)) % self._slots
+        self._wheels[level][slot].add(key)
+        self._entries[key] = (deadline, level, slot)
+
+    def _cascade(self) -> None:
+        """
+        Переносит вниз записи верхних уровней, чей слот начинается на текущем тике.
+
+        Уровни обрабатываются сверху вниз, чтобы записи, спустившиеся
+        на уровень ниже, попали в его слот до того, как он будет разобран.
+        """
+        top = 0
+        span = 1
+        while top < self._levels - 1:
+            span *= self._slots
+            if self._current % span:
+                break
+            top += 1
+        for level in range(top, 0, -1):
+            span = self._slots**level
+            bucket = self._wheels[level][(self._current // span) % self._slots]
+            moved = list(bucket)
+            bucket.clear()
+            for key in moved:
+                deadline, _, _ = self._entries.pop(key)
+                self._place(key, deadline)
+
+
+class LivenessTracker:
+    """
+    Трекер неактивности роботов.
+
+    Питается событиями приёма метрик. Дедлайны считаются по монотонным часам,
+    поэтому неактивность обнаруживается не позже чем через один тик после порога.
+    Смены статуса сохраняются пачками: все истёкшие за тик роботы — одним запросом.
+    """
+
+    def __init__(self, threshold_seconds: float, tick_seconds: float = 1.0) -> None:
+        self._threshold = threshold_seconds
+        self._tick = tick_seconds
+        self._wheel = TimingWheel()
+        self._wheel.reset(self._now_tick())
+        self._task: asyncio.Task | None = None
+
+    @property
+    def tracked(self) -> int:
+        """Количество отслеживаемых роботов."""
+        return len(self._wheel)
+
+    def touch(self, robot_id: int, seen_at: datetime | None = None) -> None:
+        """Отмечает активность робота и переносит его дедлайн."""
+        deadline = time.monotonic() + self._threshold
+        if seen_at is not None:
+            deadline -= (datetime.now(UTC) - seen_at).total_seconds()
+        self._wheel.schedule(robot_id, math.ceil(deadline / self._tick))
+
+    def forget(self, robot_id: int) -> None:
+        """Прекращает отслеживание робота (удалён или выведен из ACTIVE)."""
+        self._wheel.cancel(robot_id)
+
+    async def start(self) -> None:
+        """Загружает активных роботов из БД и запускает цикл тиков."""
+        if self._task is not None:
+            return
+        if not self.tracked:
+            self._wheel.reset(self._now_tick())
+        try:
+            await self._seed()
+        except (SQLAlchemyError, OSError) as e:
+            logger.warning("Liveness tracker seed failed: %s", e)
+        self._task = asyncio.create_task(self._run(), name="liveness-tracker")
+        logger.info(
+            "Liveness tracker started: %d robots, threshold %ss, tick %ss",
+            self.tracked,
+            self._threshold,
+            self._tick,
+        )
+
+    async def stop(self) -> None:
+        """Останавливает цикл тиков."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+        logger.info("Liveness tracker stopped")
+
+    def _now_tick(self) -> int:
+        return math.floor(time.monotonic() / self._tick)
+
+    async def _seed(self) -> None:
+        async with async_session_factory() as session:
+            result = await session.execute(
+                select(Robot.id, Robot.last_seen_at).where(Robot.status == RobotStatus.ACTIVE)
+            )
+            for robot_id, last_seen_at in result:
+                self.touch(robot_id, last_seen_at)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._tick)
+            expired = self._wheel.advance(self._now_tick())
+            if not expired:
+                continue
+            try:
+                await self._flush(expired)
+            except SQLAlchemyError:
+                logger.exception("Failed to persist inactive robots: %s", expired)
+
+    async def _flush(self, robot_ids: list[int]) -> None:
+        """
+        Помечает истёкших роботов неактивными одним UPDATE.
+
+        Условие по last_seen_at защищает от гонки с другими воркерами:
+        если метрики робота принял другой процесс, строка не изменится,
+        и робот снова ставится в колесо по значению из БД.
+        """
+        threshold = datetime.now(UTC) - timedelta(seconds=self._threshold)
+
+        async with async_session_factory() as session:
+            result = await session.execute(
+                update(Robot)
+                .where(
+                    Robot.id.in_(robot_ids),
+                    Robot.status == RobotStatus.ACTIVE,
+                    Robot.last_seen_at <= threshold,
+                )
+                .values(status=RobotStatus.INACTIVE)
+                .returning(Robot.id, Robot.name, Robot.owner_id)
+            )
+            updated = result.fetchall()
+            await session.commit()
+
+            marked = {robot_id for robot_id, _, _ in updated}
+            for robot_id, robot_name, owner_id in updated:
+                logger.info("Robot marked inactive: id=%d name=%s", robot_id, robot_name)
+                robot_event_bus.publish_status(
+                    robot_id, owner_id, RobotStatus.INACTIVE, RobotStatus.ACTIVE
+                )
+
+            remaining = [robot_id for robot_id in robot_ids if robot_id not in marked]
+            if remaining:
+                result = await session.execute(
+                    select(Robot.id, Robot.last_seen_at).where(
+                        Robot.id.in_(remaining),
+                        Robot.status == RobotStatus.ACTIVE,
+                    )
+                )
+                for robot_id, last_seen_at in result:
+                    self.touch(robot_id, last_seen_at)
+
+
+liveness_tracker = LivenessTracker(threshold_seconds=settings.robot_inactivity_threshold_seconds)
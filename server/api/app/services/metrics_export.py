@@ -0,0 +1,269 @@
+"""
+Выгрузка всей истории метрик робота в CSV или Parquet.
+
+История читается из InfluxDB окнами по `EXPORT_CHUNK_SECONDS` и отдаётся
+потоком: в памяти держится только текущее окно, поэтому объём выгрузки
+не ограничен. После пустого окна один запрос `first()` находит следующую
+точку робота, и выгрузка переходит сразу к её окну — длинные перерывы
+в данных стоят одного запроса, а не запроса на каждый час. Внутри окна
+строки отсортированы по времени, окна идут по порядку — время последней
+полученной строки служит курсором для продолжения прерванной выгрузки.
+
+Формат строк «длинный»: время, измерение, поле, теги серии и значение.
+Выгружаются только числовые поля.
+"""
+
+import asyncio
+import io
+import re
+import time
+from collections.abc import AsyncIterator
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+from app.config import get_settings
+from app.services.metrics_query import (
+    ROBOT_ID_TAG,
+    InfluxQueryError,
+    flux_string,
+    robot_filter,
+    run_query,
+)
+
+settings = get_settings()
+
+# Длина окна одного запроса к InfluxDB
+EXPORT_CHUNK_SECONDS = 3600
+_NS = 1_000_000_000
+
+EXPORT_SCHEMA = pa.schema(
+    [
+        ("time", pa.timestamp("ns", tz="UTC")),
+        ("measurement", pa.string()),
+        ("field", pa.string()),
+        ("tags", pa.string()),
+        ("value", pa.float64()),
+    ]
+)
+
+# Служебные колонки ответа и теги, одинаковые для всех серий робота
+_SKIP_COLUMNS = {"", "result", "table", "_start", "_stop", "robot", "hostname", ROBOT_ID_TAG}
+_DATA_COLUMNS = {"_time", "_value", "_field", "_measurement"}
+_TABLE_SEPARATOR = re.compile(rb"\r?\n\r?\n")
+_CONVERT_OPTIONS = pa_csv.ConvertOptions(
+    column_types={"_time": pa.timestamp("ns", tz="UTC"), "_value": pa.float64()},
+)
+
+
+def flux_time_ns(timestamp_ns: int) -> str:
+    """Литерал времени Flux с наносекундами."""
+    seconds, nanos = divmod(timestamp_ns, _NS)
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(seconds)) + f".{nanos:09d}Z"
+
+
+def build_export_flux(robot_id: int, start_ns: int, stop_ns: int) -> str:
+    """Flux-запрос всех числовых полей робота за окно `[start_ns, stop_ns)`."""
+    return "\n".join(
+        [
+            'import "types"',
+            f"from(bucket: {flux_string(settings.influxdb_bucket)})",
+            f"  |> range(start: {flux_time_ns(start_ns)}, stop: {flux_time_ns(stop_ns)})",
+            f"  |> filter(fn: (r) => {robot_filter(robot_id)})",
+            "  |> filter(fn: (r) => types.isNumeric(v: r._value))",
+            "  |> toFloat()",
+        ]
+    )
+
+
+def parse_export_chunk(data: bytes) -> pa.Table:
+    """
+    Разбирает CSV-ответ InfluxDB в таблицу `EXPORT_SCHEMA`, по времени.
+
+    Таблицы ответа с одинаковой схемой идут под общим заголовком и
+    различаются колонкой `table`; каждая — одна серия, поэтому строка
+    тегов считается один раз на таблицу.
+
+    Raises:
+        InfluxQueryError: Ответ не разбирается.
+    """
+    tables = []
+    for chunk in _TABLE_SEPARATOR.split(data):
+        if not chunk.strip():
+            continue
+        try:
+            table = pa_csv.read_csv(io.BytesIO(chunk), convert_options=_CONVERT_OPTIONS)
+        except pa.ArrowInvalid as e:
+            raise InfluxQueryError(f"invalid CSV: {e}") from e
+        if table.num_rows == 0:
+            continue
+
+        tag_names = sorted(set(table.column_names) - _SKIP_COLUMNS - _DATA_COLUMNS)
+        if "table" in table.column_names:
+            series = table["table"].to_numpy()
+        else:
+            series = np.zeros(table.num_rows, dtype=np.int64)
+        _, first_rows, row_series = np.unique(series, return_index=True, return_inverse=True)
+        series_tags = pa.array(
+            [
+                ",".join(f"{name}={table[name][row]}" for name in tag_names)
+                for row in first_rows.tolist()
+            ],
+            type=pa.string(),
+        )
+        tags = series_tags.take(pa.array(row_series.reshape(-1)))
+        tables.append(
+            pa.table(
+                [
+                    table["_time"],
+                    table["_measurement"].cast(pa.string()),
+                    table["_field"].cast(pa.string()),
+                    tags,
+                    table["_value"],
+                ],
+                schema=EXPORT_SCHEMA,
+            )
+        )
+
+    if not tables:
+        return EXPORT_SCHEMA.empty_table()
+    merged = pa.concat_tables(tables)
+    return merged.take(pc.sort_indices(merged, sort_keys=[("time", "ascending")]))
+
+
+def build_next_point_flux(robot_id: int, start_ns: int, stop_ns: int) -> str:
+    """Flux-запрос времени первой точки робота за `[start_ns, stop_ns)`."""
+    return "\n".join(
+        [
+            f"from(bucket: {flux_string(settings.influxdb_bucket)})",
+            f"  |> range(start: {flux_time_ns(start_ns)}, stop: {flux_time_ns(stop_ns)})",
+            f"  |> filter(fn: (r) => {robot_filter(robot_id)})",
+            "  |> first()",
+            '  |> keep(columns: ["_time"])',
+            "  |> group()",
+            '  |> sort(columns: ["_time"])',
+            "  |> limit(n: 1)",
+        ]
+    )
+
+
+def parse_next_point(data: bytes) -> int | None:
+    """
+    Время точки (нс) из ответа на `build_next_point_flux`; None — точек нет.
+
+    Raises:
+        InfluxQueryError: Ответ не разбирается.
+    """
+    if not data.strip():
+        return None
+    try:
+        table = pa_csv.read_csv(io.BytesIO(data), convert_options=_CONVERT_OPTIONS)
+    except pa.ArrowInvalid as e:
+        raise InfluxQueryError(f"invalid CSV: {e}") from e
+    if table.num_rows == 0 or "_time" not in table.column_names:
+        return None
+    return table["_time"].cast(pa.int64())[0].as_py()
+
+
+def export_window_end(start_ns: int, end_ns: int) -> int:
+    """Конец окна, начинающегося в `start_ns`: следующая граница, кратная длине окна."""
+    chunk = EXPORT_CHUNK_SECONDS * _NS
+    return min((start_ns // chunk + 1) * chunk, end_ns)
+
+
+async def read_export_window(robot_id: int, start_ns: int, end_ns: int) -> pa.Table:
+    """
+    Одно окно истории робота за `[start_ns, end_ns)`.
+
+    Raises:
+        InfluxQueryError: InfluxDB недоступен или вернул ошибку.
+    """
+    data = await run_query(build_export_flux(robot_id, start_ns, end_ns))
+    # Разбор окна занимает десятки миллисекунд; pyarrow отпускает GIL
+    return await asyncio.to_thread(parse_export_chunk, data)
+
+
+async def export_chunks(
+    robot_id: int, start_ns: int, end_ns: int, seek: bool = False
+) -> AsyncIterator[pa.Table]:
+    """
+    Непустые окна истории робота за `[start_ns, end_ns)` по порядку.
+
+    Границы окон (кроме первой) кратны `EXPORT_CHUNK_SECONDS`. После
+    пустого окна (и сразу, если `seek`) следующая точка ищется одним
+    запросом, и чтение продолжается с её окна; точек нет — выгрузка
+    закончена.
+
+    Raises:
+        InfluxQueryError: InfluxDB недоступен или вернул ошибку.
+    """
+    chunk = EXPORT_CHUNK_SECONDS * _NS
+    chunk_start = start_ns
+    while chunk_start < end_ns:
+        if seek:
+            data = await run_query(build_next_point_flux(robot_id, chunk_start, end_ns))
+            next_ns = parse_next_point(data)
+            if next_ns is None:
+                return
+            chunk_start = max(chunk_start, next_ns // chunk * chunk)
+        chunk_end = export_window_end(chunk_start, end_ns)
+        table = await read_export_window(robot_id, chunk_start, chunk_end)
+        if table.num_rows:
+            yield table
+        # После пустого окна ищем следующую точку, а не читаем час за часом
+        seek = table.num_rows == 0
+        chunk_start = chunk_end
+
+
+class _Drain(io.RawIOBase):
+    """Буфер записи, который забирают после каждой порции."""
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: bytes) -> int:
+        self._buffer += data
+        return len(data)
+
+    def take(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+async def encode_csv(tables: AsyncIterator[pa.Table]) -> AsyncIterator[bytes]:
+    """CSV с заголовком в первой порции."""
+    header = True
+    async for table in tables:
+        sink = io.BytesIO()
+        pa_csv.write_csv(table, sink, pa_csv.WriteOptions(include_header=header))
+        header = False
+        yield sink.getvalue()
+    if header:
+        sink = io.BytesIO()
+        pa_csv.write_csv(EXPORT_SCHEMA.empty_table(), sink)
+        yield sink.getvalue()
+
+
+async def encode_parquet(tables: AsyncIterator[pa.Table]) -> AsyncIterator[bytes]:
+    """Parquet: по группе строк на окно, футер в последней порции."""
+    drain = _Drain()
+    with pq.ParquetWriter(drain, EXPORT_SCHEMA, compression="zstd") as writer:
+        async for table in tables:
+            writer.write_table(table)
+            yield drain.take()
+    yield drain.take()
+
+
+async def prepend(first: pa.Table | None, rest: AsyncIterator[pa.Table]) -> AsyncIterator[pa.Table]:
+    """Возвращает уже прочитанное первое окно, затем остальные."""
+    if first is not None:
+        yield first
+    async for table in rest:
+        yield table
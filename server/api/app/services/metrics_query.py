@@ -0,0 +1,409 @@
+"""
+Запросы истории метрик робота к InfluxDB.
+
+Запрос строится на Flux с `aggregateWindow`: InfluxDB сам сворачивает точки
+в окна шага, и по сети приходит не больше запрошенного числа точек.
+
+Результаты кэшируются по ключу (робот, измерение, поле, шаг). Границы
+запроса выравниваются по сетке шага, поэтому обновления дашборда попадают
+в те же окна. Закрытые окна (закончились раньше чем `SETTLE_SECONDS` назад)
+неизменны и отдаются из кэша, из InfluxDB перезапрашивается только открытый
+хвост.
+
+Серии робота выбираются по тегу `ROBOT_ID_TAG`, который приём метрик
+проставляет сам (hostname задаёт робот, и он не уникален).
+
+Для прореживания на стороне API (LTTB, огибающая min/max) и выгрузки
+без прореживания запрашиваются исходные точки. CSV-ответ InfluxDB
+разбирается pyarrow сразу в типизированные колонки, без объекта Python
+на строку.
+"""
+
+import io
+import json
+import logging
+import math
+import re
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+
+import httpx
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+from app.config import get_settings
+from app.schemas import DownsampleMode
+from app.services.downsample import lttb, minmax_envelope
+from app.services.live_metrics import TRACKED_SERIES
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Точек в ответе по умолчанию и максимум
+DEFAULT_POINTS = 300
+MAX_POINTS = 2000
+# Самый длинный диапазон запроса
+MAX_RANGE_SECONDS = 90 * 86400
+MIN_STEP_SECONDS = 10
+# Шаги, к которым округляется автоматически подобранный шаг
+NICE_STEPS = (10, 30, 60, 300, 900, 1800, 3600, 3 * 3600, 6 * 3600, 12 * 3600, 86400)
+# Окно считается закрытым, когда опоздавшие точки Telegraf уже доехали
+SETTLE_SECONDS = 60
+# Сколько серий держать в кэше
+CACHE_MAX_SERIES = 1024
+# Максимум исходных точек для прореживания в API (последние по времени)
+MAX_RAW_POINTS = 500_000
+
+# Тег с id робота; проставляется при приёме, присланное роботом значение заменяется
+ROBOT_ID_TAG = "robot_id"
+
+NAME_PATTERN = re.compile(r"^[A-Za-z0-9_.\-]+$")
+_DURATION_PATTERN = re.compile(r"^(\d+)([smhd])$")
+_UNIT_SECONDS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+class InfluxQueryError(Exception):
+    """InfluxDB недоступен или вернул ошибку."""
+
+
+def parse_duration(text: str) -> int:
+    """
+    Переводит длительность вида `90s`, `15m`, `24h`, `7d` в секунды.
+
+    Raises:
+        ValueError: Неверный формат.
+    """
+    match = _DURATION_PATTERN.match(text)
+    if match is None or int(match[1]) == 0:
+        raise ValueError(f"invalid duration: {text!r}")
+    return int(match[1]) * _UNIT_SECONDS[match[2]]
+
+
+def choose_step(range_seconds: int, points: int) -> int:
+    """Наименьший «круглый» шаг, при котором в диапазон укладывается `points` точек."""
+    raw = math.ceil(range_seconds / points)
+    for step in NICE_STEPS:
+        if step >= raw:
+            return step
+    return math.ceil(raw / 86400) * 86400
+
+
+def align_window(range_seconds: int, step: int, now: float) -> tuple[int, int]:
+    """Границы `[start, end)` на сетке шага; последнее окно содержит `now`."""
+    end = (math.floor(now / step) + 1) * step
+    return end - math.ceil(range_seconds / step) * step, end
+
+
+def flux_string(value: str) -> str:
+    """Строковый литерал Flux."""
+    return json.dumps(value, ensure_ascii=False).replace("${", "\\${")
+
+
+def flux_time(timestamp: int) -> str:
+    return datetime.fromtimestamp(timestamp, UTC).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def robot_filter(robot_id: int) -> str:
+    """Условие Flux, выбирающее точки робота."""
+    return f"r.{ROBOT_ID_TAG} == {flux_string(str(robot_id))}"
+
+
+def build_flux(
+    robot_id: int, measurement: str, field_name: str, start: int, stop: int, step: int | None
+) -> str:
+    """
+    Flux-запрос значений поля.
+
+    С `step` — средние по окнам шага, без него — исходные точки по времени.
+    """
+    predicates = [
+        f"r._measurement == {flux_string(measurement)}",
+        f"r._field == {flux_string(field_name)}",
+        robot_filter(robot_id),
+    ]
+    canonical = TRACKED_SERIES.get(measurement)
+    if canonical is not None:
+        predicates.append(f"r[{flux_string(canonical[0])}] == {flux_string(canonical[1])}")
+
+    lines = [
+        f"from(bucket: {flux_string(settings.influxdb_bucket)})",
+        f"  |> range(start: {flux_time(start)}, stop: {flux_time(stop)})",
+        f"  |> filter(fn: (r) => {' and '.join(predicates)})",
+        '  |> group(columns: ["_field"])',
+    ]
+    if step is None:
+        lines += ['  |> sort(columns: ["_time"])', f"  |> tail(n: {MAX_RAW_POINTS})"]
+    else:
+        lines.append(
+            f'  |> aggregateWindow(every: {step}s, fn: mean, createEmpty: false, timeSrc: "_start")'
+        )
+    # Одна таблица в ответе — один заголовок CSV
+    lines += ["  |> group()", '  |> keep(columns: ["_time", "_value"])']
+    return "\n".join(lines)
+
+
+_TABLE_SEPARATOR = re.compile(rb"\r?\n\r?\n")
+_CSV_CONVERT_OPTIONS = pa_csv.ConvertOptions(
+    include_columns=["_time", "_value"],
+    column_types={"_time": pa.timestamp("ns", tz="UTC"), "_value": pa.float64()},
+)
+
+
+def parse_csv_table(data: bytes | str) -> pa.Table:
+    """
+    Разбирает CSV-ответ InfluxDB в таблицу Arrow с колонками `time` и `value`.
+
+    Таблицы ответа разделены пустой строкой и начинаются со своего
+    заголовка; строки без значения пропускаются.
+
+    Raises:
+        InfluxQueryError: Ответ не разбирается.
+    """
+    if isinstance(data, str):
+        data = data.encode()
+    tables = []
+    for chunk in _TABLE_SEPARATOR.split(data):
+        if not chunk.strip():
+            continue
+        try:
+            table = pa_csv.read_csv(io.BytesIO(chunk), convert_options=_CSV_CONVERT_OPTIONS)
+        except pa.ArrowInvalid as e:
+            raise InfluxQueryError(f"invalid CSV: {e}") from e
+        tables.append(table.rename_columns(["time", "value"]).drop_null())
+
+    if not tables:
+        return pa.table(
+            {
+                "time": pa.array([], pa.timestamp("ns", tz="UTC")),
+                "value": pa.array([], pa.float64()),
+            }
+        )
+    return pa.concat_tables(tables) if len(tables) > 1 else tables[0]
+
+
+def parse_csv_columns(data: bytes | str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Разбирает CSV-ответ InfluxDB в колонки NumPy.
+
+    Returns:
+        Время в наносекундах (int64) и значения (float64).
+    """
+    table = parse_csv_table(data)
+    return (
+        table["time"].cast(pa.int64()).to_numpy(),
+        table["value"].to_numpy(),
+    )
+
+
+def parse_csv(data: bytes | str) -> dict[int, float]:
+    """Разбирает CSV-ответ InfluxDB в словарь «начало окна (с) → значение»."""
+    times, values = parse_csv_columns(data)
+    return dict(zip((times // 1_000_000_000).tolist(), values.tolist(), strict=True))
+
+
+async def run_query(query: str) -> bytes:
+    """
+    Выполняет Flux-запрос и возвращает CSV.
+
+    Raises:
+        InfluxQueryError: InfluxDB недоступен или вернул ошибку.
+    """
+    async with httpx.AsyncClient() as client:
+        try:
+            response = await client.post(
+                f"{settings.influxdb_url}/api/v2/query",
+                params={"org": settings.influxdb_org},
+                headers={
+                    "Authorization": f"Token {settings.influxdb_token}",
+                    "Accept": "application/csv",
+                },
+                json={"query": query, "dialect": {"header": True, "annotations": []}},
+                timeout=30.0,
+            )
+        except httpx.RequestError as e:
+            raise InfluxQueryError(f"connection error: {e}") from e
+
+    if response.status_code != 200:
+        logger.warning("InfluxDB query failed: %s %s", response.status_code, response.text)
+        raise InfluxQueryError(f"status {response.status_code}")
+    return response.content
+
+
+async def fetch_series(
+    robot_id: int, measurement: str, field_name: str, start: int, stop: int, step: int
+) -> dict[int, float]:
+    """
+    Запрашивает средние значения по окнам из InfluxDB.
+
+    Raises:
+        InfluxQueryError: InfluxDB недоступен или вернул ошибку.
+    """
+    return parse_csv(
+        await run_query(build_flux(robot_id, measurement, field_name, start, stop, step))
+    )
+
+
+async def fetch_raw_series(
+    robot_id: int, measurement: str, field_name: str, start: int, stop: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Запрашивает исходные точки из InfluxDB (не больше `MAX_RAW_POINTS` последних).
+
+    Returns:
+        Время в наносекундах и значения по возрастанию времени.
+
+    Raises:
+        InfluxQueryError: InfluxDB недоступен или вернул ошибку.
+    """
+    data = await run_query(build_flux(robot_id, measurement, field_name, start, stop, None))
+    return parse_csv_columns(data)
+
+
+Fetcher = Callable[[int, str, str, int, int, int], Awaitable[dict[int, float]]]
+
+
+@dataclass
+class _CachedSeries:
+    """Закрытые окна серии: все окна в `[start, end)` известны."""
+
+    start: int
+    end: int
+    values: dict[int, float] = field(default_factory=dict)
+
+
+class MetricsQueryCache:
+    """Кэш агрегированных серий с неизменяемыми закрытыми окнами."""
+
+    def __init__(self, fetch: Fetcher = fetch_series, max_series: int = CACHE_MAX_SERIES) -> None:
+        self._fetch = fetch
+        self._max_series = max_series
+        self._series: OrderedDict[tuple[int, str, str, int], _CachedSeries] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._series)
+
+    async def query(
+        self,
+        robot_id: int,
+        measurement: str,
+        field_name: str,
+        start: int,
+        end: int,
+        step: int,
+        now: float,
+    ) -> list[tuple[int, float | None]]:
+        """
+        Значения по окнам `[start, end)` с шагом `step`.
+
+        Returns:
+            Список (начало окна, среднее или None, если точек не было).
+        """
+        key = (robot_id, measurement, field_name, step)
+        entry = self._series.get(key)
+        fetch_from = start
+        cached: dict[int, float] = {}
+        if entry is not None and entry.start <= start <= entry.end:
+            fetch_from = min(entry.end, end)
+            cached = {
+                t: entry.values[t] for t in range(start, fetch_from, step) if t in entry.values
+            }
+            self._series.move_to_end(key)
+
+        fetched: dict[int, float] = {}
+        if fetch_from < end:
+            fetched = await self._fetch(robot_id, measurement, field_name, fetch_from, end, step)
+
+        closed_until = min(end, math.floor((now - SETTLE_SECONDS) / step) * step)
+        if closed_until > fetch_from:
+            self._store(key, fetch_from, closed_until, fetched)
+
+        return [
+            (t, cached.get(t) if t < fetch_from else fetched.get(t))
+            for t in range(start, end, step)
+        ]
+
+    def forget(self, robot_id: int) -> None:
+        """Удаляет серии робота."""
+        for key in [key for key in self._series if key[0] == robot_id]:
+            del self._series[key]
+
+    def clear(self) -> None:
+        self._series.clear()
+
+    def _store(
+        self, key: tuple[int, str, str, int], start: int, end: int, fetched: dict[int, float]
+    ) -> None:
+        step = key[3]
+        entry = self._series.get(key)
+        # Кэш мог измениться, пока шёл запрос: продолжаем серию, только если она смыкается
+        if entry is None or not entry.start <= start <= entry.end:
+            entry = _CachedSeries(start=start, end=start)
+            self._series[key] = entry
+        entry.values.update({t: v for t, v in fetched.items() if entry.end <= t < end})
+        entry.end = max(entry.end, end)
+
+        # Храним не больше MAX_POINTS последних окон серии
+        floor = entry.end - MAX_POINTS * step
+        if entry.start < floor:
+            entry.values = {t: v for t, v in entry.values.items() if t >= floor}
+            entry.start = floor
+
+        self._series.move_to_end(key)
+        while len(self._series) > self._max_series:
+            self._series.popitem(last=False)
+
+
+metrics_query_cache = MetricsQueryCache()
+
+
+@dataclass(frozen=True)
+class SeriesColumns:
+    """История метрики в колонках; NaN в `values` — окно без данных."""
+
+    times: np.ndarray
+    values: np.ndarray
+    min: np.ndarray | None = None
+    max: np.ndarray | None = None
+
+
+async def load_series(
+    robot_id: int,
+    measurement: str,
+    field_name: str,
+    start: int,
+    end: int,
+    step: int,
+    mode: DownsampleMode,
+    now: float,
+) -> SeriesColumns:
+    """
+    История метрики за `[start, end)` в выбранном режиме прореживания.
+
+    Raises:
+        InfluxQueryError: InfluxDB недоступен или вернул ошибку.
+    """
+    if mode == DownsampleMode.MEAN:
+        series = await metrics_query_cache.query(
+            robot_id, measurement, field_name, start, end, step, now
+        )
+        return SeriesColumns(
+            times=np.arange(start, end, step, dtype=np.int64) * 1_000_000_000,
+            values=np.array([np.nan if value is None else value for _, value in series]),
+        )
+
+    times, values = await fetch_raw_series(robot_id, measurement, field_name, start, end)
+    if mode == DownsampleMode.NONE:
+        return SeriesColumns(times=times, values=values)
+
+    windows = (end - start) // step
+    if mode == DownsampleMode.LTTB:
+        selected = lttb(times, values, windows)
+        return SeriesColumns(times=times[selected], values=values[selected])
+
+    envelope = minmax_envelope(times, values, start * 1_000_000_000, step * 1_000_000_000, windows)
+    return SeriesColumns(
+        times=envelope.starts, values=envelope.mean, min=envelope.min, max=envelope.max
+    )
@@ -0,0 +1,84 @@
+"""
+Хэширование и проверка паролей вне цикла событий.
+
+Один вызов bcrypt занимает 100–300 мс процессорного времени. В цикле
+событий это останавливает воркер целиком, включая приём метрик. Поэтому
+вызовы выполняются в отдельном пуле из `PASSWORD_HASH_WORKERS` потоков
+(bcrypt отпускает GIL на время вычисления).
+
+Очередь пула ограничена: если выполняющихся и ожидающих вызовов уже
+`PASSWORD_HASH_MAX_PENDING`, новый сразу отклоняется
+`PasswordHasherBusyError`, и вход отвечает 429, не копя задержку.
+"""
+
+import asyncio
+import threading
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import TypeVar
+
+from passlib.context import CryptContext
+
+from app.config import get_settings
+
+settings = get_settings()
+
+T = TypeVar("T")
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+class PasswordHasherBusyError(Exception):
+    """Очередь проверки паролей заполнена."""
+
+
+class PasswordHasher:
+    """Пул потоков bcrypt с ограниченной очередью."""
+
+    def __init__(
+        self,
+        workers: int = settings.password_hash_workers,
+        max_pending: int = settings.password_hash_max_pending,
+        context: CryptContext = pwd_context,
+    ) -> None:
+        self._context = context
+        self._workers = workers
+        self._executor: ThreadPoolExecutor | None = None
+        # Слот освобождается, когда поток закончил работу, а не когда
+        # ожидающий запрос отменён: иначе очередь пула росла бы без учёта
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        """Проверяет пароль."""
+        return await self._run(self._context.verify, password, hashed_password)
+
+    async def hash(self, password: str) -> str:
+        """Хэширует пароль."""
+        return await self._run(self._context.hash, password)
+
+    def shutdown(self) -> None:
+        """Останавливает пул, отменяя ожидающие вызовы."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _run(self, func: Callable[..., T], *args: object) -> T:
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusyError
+        try:
+            future = self._pool().submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return await asyncio.wrap_future(future)
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._workers, thread_name_prefix="password-hash"
+            )
+        return self._executor
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,123 @@
+"""
+Запросы списка роботов.
+
+Построение фильтров, keyset-пагинация по `(created_at, id)` и оценка
+количества строк по плану запроса вместо полного `count(*)`.
+
+Нечёткий поиск опирается на pg_trgm: операторы `%>` (word_similarity)
+и ILIKE обслуживаются GIN-индексами по name, hostname и description.
+"""
+
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import ColumnElement, Select, func, or_, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import Explain
+from app.models import Robot, RobotStatus, UserRole
+from app.services.robot_tokens import token_digest
+from app.services.user_cache import CurrentUser
+
+SEARCH_COLUMNS = (Robot.name, Robot.hostname, Robot.description)
+
+
+def build_robot_list_query(
+    user: CurrentUser,
+    status_filter: RobotStatus | None = None,
+    search: str | None = None,
+    fuzzy: bool = False,
+) -> Select[tuple[Robot]]:
+    """
+    Запрос роботов, доступных пользователю, с фильтрами (без сортировки).
+
+    При `fuzzy` поиск идёт по триграммам: находит совпадения по префиксу
+    и слова с опечатками в имени, hostname и описании.
+    """
+    query = select(Robot)
+
+    if user.role != UserRole.ADMIN:
+        query = query.where(Robot.owner_id == user.id)
+
+    if status_filter:
+        query = query.where(Robot.status == status_filter)
+
+    if search and fuzzy:
+        query = query.where(
+            or_(
+                *(column.op("%>")(search) for column in SEARCH_COLUMNS),
+                *(column.istartswith(search, autoescape=True) for column in SEARCH_COLUMNS),
+            )
+        )
+    elif search:
+        search_pattern = f"%{search}%"
+        query = query.where(
+            (Robot.name.ilike(search_pattern)) | (Robot.hostname.ilike(search_pattern))
+        )
+
+    return query
+
+
+def robot_by_token_query(token: str) -> Select[tuple[Robot]]:
+    """Робот по токену старого формата: поиск по SHA-256 в уникальном индексе."""
+    return select(Robot).where(Robot.influxdb_token_digest == token_digest(token))
+
+
+def search_rank(search: str) -> ColumnElement[float]:
+    """Сходство запроса с лучшим из полей робота (0..1)."""
+    return func.greatest(*(func.word_similarity(search, column) for column in SEARCH_COLUMNS))
+
+
+def order_by_rank(query: Select[tuple[Robot]], search: str) -> Select[tuple[Robot]]:
+    """Сортирует результаты нечёткого поиска по убыванию сходства."""
+    return query.order_by(search_rank(search).desc(), Robot.created_at.desc(), Robot.id.desc())
+
+
+def order_robot_page(query: Select[tuple[Robot]], cursor: str | None) -> Select[tuple[Robot]]:
+    """Сортирует от новых к старым и продолжает выборку после курсора."""
+    query = query.order_by(Robot.created_at.desc(), Robot.id.desc())
+    if cursor is not None:
+        created_at, robot_id = decode_cursor(cursor)
+        query = query.where(tuple_(Robot.created_at, Robot.id) < tuple_(created_at, robot_id))
+    return query
+
+
+def encode_cursor(robot: Robot) -> str:
+    """Непрозрачный курсор, указывающий на позицию после робота."""
+    payload = json.dumps({"c": robot.created_at.isoformat(), "i": robot.id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """
+    Разбирает курсор.
+
+    Raises:
+        ValueError: Курсор повреждён.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        created_at = datetime.fromisoformat(payload["c"])
+        robot_id = int(payload["i"])
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError("invalid cursor") from e
+    if created_at.tzinfo is None:
+        raise ValueError("invalid cursor")
+    return created_at, robot_id
+
+
+async def count_exact(db: AsyncSession, query: Select) -> int:
+    """Точное количество строк запроса."""
+    result = await db.execute(select(func.count()).select_from(query.subquery()))
+    return result.scalar_one()
+
+
+async def count_estimate(db: AsyncSession, query: Select) -> int:
+    """Оценка количества строк запроса по плану планировщика, без выполнения."""
+    result = await db.execute(Explain(query))
+    plan = result.scalar_one()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
@@ -0,0 +1,225 @@
+"""
+Подписанные токены роботов для приёма метрик.
+
+Токен — `wpr1.<robot_id>.<версия ключа>.<время выдачи>.<подпись>`, где
+подпись — HMAC-SHA256 от первых четырёх частей ключом указанной версии.
+Проверка не обращается к БД: разбор строки, HMAC и поиск в списке отзыва
+занимают микросекунды, поэтому авторизация приёма метрик упирается в
+процессор, а не в PostgreSQL.
+
+Сам токен нигде не хранится: у робота записаны только версия ключа и время
+выдачи, по ним токен при необходимости подписывается заново (например,
+для агента, опрашивающего статус привязки).
+
+Отзыв. При перевыпуске у робота выставляется `token_not_before`: токены,
+выданные раньше, недействительны. Роботы с этой отметкой — компактный
+список отзыва — держатся в памяти процесса и перечитываются раз в
+`ROBOT_TOKEN_REVOCATION_REFRESH_SECONDS`; перевыпуск в этом процессе
+попадает в список сразу.
+
+Ключи задаются `ROBOT_TOKEN_KEYS` (`{"версия": "ключ"}`); новые токены
+подписываются ключом с наибольшей версией, остальные продолжают
+проверяться, пока их не уберут из настроек.
+
+Токены старого формата (случайные строки) по-прежнему принимаются через
+поиск в БД — их не нужно перевыпускать. В открытом виде они не хранятся:
+в `robots.influxdb_token_digest` лежит их SHA-256 (`token_digest`), и поиск
+идёт по уникальному индексу на 32-байтный ключ.
+"""
+
+import asyncio
+import base64
+import contextlib
+import hashlib
+import hmac
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.config import get_settings
+from app.database import async_session_factory
+from app.models import Robot
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+TOKEN_PREFIX = "wpr1"
+
+
+@dataclass(frozen=True, slots=True)
+class RobotTokenClaims:
+    """Содержимое подписанного токена."""
+
+    robot_id: int
+    key_version: int
+    issued_at: int
+
+
+def default_keys() -> dict[int, bytes]:
+    """Ключи из настроек; без них — версия 1, выведенная из SECRET_KEY."""
+    if settings.robot_token_keys:
+        return {version: key.encode() for version, key in settings.robot_token_keys.items()}
+    derived = hmac.new(settings.secret_key.encode(), b"robot-token", hashlib.sha256).digest()
+    return {1: derived}
+
+
+def token_digest(token: str) -> bytes:
+    """SHA-256 токена старого формата, под которым он хранится в БД."""
+    return hashlib.sha256(token.encode()).digest()
+
+
+def is_signed_token(token: str) -> bool:
+    """Токен нового, подписанного формата (а не случайная строка)."""
+    return token.startswith(TOKEN_PREFIX + ".")
+
+
+def is_current_token(robot: Robot, claims: RobotTokenClaims) -> bool:
+    """Токен — последний выданный роботу (а не перевыпущенный с тех пор)."""
+    return (
+        robot.token_issued_at is not None
+        and int(robot.token_issued_at.timestamp()) == claims.issued_at
+    )
+
+
+class RobotTokenService:
+    """Выдача и проверка подписанных токенов роботов."""
+
+    def __init__(
+        self,
+        keys: dict[int, bytes] | None = None,
+        refresh_seconds: float = settings.robot_token_revocation_refresh_seconds,
+    ) -> None:
+        self._keys = keys if keys is not None else default_keys()
+        self._current_version = max(self._keys)
+        self._refresh_seconds = refresh_seconds
+        # robot_id -> время выдачи (сек), раньше которого токены отозваны
+        self._not_before: dict[int, int] = {}
+        self._task: asyncio.Task | None = None
+
+    @property
+    def revoked(self) -> int:
+        """Размер списка отзыва."""
+        return len(self._not_before)
+
+    def assign(self, robot: Robot, now: datetime) -> str:
+        """
+        Выдаёт роботу новый токен, подписанный текущим ключом.
+
+        Если у робота уже был токен (любого формата), он отзывается: время
+        выдачи строго больше предыдущего и записывается в `token_not_before`.
+        Хэш старого токена стирается. Изменения робота нужно
+        сохранить, после чего передать в `revoke`.
+        """
+        issued_at = now.replace(microsecond=0)
+        had_token = robot.influxdb_token_digest is not None or robot.token_issued_at is not None
+        if robot.token_issued_at is not None and issued_at <= robot.token_issued_at:
+            issued_at = robot.token_issued_at + timedelta(seconds=1)
+
+        robot.token_key_version = self._current_version
+        robot.token_issued_at = issued_at
+        robot.influxdb_token_digest = None
+        if had_token:
+            robot.token_not_before = issued_at
+        return self._sign(robot.id, self._current_version, int(issued_at.timestamp()))
+
+    def token_for(self, robot: Robot) -> str | None:
+        """
+        Действующий токен робота.
+
+        Подписанный токен воспроизводится по версии ключа и времени выдачи.
+        None — токен старого формата (хранится только его хэш), токена нет
+        или его ключ выведен из настроек.
+        """
+        if robot.token_issued_at is None or robot.token_key_version is None:
+            return None
+        if robot.token_key_version not in self._keys:
+            return None
+        return self._sign(robot.id, robot.token_key_version, int(robot.token_issued_at.timestamp()))
+
+    def verify(self, token: str) -> RobotTokenClaims | None:
+        """Проверяет подпись и отзыв, не обращаясь к БД. None — токен недействителен."""
+        parts = token.split(".")
+        if len(parts) != 5 or parts[0] != TOKEN_PREFIX:
+            return None
+        if not all(part.isascii() and part.isdigit() for part in parts[1:4]):
+            return None
+        robot_id, version, issued_at = (int(part) for part in parts[1:4])
+        key = self._keys.get(version)
+        if key is None:
+            return None
+        expected = self._signature(key, robot_id, version, issued_at)
+        if not hmac.compare_digest(parts[4].encode(), expected.encode()):
+            return None
+        if issued_at < self._not_before.get(robot_id, 0):
+            return None
+        return RobotTokenClaims(robot_id, version, issued_at)
+
+    def revoke(self, robot_id: int, not_before: datetime) -> None:
+        """Отзывает токены робота, выданные раньше `not_before`."""
+        self.load_revocations([(robot_id, not_before)])
+
+    def load_revocations(self, rows: list[tuple[int, datetime]]) -> None:
+        """
+        Добавляет в список отзыва строки (robot_id, token_not_before).
+
+        Отметки только сдвигаются вперёд: обновление, прочитанное до коммита
+        перевыпуска, не отменит отзыв, уже сделанный в этом процессе.
+        """
+        for robot_id, not_before in rows:
+            value = int(not_before.timestamp())
+            if value > self._not_before.get(robot_id, 0):
+                self._not_before[robot_id] = value
+
+    async def start(self) -> None:
+        """Загружает список отзыва и запускает его периодическое обновление."""
+        if self._task is not None:
+            return
+        await self._refresh()
+        self._task = asyncio.create_task(self._run(), name="robot-token-revocations")
+        logger.info(
+            "Robot token revocations loaded: %d robots, key version %d",
+            self.revoked,
+            self._current_version,
+        )
+
+    async def stop(self) -> None:
+        """Останавливает обновление списка отзыва."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._refresh_seconds)
+            await self._refresh()
+
+    async def _refresh(self) -> None:
+        try:
+            async with async_session_factory() as session:
+                result = await session.execute(
+                    select(Robot.id, Robot.token_not_before).where(
+                        Robot.token_not_before.is_not(None)
+                    )
+                )
+                self.load_revocations(result.all())
+        except (SQLAlchemyError, OSError) as e:
+            logger.warning("Robot token revocation refresh failed: %s", e)
+
+    def _sign(self, robot_id: int, version: int, issued_at: int) -> str:
+        signature = self._signature(self._keys[version], robot_id, version, issued_at)
+        return f"{TOKEN_PREFIX}.{robot_id}.{version}.{issued_at}.{signature}"
+
+    @staticmethod
+    def _signature(key: bytes, robot_id: int, version: int, issued_at: int) -> str:
+        message = f"{TOKEN_PREFIX}.{robot_id}.{version}.{issued_at}".encode()
+        digest = hmac.new(key, message, hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest).decode().rstrip("=")
+
+
+robot_tokens = RobotTokenService()
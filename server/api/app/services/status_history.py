@@ -0,0 +1,240 @@
+"""
+История статусов роботов.
+
+Смены статуса приходят из шины событий (`app.services.events`) и копятся
+в памяти. Фоновый цикл сбрасывает буфер одним `COPY` через asyncpg, поэтому
+запись истории не добавляет отдельного запроса на каждую смену статуса.
+
+Таблица `robot_status_events` секционирована по месяцам. Секции наперёд
+создаёт и по истечении срока хранения удаляет задача планировщика.
+"""
+
+import asyncio
+import contextlib
+import logging
+import re
+from datetime import UTC, datetime
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app.database import async_session_factory, engine
+from app.models import RobotStatusEvent
+from app.services.events import RobotEvent, RobotEventType, robot_event_bus
+
+logger = logging.getLogger(__name__)
+
+TABLE_NAME = RobotStatusEvent.__tablename__
+COPY_COLUMNS = ("robot_id", "status", "previous_status", "occurred_at")
+
+# Интервал сброса буфера
+FLUSH_INTERVAL_SECONDS = 1.0
+# Размер буфера, при котором сброс выполняется сразу, не дожидаясь интервала
+FLUSH_BATCH_SIZE = 500
+# Сколько записей держать в памяти, пока БД недоступна; старые отбрасываются
+MAX_PENDING_RECORDS = 50_000
+# На сколько месяцев вперёд создавать секции
+PARTITION_MONTHS_AHEAD = 2
+
+_PARTITION_RE = re.compile(rf"^{TABLE_NAME}_(\d{{4}})_(\d{{2}})$")
+
+StatusRecord = tuple[int, str, str | None, datetime]
+
+
+def _add_months(year: int, month: int, months: int) -> tuple[int, int]:
+    index = year * 12 + (month - 1) + months
+    return index // 12, index % 12 + 1
+
+
+def partition_name(year: int, month: int) -> str:
+    """Имя секции за месяц."""
+    return f"{TABLE_NAME}_{year:04d}_{month:02d}"
+
+
+async def ensure_partitions(
+    session: AsyncSession, now: datetime, months_ahead: int = PARTITION_MONTHS_AHEAD
+) -> list[str]:
+    """
+    Создаёт секции с текущего месяца на `months_ahead` месяцев вперёд.
+
+    Returns:
+        Имена секций, которых раньше не было.
+    """
+    existing = set(await list_partitions(session))
+    created = []
+    for offset in range(months_ahead + 1):
+        year, month = _add_months(now.year, now.month, offset)
+        name = partition_name(year, month)
+        if name in existing:
+            continue
+        next_year, next_month = _add_months(year, month, 1)
+        await session.execute(
+            text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {TABLE_NAME} "
+                f"FOR VALUES FROM ('{year:04d}-{month:02d}-01 00:00:00+00') "
+                f"TO ('{next_year:04d}-{next_month:02d}-01 00:00:00+00')"
+            )
+        )
+        created.append(name)
+    return created
+
+
+async def drop_expired_partitions(
+    session: AsyncSession, now: datetime, retention_months: int
+) -> list[str]:
+    """
+    Удаляет секции, целиком вышедшие за срок хранения.
+
+    Секция удаляется, если её месяц закончился раньше, чем
+    `retention_months` месяцев назад от текущего.
+
+    Returns:
+        Имена удалённых секций.
+    """
+    oldest_year, oldest_month = _add_months(now.year, now.month, -retention_months)
+    dropped = []
+    for name in await list_partitions(session):
+        match = _PARTITION_RE.match(name)
+        if match is None:
+            continue
+        if (int(match[1]), int(match[2])) < (oldest_year, oldest_month):
+            await session.execute(text(f"DROP TABLE IF EXISTS {name}"))
+            dropped.append(name)
+    return dropped
+
+
+async def list_partitions(session: AsyncSession) -> list[str]:
+    """Имена существующих секций таблицы истории."""
+    result = await session.execute(
+        text(
+            "SELECT child.relname FROM pg_inherits i "
+            "JOIN pg_class parent ON parent.oid = i.inhparent "
+            "JOIN pg_class child ON child.oid = i.inhrelid "
+            "WHERE parent.relname = :table ORDER BY child.relname"
+        ),
+        {"table": TABLE_NAME},
+    )
+    return list(result.scalars())
+
+
+class StatusHistoryRecorder:
+    """
+    Буферизованная запись истории статусов.
+
+    Подписывается на шину событий и складывает смены статуса в список.
+    Сброс выполняется раз в интервал или сразу при заполнении пачки;
+    если БД недоступна, записи остаются в буфере до следующей попытки.
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = FLUSH_INTERVAL_SECONDS,
+        batch_size: int = FLUSH_BATCH_SIZE,
+        max_pending: int = MAX_PENDING_RECORDS,
+    ) -> None:
+        self._flush_interval = flush_interval
+        self._batch_size = batch_size
+        self._max_pending = max_pending
+        self._buffer: list[StatusRecord] = []
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        self._subscribed = False
+
+    @property
+    def pending(self) -> int:
+        """Количество записей, ожидающих сброса."""
+        return len(self._buffer)
+
+    def record(self, event: RobotEvent) -> None:
+        """Слушатель шины: буферизует смену статуса."""
+        if event.type not in (RobotEventType.STATUS, RobotEventType.PAIRED):
+            return
+        if event.status is None:
+            return
+        self._buffer.append(
+            (
+                event.robot_id,
+                event.status.value,
+                event.previous_status.value if event.previous_status else None,
+                event.occurred_at,
+            )
+        )
+        if len(self._buffer) >= self._batch_size:
+            self._wakeup.set()
+
+    async def start(self) -> None:
+        """Подписывается на шину, создаёт недостающие секции и запускает цикл сброса."""
+        if self._task is not None:
+            return
+        if not self._subscribed:
+            robot_event_bus.add_listener(self.record)
+            self._subscribed = True
+        try:
+            async with async_session_factory() as session:
+                created = await ensure_partitions(session, datetime.now(UTC))
+                await session.commit()
+            if created:
+                logger.info("Status history partitions created: %s", ", ".join(created))
+        except (SQLAlchemyError, OSError) as e:
+            logger.warning("Status history partition check failed: %s", e)
+        self._task = asyncio.create_task(self._run(), name="status-history")
+
+    async def stop(self) -> None:
+        """Останавливает цикл и сбрасывает остаток буфера."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+        await self._flush_safely()
+
+    async def flush(self) -> int:
+        """
+        Записывает буфер в БД одним COPY.
+
+        Returns:
+            Количество записанных строк.
+        """
+        async with self._lock:
+            records, self._buffer = self._buffer, []
+            if not records:
+                return 0
+            try:
+                async with engine.connect() as conn:
+                    await self._copy(conn, records)
+            except BaseException:
+                self._requeue(records)
+                raise
+            return len(records)
+
+    async def _copy(self, conn: AsyncConnection, records: list[StatusRecord]) -> None:
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            TABLE_NAME, records=records, columns=COPY_COLUMNS
+        )
+
+    def _requeue(self, records: list[StatusRecord]) -> None:
+        self._buffer[:0] = records
+        overflow = len(self._buffer) - self._max_pending
+        if overflow > 0:
+            del self._buffer[:overflow]
+            logger.warning("Status history buffer overflow: dropped %d oldest records", overflow)
+
+    async def _flush_safely(self) -> None:
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.warning("Failed to write status history (%d pending): %s", self.pending, e)
+
+    async def _run(self) -> None:
+        while True:
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self._flush_interval)
+            self._wakeup.clear()
+            await self._flush_safely()
+
+
+status_history_recorder = StatusHistoryRecorder()
@@ -0,0 +1,318 @@
+"""
+Расчёт доступности роботов по истории статусов.
+
+История из `robot_status_events` загружается в массивы NumPy, после чего
+доступность, MTBF и MTTR считаются для всех роботов сразу, без циклов
+по Python-объектам. Окно задаётся произвольно.
+
+Состояние в начале окна берётся из последнего события до окна. Если его нет,
+используется предыдущий статус первого события в окне, а для роботов без
+событий — их текущий статус. Статус PENDING и неизвестное состояние
+в наблюдаемое время не входят.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Robot, RobotStatus, RobotStatusEvent
+
+# Коды состояний в массивах
+UNKNOWN = -1
+STATE_CODES: dict[RobotStatus, int] = {
+    RobotStatus.PENDING: 0,
+    RobotStatus.ACTIVE: 1,
+    RobotStatus.INACTIVE: 2,
+    RobotStatus.ERROR: 3,
+}
+ACTIVE = STATE_CODES[RobotStatus.ACTIVE]
+DOWN_STATES = (STATE_CODES[RobotStatus.INACTIVE], STATE_CODES[RobotStatus.ERROR])
+
+
+@dataclass(frozen=True)
+class UptimeStats:
+    """
+    Показатели доступности, по элементу массива на робота.
+
+    Доступность — доля времени в ACTIVE от наблюдаемого времени
+    (ACTIVE + INACTIVE + ERROR). MTBF — время в ACTIVE на один отказ
+    (переход ACTIVE → INACTIVE/ERROR), MTTR — средняя длительность простоя.
+    Где показатель не определён, стоит NaN.
+    """
+
+    up_seconds: np.ndarray
+    down_seconds: np.ndarray
+    failures: np.ndarray
+    availability: np.ndarray
+    mtbf_seconds: np.ndarray
+    mttr_seconds: np.ndarray
+
+    @property
+    def observed_seconds(self) -> np.ndarray:
+        """Наблюдаемое время по роботам."""
+        return self.up_seconds + self.down_seconds
+
+
+def compute_uptime(
+    window_seconds: float,
+    initial_states: np.ndarray,
+    start_offsets: np.ndarray,
+    event_robots: np.ndarray,
+    event_offsets: np.ndarray,
+    event_states: np.ndarray,
+) -> UptimeStats:
+    """
+    Считает показатели доступности для всех роботов окна.
+
+    Args:
+        window_seconds: Длина окна в секундах.
+        initial_states: Код состояния каждого робота в начале наблюдения.
+        start_offsets: Начало наблюдения робота от начала окна (регистрация внутри окна).
+        event_robots: Индекс робота для каждого события.
+        event_offsets: Время события от начала окна.
+        event_states: Код нового состояния для каждого события.
+
+    Returns:
+        Показатели по роботам в порядке `initial_states`.
+    """
+    robot_count = len(initial_states)
+    start_offsets = np.clip(np.asarray(start_offsets, dtype=np.float64), 0.0, window_seconds)
+    event_robots = np.asarray(event_robots, dtype=np.int64)
+    event_offsets = np.clip(
+        np.asarray(event_offsets, dtype=np.float64),
+        start_offsets[event_robots],
+        window_seconds,
+    )
+
+    # Начальное состояние — псевдособытие в момент начала наблюдения
+    robots = np.concatenate([np.arange(robot_count, dtype=np.int64), event_robots])
+    times = np.concatenate([start_offsets, event_offsets])
+    states = np.concatenate(
+        [np.asarray(initial_states, dtype=np.int8), np.asarray(event_states, dtype=np.int8)]
+    )
+    # При равном времени сохраняется исходный порядок: начальное состояние первым
+    order = np.lexsort((np.arange(len(robots)), times, robots))
+    robots, times, states = robots[order], times[order], states[order]
+
+    boundary = np.empty(len(robots), dtype=bool)
+    boundary[:-1] = robots[1:] != robots[:-1]
+    boundary[-1:] = True
+    next_times = np.empty_like(times)
+    next_times[:-1] = times[1:]
+    next_times[boundary] = window_seconds
+    durations = next_times - times
+
+    # Интервалы нулевой длины не влияют ни на время, ни на переходы
+    keep = durations > 0
+    robots, states, durations = robots[keep], states[keep], durations[keep]
+
+    is_up = states == ACTIVE
+    is_down = np.isin(states, DOWN_STATES)
+    previous = np.full(len(states), UNKNOWN, dtype=np.int8)
+    same_robot = robots[1:] == robots[:-1]
+    previous[1:][same_robot] = states[:-1][same_robot]
+    was_down = np.isin(previous, DOWN_STATES)
+
+    up = np.bincount(robots, weights=durations * is_up, minlength=robot_count)
+    down = np.bincount(robots, weights=durations * is_down, minlength=robot_count)
+    failures = np.bincount(robots[is_down & (previous == ACTIVE)], minlength=robot_count)
+    outages = np.bincount(robots[is_down & ~was_down], minlength=robot_count)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        availability = np.where(up + down > 0, up / (up + down), np.nan)
+        mtbf = np.where(failures > 0, up / failures, np.nan)
+        mttr = np.where(outages > 0, down / outages, np.nan)
+
+    return UptimeStats(
+        up_seconds=up,
+        down_seconds=down,
+        failures=failures,
+        availability=availability,
+        mtbf_seconds=mtbf,
+        mttr_seconds=mttr,
+    )
+
+
+@dataclass(frozen=True)
+class FleetUptime:
+    """Показатели доступности набора роботов за окно."""
+
+    start: datetime
+    end: datetime
+    robot_ids: np.ndarray
+    owner_ids: np.ndarray
+    stats: UptimeStats
+
+    @property
+    def availability(self) -> float | None:
+        """Доступность всего набора роботов."""
+        return _ratio(self.stats.up_seconds.sum(), self.stats.observed_seconds.sum())
+
+    def robot_summaries(self) -> list[dict]:
+        """Показатели по роботам в виде словарей для ответа API."""
+        stats = self.stats
+        columns = zip(
+            self.robot_ids.tolist(),
+            self.owner_ids.tolist(),
+            stats.availability.tolist(),
+            stats.up_seconds.tolist(),
+            stats.down_seconds.tolist(),
+            stats.failures.tolist(),
+            stats.mtbf_seconds.tolist(),
+            stats.mttr_seconds.tolist(),
+            strict=True,
+        )
+        return [
+            {
+                "robot_id": robot_id,
+                "owner_id": None if owner_id < 0 else owner_id,
+                "availability": _finite(availability),
+                "up_seconds": up,
+                "down_seconds": down,
+                "observed_seconds": up + down,
+                "failures": failures,
+                "mtbf_seconds": _finite(mtbf),
+                "mttr_seconds": _finite(mttr),
+            }
+            for robot_id, owner_id, availability, up, down, failures, mtbf, mttr in columns
+        ]
+
+    def owner_summaries(self) -> list[dict]:
+        """Сводка по владельцам: число роботов и суммарная доступность."""
+        # Роботы без владельца получают код -1
+        owners, inverse = np.unique(self.owner_ids, return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(owners))
+        up = np.bincount(inverse, weights=self.stats.up_seconds, minlength=len(owners))
+        observed = np.bincount(inverse, weights=self.stats.observed_seconds, minlength=len(owners))
+        return [
+            {
+                "owner_id": None if owner < 0 else owner,
+                "robots": count,
+                "availability": _ratio(owner_up, owner_observed),
+                "up_seconds": owner_up,
+                "observed_seconds": owner_observed,
+            }
+            for owner, count, owner_up, owner_observed in zip(
+                owners.tolist(), counts.tolist(), up.tolist(), observed.tolist(), strict=True
+            )
+        ]
+
+
+def _finite(value: float) -> float | None:
+    return None if np.isnan(value) else value
+
+
+def _ratio(numerator: float, denominator: float) -> float | None:
+    return float(numerator / denominator) if denominator > 0 else None
+
+
+def _state_code(status: RobotStatus | None) -> int:
+    return UNKNOWN if status is None else STATE_CODES[status]
+
+
+async def load_fleet_uptime(
+    db: AsyncSession,
+    start: datetime,
+    end: datetime,
+    owner_id: int | None = None,
+    robot_id: int | None = None,
+) -> FleetUptime:
+    """
+    Загружает историю статусов и считает доступность роботов за окно.
+
+    Args:
+        db: Сессия БД.
+        start: Начало окна.
+        end: Конец окна.
+        owner_id: Только роботы владельца.
+        robot_id: Только один робот.
+    """
+    prior_status = (
+        select(RobotStatusEvent.status)
+        .where(RobotStatusEvent.robot_id == Robot.id, RobotStatusEvent.occurred_at < start)
+        .order_by(RobotStatusEvent.occurred_at.desc())
+        .limit(1)
+        .correlate(Robot)
+        .scalar_subquery()
+    )
+    robots_query = (
+        select(Robot.id, Robot.owner_id, Robot.status, Robot.created_at, prior_status)
+        .where(Robot.created_at < end)
+        .order_by(Robot.id)
+    )
+    events_query = (
+        select(
+            RobotStatusEvent.robot_id,
+            RobotStatusEvent.status,
+            RobotStatusEvent.previous_status,
+            RobotStatusEvent.occurred_at,
+        )
+        .where(RobotStatusEvent.occurred_at >= start, RobotStatusEvent.occurred_at < end)
+        .order_by(RobotStatusEvent.robot_id, RobotStatusEvent.occurred_at, RobotStatusEvent.id)
+    )
+    if owner_id is not None:
+        robots_query = robots_query.where(Robot.owner_id == owner_id)
+        events_query = events_query.where(
+            RobotStatusEvent.robot_id.in_(select(Robot.id).where(Robot.owner_id == owner_id))
+        )
+    if robot_id is not None:
+        robots_query = robots_query.where(Robot.id == robot_id)
+        events_query = events_query.where(RobotStatusEvent.robot_id == robot_id)
+
+    robot_rows = (await db.execute(robots_query)).all()
+    event_rows = (await db.execute(events_query)).all()
+
+    robot_ids = np.fromiter((row[0] for row in robot_rows), dtype=np.int64, count=len(robot_rows))
+    owner_ids = np.fromiter(
+        (-1 if row[1] is None else row[1] for row in robot_rows),
+        dtype=np.int64,
+        count=len(robot_rows),
+    )
+    current = np.fromiter(
+        (STATE_CODES[row[2]] for row in robot_rows), dtype=np.int8, count=len(robot_rows)
+    )
+    initial = np.fromiter(
+        (_state_code(row[4]) for row in robot_rows), dtype=np.int8, count=len(robot_rows)
+    )
+    start_offsets = np.fromiter(
+        ((row[3] - start).total_seconds() for row in robot_rows),
+        dtype=np.float64,
+        count=len(robot_rows),
+    )
+
+    # События удалённых роботов в выборку не попадают
+    event_robot_ids = np.fromiter((row[0] for row in event_rows), dtype=np.int64)
+    known = np.isin(event_robot_ids, robot_ids)
+    event_rows = [row for row, is_known in zip(event_rows, known, strict=True) if is_known]
+    event_robots = np.searchsorted(robot_ids, event_robot_ids[known])
+    event_states = np.fromiter(
+        (STATE_CODES[row[1]] for row in event_rows), dtype=np.int8, count=len(event_rows)
+    )
+    event_previous = np.fromiter(
+        (_state_code(row[2]) for row in event_rows), dtype=np.int8, count=len(event_rows)
+    )
+    event_offsets = np.fromiter(
+        ((row[3] - start).total_seconds() for row in event_rows),
+        dtype=np.float64,
+        count=len(event_rows),
+    )
+
+    # Нет события до окна: состояние до первого события в окне — его previous_status,
+    # а для роботов без событий в окне — текущий статус
+    first_event_robots, first_event_idx = np.unique(event_robots, return_index=True)
+    fallback = current.copy()
+    fallback[first_event_robots] = event_previous[first_event_idx]
+    initial = np.where(initial == UNKNOWN, fallback, initial)
+
+    stats = compute_uptime(
+        (end - start).total_seconds(),
+        initial,
+        start_offsets,
+        event_robots,
+        event_offsets,
+        event_states,
+    )
+    return FleetUptime(start=start, end=end, robot_ids=robot_ids, owner_ids=owner_ids, stats=stats)
@@ -0,0 +1,99 @@
+"""
+Кэш пользователей для аутентификации запросов.
+
+Зависимости `app.deps` берут пользователя запроса не из PostgreSQL,
+а из кэша процесса: компактная запись (id, имя, роль, активность)
+живёт не дольше `USER_CACHE_TTL_SECONDS`. Это и есть граница
+устаревания: деактивация или смена роли, сделанные в другом воркере или
+напрямую в БД, вступают в силу не позже чем через TTL. Изменения через
+ORM в этом процессе сбрасывают запись сразу (события `after_update` и
+`after_delete` модели `User`).
+
+Отсутствующий пользователь тоже кэшируется, чтобы токен удалённого
+пользователя не приводил к запросу в БД на каждый вызов.
+"""
+
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.models import User, UserRole
+
+settings = get_settings()
+
+# Сколько пользователей держать в кэше; дольше всех не запрашивавшиеся вытесняются
+USER_CACHE_MAX_SIZE = 10_000
+
+
+@dataclass(frozen=True, slots=True)
+class CurrentUser:
+    """Пользователь, от имени которого выполняется запрос."""
+
+    id: int
+    name: str
+    role: UserRole
+    is_active: bool
+
+
+class UserCache:
+    """Кэш «id → пользователь» с ограниченным временем жизни записи."""
+
+    def __init__(
+        self,
+        ttl: float = settings.user_cache_ttl_seconds,
+        max_size: int = USER_CACHE_MAX_SIZE,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.ttl = ttl
+        self._max_size = max_size
+        self._clock = clock
+        # id -> (момент загрузки, пользователь или None, если его нет)
+        self._entries: OrderedDict[int, tuple[float, CurrentUser | None]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, db: AsyncSession, user_id: int) -> CurrentUser | None:
+        """Пользователь из кэша; при промахе или устаревшей записи — из БД."""
+        now = self._clock()
+        entry = self._entries.get(user_id)
+        if entry is not None and now - entry[0] < self.ttl:
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+        result = await db.execute(
+            select(User.id, User.name, User.role, User.is_active).where(User.id == user_id)
+        )
+        row = result.one_or_none()
+        user = CurrentUser(*row) if row is not None else None
+        if self.ttl > 0:
+            self._store(user_id, now, user)
+        return user
+
+    def invalidate(self, user_id: int) -> None:
+        """Сбрасывает запись пользователя."""
+        self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        """Сбрасывает все записи."""
+        self._entries.clear()
+
+    def _store(self, user_id: int, loaded_at: float, user: CurrentUser | None) -> None:
+        self._entries[user_id] = (loaded_at, user)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+
+user_cache = UserCache()
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_cached_user(_mapper, _connection, target: User) -> None:
+    user_cache.invalidate(target.id)
@@ -0,0 +1,616 @@
+"""
+Отправка уведомлений о событиях роботов на вебхуки.
+
+Смены статуса, подтверждения привязки и переходы алертов приходят от шины
+событий (`app.services.events`) и движка алертов (`app.services.alerts`)
+и копятся в памяти. Раз в окно `WEBHOOK_BATCH_WINDOW_SECONDS` буфер
+раскладывается по подходящим адресам и записывается в outbox-таблицу
+`webhook_deliveries`: дальше уведомления переживают перезапуск и смену лидера.
+
+Отправляет только лидер фоновых задач. Все ожидающие уведомления адреса
+уходят одним запросом; если их больше `WEBHOOK_DIGEST_THRESHOLD` (например,
+при сетевой аварии на площадке сотни роботов разом становятся
+неактивными), вместо списка отправляется сводка: число событий и роботы
+по типу и статусу.
+
+Одновременных запросов не больше `WEBHOOK_MAX_CONCURRENCY`. После ошибки
+адрес откладывается целиком с экспоненциальной задержкой, а новые события
+копятся и уходят одной пачкой, когда он оживёт. Уведомление, не
+доставленное за `WEBHOOK_MAX_ATTEMPTS` попыток или отвергнутое адресом
+(4xx), получает статус DEAD и ждёт ручного повтора через API.
+"""
+
+import asyncio
+import contextlib
+import enum
+import hashlib
+import hmac
+import json
+import logging
+import random
+from collections import defaultdict
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
+
+import httpx
+from sqlalchemy import (
+    ColumnElement,
+    Select,
+    and_,
+    case,
+    delete,
+    exists,
+    insert,
+    literal,
+    or_,
+    select,
+    update,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import __version__
+from app.config import get_settings
+from app.database import async_session_factory
+from app.models import WebhookDelivery, WebhookDeliveryStatus, WebhookEndpoint
+from app.services.alerts import AlertEvent, AlertEventType, alert_engine
+from app.services.events import RobotEvent, RobotEventType, robot_event_bus
+from app.services.leader import leader_elector
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+REQUEST_TIMEOUT_SECONDS = 10.0
+# Задержка после первой неудачи; дальше удваивается до потолка
+BACKOFF_BASE_SECONDS = 10.0
+BACKOFF_MAX_SECONDS = 3600.0
+# Сколько уведомлений адреса уходит одним запросом
+MAX_DELIVERIES_PER_REQUEST = 5000
+# Сколько уведомлений держать в памяти, пока БД недоступна; старые отбрасываются
+MAX_PENDING_NOTIFICATIONS = 50_000
+DELIVERED_RETENTION_DAYS = 7
+DEAD_RETENTION_DAYS = 30
+
+SIGNATURE_HEADER = "X-Wolfpack-Signature"
+# Ответы 4xx, после которых отправку стоит повторить
+RETRYABLE_STATUS_CODES = frozenset({408, 425, 429})
+_ERROR_MAX_LENGTH = 500
+
+
+class NotificationType(enum.StrEnum):
+    """Типы уведомлений."""
+
+    ROBOT_STATUS = "robot.status"
+    ROBOT_PAIRED = "robot.paired"
+    ALERT_FIRING = "alert.firing"
+    ALERT_RESOLVED = "alert.resolved"
+
+
+# Поле, по которому события типа группируются в сводке
+DIGEST_GROUP_FIELDS: dict[str, str] = {
+    NotificationType.ROBOT_STATUS: "status",
+    NotificationType.ALERT_FIRING: "rule_id",
+    NotificationType.ALERT_RESOLVED: "rule_id",
+}
+
+
+@dataclass(frozen=True, slots=True)
+class Notification:
+    """Событие, которое нужно разослать на вебхуки."""
+
+    type: NotificationType
+    owner_id: int | None
+    payload: dict
+
+    @classmethod
+    def from_robot_event(cls, event: RobotEvent) -> "Notification | None":
+        """Уведомление о событии шины; отметки активности не рассылаются."""
+        if event.type == RobotEventType.STATUS:
+            notification_type = NotificationType.ROBOT_STATUS
+        elif event.type == RobotEventType.PAIRED:
+            notification_type = NotificationType.ROBOT_PAIRED
+        else:
+            return None
+        return cls(
+            type=notification_type,
+            owner_id=event.owner_id,
+            payload={
+                "type": notification_type.value,
+                "robot_id": event.robot_id,
+                "owner_id": event.owner_id,
+                "status": event.status.value if event.status else None,
+                "previous_status": event.previous_status.value if event.previous_status else None,
+                "occurred_at": event.occurred_at.isoformat(),
+            },
+        )
+
+    @classmethod
+    def from_alert_event(cls, event: AlertEvent) -> "Notification":
+        """Уведомление о срабатывании или снятии алерта."""
+        notification_type = (
+            NotificationType.ALERT_FIRING
+            if event.type == AlertEventType.FIRING
+            else NotificationType.ALERT_RESOLVED
+        )
+        return cls(
+            type=notification_type,
+            owner_id=event.owner_id,
+            payload={
+                "type": notification_type.value,
+                "robot_id": event.robot_id,
+                "owner_id": event.owner_id,
+                "rule_id": event.rule.id,
+                "rule_name": event.rule.name,
+                "metric": event.rule.metric,
+                "condition": event.rule.condition.value,
+                "threshold": event.rule.threshold,
+                "value": event.value,
+                "occurred_at": datetime.fromtimestamp(event.time, UTC).isoformat(),
+            },
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class DeliveryResult:
+    """Итог одного запроса к вебхуку."""
+
+    delivered: bool
+    retryable: bool = True
+    error: str | None = None
+    # Задержка из заголовка Retry-After, секунды
+    retry_after: float | None = None
+
+
+def build_payload(events: Sequence[dict], digest_threshold: int) -> dict:
+    """
+    Тело запроса для пачки событий одного адреса.
+
+    До `digest_threshold` событий включительно отправляются целиком,
+    больше — сводкой: по каждому типу (и статусу или правилу) число
+    событий и отсортированный список роботов.
+    """
+    if len(events) <= digest_threshold:
+        return {"kind": "events", "count": len(events), "events": list(events)}
+
+    groups: dict[tuple, tuple[int, set[int]]] = {}
+    for event in events:
+        field = DIGEST_GROUP_FIELDS.get(event["type"])
+        key = (event["type"], field, event.get(field) if field else None)
+        count, robot_ids = groups.get(key, (0, set()))
+        robot_ids.add(event["robot_id"])
+        groups[key] = (count + 1, robot_ids)
+
+    summary = []
+    for (event_type, field, value), (count, robot_ids) in groups.items():
+        entry = {"type": event_type}
+        if field:
+            entry[field] = value
+        entry |= {"count": count, "robot_ids": sorted(robot_ids)}
+        summary.append(entry)
+
+    return {
+        "kind": "digest",
+        "count": len(events),
+        "first_occurred_at": events[0]["occurred_at"],
+        "last_occurred_at": events[-1]["occurred_at"],
+        "summary": summary,
+    }
+
+
+def sign(secret: str, body: bytes) -> str:
+    """Подпись тела запроса HMAC-SHA256 для заголовка `SIGNATURE_HEADER`."""
+    return "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def backoff_delay(failures: int, jitter: Callable[[], float] = random.random) -> float:
+    """
+    Задержка перед повтором после `failures` неудач подряд.
+
+    Экспонента от `BACKOFF_BASE_SECONDS` с потолком `BACKOFF_MAX_SECONDS`;
+    вторая половина задержки случайная, чтобы адреса, упавшие вместе,
+    не опрашивались синхронно.
+    """
+    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** min(failures - 1, 32))
+    return delay / 2 + delay / 2 * jitter()
+
+
+def _parse_retry_after(value: str | None) -> float | None:
+    if value is None or not value.strip().isdigit():
+        return None
+    return float(value)
+
+
+async def send(
+    client: httpx.AsyncClient, url: str, secret: str | None, payload: dict
+) -> DeliveryResult:
+    """Отправляет тело на адрес и классифицирует ответ."""
+    body = json.dumps(payload, separators=(",", ":")).encode()
+    headers = {
+        "Content-Type": "application/json",
+        "User-Agent": f"WolfpackCloud-Monitoring/{__version__}",
+    }
+    if secret:
+        headers[SIGNATURE_HEADER] = sign(secret, body)
+
+    try:
+        response = await client.post(url, content=body, headers=headers)
+    except httpx.HTTPError as e:
+        return DeliveryResult(delivered=False, error=f"{type(e).__name__}: {e}")
+
+    if response.is_success:
+        return DeliveryResult(delivered=True)
+    error = f"HTTP {response.status_code}"
+    if response.is_client_error and response.status_code not in RETRYABLE_STATUS_CODES:
+        return DeliveryResult(delivered=False, retryable=False, error=error)
+    return DeliveryResult(
+        delivered=False,
+        error=error,
+        retry_after=_parse_retry_after(response.headers.get("Retry-After")),
+    )
+
+
+async def enqueue_notifications(
+    session: AsyncSession, notifications: Sequence[Notification]
+) -> int:
+    """
+    Записывает уведомления в outbox для каждого подходящего включённого адреса.
+
+    Адрес владельца получает события его роботов, адрес без владельца —
+    события всего парка.
+
+    Returns:
+        Количество созданных строк.
+    """
+    owner_ids = {n.owner_id for n in notifications if n.owner_id is not None}
+    result = await session.execute(
+        select(WebhookEndpoint.id, WebhookEndpoint.owner_id).where(
+            WebhookEndpoint.enabled,
+            or_(WebhookEndpoint.owner_id.is_(None), WebhookEndpoint.owner_id.in_(owner_ids)),
+        )
+    )
+    fleet: list[int] = []
+    by_owner: dict[int, list[int]] = defaultdict(list)
+    for endpoint_id, owner_id in result:
+        (fleet if owner_id is None else by_owner[owner_id]).append(endpoint_id)
+
+    rows = [
+        {
+            "endpoint_id": endpoint_id,
+            "event_type": notification.type.value,
+            "payload": notification.payload,
+        }
+        for notification in notifications
+        for endpoint_id in (*fleet, *by_owner.get(notification.owner_id, ()))
+    ]
+    if rows:
+        await session.execute(insert(WebhookDelivery), rows)
+    return len(rows)
+
+
+def due_endpoints_query(now: datetime) -> Select[tuple[WebhookEndpoint]]:
+    """Включённые адреса с ожидающими уведомлениями, у которых не идёт задержка."""
+    pending = exists().where(
+        WebhookDelivery.endpoint_id == WebhookEndpoint.id,
+        WebhookDelivery.status == WebhookDeliveryStatus.PENDING,
+    )
+    return (
+        select(WebhookEndpoint)
+        .where(
+            WebhookEndpoint.enabled,
+            or_(WebhookEndpoint.retry_after.is_(None), WebhookEndpoint.retry_after <= now),
+            pending,
+        )
+        .order_by(WebhookEndpoint.id)
+    )
+
+
+async def pending_deliveries(
+    session: AsyncSession, endpoint_id: int, limit: int = MAX_DELIVERIES_PER_REQUEST
+) -> list[tuple[int, dict]]:
+    """Первые `limit` ожидающих уведомлений адреса по порядку: (id, payload)."""
+    result = await session.execute(
+        select(WebhookDelivery.id, WebhookDelivery.payload)
+        .where(
+            WebhookDelivery.endpoint_id == endpoint_id,
+            WebhookDelivery.status == WebhookDeliveryStatus.PENDING,
+        )
+        .order_by(WebhookDelivery.id)
+        .limit(limit)
+    )
+    return [(delivery_id, payload) for delivery_id, payload in result]
+
+
+async def record_result(
+    session: AsyncSession,
+    endpoint: WebhookEndpoint,
+    delivery_ids: Sequence[int],
+    result: DeliveryResult,
+    now: datetime,
+    max_attempts: int,
+    jitter: Callable[[], float] = random.random,
+) -> None:
+    """
+    Сохраняет итог отправки пачки.
+
+    Успех сбрасывает задержку адреса. Повторяемая ошибка увеличивает счётчик
+    попыток уведомлений (исчерпавшие попытки получают статус DEAD) и
+    откладывает адрес; неповторяемая сразу переводит пачку в DEAD.
+    """
+    deliveries = update(WebhookDelivery).where(WebhookDelivery.id.in_(delivery_ids))
+    endpoints = update(WebhookEndpoint).where(WebhookEndpoint.id == endpoint.id)
+
+    if result.delivered:
+        await session.execute(
+            deliveries.values(
+                status=WebhookDeliveryStatus.DELIVERED,
+                attempts=WebhookDelivery.attempts + 1,
+                last_error=None,
+                delivered_at=now,
+            )
+        )
+        await session.execute(endpoints.values(failure_count=0, retry_after=None, last_error=None))
+        return
+
+    error = (result.error or "")[:_ERROR_MAX_LENGTH]
+    if not result.retryable:
+        await session.execute(
+            deliveries.values(
+                status=WebhookDeliveryStatus.DEAD,
+                attempts=WebhookDelivery.attempts + 1,
+                last_error=error,
+            )
+        )
+        await session.execute(endpoints.values(last_error=error))
+        return
+
+    await session.execute(
+        deliveries.values(
+            status=case(
+                (WebhookDelivery.attempts + 1 >= max_attempts, _status(WebhookDeliveryStatus.DEAD)),
+                else_=_status(WebhookDeliveryStatus.PENDING),
+            ),
+            attempts=WebhookDelivery.attempts + 1,
+            last_error=error,
+        )
+    )
+    failures = endpoint.failure_count + 1
+    delay = max(backoff_delay(failures, jitter), result.retry_after or 0.0)
+    await session.execute(
+        endpoints.values(
+            failure_count=failures,
+            retry_after=now + timedelta(seconds=delay),
+            last_error=error,
+        )
+    )
+
+
+def _status(value: WebhookDeliveryStatus) -> ColumnElement[WebhookDeliveryStatus]:
+    # Без явного типа PostgreSQL выводит для CASE text, а не enum
+    return literal(value, WebhookDelivery.status.type)
+
+
+async def delete_old_deliveries(session: AsyncSession, now: datetime) -> int:
+    """
+    Удаляет доставленные уведомления старше `DELIVERED_RETENTION_DAYS`
+    и мёртвые старше `DEAD_RETENTION_DAYS`.
+
+    Returns:
+        Количество удалённых строк.
+    """
+    result = await session.execute(
+        delete(WebhookDelivery).where(
+            or_(
+                and_(
+                    WebhookDelivery.status == WebhookDeliveryStatus.DELIVERED,
+                    WebhookDelivery.created_at < now - timedelta(days=DELIVERED_RETENTION_DAYS),
+                ),
+                and_(
+                    WebhookDelivery.status == WebhookDeliveryStatus.DEAD,
+                    WebhookDelivery.created_at < now - timedelta(days=DEAD_RETENTION_DAYS),
+                ),
+            )
+        )
+    )
+    return result.rowcount
+
+
+class WebhookDispatcher:
+    """
+    Буфер уведомлений и цикл отправки.
+
+    Буфер сбрасывается в outbox каждым воркером раз в окно; если БД
+    недоступна, уведомления остаются в памяти до следующей попытки.
+    Отправка из outbox выполняется только в процессе-лидере.
+    """
+
+    def __init__(
+        self,
+        batch_window: float = settings.webhook_batch_window_seconds,
+        digest_threshold: int = settings.webhook_digest_threshold,
+        max_concurrency: int = settings.webhook_max_concurrency,
+        max_attempts: int = settings.webhook_max_attempts,
+        max_pending: int = MAX_PENDING_NOTIFICATIONS,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        self._batch_window = batch_window
+        self._digest_threshold = digest_threshold
+        self._max_concurrency = max_concurrency
+        self._max_attempts = max_attempts
+        self._max_pending = max_pending
+        self._transport = transport
+        self._buffer: list[Notification] = []
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._client: httpx.AsyncClient | None = None
+        self._task: asyncio.Task | None = None
+        self._subscribed = False
+
+    @property
+    def pending(self) -> int:
+        """Количество уведомлений, ожидающих записи в outbox."""
+        return len(self._buffer)
+
+    def notify(self, notification: Notification) -> None:
+        """Ставит уведомление в буфер."""
+        self._buffer.append(notification)
+        if len(self._buffer) >= self._max_pending:
+            self._wakeup.set()
+
+    def on_robot_event(self, event: RobotEvent) -> None:
+        """Слушатель шины событий роботов."""
+        notification = Notification.from_robot_event(event)
+        if notification is not None:
+            self.notify(notification)
+
+    def on_alert_event(self, event: AlertEvent) -> None:
+        """Слушатель движка алертов."""
+        self.notify(Notification.from_alert_event(event))
+
+    async def start(self) -> None:
+        """Подписывается на события и запускает цикл."""
+        if self._task is not None:
+            return
+        if not self._subscribed:
+            robot_event_bus.add_listener(self.on_robot_event)
+            alert_engine.add_listener(self.on_alert_event)
+            self._subscribed = True
+        self._task = asyncio.create_task(self._run(), name="webhook-dispatcher")
+
+    async def stop(self) -> None:
+        """Останавливает цикл, сбрасывает буфер в outbox и закрывает HTTP-клиент."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+        await self._flush_safely()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def flush(self) -> int:
+        """
+        Записывает буфер в outbox.
+
+        Returns:
+            Количество созданных строк outbox.
+        """
+        async with self._lock:
+            notifications, self._buffer = self._buffer, []
+            if not notifications:
+                return 0
+            try:
+                async with async_session_factory() as session:
+                    created = await enqueue_notifications(session, notifications)
+                    await session.commit()
+            except BaseException:
+                self._requeue(notifications)
+                raise
+            return created
+
+    async def deliver(self) -> int:
+        """
+        Отправляет ожидающие уведомления всех адресов, по запросу на адрес.
+
+        Returns:
+            Количество доставленных уведомлений.
+        """
+        now = datetime.now(UTC)
+        async with async_session_factory() as session:
+            endpoints = (await session.execute(due_endpoints_query(now))).scalars().all()
+        if not endpoints:
+            return 0
+
+        semaphore = asyncio.Semaphore(self._max_concurrency)
+        results = await asyncio.gather(
+            *(self._deliver_endpoint(endpoint, semaphore) for endpoint in endpoints),
+            return_exceptions=True,
+        )
+        delivered = 0
+        for endpoint, result in zip(endpoints, results, strict=True):
+            if isinstance(result, BaseException):
+                logger.warning("Webhook dispatch failed: endpoint=%d error=%s", endpoint.id, result)
+            else:
+                delivered += result
+        return delivered
+
+    async def _deliver_endpoint(
+        self, endpoint: WebhookEndpoint, semaphore: asyncio.Semaphore
+    ) -> int:
+        async with semaphore:
+            async with async_session_factory() as session:
+                deliveries = await pending_deliveries(session, endpoint.id)
+            if not deliveries:
+                return 0
+
+            payload = build_payload([p for _, p in deliveries], self._digest_threshold)
+            result = await send(self._http_client(), endpoint.url, endpoint.secret, payload)
+
+            async with async_session_factory() as session:
+                await record_result(
+                    session,
+                    endpoint,
+                    [delivery_id for delivery_id, _ in deliveries],
+                    result,
+                    datetime.now(UTC),
+                    self._max_attempts,
+                )
+                await session.commit()
+
+        if result.delivered:
+            logger.info(
+                "Webhook delivered: endpoint=%d kind=%s events=%d",
+                endpoint.id,
+                payload["kind"],
+                len(deliveries),
+            )
+            return len(deliveries)
+        logger.warning(
+            "Webhook delivery failed: endpoint=%d events=%d retryable=%s error=%s",
+            endpoint.id,
+            len(deliveries),
+            result.retryable,
+            result.error,
+        )
+        return 0
+
+    def _http_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=REQUEST_TIMEOUT_SECONDS,
+                limits=httpx.Limits(max_connections=self._max_concurrency),
+                transport=self._transport,
+            )
+        return self._client
+
+    def _requeue(self, notifications: list[Notification]) -> None:
+        self._buffer[:0] = notifications
+        overflow = len(self._buffer) - self._max_pending
+        if overflow > 0:
+            del self._buffer[:overflow]
+            logger.warning("Webhook buffer overflow: dropped %d oldest notifications", overflow)
+
+    async def _flush_safely(self) -> None:
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.warning("Failed to enqueue webhooks (%d pending): %s", self.pending, e)
+
+    async def _deliver_safely(self) -> None:
+        try:
+            await self.deliver()
+        except Exception as e:
+            logger.warning("Webhook dispatch failed: %s", e)
+
+    async def _run(self) -> None:
+        while True:
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self._batch_window)
+            self._wakeup.clear()
+            await self._flush_safely()
+            if leader_elector.is_leader:
+                await self._deliver_safely()
+
+
+webhook_dispatcher = WebhookDispatcher()
@@ -1,60 +1,271 @@
 """
 Фоновые задачи приложения.
 
-Использует APScheduler для периодических задач.
+Использует APScheduler для периодических задач. Основное обнаружение
+неактивных роботов выполняет `app.services.liveness`; периодическая
+проверка ниже остаётся страховкой на случай пропущенных событий.
+
+Планировщик запущен в каждом воркере, но задачи выполняет только
+лидер (см. `app.services.leader`).
 """
 
+import functools
 import logging
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
 from datetime import UTC, datetime, timedelta
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from sqlalchemy import update
+from sqlalchemy import Select, Update, delete, exists, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import get_settings
 from app.database import async_session_factory
-from app.models import Robot, RobotStatus
+from app.models import PairCode, PairCodeStatus, Robot, RobotStatus
+from app.services.events import robot_event_bus
+from app.services.leader import leader_elector
+from app.services.status_history import drop_expired_partitions, ensure_partitions
+from app.services.webhooks import delete_old_deliveries
 
 logger = logging.getLogger(__name__)
+settings = get_settings()
+
+INACTIVITY_THRESHOLD_SECONDS = settings.robot_inactivity_threshold_seconds
+CHECK_INTERVAL_SECONDS = 300
+
+PAIRING_SWEEP_INTERVAL_SECONDS = 300
+PAIRING_SWEEP_BATCH_SIZE = 500
+# Сколько хранить непривязанных роботов (и их истёкшие коды) после регистрации
+ABANDONED_ROBOT_RETENTION_HOURS = 24
 
-INACTIVITY_THRESHOLD_SECONDS = 60
-CHECK_INTERVAL_SECONDS = 30
+STATUS_HISTORY_MAINTENANCE_INTERVAL_HOURS = 24
+STATUS_HISTORY_RETENTION_MONTHS = settings.status_history_retention_months
+
+WEBHOOK_CLEANUP_INTERVAL_HOURS = 24
 
 scheduler = AsyncIOScheduler()
 
 
+def leader_only(job: Callable[[], Awaitable[object]]) -> Callable[[], Awaitable[None]]:
+    """Оборачивает задачу так, чтобы она выполнялась только в процессе-лидере."""
+
+    @functools.wraps(job)
+    async def wrapper() -> None:
+        if not leader_elector.is_leader:
+            return
+        await job()
+
+    return wrapper
+
+
+def mark_inactive_statement(threshold: datetime) -> Update:
+    """UPDATE, переводящий в INACTIVE активных роботов без метрик с `threshold`."""
+    return (
+        update(Robot)
+        .where(
+            Robot.status == RobotStatus.ACTIVE,
+            Robot.last_seen_at < threshold,
+        )
+        .values(status=RobotStatus.INACTIVE)
+        .returning(Robot.id, Robot.name, Robot.owner_id)
+    )
+
+
 async def mark_inactive_robots() -> None:
     """Помечает роботов как неактивных если метрики не приходили дольше порога."""
     threshold = datetime.now(UTC) - timedelta(seconds=INACTIVITY_THRESHOLD_SECONDS)
 
     async with async_session_factory() as session:
-        result = await session.execute(
-            update(Robot)
-            .where(
-                Robot.status == RobotStatus.ACTIVE,
-                Robot.last_seen_at < threshold,
-            )
-            .values(status=RobotStatus.INACTIVE)
-            .returning(Robot.id, Robot.name)
-        )
+        result = await session.execute(mark_inactive_statement(threshold))
         updated = result.fetchall()
 
         if updated:
             await session.commit()
-            for robot_id, robot_name in updated:
+            for robot_id, robot_name, owner_id in updated:
                 logger.info("Robot marked inactive: id=%d name=%s", robot_id, robot_name)
+                robot_event_bus.publish_status(
+                    robot_id, owner_id, RobotStatus.INACTIVE, RobotStatus.ACTIVE
+                )
+
+
+@dataclass
+class PairingSweepResult:
+    """Итоги одного прохода очистки привязок."""
+
+    expired_codes: int = 0
+    deleted_robots: int = 0
+    deleted_codes: int = 0
+
+
+def expire_pair_codes_statement(now: datetime, batch_size: int) -> Update:
+    """UPDATE, помечающий истёкшими до `batch_size` просроченных кодов без блокировок."""
+    candidates = (
+        select(PairCode.id)
+        .where(PairCode.status == PairCodeStatus.PENDING, PairCode.expires_at < now)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    return (
+        update(PairCode)
+        .where(PairCode.id.in_(candidates.scalar_subquery()))
+        .values(status=PairCodeStatus.EXPIRED)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def expire_pair_codes_batch(session: AsyncSession, now: datetime, batch_size: int) -> int:
+    """Помечает истёкшими до `batch_size` просроченных кодов, пропуская заблокированные."""
+    result = await session.execute(expire_pair_codes_statement(now, batch_size))
+    return result.rowcount
+
+
+def abandoned_robots_query(cutoff: datetime, batch_size: int) -> Select[tuple[int]]:
+    """
+    Выбирает и блокирует до `batch_size` брошенных роботов.
+
+    Брошенный робот — в статусе PENDING, без владельца, зарегистрирован раньше
+    `cutoff` и не имеет ожидающих кодов привязки.
+    """
+    pending_code = exists().where(
+        PairCode.robot_id == Robot.id,
+        PairCode.status == PairCodeStatus.PENDING,
+    )
+    return (
+        select(Robot.id)
+        .where(
+            Robot.status == RobotStatus.PENDING,
+            Robot.owner_id.is_(None),
+            Robot.created_at < cutoff,
+            ~pending_code,
+        )
+        .limit(batch_size)
+        .with_for_update(of=Robot, skip_locked=True)
+    )
+
+
+async def delete_abandoned_robots_batch(
+    session: AsyncSession, cutoff: datetime, batch_size: int
+) -> tuple[int, int]:
+    """
+    Удаляет до `batch_size` брошенных роботов вместе с их кодами привязки.
+
+    Returns:
+        Количество удалённых роботов и кодов привязки.
+    """
+    result = await session.execute(abandoned_robots_query(cutoff, batch_size))
+    robot_ids = result.scalars().all()
+    if not robot_ids:
+        return 0, 0
+
+    codes = await session.execute(
+        delete(PairCode)
+        .where(PairCode.robot_id.in_(robot_ids))
+        .execution_options(synchronize_session=False)
+    )
+    robots = await session.execute(
+        delete(Robot).where(Robot.id.in_(robot_ids)).execution_options(synchronize_session=False)
+    )
+    return robots.rowcount, codes.rowcount
+
+
+async def sweep_pairing_leftovers(
+    batch_size: int = PAIRING_SWEEP_BATCH_SIZE,
+) -> PairingSweepResult:
+    """
+    Истекает просроченные коды привязки и удаляет брошенных роботов.
+
+    Работает ограниченными пачками, каждая — в своей транзакции, чтобы
+    не держать долгих блокировок на `robots` и `pair_codes`.
+    """
+    sweep = PairingSweepResult()
+    now = datetime.now(UTC)
+
+    while True:
+        async with async_session_factory() as session:
+            expired = await expire_pair_codes_batch(session, now, batch_size)
+            await session.commit()
+        sweep.expired_codes += expired
+        if expired < batch_size:
+            break
+
+    cutoff = now - timedelta(hours=ABANDONED_ROBOT_RETENTION_HOURS)
+    while True:
+        async with async_session_factory() as session:
+            robots, codes = await delete_abandoned_robots_batch(session, cutoff, batch_size)
+            await session.commit()
+        sweep.deleted_robots += robots
+        sweep.deleted_codes += codes
+        if robots < batch_size:
+            break
+
+    logger.info(
+        "Pairing sweep: expired_codes=%d deleted_robots=%d deleted_codes=%d",
+        sweep.expired_codes,
+        sweep.deleted_robots,
+        sweep.deleted_codes,
+    )
+    return sweep
+
+
+async def maintain_status_history_partitions() -> None:
+    """Создаёт секции истории статусов наперёд и удаляет устаревшие."""
+    now = datetime.now(UTC)
+    async with async_session_factory() as session:
+        created = await ensure_partitions(session, now)
+        dropped = await drop_expired_partitions(session, now, STATUS_HISTORY_RETENTION_MONTHS)
+        await session.commit()
+
+    if created or dropped:
+        logger.info(
+            "Status history partitions: created=%s dropped=%s",
+            ", ".join(created) or "-",
+            ", ".join(dropped) or "-",
+        )
+
+
+async def purge_webhook_deliveries() -> None:
+    """Удаляет старые доставленные и мёртвые уведомления вебхуков."""
+    async with async_session_factory() as session:
+        deleted = await delete_old_deliveries(session, datetime.now(UTC))
+        await session.commit()
+
+    if deleted:
+        logger.info("Webhook deliveries purged: %d", deleted)
 
 
 def start_scheduler() -> None:
     """Запускает планировщик задач."""
     scheduler.add_job(
-        mark_inactive_robots,
+        leader_only(mark_inactive_robots),
         "interval",
         seconds=CHECK_INTERVAL_SECONDS,
         id="mark_inactive_robots",
         replace_existing=True,
     )
+    scheduler.add_job(
+        leader_only(sweep_pairing_leftovers),
+        "interval",
+        seconds=PAIRING_SWEEP_INTERVAL_SECONDS,
+        id="sweep_pairing_leftovers",
+        replace_existing=True,
+    )
+    scheduler.add_job(
+        leader_only(maintain_status_history_partitions),
+        "interval",
+        hours=STATUS_HISTORY_MAINTENANCE_INTERVAL_HOURS,
+        id="maintain_status_history_partitions",
+        replace_existing=True,
+    )
+    scheduler.add_job(
+        leader_only(purge_webhook_deliveries),
+        "interval",
+        hours=WEBHOOK_CLEANUP_INTERVAL_HOURS,
+        id="purge_webhook_deliveries",
+        replace_existing=True,
+    )
     scheduler.start()
     logger.info(
-        "Scheduler started: checking robot activity every %ds, threshold %ds",
+        "Scheduler started: fallback robot activity sweep every %ds, threshold %ds",
         CHECK_INTERVAL_SECONDS,
         INACTIVITY_THRESHOLD_SECONDS,
     )
@@ -0,0 +1,71 @@
+"""
+Бенчмарк форматов ответа истории метрик: JSON против Arrow IPC.
+
+Разбирает CSV в формате ответа InfluxDB (неделя точек с шагом 10 с)
+и сравнивает размер и время кодирования ответа в обоих форматах.
+
+Запуск из server/api:
+
+    python -m benchmarks.bench_arrow [--days 7]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from app.routers.telemetry import series_points
+from app.schemas import DownsampleMode, RobotMetricSeriesResponse
+from app.services.arrow_format import series_table, to_ipc_stream
+from app.services.metrics_query import SeriesColumns, parse_csv_columns
+
+SAMPLE_SECONDS = 10
+
+
+def make_csv(days: int, rng: np.random.Generator) -> bytes:
+    """CSV с заголовком и колонками как у ответа InfluxDB."""
+    times = np.arange(0, days * 86400, SAMPLE_SECONDS).astype("datetime64[s]")
+    values = np.clip(50 + np.cumsum(rng.normal(size=len(times))), 0, 100)
+    rows = [",result,table,_time,_value"]
+    rows += [f",_result,0,{t}Z,{v:.3f}" for t, v in zip(times, values, strict=True)]
+    return "\r\n".join(rows).encode()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--days", type=int, default=7, help="Длина истории в днях")
+    args = parser.parse_args()
+
+    data = make_csv(args.days, np.random.default_rng(42))
+    started = time.perf_counter()
+    times, values = parse_csv_columns(data)
+    parsed = time.perf_counter()
+    columns = SeriesColumns(times=times, values=values)
+    print(
+        f"{len(times)} точек, CSV {len(data) / 1e6:.2f} MB, разбор {(parsed - started) * 1e3:.1f} ms"
+    )
+
+    started = time.perf_counter()
+    body = RobotMetricSeriesResponse(
+        robot_id=1,
+        measurement="cpu",
+        field="usage_active",
+        start=0,
+        end=args.days * 86400,
+        step=SAMPLE_SECONDS,
+        downsample=DownsampleMode.NONE,
+        points=series_points(columns),
+    ).model_dump_json()
+    json_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    arrow = to_ipc_stream(series_table(columns, {"robot_id": "1"}))
+    arrow_time = time.perf_counter() - started
+
+    print(f"{'format':<8} {'MB':>8} {'encode ms':>10}")
+    print(f"{'json':<8} {len(body) / 1e6:>8.2f} {json_time * 1e3:>10.1f}")
+    print(f"{'arrow':<8} {len(arrow) / 1e6:>8.2f} {arrow_time * 1e3:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Бенчмарк прореживания истории метрик.
+
+Моделирует дашборд с несколькими сериями за 7 дней с шагом Telegraf 10 с
+и сравнивает объём и время сериализации ответа без прореживания
+и с LTTB / огибающей min/max.
+
+Запуск из server/api:
+
+    python -m benchmarks.bench_downsample [--series 16] [--points 1000]
+"""
+
+import argparse
+import time
+from collections.abc import Callable
+from datetime import UTC, datetime
+
+import numpy as np
+
+from app.schemas import DownsampleMode, MetricPoint, RobotMetricSeriesResponse
+from app.services.downsample import lttb, minmax_envelope
+
+RANGE_SECONDS = 7 * 86400
+SAMPLE_SECONDS = 10
+
+
+def make_series(count: int, rng: np.random.Generator) -> list[tuple[np.ndarray, np.ndarray]]:
+    """Случайные блуждания с редкими пиками, как у загрузки CPU."""
+    times = np.arange(0, RANGE_SECONDS, SAMPLE_SECONDS, dtype=np.int64) * 1_000_000_000
+    series = []
+    for _ in range(count):
+        values = np.clip(50 + np.cumsum(rng.normal(size=len(times))), 0, 100)
+        spikes = rng.choice(len(times), size=20, replace=False)
+        values[spikes] = 100.0
+        series.append((times, values))
+    return series
+
+
+def encode(points: list[MetricPoint], mode: DownsampleMode) -> bytes:
+    response = RobotMetricSeriesResponse(
+        robot_id=1,
+        measurement="cpu",
+        field="usage_active",
+        start=datetime.fromtimestamp(0, UTC),
+        end=datetime.fromtimestamp(RANGE_SECONDS, UTC),
+        step=SAMPLE_SECONDS,
+        downsample=mode,
+        points=points,
+    )
+    return response.model_dump_json().encode()
+
+
+def raw_points(times: np.ndarray, values: np.ndarray) -> list[MetricPoint]:
+    return [
+        MetricPoint(time=datetime.fromtimestamp(t / 1e9, UTC), value=v)
+        for t, v in zip(times.tolist(), values.tolist(), strict=True)
+    ]
+
+
+def lttb_points(times: np.ndarray, values: np.ndarray, points: int) -> list[MetricPoint]:
+    return raw_points(*(column[lttb(times, values, points)] for column in (times, values)))
+
+
+def minmax_points(times: np.ndarray, values: np.ndarray, points: int) -> list[MetricPoint]:
+    step = RANGE_SECONDS // points * 1_000_000_000
+    envelope = minmax_envelope(times, values, 0, step, points)
+    return [
+        MetricPoint(time=datetime.fromtimestamp(t / 1e9, UTC), value=m, min=lo, max=hi)
+        for t, m, lo, hi in zip(
+            envelope.starts.tolist(),
+            envelope.mean.tolist(),
+            envelope.min.tolist(),
+            envelope.max.tolist(),
+            strict=True,
+        )
+    ]
+
+
+def measure(
+    name: str,
+    series: list[tuple[np.ndarray, np.ndarray]],
+    build: Callable[[np.ndarray, np.ndarray], list[MetricPoint]],
+    mode: DownsampleMode,
+) -> None:
+    started = time.perf_counter()
+    points = [build(times, values) for times, values in series]
+    built = time.perf_counter()
+    size = sum(len(encode(p, mode)) for p in points)
+    encoded = time.perf_counter()
+    print(
+        f"{name:<8} {sum(map(len, points)):>10} {size / 1e6:>9.2f} "
+        f"{(built - started) * 1e3:>10.1f} {(encoded - built) * 1e3:>10.1f}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--series", type=int, default=16, help="Серий в ответе")
+    parser.add_argument(
+        "--points", type=int, default=1000, help="Точек на серию после прореживания"
+    )
+    args = parser.parse_args()
+
+    series = make_series(args.series, np.random.default_rng(42))
+    print(f"{args.series} серий по {len(series[0][0])} точек, прореживание до {args.points}")
+    print(f"{'mode':<8} {'points':>10} {'MB':>9} {'build ms':>10} {'json ms':>10}")
+    measure("raw", series, raw_points, DownsampleMode.MEAN)
+    measure("lttb", series, lambda t, v: lttb_points(t, v, args.points), DownsampleMode.LTTB)
+    measure("minmax", series, lambda t, v: minmax_points(t, v, args.points), DownsampleMode.MINMAX)
+
+
+if __name__ == "__main__":
+    main()
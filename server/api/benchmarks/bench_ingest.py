@@ -0,0 +1,113 @@
+"""
+Бенчмарк приёма метрик в кэш последних значений с детектором аномалий.
+
+Моделирует парк роботов, каждый из которых присылает типичный пакет
+Telegraf (CPU по ядрам, память, диски, сеть, система), и сравнивает время
+`LiveMetricsCache.ingest` без детектора и с ним (с сезонной базой и без).
+
+Запуск из server/api:
+
+    python -m benchmarks.bench_ingest [--robots 1000] [--rounds 20]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from app.services.anomalies import AnomalyDetector
+from app.services.live_metrics import LiveMetricsCache
+
+SAMPLE_SECONDS = 10
+
+
+def make_batch(rng: np.random.Generator, timestamp: int) -> str:
+    """Пакет Line Protocol одного робота за один интервал сбора."""
+    ns = timestamp * 1_000_000_000
+    host = "host=robot"
+    lines = []
+    for cpu in ("cpu-total", "cpu0", "cpu1", "cpu2", "cpu3"):
+        active = rng.uniform(5, 60)
+        lines.append(
+            f"cpu,cpu={cpu},{host} usage_active={active:.3f},usage_idle={100 - active:.3f},"
+            f"usage_system={active / 3:.3f},usage_user={active / 2:.3f},usage_iowait=0.1 {ns}"
+        )
+    used = rng.uniform(30, 70)
+    lines.append(
+        f"mem,{host} used_percent={used:.3f},available_percent={100 - used:.3f},"
+        f"total=8264445952i,used={int(used * 82644459)}i,available=4132222976i {ns}"
+    )
+    for path, device in (("/", "mmcblk0p2"), ("/boot", "mmcblk0p1")):
+        lines.append(
+            f"disk,path={path},device={device},fstype=ext4,{host} used_percent=42.1,"
+            f"total=62000000000i,used=26000000000i,free=36000000000i,inodes_used=120000i {ns}"
+        )
+    lines.append(f"diskio,name=mmcblk0,{host} reads=1234i,writes=5678i,io_time=910i {ns}")
+    for interface in ("eth0", "wlan0"):
+        lines.append(
+            f"net,interface={interface},{host} bytes_recv=123456i,bytes_sent=654321i,"
+            f"packets_recv=1000i,packets_sent=900i,err_in=0i,err_out=0i {ns}"
+        )
+    lines.append(
+        f"system,{host} load1={rng.uniform(0, 4):.2f},load5=1.1,load15=0.9,"
+        f"n_cpus=4i,n_users=1i,uptime=123456i {ns}"
+    )
+    lines.append(
+        f"swap,{host} used_percent=3.2,total=104853504i,used=3355443i,free=101498061i {ns}"
+    )
+    lines.append(
+        f"processes,{host} total=180i,running=1i,sleeping=179i,zombies=0i,threads=420i {ns}"
+    )
+    lines.append(f'temp,sensor=cpu_thermal,{host} temp=48.5,status="ok" {ns}')
+    return "\n".join(lines)
+
+
+def make_cache(detector: str) -> tuple[LiveMetricsCache, AnomalyDetector | None]:
+    cache = LiveMetricsCache()
+    if detector == "none":
+        return cache, None
+    anomaly_detector = AnomalyDetector(cache, seasonal=detector == "seasonal")
+    cache.add_observer(anomaly_detector.observe)
+    return cache, anomaly_detector
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--robots", type=int, default=1000, help="Роботов в парке")
+    parser.add_argument("--rounds", type=int, default=60, help="Интервалов сбора")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    batches = [
+        [make_batch(rng, 1_700_000_000 + i * SAMPLE_SECONDS) for _ in range(args.robots)]
+        for i in range(args.rounds)
+    ]
+    lines = batches[0][0].count("\n") + 1
+    print(f"{args.robots} роботов × {args.rounds} пакетов по {lines} строк")
+
+    # Режимы чередуются внутри каждого интервала, так что шум машины
+    # одинаково влияет на все. Обработка буфера детектора входит во время
+    modes = ("none", "ewma", "seasonal")
+    caches = {mode: make_cache(mode) for mode in modes}
+    total = dict.fromkeys(modes, 0.0)
+    for round_batches in batches:
+        for mode, (cache, _) in caches.items():
+            started = time.perf_counter()
+            for robot_id, body in enumerate(round_batches):
+                cache.ingest(robot_id, robot_id % 50, body)
+            total[mode] += time.perf_counter() - started
+    for mode, (_, detector) in caches.items():
+        if detector is not None:
+            started = time.perf_counter()
+            detector.flush()
+            total[mode] += time.perf_counter() - started
+
+    print(f"{'detector':<10} {'µs/batch':>10} {'slowdown':>10}")
+    for mode in modes:
+        per_batch = total[mode] / (args.robots * args.rounds)
+        slowdown = (total[mode] / total["none"] - 1) * 100
+        print(f"{mode:<10} {per_batch * 1e6:>10.1f} {slowdown:>9.1f}%")
+
+
+if __name__ == "__main__":
+    main()
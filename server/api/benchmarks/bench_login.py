@@ -0,0 +1,106 @@
+"""
+Бенчмарк задержки приёма метрик во время волны входов.
+
+В одном цикле событий идут приём пакетов метрик (`LiveMetricsCache.ingest`
+каждые `--interval` мс) и `--logins` одновременных проверок пароля bcrypt.
+Задержка пакета — от момента, когда он должен был быть принят, до конца
+приёма. Сравниваются: без входов, bcrypt прямо в цикле событий (как
+раньше) и пул `PasswordHasher` с ограниченной очередью.
+
+Запуск из server/api:
+
+    python -m benchmarks.bench_login [--logins 40] [--interval 5]
+"""
+
+import argparse
+import asyncio
+import time
+
+import numpy as np
+from passlib.context import CryptContext
+
+from app.services.live_metrics import LiveMetricsCache
+from app.services.passwords import PasswordHasher, PasswordHasherBusyError
+from benchmarks.bench_ingest import make_batch
+
+PASSWORD = "correct horse battery staple"
+
+
+async def ingest_loop(
+    cache: LiveMetricsCache, bodies: list[str], interval: float, stop: asyncio.Event
+) -> list[float]:
+    """Принимает пакеты по расписанию; возвращает задержки в секундах."""
+    latencies = []
+    scheduled = time.perf_counter()
+    i = 0
+    while not stop.is_set():
+        cache.ingest(i % 1000, 1, bodies[i % len(bodies)])
+        latencies.append(time.perf_counter() - scheduled)
+        i += 1
+        scheduled += interval
+        await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+    return latencies
+
+
+async def run(mode: str, args: argparse.Namespace, bodies: list[str], hashed: str) -> dict:
+    context = CryptContext(schemes=["bcrypt"])
+    hasher = PasswordHasher(workers=args.workers, max_pending=args.max_pending, context=context)
+    rejected = 0
+
+    async def login() -> None:
+        nonlocal rejected
+        await asyncio.sleep(0)
+        if mode == "inline":
+            context.verify(PASSWORD, hashed)
+            return
+        try:
+            await hasher.verify(PASSWORD, hashed)
+        except PasswordHasherBusyError:
+            rejected += 1
+
+    stop = asyncio.Event()
+    ingest = asyncio.create_task(
+        ingest_loop(LiveMetricsCache(), bodies, args.interval / 1000, stop)
+    )
+    await asyncio.sleep(0.2)
+    started = time.perf_counter()
+    if mode != "idle":
+        await asyncio.gather(*(login() for _ in range(args.logins)))
+    burst = time.perf_counter() - started
+    await asyncio.sleep(0.2)
+    stop.set()
+    latencies = np.array(await ingest) * 1000
+    hasher.shutdown()
+    return {
+        "p50": np.percentile(latencies, 50),
+        "p99": np.percentile(latencies, 99),
+        "max": latencies.max(),
+        "burst": burst,
+        "rejected": rejected,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--logins", type=int, default=40, help="Одновременных входов")
+    parser.add_argument("--interval", type=float, default=5, help="Интервал приёма, мс")
+    parser.add_argument("--workers", type=int, default=2, help="Потоков bcrypt")
+    parser.add_argument("--max-pending", type=int, default=16, help="Предел очереди bcrypt")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    bodies = [make_batch(rng, 1_700_000_000 + i * 10) for i in range(200)]
+    hashed = CryptContext(schemes=["bcrypt"]).hash(PASSWORD)
+
+    print(f"{args.logins} входов, приём пакета каждые {args.interval:g} мс")
+    print(f"{'mode':<8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>9} {'burst s':>8} {'429':>5}")
+    for mode in ("idle", "inline", "pool"):
+        r = asyncio.run(run(mode, args, bodies, hashed))
+        print(
+            f"{mode:<8} {r['p50']:>8.2f} {r['p99']:>8.2f} {r['max']:>9.1f} "
+            f"{r['burst']:>8.2f} {r['rejected']:>5}"
+        )
+
+
+if __name__ == "__main__":
+    main()
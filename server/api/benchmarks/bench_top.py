@@ -0,0 +1,46 @@
+"""
+Бенчмарк выборки N лучших роботов из кэша последних значений.
+
+Заполняет `LiveMetricsCache` значениями метрики для `--robots` роботов
+и замеряет `top` по всему парку и по одному владельцу (ориентир —
+доли миллисекунды на 10 тысячах роботов).
+
+Запуск из server/api:
+
+    python -m benchmarks.bench_top [--robots 10000] [--owners 50] [--limit 20]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from app.services.live_metrics import LiveMetricsCache
+
+REPEAT = 100
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--robots", type=int, default=10_000, help="Роботов в кэше")
+    parser.add_argument("--owners", type=int, default=50, help="Владельцев")
+    parser.add_argument("--limit", type=int, default=20, help="N лучших")
+    args = parser.parse_args()
+
+    cache = LiveMetricsCache()
+    rng = np.random.default_rng(42)
+    for robot_id, value in enumerate(rng.uniform(0, 100, args.robots)):
+        cache.ingest(robot_id, robot_id % args.owners, f"cpu,cpu=cpu-total usage_idle={value} 1")
+
+    print(f"{args.robots} роботов, {args.owners} владельцев, top {args.limit}")
+    print(f"{'scope':<8} {'ms':>8}")
+    for scope, owner_id in (("fleet", None), ("owner", 7)):
+        started = time.perf_counter()
+        for _ in range(REPEAT):
+            cache.top("cpu.usage_idle", args.limit, owner_id=owner_id)
+        elapsed = (time.perf_counter() - started) / REPEAT
+        print(f"{scope:<8} {elapsed * 1e3:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
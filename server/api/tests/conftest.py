@@ -6,11 +6,13 @@ import asyncio
 import os
 from collections.abc import AsyncGenerator
 from datetime import UTC, datetime, timedelta
+from unittest.mock import AsyncMock, patch
 
 import pytest
 from httpx import ASGITransport, AsyncClient
 from jose import jwt
 from passlib.context import CryptContext
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.pool import NullPool
 
@@ -18,6 +20,7 @@ from app.config import get_settings
 from app.database import Base, get_db
 from app.main import app
 from app.models import User, UserRole
+from app.services.user_cache import user_cache
 
 TEST_DATABASE_URL = os.environ.get(
     "DATABASE_URL",
@@ -53,6 +56,7 @@ async def setup_database(test_engine):
     """Создание таблиц перед тестами."""
     async with test_engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
         await conn.run_sync(Base.metadata.create_all)
     yield
     async with test_engine.begin() as conn:
@@ -82,6 +86,23 @@ def create_test_access_token(user_id: int) -> str:
     return jwt.encode(to_encode, settings.jwt_secret_key, algorithm=settings.jwt_algorithm)
 
 
+@pytest.fixture
+def mock_influxdb():
+    """Мок для InfluxDB запросов."""
+    with patch("app.routers.metrics.httpx.AsyncClient") as mock:
+        mock_response = AsyncMock()
+        mock_response.status_code = 204
+        mock_response.text = ""
+
+        mock_client = AsyncMock()
+        mock_client.post.return_value = mock_response
+        mock_client.__aenter__.return_value = mock_client
+        mock_client.__aexit__.return_value = None
+
+        mock.return_value = mock_client
+        yield mock
+
+
 @pytest.fixture
 async def test_admin(db_session: AsyncSession) -> User:
     """Создаёт тестового администратора."""
@@ -125,3 +146,5 @@ async def client(
         yield ac
 
     app.dependency_overrides.clear()
+    # Откат транзакции теста не вызывает событий ORM, сбрасывающих кэш
+    user_cache.clear()
@@ -0,0 +1,300 @@
+"""
+Тесты правил алертов и их проверки при приёме метрик.
+"""
+
+from dataclasses import replace
+from datetime import UTC, datetime
+
+import pytest
+from fastapi import status
+from httpx import AsyncClient
+
+from app.models import AlertCondition, AlertRule, AlertScope, AlertStatus, RobotStatus
+from app.services.alerts import ActiveAlert, AlertEngine, AlertEvent, AlertEventType, AlertKey
+from app.services.events import RobotEvent, RobotEventType
+from app.services.live_metrics import LiveMetricsCache
+
+START = 1_700_000_000
+
+
+def make_rule(rule_id: int, **overrides) -> AlertRule:
+    fields = {
+        "id": rule_id,
+        "name": f"rule-{rule_id}",
+        "metric": "cpu.usage_active",
+        "condition": AlertCondition.GT,
+        "threshold": 90.0,
+        "duration_seconds": 0,
+        "scope": AlertScope.FLEET,
+        "robot_id": None,
+        "owner_id": None,
+        "enabled": True,
+    }
+    fields.update(overrides)
+    return AlertRule(**fields)
+
+
+def make_engine(*rules: AlertRule) -> tuple[LiveMetricsCache, AlertEngine, list[AlertEvent]]:
+    cache = LiveMetricsCache()
+    engine = AlertEngine(cache)
+    cache.add_observer(engine.observe)
+    engine.load_rules(rules)
+    events: list[AlertEvent] = []
+    engine.add_listener(events.append)
+    return cache, engine, events
+
+
+def cpu(cache: LiveMetricsCache, robot_id: int, value: float, at: float, owner_id: int = 10):
+    cache.ingest(robot_id, owner_id, f"cpu,cpu=cpu-total usage_active={value} {int(at * 1e9)}")
+
+
+def sync(engine: AlertEngine, table: dict[AlertKey, ActiveAlert]) -> None:
+    """Цикл синхронизации с таблицей-словарём вместо `alert_rule_states`."""
+    dirty, engine._dirty = engine._dirty, set()
+    resolved, engine._resolved = engine._resolved, {}
+    stored = {key: replace(table[key]) for key in dirty if key in table}
+    settlement = engine.settle(dirty, resolved, stored)
+    for key in settlement.deletes:
+        table.pop(key, None)
+    for alert in settlement.upserts:
+        table[(alert.rule_id, alert.robot_id)] = replace(alert)
+    engine._emit_all(settlement.events)
+    engine.adopt({key: replace(alert) for key, alert in table.items()})
+
+
+def test_rule_fires_after_duration_and_resolves():
+    """Правило срабатывает, только если условие держится duration_seconds."""
+    cache, engine, events = make_engine(make_rule(1, duration_seconds=60))
+    table: dict[AlertKey, ActiveAlert] = {}
+
+    cpu(cache, 1, 95, START)
+    sync(engine, table)
+    [(alert, rule)] = engine.active()
+    assert (alert.status, rule.id, alert.since) == (AlertStatus.PENDING, 1, START)
+    assert table[(1, 1)].status == AlertStatus.PENDING
+    assert events == []
+
+    cpu(cache, 1, 97, START + 30)
+    sync(engine, table)
+    assert events == []
+    cpu(cache, 1, 96, START + 60)
+    assert engine.active()[0][0].status == AlertStatus.FIRING
+    assert events == []
+    sync(engine, table)
+    [event] = events
+    assert (event.type, event.robot_id, event.value, event.time) == (
+        AlertEventType.FIRING,
+        1,
+        96,
+        START + 60,
+    )
+
+    cpu(cache, 1, 20, START + 70)
+    assert engine.active() == []
+    sync(engine, table)
+    assert table == {}
+    assert [event.type for event in events] == [AlertEventType.FIRING, AlertEventType.RESOLVED]
+    assert (events[1].value, events[1].time) == (20, START + 70)
+
+
+def test_pending_alert_is_dropped_when_condition_breaks():
+    """Прерванное ожидание не даёт событий."""
+    cache, engine, events = make_engine(make_rule(1, duration_seconds=60))
+
+    cpu(cache, 1, 95, START)
+    cpu(cache, 1, 50, START + 10)
+    cpu(cache, 1, 95, START + 20)
+
+    assert engine.active()[0][0].since == START + 20
+    assert events == []
+
+
+def test_scopes_select_robots():
+    """Правило робота, владельца и парка применяется только к своим роботам."""
+    cache, engine, events = make_engine(
+        make_rule(1, scope=AlertScope.ROBOT, robot_id=1, owner_id=10),
+        make_rule(2, scope=AlertScope.OWNER, owner_id=20),
+        make_rule(3, threshold=99),
+    )
+
+    cpu(cache, 1, 95, START, owner_id=10)
+    cpu(cache, 2, 95, START, owner_id=10)
+    cpu(cache, 3, 95, START, owner_id=20)
+    cpu(cache, 4, 100, START, owner_id=30)
+    sync(engine, {})
+
+    fired = {(event.rule.id, event.robot_id) for event in events}
+    assert fired == {(1, 1), (2, 3), (3, 4)}
+
+
+def test_conditions_and_untracked_metrics():
+    """Сравнения работают по своей метрике; прочие метрики правил не задевают."""
+    cache, engine, events = make_engine(
+        make_rule(1, metric="mem.used_percent", condition=AlertCondition.GTE, threshold=80),
+        make_rule(2, metric="disk.free", condition=AlertCondition.LT, threshold=1000),
+    )
+
+    cache.ingest(1, 10, f"mem used_percent=80,free=5 {START * 10**9}")
+    cache.ingest(1, 10, f"disk,path=/ free=999i,used_percent=99 {START * 10**9}")
+    sync(engine, {})
+
+    assert sorted(event.rule.id for event in events) == [1, 2]
+
+
+def test_rule_changes_rebuild_index_and_drop_state():
+    """Выключенное или удалённое правило снимает свои алерты без событий."""
+    cache, engine, events = make_engine(make_rule(1), make_rule(2, threshold=50))
+    table: dict[AlertKey, ActiveAlert] = {}
+    cpu(cache, 1, 95, START)
+    sync(engine, table)
+    assert len(engine.active()) == len(table) == 2
+
+    engine.set_rule(make_rule(1, enabled=False))
+    engine.remove_rule(2)
+    assert engine.active() == []
+
+    cpu(cache, 1, 99, START + 10)
+    sync(engine, table)
+    assert table == {}
+    assert len(events) == 2
+
+    engine.set_rule(make_rule(3, metric="system.load1", threshold=2))
+    cache.ingest(1, 10, f"system load1=3 {(START + 20) * 10**9}")
+    sync(engine, table)
+    assert [event.rule.id for event in events][-1] == 3
+
+
+def test_forget_robot_drops_rules_and_state():
+    """Удалённый робот теряет свои правила и алерты."""
+    cache, engine, _ = make_engine(
+        make_rule(1, scope=AlertScope.ROBOT, robot_id=1, owner_id=10), make_rule(2)
+    )
+    cpu(cache, 1, 95, START)
+    cpu(cache, 2, 95, START)
+
+    engine.forget_robot(1)
+
+    assert [alert.robot_id for alert, _ in engine.active()] == [2]
+    assert set(engine.rules) == {2}
+
+
+def test_evaluation_cost_does_not_grow_with_robot_rules():
+    """Правила других роботов не проверяются для точки робота."""
+    rules = [
+        make_rule(rule_id, scope=AlertScope.ROBOT, robot_id=rule_id, owner_id=10)
+        for rule_id in range(1, 20_001)
+    ]
+    cache, engine, _ = make_engine(*rules)
+    evaluated: list[tuple[int, int]] = []
+    evaluate = engine._evaluate
+
+    def counting_evaluate(rule, robot_id, owner_id, value, at):
+        evaluated.append((rule.id, robot_id))
+        evaluate(rule, robot_id, owner_id, value, at)
+
+    engine._evaluate = counting_evaluate
+    body = "\n".join(
+        f"cpu,cpu=cpu-total usage_active=95 {(START + i) * 10**9}" for i in range(1000)
+    )
+
+    cache.ingest(1, 10, body)
+    cache.ingest(50_000, 10, body)
+
+    assert set(evaluated) == {(1, 1)}
+    assert len(evaluated) == 1000
+    assert [alert.robot_id for alert, _ in engine.active()] == [1]
+
+
+def test_workers_announce_each_transition_once():
+    """Два воркера с общей таблицей: одно срабатывание и одно снятие на алерт."""
+    rule = make_rule(1)
+    first_cache, first, events = make_engine(rule)
+    second_cache, second, _ = make_engine(rule)
+    second.add_listener(events.append)
+    table: dict[AlertKey, ActiveAlert] = {}
+
+    cpu(first_cache, 1, 95, START)
+    cpu(second_cache, 1, 96, START + 10)
+    sync(first, table)
+    sync(second, table)
+    sync(first, table)
+    assert [event.type for event in events] == [AlertEventType.FIRING]
+    assert table[(1, 1)].since == START
+    assert first.active()[0][0].value == 96
+
+    # Снял второй воркер: копия первого исчезает при следующей синхронизации
+    cpu(second_cache, 1, 20, START + 20)
+    sync(second, table)
+    sync(first, table)
+    assert [event.type for event in events] == [AlertEventType.FIRING, AlertEventType.RESOLVED]
+    assert first.active() == second.active() == []
+
+
+def test_stale_resolution_keeps_newer_state():
+    """Снятие по старой точке не удаляет алерт, обновлённый другим воркером позже."""
+    first_cache, first, events = make_engine(make_rule(1))
+    second_cache, second, _ = make_engine(make_rule(1))
+    table: dict[AlertKey, ActiveAlert] = {}
+
+    cpu(first_cache, 1, 95, START)
+    sync(first, table)
+    cpu(first_cache, 1, 20, START + 10)
+    cpu(second_cache, 1, 97, START + 20)
+    sync(second, table)
+    sync(first, table)
+
+    assert table[(1, 1)].updated_at == START + 20
+    assert [alert.value for alert, _ in first.active()] == [97]
+    assert [event.type for event in events] == [AlertEventType.FIRING]
+
+
+def test_alerts_expire_without_points_and_on_inactive_robot():
+    """Алерт снимается, если точек нет дольше порога или робот стал неактивным."""
+    cache = LiveMetricsCache()
+    engine = AlertEngine(cache, expire_after=60)
+    cache.add_observer(engine.observe)
+    engine.load_rules([make_rule(1)])
+    events: list[AlertEvent] = []
+    engine.add_listener(events.append)
+    table: dict[AlertKey, ActiveAlert] = {}
+
+    cpu(cache, 1, 95, START)
+    cpu(cache, 2, 95, START + 50)
+    sync(engine, table)
+
+    assert engine.expire(START + 100) == 1
+    engine.on_robot_event(
+        RobotEvent(
+            type=RobotEventType.STATUS,
+            robot_id=2,
+            owner_id=10,
+            status=RobotStatus.INACTIVE,
+            previous_status=RobotStatus.ACTIVE,
+            occurred_at=datetime.fromtimestamp(START + 100, UTC),
+        )
+    )
+    sync(engine, table)
+
+    assert table == {}
+    assert sorted((event.type, event.robot_id) for event in events) == [
+        (AlertEventType.FIRING, 1),
+        (AlertEventType.FIRING, 2),
+        (AlertEventType.RESOLVED, 1),
+        (AlertEventType.RESOLVED, 2),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_alert_rule_rejects_untracked_metric(client: AsyncClient):
+    """Правило по метрике, которой нет в кэше, не создаётся."""
+    response = await client.post(
+        "/api/alerts/rules",
+        json={
+            "name": "Net",
+            "metric": "net.bytes_recv",
+            "condition": "gt",
+            "threshold": 1,
+            "scope": "fleet",
+        },
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
@@ -0,0 +1,173 @@
+"""
+Тесты потокового обнаружения аномалий в метриках.
+"""
+
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.services.anomalies import WARMUP_POINTS, AnomalyDetector
+from app.services.live_metrics import LiveMetricsCache
+
+START = 1_700_000_000
+
+
+def make_detector(seasonal: bool = False) -> tuple[LiveMetricsCache, AnomalyDetector]:
+    cache = LiveMetricsCache()
+    detector = AnomalyDetector(cache, threshold=4.0, seasonal=seasonal)
+    cache.add_observer(detector.observe)
+    return cache, detector
+
+
+def mem_line(value: float, timestamp: float) -> str:
+    return f"mem used_percent={value},total=1024i {int(timestamp * 1_000_000_000)}"
+
+
+def feed(cache: LiveMetricsCache, robot_id: int, values: np.ndarray, start: float = START) -> None:
+    for i, value in enumerate(values.tolist()):
+        cache.ingest(robot_id, 10, mem_line(value, start + i * 10))
+
+
+def test_spike_after_warmup_is_recorded_once():
+    """Серия аномальных точек подряд даёт одну запись."""
+    cache, detector = make_detector()
+    rng = np.random.default_rng(1)
+    feed(cache, 1, 40 + rng.normal(0, 0.5, 100))
+    assert list(detector.recent()) == []
+
+    feed(cache, 1, np.array([90.0]), start=START + 1000)
+    assert detector.is_flagged(1, "mem.used_percent")
+    feed(cache, 1, np.array([91.0]), start=START + 1010)
+
+    anomalies = list(detector.recent())
+    assert len(anomalies) == 1
+    anomaly = anomalies[0]
+    assert (anomaly.robot_id, anomaly.owner_id, anomaly.metric) == (1, 10, "mem.used_percent")
+    assert anomaly.value == 90
+    assert abs(anomaly.expected - 40) < 1
+    assert anomaly.zscore > 4
+    assert anomaly.time == START + 1000
+
+    feed(cache, 1, np.full(3, 40.0), start=START + 2000)
+    assert not detector.is_flagged(1, "mem.used_percent")
+
+
+def test_no_anomalies_during_warmup():
+    """Пока база не накоплена, выбросы не отмечаются."""
+    cache, detector = make_detector()
+    values = np.full(WARMUP_POINTS - 1, 40.0)
+    values[-1] = 99.0
+    feed(cache, 1, values)
+
+    assert list(detector.recent()) == []
+
+
+def test_buffered_points_match_point_by_point_processing():
+    """Буфер из многих пакетов и точек серии даёт тот же результат, что и по точке."""
+    rng = np.random.default_rng(2)
+    values = np.append(50 + rng.normal(0, 1, (3, 60)), [[80.0], [50.0], [20.0]], axis=1)
+
+    cache_a, detector_a = make_detector()
+    for i in range(values.shape[1]):
+        for robot_id in range(3):
+            cache_a.ingest(robot_id, 10, mem_line(values[robot_id, i], START + i * 10))
+            detector_a.flush()
+
+    cache_b, detector_b = make_detector()
+    for robot_id in range(3):
+        lines = [mem_line(value, START + i * 10) for i, value in enumerate(values[robot_id])]
+        # Порядок строк в пакете не важен
+        cache_b.ingest(robot_id, 10, "\n".join(reversed(lines)))
+
+    assert list(detector_b.recent()) == list(detector_a.recent())
+    assert {(anomaly.robot_id, anomaly.value) for anomaly in detector_b.recent()} == {
+        (0, 80.0),
+        (2, 20.0),
+    }
+    np.testing.assert_allclose(detector_a._mean, detector_b._mean)
+    np.testing.assert_allclose(detector_a._var, detector_b._var)
+
+
+def test_robots_have_independent_baselines():
+    """База каждого робота своя; запись доступна с фильтром по роботу."""
+    cache, detector = make_detector()
+    feed(cache, 1, np.full(50, 20.0))
+    feed(cache, 2, np.full(50, 80.0))
+    feed(cache, 1, np.array([80.0]), start=START + 1000)
+    feed(cache, 2, np.array([80.0]), start=START + 1000)
+
+    assert [anomaly.robot_id for anomaly in detector.recent()] == [1]
+    assert list(detector.recent(2)) == []
+
+
+def test_forget_and_row_reuse_reset_state():
+    """Удалённый робот теряет аномалии, а его строку новый робот получает чистой."""
+    cache, detector = make_detector()
+    feed(cache, 1, np.append(np.full(50, 20.0), 80.0))
+    assert len(list(detector.recent(1))) == 1
+
+    cache.forget(1)
+    detector.forget(1)
+    assert list(detector.recent()) == []
+
+    # Строка робота 1 переиспользуется: прошлое среднее 20 не должно влиять
+    feed(cache, 2, np.full(WARMUP_POINTS + 5, 80.0))
+    assert list(detector.recent()) == []
+
+
+def test_seasonal_baseline_follows_daily_cycle():
+    """С базой по часу суток ежедневная смена уровня не считается аномалией."""
+    rng = np.random.default_rng(3)
+    day_start = START - START % 86400
+    times = day_start + np.arange(0, 2 * 86400, 60)
+    hours = (times // 3600) % 24
+    values = np.where(hours < 12, 20.0, 80.0) + rng.normal(0, 1, len(times))
+
+    def second_day_anomalies(seasonal: bool) -> int:
+        cache, detector = make_detector(seasonal=seasonal)
+        for timestamp, value in zip(times.tolist(), values.tolist(), strict=True):
+            cache.ingest(1, 10, mem_line(value, timestamp))
+        return sum(anomaly.time >= day_start + 86400 for anomaly in detector.recent())
+
+    assert second_day_anomalies(seasonal=False) > 0
+    assert second_day_anomalies(seasonal=True) == 0
+
+
+def test_untracked_metrics_are_ignored():
+    """Метрики вне списка наблюдения не заводят состояние."""
+    cache, detector = make_detector()
+    for i in range(50):
+        cache.ingest(1, 10, f"mem total={1024 if i < 49 else 10**9}i {(START + i) * 10**9}")
+
+    assert list(detector.recent()) == []
+    assert not detector.is_flagged(1, "mem.total")
+
+
+def test_cpu_load_spike_is_seen_in_idle():
+    """Всплеск загрузки CPU — провал `usage_idle`, который агент и присылает."""
+    cache, detector = make_detector()
+    for i in range(40):
+        idle = 5 if i == 39 else 90 + i % 2
+        cache.ingest(1, 10, f"cpu,cpu=cpu-total usage_idle={idle} {(START + i * 10) * 10**9}")
+
+    assert [(anomaly.metric, anomaly.value) for anomaly in detector.recent()] == [
+        ("cpu.usage_idle", 5.0)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_buffer_is_flushed_on_timer():
+    """Буфер разбирается фоновой задачей, не дожидаясь чтения результатов."""
+    cache = LiveMetricsCache()
+    detector = AnomalyDetector(cache, flush_interval=0.01)
+    cache.add_observer(detector.observe)
+    await detector.start()
+    try:
+        feed(cache, 1, np.append(np.full(WARMUP_POINTS + 5, 40.0), 95.0))
+        assert detector._pending
+        await asyncio.sleep(0.05)
+        assert not detector._pending
+        assert [anomaly.value for anomaly in detector._anomalies] == [95.0]
+    finally:
+        await detector.stop()
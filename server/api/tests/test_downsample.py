@@ -0,0 +1,75 @@
+"""
+Тесты прореживания временных рядов.
+"""
+
+import numpy as np
+
+from app.services.downsample import lttb, minmax_envelope
+
+
+def reference_lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> list[int]:
+    """Построчная реализация LTTB по описанию алгоритма."""
+    every = (len(x) - 2) / (threshold - 2)
+    a, selected = 0, [0]
+    for i in range(threshold - 2):
+        lo = int(i * every) + 1
+        hi = int((i + 1) * every) + 1
+        if i == threshold - 3:
+            cx, cy = x[-1], y[-1]
+        else:
+            next_hi = min(int((i + 2) * every) + 1, len(x))
+            cx, cy = x[hi:next_hi].mean(), y[hi:next_hi].mean()
+        best, best_area = lo, -1.0
+        for j in range(lo, hi):
+            area = abs((x[a] - cx) * (y[j] - y[a]) - (x[a] - x[j]) * (cy - y[a]))
+            if area > best_area:
+                best, best_area = j, area
+        a = best
+        selected.append(a)
+    return [*selected, len(x) - 1]
+
+
+def test_lttb_matches_reference():
+    """Векторная реализация выбирает те же точки, что построчная."""
+    rng = np.random.default_rng(7)
+    x = np.arange(5000) * 10.0
+    y = np.cumsum(rng.normal(size=5000))
+
+    assert lttb(x, y, 250).tolist() == reference_lttb(x, y, 250)
+
+
+def test_lttb_keeps_spikes_and_edges():
+    """Одиночный пик и крайние точки всегда попадают в результат."""
+    x = np.arange(10_000, dtype=np.float64)
+    y = np.zeros(10_000)
+    y[4321] = 100.0
+
+    selected = lttb(x, y, 100)
+
+    assert len(selected) == 100
+    assert selected[0] == 0 and selected[-1] == 9999
+    assert 4321 in selected
+    assert np.all(np.diff(selected) > 0)
+
+
+def test_lttb_small_inputs():
+    """Короткие ряды возвращаются целиком, малый порог — крайние точки."""
+    x = np.arange(5, dtype=np.float64)
+
+    assert lttb(x, x, 10).tolist() == [0, 1, 2, 3, 4]
+    assert lttb(x, x, 2).tolist() == [0, 4]
+    assert lttb(np.empty(0), np.empty(0), 10).tolist() == []
+
+
+def test_minmax_envelope_skips_empty_windows():
+    """Огибающая считается по непустым окнам, точки вне диапазона отброшены."""
+    times = np.array([0, 5, 12, 13, 40, 55])
+    values = np.array([1.0, 3.0, 2.0, 6.0, 7.0, 100.0])
+
+    envelope = minmax_envelope(times, values, start=0, step=10, windows=5)
+
+    assert envelope.starts.tolist() == [0, 10, 40]
+    assert envelope.mean.tolist() == [2.0, 4.0, 7.0]
+    assert envelope.min.tolist() == [1.0, 2.0, 7.0]
+    assert envelope.max.tolist() == [3.0, 6.0, 7.0]
+    assert minmax_envelope(times, values, start=100, step=10, windows=3).starts.size == 0
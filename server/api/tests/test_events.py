@@ -0,0 +1,84 @@
+"""
+Тесты шины событий роботов.
+"""
+
+from datetime import UTC, datetime
+from unittest.mock import patch
+
+from app.models import RobotStatus
+from app.services.events import RobotEventBus, RobotEventType
+
+
+def test_subscriber_receives_only_filtered_events():
+    """Подписчик получает только события, прошедшие его фильтр."""
+    bus = RobotEventBus()
+    queue = bus.subscribe(lambda event: event.owner_id == 1)
+
+    bus.publish_status(10, 1, RobotStatus.INACTIVE, RobotStatus.ACTIVE)
+    bus.publish_status(20, 2, RobotStatus.INACTIVE, RobotStatus.ACTIVE)
+
+    assert queue.qsize() == 1
+    event = queue.get_nowait()
+    assert event.robot_id == 10
+    assert event.type == RobotEventType.STATUS
+    assert event.to_dict()["status"] == "inactive"
+
+
+def test_unchanged_status_is_not_published():
+    """Публикация без фактической смены статуса игнорируется."""
+    bus = RobotEventBus()
+    queue = bus.subscribe(lambda _event: True)
+
+    bus.publish_status(10, 1, RobotStatus.ACTIVE, RobotStatus.ACTIVE)
+
+    assert queue.empty()
+
+
+def test_last_seen_is_throttled_per_robot():
+    """Отметки активности одного робота публикуются не чаще интервала."""
+    bus = RobotEventBus(last_seen_interval=60.0)
+    queue = bus.subscribe(lambda _event: True)
+    now = datetime.now(UTC)
+
+    bus.publish_last_seen(10, 1, now)
+    bus.publish_last_seen(10, 1, now)
+    bus.publish_last_seen(11, 1, now)
+
+    assert [queue.get_nowait().robot_id for _ in range(queue.qsize())] == [10, 11]
+
+
+def test_last_seen_throttle_forgets_stale_robots():
+    """Записи троттлинга старше интервала удаляются при публикации."""
+    bus = RobotEventBus(last_seen_interval=60.0)
+    now = datetime.now(UTC)
+
+    with patch("app.services.events.time.monotonic", side_effect=[0.0, 30.0, 70.0, 71.0]):
+        bus.publish_last_seen(10, 1, now)
+        bus.publish_last_seen(11, 1, now)
+        bus.publish_last_seen(12, 1, now)
+        bus.publish_last_seen(13, 1, now)
+
+    assert list(bus._last_seen_published) == [11, 12, 13]
+
+
+def test_slow_subscriber_gets_resync():
+    """Переполненная очередь подписчика заменяется событием resync."""
+    bus = RobotEventBus(queue_size=2)
+    queue = bus.subscribe(lambda _event: True)
+
+    for robot_id in range(3):
+        bus.publish_status(robot_id, 1, RobotStatus.INACTIVE, RobotStatus.ACTIVE)
+
+    assert queue.qsize() == 1
+    assert queue.get_nowait().type == RobotEventType.RESYNC
+
+
+def test_listener_receives_all_events():
+    """Внутренний слушатель получает события независимо от подписчиков."""
+    bus = RobotEventBus()
+    received = []
+    bus.add_listener(received.append)
+
+    bus.publish_paired(10, 1, datetime.now(UTC))
+
+    assert [event.type for event in received] == [RobotEventType.PAIRED]
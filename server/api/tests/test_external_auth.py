@@ -0,0 +1,189 @@
+"""
+Тесты создания учёток в Grafana и Superset.
+"""
+
+import asyncio
+import time
+from collections import Counter
+
+import httpx
+import pytest
+from jose import jwt
+
+from app.config import Settings
+from app.services.external_auth import (
+    SUPERSET_SESSION_REFRESH_MARGIN_SECONDS,
+    ExternalAuthService,
+)
+
+SETTINGS = Settings(grafana_url="http://grafana", superset_url="http://superset")
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeServices:
+    """Grafana и Superset в одном обработчике MockTransport."""
+
+    def __init__(self, token_ttl: float = 900) -> None:
+        self.calls: Counter[str] = Counter()
+        self.token_ttl = token_ttl
+        self.logins = 0
+        self.reject_next_create = False
+        self.created: list[dict] = []
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        key = f"{request.method} {request.url.host}{request.url.path}"
+        self.calls[key] += 1
+        path = request.url.path
+
+        if request.url.host == "grafana":
+            if path == "/api/admin/users":
+                return httpx.Response(200, json={"id": 100 + self.calls[key]})
+            return httpx.Response(200, json={})
+
+        if path == "/api/v1/security/login":
+            self.logins += 1
+            token = jwt.encode(
+                {"n": self.logins, "exp": int(time.time() + self.token_ttl)}, "k", "HS256"
+            )
+            return httpx.Response(200, json={"access_token": token})
+        if path == "/api/v1/security/csrf_token/":
+            return httpx.Response(200, json={"result": f"csrf-{self.logins}"})
+        if path == "/api/v1/security/roles/":
+            return httpx.Response(200, json={"result": [{"id": 9, "name": "Gamma"}]})
+        if path == "/api/v1/security/users/":
+            if self.reject_next_create:
+                self.reject_next_create = False
+                return httpx.Response(400, json={"errors": "The CSRF token has expired."})
+            assert request.headers["X-CSRFToken"] == f"csrf-{self.logins}"
+            self.created.append(
+                {"csrf": request.headers["X-CSRFToken"], "body": request.content.decode()}
+            )
+            return httpx.Response(201, json={"id": len(self.created)})
+        return httpx.Response(404)
+
+
+def make_service(fake: FakeServices, clock: Clock | None = None) -> ExternalAuthService:
+    return ExternalAuthService(
+        SETTINGS, transport=httpx.MockTransport(fake.handler), clock=clock or Clock()
+    )
+
+
+@pytest.mark.asyncio
+async def test_batch_provisioning_reuses_one_superset_session():
+    """Пачка пользователей — один вход, один CSRF и один список ролей."""
+    fake = FakeServices()
+    service = make_service(fake)
+    try:
+        results = await asyncio.gather(
+            *(service.provision_user(f"u{i}@test.local", "password", f"U{i}") for i in range(20))
+        )
+    finally:
+        await service.stop()
+
+    assert all(grafana and superset for grafana, superset in results)
+    assert fake.calls["POST superset/api/v1/security/login"] == 1
+    assert fake.calls["GET superset/api/v1/security/csrf_token/"] == 1
+    assert fake.calls["GET superset/api/v1/security/roles/"] == 1
+    assert fake.calls["POST grafana/api/admin/users"] == 20
+    assert fake.calls["PATCH grafana/api/orgs/1/users/101"] == 1
+    assert all('"roles":[9]' in c["body"].replace(" ", "") for c in fake.created)
+
+
+@pytest.mark.asyncio
+async def test_session_refreshed_before_token_expiry():
+    """Сессия обновляется, когда до истечения токена остаётся меньше запаса."""
+    fake = FakeServices(token_ttl=600)
+    clock = Clock()
+    service = make_service(fake, clock)
+    try:
+        await service.create_superset_user("a@test.local", "password", "A")
+        clock.now = 600 - SUPERSET_SESSION_REFRESH_MARGIN_SECONDS - 5
+        await service.create_superset_user("b@test.local", "password", "B")
+        assert fake.logins == 1
+
+        clock.now = 600
+        await service.create_superset_user("c@test.local", "password", "C")
+        assert fake.logins == 2
+        assert fake.calls["GET superset/api/v1/security/roles/"] == 1
+    finally:
+        await service.stop()
+
+
+@pytest.mark.asyncio
+async def test_expired_csrf_triggers_one_relogin_and_retry():
+    """Отклонённый CSRF сбрасывает сессию, запрос повторяется с новой."""
+    fake = FakeServices()
+    service = make_service(fake)
+    try:
+        await service.create_superset_user("a@test.local", "password", "A")
+        fake.reject_next_create = True
+
+        assert await service.create_superset_user("b@test.local", "password", "B") == 2
+        assert fake.logins == 2
+        assert fake.created[-1]["csrf"] == "csrf-2"
+    finally:
+        await service.stop()
+
+
+@pytest.mark.asyncio
+async def test_failed_login_returns_none():
+    """Без входа в Superset учётка не создаётся, Grafana не затронута."""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host == "grafana":
+            return httpx.Response(200, json={"id": 5})
+        return httpx.Response(401, json={"message": "bad credentials"})
+
+    service = ExternalAuthService(SETTINGS, transport=httpx.MockTransport(handler))
+    try:
+        assert await service.provision_user("a@test.local", "password", "A") == (5, None)
+    finally:
+        await service.stop()
+
+
+@pytest.mark.asyncio
+async def test_user_pages_mark_service_admins():
+    """Страницы пользователей разбираются; администраторы сервисов помечены."""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host == "grafana":
+            assert request.url.params["page"] == "2"
+            users = [
+                {"id": 1, "email": "admin@localhost", "login": "admin", "isAdmin": False},
+                {"id": 7, "email": "Bob@Test.local", "login": "bob", "isAdmin": False},
+            ]
+            return httpx.Response(200, json={"totalCount": 1002, "users": users})
+        if request.url.path == "/api/v1/security/users/":
+            assert "page:3,page_size:100" in request.url.params["q"]
+            users = [
+                {
+                    "id": 2,
+                    "email": "ops@test.local",
+                    "username": "ops",
+                    "roles": [{"name": "Admin"}],
+                },
+                {"id": 3, "email": "eve@test.local", "username": "eve", "roles": []},
+            ]
+            return httpx.Response(200, json={"count": 302, "result": users})
+        return FakeServices().handler(request)
+
+    service = ExternalAuthService(SETTINGS, transport=httpx.MockTransport(handler))
+    try:
+        grafana, grafana_total = await service.grafana_users_page(2, 1000)
+        superset, superset_total = await service.superset_users_page(3, 100)
+    finally:
+        await service.stop()
+
+    assert (grafana_total, superset_total) == (1002, 302)
+    assert [(a.id, a.email, a.admin) for a in grafana] == [
+        (1, "admin@localhost", True),
+        (7, "bob@test.local", False),
+    ]
+    assert [(a.login, a.admin) for a in superset] == [("ops", True), ("eve", False)]
@@ -0,0 +1,84 @@
+"""
+Тесты сводки по парку роботов.
+"""
+
+from datetime import UTC, datetime
+
+import pytest
+from fastapi import status
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Architecture, Robot, RobotStatus
+from app.services import fleet_summary
+from app.services.events import RobotEventBus
+from app.services.fleet_summary import FleetSummary, FleetSummaryCache
+
+
+@pytest.fixture
+def queries(monkeypatch) -> list[int | None]:
+    """Подменяет запрос сводки и записывает его вызовы."""
+    calls: list[int | None] = []
+
+    async def fake_query(_db, owner_id=None):
+        calls.append(owner_id)
+        return FleetSummary(total=len(calls))
+
+    monkeypatch.setattr(fleet_summary, "query_fleet_summary", fake_query)
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_cache_reuses_summary_per_scope(queries: list[int | None]):
+    """Повторный запрос в пределах TTL берётся из кэша отдельно для каждой области."""
+    cache = FleetSummaryCache(ttl_seconds=60)
+
+    await cache.get(None)
+    await cache.get(None)
+    await cache.get(None, owner_id=7)
+
+    assert queries == [None, 7]
+
+
+@pytest.mark.asyncio
+async def test_status_event_invalidates_cache(queries: list[int | None]):
+    """Смена статуса робота сбрасывает кэш, отметка активности — нет."""
+    bus = RobotEventBus(last_seen_interval=0)
+    cache = FleetSummaryCache(ttl_seconds=60)
+    bus.add_listener(cache.on_event)
+
+    first = await cache.get(None)
+    bus.publish_last_seen(1, None, datetime.now(UTC))
+    assert await cache.get(None) is first
+
+    bus.publish_status(1, None, RobotStatus.INACTIVE, RobotStatus.ACTIVE)
+    assert (await cache.get(None)).total == 2
+    assert len(queries) == 2
+
+
+@pytest.mark.asyncio
+async def test_summary_endpoint(client: AsyncClient, db_session: AsyncSession):
+    """Сводка считает роботов по статусам и архитектурам."""
+    fleet_summary.fleet_summary_cache.invalidate()
+    db_session.add_all(
+        [
+            Robot(name="s1", hostname="s1", status=RobotStatus.ACTIVE),
+            Robot(name="s2", hostname="s2", status=RobotStatus.ACTIVE),
+            Robot(
+                name="s3",
+                hostname="s3",
+                status=RobotStatus.ERROR,
+                architecture=Architecture.AMD64,
+            ),
+        ]
+    )
+    await db_session.commit()
+
+    response = await client.get("/api/robots/summary")
+
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["total"] == 3
+    assert data["by_status"] == {"pending": 0, "active": 2, "inactive": 0, "error": 1}
+    assert data["by_architecture"] == {"arm64": 2, "amd64": 1, "armhf": 0}
+    assert data["by_owner"] == [{"owner_id": None, "count": 3}]
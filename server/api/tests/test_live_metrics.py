@@ -0,0 +1,165 @@
+"""
+Тесты разбора Line Protocol и кэша последних значений метрик.
+"""
+
+import numpy as np
+
+from app.services.line_protocol import parse_line, parse_lines, set_tag
+from app.services.live_metrics import LiveMetricsCache
+
+BATCH = """\
+cpu,cpu=cpu0,robot=r1 usage_active=90.5 1700000000000000000
+cpu,cpu=cpu-total,robot=r1 usage_active=42.5,usage_idle=57.5 1700000000000000000
+mem,robot=r1 used_percent=61.2,available=1024i 1700000000000000000
+disk,path=/boot,robot=r1 used_percent=80 1700000000000000000
+disk,path=/,robot=r1 used_percent=33.3 1700000000000000000
+net,interface=eth0 bytes_recv=100i 1700000000000000000
+"""
+
+
+def test_parse_line_handles_escapes_and_types():
+    """Экранирование, кавычки и типы полей разбираются по спецификации."""
+    point = parse_line(
+        r'my\ measurement,tag\,key=a\ b value=1.5,count=3i,flag=true,msg="x, y z" 123'
+    )
+
+    assert point is not None
+    assert point.measurement == "my measurement"
+    assert point.tags == {"tag,key": "a b"}
+    assert point.fields == {"value": 1.5, "count": 3.0}
+    assert point.timestamp_ns == 123
+
+
+def test_parse_line_rejects_malformed():
+    """Комментарии и некорректные строки пропускаются."""
+    assert parse_line("# comment") is None
+    assert parse_line("cpu") is None
+    assert parse_line("cpu usage") is None
+    assert parse_line("cpu usage=1 not-a-time") is None
+
+
+def test_parse_lines_filters_measurements():
+    """Фильтр по измерениям отбрасывает лишние строки до разбора."""
+    points = list(parse_lines(BATCH, {"mem"}))
+
+    assert [point.measurement for point in points] == ["mem"]
+
+
+def test_set_tag_replaces_sender_value():
+    """Тег проставляется каждой строке, присланное значение заменяется."""
+    body = (
+        "# comment\n"
+        "cpu,robot_id=7,cpu=cpu-total usage_idle=50 1\n"
+        r"my\ disk,path=/a\ b used=1i"
+        "\n"
+        "mem used_percent=40"
+    )
+
+    assert set_tag(body, "robot_id", "42").splitlines() == [
+        "# comment",
+        "cpu,cpu=cpu-total,robot_id=42 usage_idle=50 1",
+        r"my\ disk,path=/a\ b,robot_id=42 used=1i",
+        "mem,robot_id=42 used_percent=40",
+    ]
+    assert parse_line(set_tag("cpu,robot_id=7 usage_idle=1", "robot_id", "42")).tags == {
+        "robot_id": "42"
+    }
+
+
+def test_ingest_keeps_canonical_series():
+    """Для CPU и диска хранятся только суммарная серия и корневой раздел."""
+    cache = LiveMetricsCache()
+    updated = cache.ingest(1, 10, BATCH)
+
+    assert updated == 5
+    updated_at, values = cache.get(1)
+    assert updated_at == 1_700_000_000
+    assert values["cpu.usage_idle"] == (57.5, 1_700_000_000)
+    assert values["disk.used_percent"][0] == 33.3
+    assert values["mem.available"][0] == 1024
+    assert "net.bytes_recv" not in values
+    assert cache.owner_of(1) == 10
+
+
+def test_ingest_ignores_older_points():
+    """Запоздавшая точка не затирает более свежее значение."""
+    cache = LiveMetricsCache()
+    cache.ingest(1, None, "mem used_percent=50 2000000000000000000")
+    cache.ingest(1, None, "mem used_percent=10 1000000000000000000")
+
+    _, values = cache.get(1, ["mem.used_percent"])
+    assert values["mem.used_percent"][0] == 50
+    assert cache.owner_of(1) is None
+
+
+def test_ingest_without_timestamp_uses_received_at():
+    """Точка без времени получает время приёма."""
+    cache = LiveMetricsCache()
+    cache.ingest(1, 10, "system load1=0.5", received_at=1234.0)
+
+    assert cache.get(1) == (1234.0, {"system.load1": (0.5, 1234.0)})
+
+
+def test_cache_grows_and_reuses_rows():
+    """Массивы расширяются, а строки удалённых роботов переиспользуются."""
+    cache = LiveMetricsCache(initial_robots=2, initial_metrics=2)
+    for robot_id in range(5):
+        cache.ingest(robot_id, 10, f"mem used_percent={robot_id},free={robot_id}i,total=8i 1")
+
+    assert len(cache) == 5
+    assert cache.get(4)[1]["mem.total"][0] == 8
+
+    cache.forget(2)
+    assert 2 not in cache
+    assert cache.get(2) is None
+    cache.ingest(7, 11, "mem used_percent=70 1")
+    assert len(cache) == 5
+    assert cache.get(7)[1] == {"mem.used_percent": (70.0, 1e-9)}
+
+
+def test_column_slices_metric_across_robots():
+    """Колонка метрики — значения всех роботов с их владельцами."""
+    cache = LiveMetricsCache()
+    cache.ingest(1, 10, "mem used_percent=10 1")
+    cache.ingest(2, 20, "mem used_percent=20 1")
+    cache.ingest(3, 20, "swap used_percent=5 1")
+
+    column = cache.column("mem.used_percent")
+    present = ~np.isnan(column.values)
+    assert column.robot_ids[present].tolist() == [1, 2]
+    assert column.owner_ids[present].tolist() == [10, 20]
+    assert column.values[present].tolist() == [10.0, 20.0]
+    assert cache.column("unknown") is None
+
+
+def test_top_orders_and_filters():
+    """Выборка учитывает направление, владельца и устаревшие значения."""
+    cache = LiveMetricsCache()
+    for robot_id, (owner, value, timestamp) in enumerate(
+        [(10, 50, 100), (10, 90, 100), (20, 70, 100), (10, 99, 10), (10, 5, 100)], start=1
+    ):
+        cache.ingest(robot_id, owner, f"mem used_percent={value} {timestamp * 1_000_000_000}")
+
+    assert [entry[0] for entry in cache.top("mem.used_percent", 3)] == [4, 2, 3]
+    assert [entry[0] for entry in cache.top("mem.used_percent", 2, largest=False)] == [5, 1]
+    assert cache.top("mem.used_percent", 2, owner_id=10, since=50) == [
+        (2, 90.0, 100.0),
+        (1, 50.0, 100.0),
+    ]
+    assert cache.top("mem.used_percent", 10, owner_id=30) == []
+    assert cache.top("unknown", 10) == []
+
+
+def test_top_over_10k_robots():
+    """Выборка по парку из 10 тысяч роботов отдаёт N лучших роботов владельца."""
+    cache = LiveMetricsCache()
+    rng = np.random.default_rng(42)
+    values = rng.uniform(0, 100, 10_000)
+    for robot_id, value in enumerate(values):
+        cache.ingest(robot_id, robot_id % 50, f"cpu,cpu=cpu-total usage_idle={value} 1")
+
+    top = cache.top("cpu.usage_idle", 20, owner_id=7)
+
+    expected = sorted(values[7::50], reverse=True)[:20]
+    assert [entry[1] for entry in top] == expected
+    assert all(entry[0] % 50 == 7 for entry in top)
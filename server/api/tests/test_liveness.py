@@ -0,0 +1,71 @@
+"""
+Тесты timing wheel для отслеживания активности роботов.
+"""
+
+from app.services.liveness import TimingWheel
+
+
+def test_wheel_fires_exactly_on_deadline():
+    """Таймер срабатывает ровно на своём тике."""
+    wheel = TimingWheel(slots=8, levels=3)
+    wheel.schedule(1, 5)
+
+    assert wheel.advance(4) == []
+    assert wheel.advance(5) == [1]
+    assert 1 not in wheel
+
+
+def test_wheel_cascades_from_upper_levels():
+    """Дальние дедлайны каскадно спускаются с верхних уровней без потери точности."""
+    wheel = TimingWheel(slots=8, levels=3)
+    deadlines = dict(enumerate([9, 63, 64, 65, 100, 511]))
+    for key, deadline in deadlines.items():
+        wheel.schedule(key, deadline)
+
+    fired: dict[int, int] = {}
+    for tick in range(1, 520):
+        for key in wheel.advance(tick):
+            fired[key] = tick
+
+    assert fired == deadlines
+    assert len(wheel) == 0
+
+
+def test_wheel_reschedule_moves_deadline():
+    """Повторная постановка переносит дедлайн, а не дублирует таймер."""
+    wheel = TimingWheel(slots=8, levels=3)
+    wheel.schedule(1, 10)
+    wheel.advance(8)
+    wheel.schedule(1, 20)
+
+    assert wheel.advance(19) == []
+    assert wheel.advance(20) == [1]
+
+
+def test_wheel_cancel():
+    """Отменённый таймер не срабатывает."""
+    wheel = TimingWheel(slots=8, levels=3)
+    wheel.schedule(1, 3)
+
+    assert wheel.cancel(1) is True
+    assert wheel.cancel(1) is False
+    assert wheel.advance(10) == []
+
+
+def test_wheel_past_deadline_fires_on_next_tick():
+    """Дедлайн в прошлом срабатывает на ближайшем тике."""
+    wheel = TimingWheel(slots=8, levels=3)
+    wheel.advance(100)
+    wheel.schedule(1, 50)
+
+    assert wheel.advance(101) == [1]
+
+
+def test_wheel_beyond_range_is_clamped():
+    """Дедлайн дальше диапазона колеса срабатывает вовремя после повторных каскадов."""
+    wheel = TimingWheel(slots=4, levels=2)
+    wheel.schedule(1, 50)
+
+    fired = [tick for tick in range(1, 60) if wheel.advance(tick)]
+
+    assert fired == [50]
@@ -3,28 +3,13 @@
 """
 
 import uuid
-from unittest.mock import AsyncMock, patch
 
 import pytest
 from fastapi import status
 from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
 
-
-@pytest.fixture
-def mock_influxdb():
-    """Мок для InfluxDB запросов."""
-    with patch("app.routers.metrics.httpx.AsyncClient") as mock:
-        mock_response = AsyncMock()
-        mock_response.status_code = 204
-        mock_response.text = ""
-
-        mock_client = AsyncMock()
-        mock_client.post.return_value = mock_response
-        mock_client.__aenter__.return_value = mock_client
-        mock_client.__aexit__.return_value = None
-
-        mock.return_value = mock_client
-        yield mock
+from app.services.alerts import alert_engine
 
 
 @pytest.fixture
@@ -227,3 +212,160 @@ mem_usage,robot=test value=70.0 1234567890000000000"""
     )
 
     assert response.status_code == status.HTTP_204_NO_CONTENT
+
+
+@pytest.mark.asyncio
+async def test_metrics_are_tagged_with_robot_id(client: AsyncClient, mock_influxdb):
+    """В InfluxDB уходит тег id робота из токена, а не присланный роботом."""
+    pair_code = "TAGS1234"
+    reg_response = await client.post(
+        "/api/pair", json={"hostname": "test-robot-tags", "pair_code": pair_code}
+    )
+    robot_id = reg_response.json()["robot_id"]
+    confirm_response = await client.post(f"/api/pair/{pair_code}/confirm")
+    token = confirm_response.json()["influxdb_token"]
+
+    response = await client.post(
+        "/api/metrics",
+        content="cpu,robot_id=1,cpu=cpu-total usage_idle=87.5 1700000000000000000",
+        headers={"Authorization": f"Bearer {token}", "Content-Type": "text/plain"},
+    )
+
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    sent = mock_influxdb.return_value.post.call_args.kwargs["content"].decode()
+    assert sent == f"cpu,cpu=cpu-total,robot_id={robot_id} usage_idle=87.5 1700000000000000000"
+
+
+@pytest.mark.asyncio
+async def test_metrics_feed_live_cache(client: AsyncClient, mock_influxdb):  # noqa: ARG001
+    """Принятые метрики сразу видны в /live без запроса к InfluxDB."""
+    pair_code = "LIVE1234"
+    reg_response = await client.post(
+        "/api/pair", json={"hostname": "test-robot-live", "pair_code": pair_code}
+    )
+    robot_id = reg_response.json()["robot_id"]
+    confirm_response = await client.post(f"/api/pair/{pair_code}/confirm")
+    token = confirm_response.json()["influxdb_token"]
+
+    await client.post(
+        "/api/metrics",
+        content="cpu,cpu=cpu-total usage_idle=87.5 1700000000000000000\nmem used_percent=40",
+        headers={"Authorization": f"Bearer {token}", "Content-Type": "text/plain"},
+    )
+
+    response = await client.get(f"/api/robots/{robot_id}/live")
+    assert response.status_code == status.HTTP_200_OK
+    metrics = response.json()["metrics"]
+    assert metrics["cpu.usage_idle"]["value"] == 87.5
+    assert metrics["mem.used_percent"]["value"] == 40
+
+    response = await client.get(
+        "/api/robots/live", params={"ids": [robot_id, 999_999], "metrics": "mem.used_percent"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    robots = response.json()["robots"]
+    assert [robot["robot_id"] for robot in robots] == [robot_id]
+    assert list(robots[0]["metrics"]) == ["mem.used_percent"]
+
+
+@pytest.mark.asyncio
+async def test_metrics_anomalies(client: AsyncClient, mock_influxdb):  # noqa: ARG001
+    """Выброс в принятых метриках появляется в /anomalies."""
+    pair_code = "ANOM1234"
+    reg_response = await client.post(
+        "/api/pair", json={"hostname": "test-robot-anomaly", "pair_code": pair_code}
+    )
+    robot_id = reg_response.json()["robot_id"]
+    confirm_response = await client.post(f"/api/pair/{pair_code}/confirm")
+    token = confirm_response.json()["influxdb_token"]
+
+    lines = [f"mem used_percent={40 + i % 2} {(1_700_000_000 + i * 10) * 10**9}" for i in range(40)]
+    lines.append(f"mem used_percent=95 {(1_700_000_000 + 400) * 10**9}")
+    await client.post(
+        "/api/metrics",
+        content="\n".join(lines),
+        headers={"Authorization": f"Bearer {token}", "Content-Type": "text/plain"},
+    )
+
+    response = await client.get("/api/robots/anomalies", params={"robot_id": robot_id})
+    assert response.status_code == status.HTTP_200_OK
+    anomalies = response.json()["anomalies"]
+    assert len(anomalies) == 1
+    assert anomalies[0]["metric"] == "mem.used_percent"
+    assert anomalies[0]["value"] == 95
+    assert anomalies[0]["zscore"] > 4
+
+
+@pytest.mark.asyncio
+async def test_alert_rule_crud_and_firing(
+    client: AsyncClient,
+    db_session: AsyncSession,
+    mock_influxdb,  # noqa: ARG001
+):
+    """Созданное правило срабатывает по принятым метрикам и удаляется."""
+    pair_code = "ALRT1234"
+    reg_response = await client.post(
+        "/api/pair", json={"hostname": "test-robot-alert", "pair_code": pair_code}
+    )
+    robot_id = reg_response.json()["robot_id"]
+    confirm_response = await client.post(f"/api/pair/{pair_code}/confirm")
+    token = confirm_response.json()["influxdb_token"]
+
+    response = await client.post(
+        "/api/alerts/rules",
+        json={
+            "name": "CPU",
+            "metric": "cpu.usage_active",
+            "condition": "gt",
+            "threshold": 90,
+            "scope": "robot",
+            "robot_id": robot_id,
+        },
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    rule_id = response.json()["id"]
+
+    await client.post(
+        "/api/metrics",
+        content="cpu,cpu=cpu-total usage_active=97",
+        headers={"Authorization": f"Bearer {token}", "Content-Type": "text/plain"},
+    )
+    await alert_engine.checkpoint(db_session)
+
+    response = await client.get("/api/alerts")
+    alerts = [alert for alert in response.json()["alerts"] if alert["rule_id"] == rule_id]
+    assert [(alert["robot_id"], alert["status"]) for alert in alerts] == [(robot_id, "firing")]
+
+    response = await client.patch(f"/api/alerts/rules/{rule_id}", json={"enabled": False})
+    assert response.json()["enabled"] is False
+    response = await client.get("/api/alerts")
+    assert all(alert["rule_id"] != rule_id for alert in response.json()["alerts"])
+
+    response = await client.delete(f"/api/alerts/rules/{rule_id}")
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    response = await client.get("/api/alerts/rules")
+    assert all(rule["id"] != rule_id for rule in response.json()["rules"])
+
+
+@pytest.mark.asyncio
+async def test_top_robots_by_metric(client: AsyncClient, mock_influxdb):  # noqa: ARG001
+    """Робот с новыми метриками попадает в выборку /top."""
+    pair_code = "TOP12345"
+    reg_response = await client.post(
+        "/api/pair", json={"hostname": "test-robot-top", "pair_code": pair_code}
+    )
+    robot_id = reg_response.json()["robot_id"]
+    confirm_response = await client.post(f"/api/pair/{pair_code}/confirm")
+    token = confirm_response.json()["influxdb_token"]
+
+    await client.post(
+        "/api/metrics",
+        content="cpu,cpu=cpu-total usage_idle=-1000",
+        headers={"Authorization": f"Bearer {token}", "Content-Type": "text/plain"},
+    )
+
+    response = await client.get(
+        "/api/robots/top", params={"metric": "cpu.usage_idle", "n": 1, "order": "lowest"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["robots"][0]["robot_id"] == robot_id
@@ -0,0 +1,201 @@
+"""
+Тесты потоковой выгрузки истории метрик.
+"""
+
+import io
+from datetime import UTC, datetime
+from unittest.mock import patch
+
+import pyarrow.parquet as pq
+import pytest
+from fastapi import status
+from httpx import AsyncClient
+
+from app.services.metrics_export import (
+    EXPORT_CHUNK_SECONDS,
+    EXPORT_SCHEMA,
+    encode_csv,
+    encode_parquet,
+    export_chunks,
+    flux_time_ns,
+    parse_export_chunk,
+    parse_next_point,
+)
+
+HOUR_NS = EXPORT_CHUNK_SECONDS * 1_000_000_000
+HEADER = (
+    b",result,table,_start,_stop,_time,_value,_field,_measurement,cpu,hostname,robot,robot_id\r\n"
+)
+
+
+def chunk_csv(start_ns: int) -> bytes:
+    """Ответ InfluxDB с двумя сериями: CPU с тегом и память без тегов."""
+    second = datetime.fromtimestamp(start_ns // 1_000_000_000, UTC).strftime("%Y-%m-%dT%H:%M:%S")
+    return (
+        HEADER
+        + f",_result,0,a,b,{second}.5Z,99.5,usage_idle,cpu,cpu0,h,r,7\r\n".encode()
+        + b"\r\n"
+        + b",result,table,_start,_stop,_time,_value,_field,_measurement,hostname,robot,robot_id\r\n"
+        + f",_result,1,a,b,{second}Z,40,used_percent,mem,h,r,7\r\n".encode()
+    )
+
+
+async def collect(chunks) -> list:
+    return [chunk async for chunk in chunks]
+
+
+def test_parse_export_chunk_flattens_series():
+    """Серии сливаются в одну таблицу по времени, теги — в строку."""
+    table = parse_export_chunk(chunk_csv(0))
+
+    assert table.schema == EXPORT_SCHEMA
+    assert table.to_pydict()["measurement"] == ["mem", "cpu"]
+    assert table.to_pydict()["tags"] == ["", "cpu=cpu0"]
+    assert table.to_pydict()["value"] == [40.0, 99.5]
+    assert parse_export_chunk(b"\r\n").num_rows == 0
+
+
+def test_parse_export_chunk_separates_series_under_one_header():
+    """Серии с одной схемой под общим заголовком различаются по колонке table."""
+    data = (
+        HEADER
+        + b",_result,0,a,b,2024-01-01T00:00:00Z,10,usage_idle,cpu,cpu0,h,r,7\r\n"
+        + b",_result,1,a,b,2024-01-01T00:00:01Z,20,usage_idle,cpu,cpu-total,h,r,7\r\n"
+        + b",_result,0,a,b,2024-01-01T00:00:02Z,30,usage_idle,cpu,cpu0,h,r,7\r\n"
+    )
+
+    table = parse_export_chunk(data)
+
+    assert table.to_pydict()["tags"] == ["cpu=cpu0", "cpu=cpu-total", "cpu=cpu0"]
+    assert table.to_pydict()["value"] == [10.0, 20.0, 30.0]
+
+
+def test_flux_time_ns_keeps_nanoseconds():
+    """Границы окна передаются в Flux с наносекундами."""
+    assert flux_time_ns(1_704_067_200_000_000_005) == "2024-01-01T00:00:00.000000005Z"
+
+
+def point_csv(time_ns: int) -> bytes:
+    """Ответ на поиск следующей точки."""
+    seconds, nanos = divmod(time_ns, 1_000_000_000)
+    second = datetime.fromtimestamp(seconds, UTC).strftime("%Y-%m-%dT%H:%M:%S")
+    return f",result,table,_time\r\n,_result,0,{second}.{nanos:09d}Z\r\n".encode()
+
+
+def test_parse_next_point_keeps_nanoseconds():
+    """Время следующей точки разбирается с наносекундами; пустой ответ — точек нет."""
+    assert parse_next_point(point_csv(5 * HOUR_NS + 7)) == 5 * HOUR_NS + 7
+    assert parse_next_point(b"\r\n") is None
+
+
+@pytest.mark.asyncio
+async def test_export_chunks_are_aligned_and_seek_over_gaps():
+    """Окна выровнены по длине окна; после пустого окна — переход к следующей точке."""
+    queries: list[str] = []
+    data_hours = {0, 1, 1000}
+
+    async def fake_run_query(query: str) -> bytes:
+        queries.append(query)
+        start_ns = (
+            int(
+                datetime.fromisoformat(query.split("start: ")[1][:19])
+                .replace(tzinfo=UTC)
+                .timestamp()
+            )
+            * 1_000_000_000
+        )
+        hour = start_ns // HOUR_NS
+        if "first()" in query:
+            later = [h for h in sorted(data_hours) if h >= hour]
+            return point_csv(later[0] * HOUR_NS + 42) if later else b""
+        return chunk_csv(hour * HOUR_NS) if hour in data_hours else b""
+
+    start = HOUR_NS // 2
+    with patch("app.services.metrics_export.run_query", fake_run_query):
+        tables = await collect(export_chunks(7, start, 2000 * HOUR_NS))
+
+    assert f"start: {flux_time_ns(start)}, stop: {flux_time_ns(HOUR_NS)}" in queries[0]
+    assert f"start: {flux_time_ns(HOUR_NS)}, stop: {flux_time_ns(2 * HOUR_NS)}" in queries[1]
+    assert len(tables) == 3
+    # Два окна с данными, пустое, поиск, окно 1000, пустое, поиск без результата
+    assert len(queries) == 7
+    assert all('r.robot_id == "7"' in query for query in queries)
+    assert f"start: {flux_time_ns(1000 * HOUR_NS)}" in queries[4]
+
+
+@pytest.mark.asyncio
+async def test_encoders_stream_chunks():
+    """CSV с одним заголовком, Parquet — по группе строк на окно."""
+
+    async def tables():
+        for hour in range(3):
+            yield parse_export_chunk(chunk_csv(hour * HOUR_NS))
+
+    csv_parts = await collect(encode_csv(tables()))
+    assert len(csv_parts) == 3
+    assert b"".join(csv_parts).count(b'"time"') == 1
+    assert b"".join(csv_parts).count(b"\n") == 7
+
+    parquet = pq.ParquetFile(io.BytesIO(b"".join(await collect(encode_parquet(tables())))))
+    assert parquet.metadata.num_row_groups == 3
+    assert parquet.metadata.num_rows == 6
+
+
+@pytest.mark.asyncio
+async def test_empty_export_is_valid():
+    """Пустая выгрузка — заголовок CSV или пустой файл Parquet."""
+
+    async def nothing():
+        return
+        yield
+
+    assert b"".join(await collect(encode_csv(nothing()))).startswith(b'"time","measurement"')
+    parquet = pq.read_table(io.BytesIO(b"".join(await collect(encode_parquet(nothing())))))
+    assert parquet.num_rows == 0
+
+
+@pytest.mark.asyncio
+async def test_export_endpoint(client: AsyncClient):
+    """Выгрузка отдаётся потоком с именем файла; пустой интервал отклоняется."""
+    pair_code = "EXPT1234"
+    reg_response = await client.post(
+        "/api/pair", json={"hostname": "test-robot-export", "pair_code": pair_code}
+    )
+    robot_id = reg_response.json()["robot_id"]
+
+    async def fake_run_query(query: str) -> bytes:  # noqa: ARG001
+        return chunk_csv(0)
+
+    params = {"from": "2024-01-01T00:00:00Z", "to": "2024-01-01T03:00:00Z"}
+    with patch("app.services.metrics_export.run_query", fake_run_query):
+        response = await client.get(
+            f"/api/robots/{robot_id}/export", params={**params, "format": "parquet"}
+        )
+    assert response.status_code == status.HTTP_200_OK
+    assert "attachment" in response.headers["content-disposition"]
+    assert pq.read_table(io.BytesIO(response.content)).num_rows == 6
+
+    response = await client.get(
+        f"/api/robots/{robot_id}/export", params={"from": params["to"], "to": params["from"]}
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    queries: list[str] = []
+
+    async def recording_run_query(query: str) -> bytes:
+        queries.append(query)
+        return b""
+
+    with patch("app.services.metrics_export.run_query", recording_run_query):
+        response = await client.get(
+            f"/api/robots/{robot_id}/export",
+            params={"from_ns": 1_704_067_200_000_000_005, "to": params["to"]},
+        )
+    assert response.status_code == status.HTTP_200_OK
+    assert "start: 2024-01-01T00:00:00.000000005Z" in queries[0]
+    assert all(f'r.robot_id == "{robot_id}"' in query for query in queries)
+    # Пустое начало: одно окно и один поиск следующей точки
+    assert len(queries) == 2
+
+    response = await client.get(f"/api/robots/{robot_id}/export", params={**params, "from_ns": 0})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
@@ -0,0 +1,275 @@
+"""
+Тесты запросов истории метрик и кэша закрытых окон.
+"""
+
+from unittest.mock import patch
+
+import numpy as np
+import pyarrow as pa
+import pytest
+from fastapi import status
+from httpx import AsyncClient
+
+from app.services.arrow_format import (
+    ARROW_STREAM_MEDIA_TYPE,
+    accepts_arrow,
+    series_table,
+    to_ipc_stream,
+)
+from app.services.metrics_query import (
+    SETTLE_SECONDS,
+    MetricsQueryCache,
+    SeriesColumns,
+    align_window,
+    build_flux,
+    choose_step,
+    parse_csv,
+    parse_csv_columns,
+    parse_duration,
+)
+
+STEP = 60
+
+
+class FakeInflux:
+    """Отдаёт значение, равное началу окна, и запоминает запрошенные диапазоны."""
+
+    def __init__(self) -> None:
+        self.calls: list[tuple[int, int]] = []
+
+    async def __call__(self, robot_id, measurement, field_name, start, stop, step):  # noqa: ARG002
+        self.calls.append((start, stop))
+        return {t: float(t) for t in range(start, stop, step)}
+
+
+def test_parse_duration_and_step():
+    """Длительности разбираются, шаг округляется до «круглого»."""
+    assert parse_duration("90s") == 90
+    assert parse_duration("24h") == 86400
+    with pytest.raises(ValueError):
+        parse_duration("0m")
+    with pytest.raises(ValueError):
+        parse_duration("1w")
+
+    assert choose_step(3600, 300) == 30
+    assert choose_step(7 * 86400, 300) == 3600
+    assert choose_step(90 * 86400, 10) == 9 * 86400
+
+
+def test_align_window_is_step_aligned():
+    """Границы лежат на сетке шага, последнее окно содержит текущий момент."""
+    start, end = align_window(3600, STEP, 10_000.5)
+
+    assert (start % STEP, end % STEP) == (0, 0)
+    assert end - start == 3600
+    assert end - STEP <= 10_000.5 < end
+
+
+def test_build_flux_filters_robot_and_canonical_series():
+    """Точки выбираются по тегу id робота, у CPU — суммарная серия."""
+    query = build_flux(42, "cpu", "usage_idle", 0, 600, STEP)
+
+    assert 'r.robot_id == "42"' in query
+    assert "hostname" not in query
+    assert 'r["cpu"] == "cpu-total"' in query
+    assert "aggregateWindow(every: 60s" in query
+
+
+def test_parse_csv_reads_all_tables():
+    """Разбираются все таблицы ответа, пустые значения пропускаются."""
+    text = (
+        ",result,table,_time,_value\r\n"
+        ",_result,0,1970-01-01T00:01:00Z,1.5\r\n"
+        ",_result,0,1970-01-01T00:02:00Z,\r\n"
+        "\r\n"
+        ",result,table,_time,_value\r\n"
+        ",_result,1,1970-01-01T00:03:00Z,2\r\n"
+    )
+
+    assert parse_csv(text) == {60: 1.5, 180: 2.0}
+
+
+def test_parse_csv_columns_keeps_nanoseconds():
+    """Исходные точки разбираются в колонки с наносекундной точностью."""
+    text = ",result,table,_time,_value\r\n,_result,0,1970-01-01T00:00:01.000000005Z,3\r\n"
+
+    times, values = parse_csv_columns(text)
+
+    assert times.tolist() == [1_000_000_005]
+    assert values.tolist() == [3.0]
+
+
+def test_parse_csv_columns_empty_response():
+    """Пустой ответ InfluxDB — пустые колонки."""
+    times, values = parse_csv_columns(b"\r\n")
+
+    assert times.size == 0 and values.size == 0
+
+
+def test_accepts_arrow():
+    """Поток Arrow выбирается только по явному типу в Accept."""
+    assert accepts_arrow(f"{ARROW_STREAM_MEDIA_TYPE}, application/json;q=0.5")
+    assert not accepts_arrow("application/json")
+    assert not accepts_arrow("*/*")
+    assert not accepts_arrow(None)
+
+
+def test_series_table_roundtrip():
+    """Колонки переживают IPC-поток, NaN становится null, метаданные сохраняются."""
+    columns = SeriesColumns(
+        times=np.array([0, 60_000_000_000]),
+        values=np.array([1.5, np.nan]),
+        min=np.array([1.0, 2.0]),
+        max=np.array([2.0, 3.0]),
+    )
+
+    data = to_ipc_stream(series_table(columns, {"step": "60"}))
+    table = pa.ipc.open_stream(data).read_all()
+
+    assert table.column_names == ["time", "value", "min", "max"]
+    assert table.schema.field("time").type == pa.timestamp("ns", tz="UTC")
+    assert table["value"].to_pylist() == [1.5, None]
+    assert table.schema.metadata == {b"step": b"60"}
+
+
+def test_build_flux_without_step_returns_raw_points():
+    """Без шага запрос отдаёт исходные точки, последние по времени."""
+    query = build_flux(1, "mem", "used_percent", 0, 600, None)
+
+    assert "aggregateWindow" not in query
+    assert "tail(n:" in query
+
+
+@pytest.mark.asyncio
+async def test_closed_buckets_are_served_from_cache():
+    """Повторный запрос догружает только открытый хвост."""
+    influx = FakeInflux()
+    cache = MetricsQueryCache(fetch=influx)
+    now = 100 * STEP + 30
+    start, end = align_window(3600, STEP, now)
+
+    first = await cache.query(1, "cpu", "usage_active", start, end, STEP, now)
+    assert influx.calls == [(start, end)]
+    assert first == [(t, float(t)) for t in range(start, end, STEP)]
+
+    closed_until = (now - SETTLE_SECONDS) // STEP * STEP
+    now += 2 * STEP
+    start, end = align_window(3600, STEP, now)
+    second = await cache.query(1, "cpu", "usage_active", start, end, STEP, now)
+
+    assert influx.calls[1] == (closed_until, end)
+    assert second == [(t, float(t)) for t in range(start, end, STEP)]
+
+
+@pytest.mark.asyncio
+async def test_cache_keys_and_eviction():
+    """Серии разделены по шагу и роботу, старые вытесняются."""
+    influx = FakeInflux()
+    cache = MetricsQueryCache(fetch=influx, max_series=2)
+    now = 1000 * STEP
+
+    for robot_id in (1, 2, 3):
+        await cache.query(robot_id, "mem", "used_percent", 0, 600, STEP, now)
+    assert len(cache) == 2
+
+    await cache.query(1, "mem", "used_percent", 0, 600, STEP, now)
+    assert influx.calls[-1] == (0, 600)
+
+    cache.forget(1)
+    assert len(cache) == 1
+
+
+@pytest.mark.asyncio
+async def test_robot_metrics_endpoint(client: AsyncClient):
+    """Эндпоинт истории проверяет параметры и отдаёт точки по окнам."""
+    pair_code = "HIST1234"
+    reg_response = await client.post(
+        "/api/pair", json={"hostname": "test-robot-history", "pair_code": pair_code}
+    )
+    robot_id = reg_response.json()["robot_id"]
+
+    influx = FakeInflux()
+    with patch("app.services.metrics_query.metrics_query_cache", MetricsQueryCache(fetch=influx)):
+        response = await client.get(
+            f"/api/robots/{robot_id}/metrics",
+            params={"measurement": "cpu", "field": "usage_active", "range": "1h", "step": "5m"},
+        )
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["step"] == 300
+        assert len(data["points"]) == 12
+
+        response = await client.get(
+            f"/api/robots/{robot_id}/metrics",
+            params={"measurement": "cpu", "field": "usage_active", "range": "7d", "step": "10s"},
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+        response = await client.get(
+            f"/api/robots/{robot_id}/metrics",
+            params={"measurement": "cpu|>", "field": "usage_active"},
+        )
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.asyncio
+async def test_robot_metrics_downsampled(client: AsyncClient):
+    """Режимы lttb и minmax прореживают исходные точки до числа окон."""
+    pair_code = "DOWN1234"
+    reg_response = await client.post(
+        "/api/pair", json={"hostname": "test-robot-downsample", "pair_code": pair_code}
+    )
+    robot_id = reg_response.json()["robot_id"]
+
+    async def fake_raw(target_id, measurement, field_name, start, stop):  # noqa: ARG001
+        times = np.arange(start, stop, 10, dtype=np.int64) * 1_000_000_000
+        return times, np.sin(np.arange(len(times)) / 50.0)
+
+    with patch("app.services.metrics_query.fetch_raw_series", fake_raw):
+        for mode in ("lttb", "minmax"):
+            response = await client.get(
+                f"/api/robots/{robot_id}/metrics",
+                params={
+                    "measurement": "cpu",
+                    "field": "usage_active",
+                    "range": "24h",
+                    "points": 100,
+                    "downsample": mode,
+                },
+            )
+            assert response.status_code == status.HTTP_200_OK
+            data = response.json()
+            assert data["downsample"] == mode
+            assert len(data["points"]) <= 24 * 3600 // data["step"] + 1
+        assert data["points"][0]["min"] <= data["points"][0]["value"] <= data["points"][0]["max"]
+
+
+@pytest.mark.asyncio
+async def test_robot_metrics_arrow(client: AsyncClient):
+    """С Accept для Arrow история отдаётся потоком IPC, в том числе без прореживания."""
+    pair_code = "ARRW1234"
+    reg_response = await client.post(
+        "/api/pair", json={"hostname": "test-robot-arrow", "pair_code": pair_code}
+    )
+    robot_id = reg_response.json()["robot_id"]
+
+    async def fake_raw(target_id, measurement, field_name, start, stop):  # noqa: ARG001
+        times = np.arange(start, stop, 10, dtype=np.int64) * 1_000_000_000
+        return times, np.ones(len(times))
+
+    params = {"measurement": "mem", "field": "used_percent", "range": "1h", "downsample": "none"}
+    with patch("app.services.metrics_query.fetch_raw_series", fake_raw):
+        response = await client.get(f"/api/robots/{robot_id}/metrics", params=params)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+        response = await client.get(
+            f"/api/robots/{robot_id}/metrics",
+            params=params,
+            headers={"Accept": ARROW_STREAM_MEDIA_TYPE},
+        )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == ARROW_STREAM_MEDIA_TYPE
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.num_rows == 360
+    assert table.schema.metadata[b"downsample"] == b"none"
@@ -0,0 +1,97 @@
+"""
+Тесты проверки паролей вне цикла событий.
+"""
+
+import asyncio
+import threading
+
+import pytest
+from fastapi import status
+from httpx import AsyncClient
+from passlib.context import CryptContext
+
+from app.services.passwords import PasswordHasher, PasswordHasherBusyError, password_hasher
+
+FAST_CONTEXT = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4)
+
+
+class BlockingContext:
+    """Контекст, проверка в котором ждёт сигнала из теста."""
+
+    def __init__(self) -> None:
+        self.release = threading.Event()
+
+    def verify(self, password: str, hashed_password: str) -> bool:
+        self.release.wait(timeout=5)
+        return password == hashed_password
+
+
+@pytest.mark.asyncio
+async def test_hash_and_verify_in_pool():
+    """Хэш, посчитанный в пуле, проверяется в пуле."""
+    hasher = PasswordHasher(workers=1, max_pending=2, context=FAST_CONTEXT)
+    try:
+        hashed = await hasher.hash("s3cret-password")
+        assert await hasher.verify("s3cret-password", hashed)
+        assert not await hasher.verify("wrong-password", hashed)
+    finally:
+        hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_full_queue_rejects_immediately():
+    """Сверх предела очереди вызов отклоняется, не дожидаясь пула."""
+    context = BlockingContext()
+    hasher = PasswordHasher(workers=1, max_pending=2, context=context)
+    try:
+        running = [asyncio.create_task(hasher.verify("a", "a")) for _ in range(2)]
+        await asyncio.sleep(0)
+
+        with pytest.raises(PasswordHasherBusyError):
+            await hasher.verify("a", "a")
+
+        context.release.set()
+        assert await asyncio.gather(*running) == [True, True]
+        assert await hasher.verify("a", "b") is False
+    finally:
+        hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_wait_keeps_slot_until_thread_finishes():
+    """Отменённый запрос освобождает слот только после завершения потока."""
+    context = BlockingContext()
+    hasher = PasswordHasher(workers=1, max_pending=1, context=context)
+    try:
+        task = asyncio.create_task(hasher.verify("a", "a"))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        with pytest.raises(PasswordHasherBusyError):
+            await hasher.verify("a", "a")
+
+        context.release.set()
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if hasher._slots.acquire(blocking=False):
+                hasher._slots.release()
+                break
+        assert await hasher.verify("a", "a")
+    finally:
+        hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_login_returns_429_when_queue_is_full(client: AsyncClient, monkeypatch):
+    """Вход при заполненной очереди сразу получает 429."""
+    monkeypatch.setattr(password_hasher, "_slots", threading.BoundedSemaphore(1))
+    password_hasher._slots.acquire()
+
+    response = await client.post(
+        "/api/auth/login", json={"email": "admin@test.local", "password": "testpassword"}
+    )
+
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert response.headers["Retry-After"] == "1"
@@ -0,0 +1,192 @@
+"""
+Регрессионные тесты планов горячих запросов.
+
+Схема строится миграциями Alembic в отдельной схеме PostgreSQL, а не по
+моделям: проверяются индексы, которые реально окажутся в базе. Запросы
+строятся теми же функциями, что использует приложение, и проходят через
+EXPLAIN на заполненных таблицах с выключенным seq scan. Без seq scan
+планировщик возьмёт любой индекс, поэтому для каждого запроса проверяется
+имя ожидаемого индекса.
+"""
+
+import json
+from collections.abc import Iterator
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+
+import pytest
+from alembic.config import Config
+from sqlalchemy import Connection, insert, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.expression import Executable
+
+from alembic import command
+from app.database import Explain
+from app.models import PairCode, PairCodeStatus, Robot, RobotStatus, User, UserRole
+from app.services.robot_queries import (
+    build_robot_list_query,
+    encode_cursor,
+    order_robot_page,
+    robot_by_token_query,
+)
+from app.services.robot_tokens import token_digest
+from app.tasks import abandoned_robots_query, expire_pair_codes_statement, mark_inactive_statement
+
+SEED_ROBOTS = 2000
+OWNERS = 20
+STATUSES = list(RobotStatus)
+# Схема, в которую применяются миграции
+SCHEMA = "query_plans"
+API_DIR = Path(__file__).resolve().parents[1]
+
+
+def upgrade_head(connection: Connection) -> None:
+    config = Config()
+    config.set_main_option("script_location", str(API_DIR / "alembic"))
+    config.attributes["connection"] = connection
+    command.upgrade(config, "head")
+
+
+@pytest.fixture(scope="module")
+async def migrated(test_engine):
+    """Применяет миграции к пустой схеме `SCHEMA`."""
+    async with test_engine.connect() as conn:
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        await conn.execute(text(f"SET search_path TO {SCHEMA}, public"))
+        # Миграции с CONCURRENTLY управляют транзакциями сами
+        await conn.commit()
+        await conn.run_sync(upgrade_head)
+    yield
+    async with test_engine.begin() as conn:
+        await conn.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+
+
+@pytest.fixture
+async def seeded(db_session: AsyncSession, migrated: None) -> None:  # noqa: ARG001
+    """Заполняет robots и pair_codes схемы миграций и обновляет статистику."""
+    await db_session.execute(text(f"SET LOCAL search_path TO {SCHEMA}, public"))
+    now = datetime.now(UTC)
+    await db_session.execute(
+        insert(User),
+        [
+            {
+                "id": 100_000 + i,
+                "email": f"plan-{i}@test.local",
+                "hashed_password": "x",
+                "name": f"plan-{i}",
+                "role": UserRole.USER,
+            }
+            for i in range(OWNERS)
+        ],
+    )
+    await db_session.execute(
+        insert(Robot),
+        [
+            {
+                "id": 100_000 + i,
+                "name": f"plan-robot-{i}",
+                "hostname": f"plan-robot-{i}",
+                "status": STATUSES[i % len(STATUSES)],
+                "influxdb_token_digest": token_digest(f"plan-token-{i}"),
+                "owner_id": 100_000 + i % OWNERS,
+                "created_at": now - timedelta(minutes=i),
+                "last_seen_at": now - timedelta(seconds=i),
+            }
+            for i in range(SEED_ROBOTS)
+        ],
+    )
+    await db_session.execute(
+        insert(PairCode),
+        [
+            {
+                "code": f"P{i:07d}",
+                "robot_id": 100_000 + i,
+                "status": PairCodeStatus.CONFIRMED if i % 10 else PairCodeStatus.PENDING,
+                "expires_at": now + timedelta(minutes=i % 30 - 15),
+            }
+            for i in range(SEED_ROBOTS)
+        ],
+    )
+    await db_session.execute(text("ANALYZE robots"))
+    await db_session.execute(text("ANALYZE pair_codes"))
+    await db_session.execute(text("SET LOCAL enable_seqscan = off"))
+
+
+def walk(node: dict) -> Iterator[dict]:
+    """Обходит узлы плана."""
+    yield node
+    for child in node.get("Plans", []):
+        yield from walk(child)
+
+
+async def plan_nodes(db_session: AsyncSession, statement: Executable) -> list[dict]:
+    """Узлы плана запроса."""
+    result = await db_session.execute(Explain(statement))
+    plan = result.scalar_one()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return list(walk(plan[0]["Plan"]))
+
+
+def owner() -> User:
+    return User(id=100_001, role=UserRole.USER)
+
+
+def admin() -> User:
+    return User(id=1, role=UserRole.ADMIN)
+
+
+# Запрос и индекс, по которому он должен читать основную таблицу
+HOT_QUERIES = {
+    "list_owner": (
+        lambda: order_robot_page(build_robot_list_query(owner()), None).limit(51),
+        "ix_robots_owner_id_created_at_id",
+    ),
+    "list_owner_status": (
+        lambda: order_robot_page(build_robot_list_query(owner(), RobotStatus.ACTIVE), None).limit(
+            51
+        ),
+        "ix_robots_owner_id_created_at_id",
+    ),
+    "list_admin_status": (
+        lambda: order_robot_page(build_robot_list_query(admin(), RobotStatus.INACTIVE), None).limit(
+            51
+        ),
+        "ix_robots_status_created_at_id",
+    ),
+    "list_owner_cursor": (
+        lambda: order_robot_page(
+            build_robot_list_query(owner()),
+            encode_cursor(Robot(id=100_500, created_at=datetime.now(UTC) - timedelta(minutes=500))),
+        ).limit(51),
+        "ix_robots_owner_id_created_at_id",
+    ),
+    "robot_by_token": (
+        lambda: robot_by_token_query("plan-token-42"),
+        "ix_robots_influxdb_token_digest",
+    ),
+    "mark_inactive": (
+        lambda: mark_inactive_statement(datetime.now(UTC) - timedelta(minutes=1)),
+        "ix_robots_active_last_seen_at",
+    ),
+    "expire_pair_codes": (
+        lambda: expire_pair_codes_statement(datetime.now(UTC), 500),
+        "ix_pair_codes_pending_expires_at",
+    ),
+    "abandoned_robots": (
+        lambda: abandoned_robots_query(datetime.now(UTC) - timedelta(hours=24), 500),
+        "ix_robots_pending_unowned_created_at",
+    ),
+}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("name", list(HOT_QUERIES))
+async def test_hot_query_uses_index(db_session: AsyncSession, seeded: None, name: str):  # noqa: ARG001
+    """Горячий запрос читает таблицу по своему индексу, без seq scan."""
+    build, expected_index = HOT_QUERIES[name]
+    nodes = await plan_nodes(db_session, build())
+
+    assert [node.get("Relation Name") for node in nodes if node["Node Type"] == "Seq Scan"] == []
+    assert expected_index in {node.get("Index Name") for node in nodes}
@@ -0,0 +1,190 @@
+"""
+Тесты сверки учёток с Grafana и Superset.
+"""
+
+import pytest
+
+from app.reconcile import (
+    Action,
+    ActionKind,
+    LocalUser,
+    RateLimiter,
+    Reconciler,
+    Service,
+    format_report,
+    plan_actions,
+    user_updates,
+)
+from app.services.external_auth import ExternalAccount
+
+
+def account(id: int, email: str, admin: bool = False) -> ExternalAccount:
+    return ExternalAccount(id=id, email=email, login=email.split("@")[0], admin=admin)
+
+
+def user(id: int, email: str, grafana_id: int | None = None, active: bool = True) -> LocalUser:
+    return LocalUser(id, email, f"user-{id}", active, grafana_id, None)
+
+
+def test_plan_links_creates_and_deletes():
+    """Сверка находит потерянные id, отсутствующие и лишние учётки."""
+    users = [
+        user(1, "linked@test.local", grafana_id=10),
+        user(2, "Lost@Test.local"),
+        user(3, "missing@test.local"),
+        user(4, "gone@test.local", grafana_id=40),
+        user(5, "stale@test.local", grafana_id=50, active=False),
+        user(6, "removed@test.local", grafana_id=60, active=False),
+    ]
+    accounts = [
+        account(10, "linked@test.local"),
+        account(20, "lost@test.local"),
+        account(50, "stale@test.local"),
+        account(70, "orphan@test.local"),
+        account(1, "admin@localhost", admin=True),
+    ]
+
+    actions = plan_actions(Service.GRAFANA, users, accounts)
+
+    assert {(a.kind, a.user_id, a.external_id) for a in actions} == {
+        (ActionKind.LINK, 2, 20),
+        (ActionKind.CREATE, 3, None),
+        (ActionKind.CREATE, 4, None),
+        (ActionKind.DELETE, 5, 50),
+        (ActionKind.UNLINK, 6, 60),
+    }
+
+    orphans = plan_actions(Service.GRAFANA, users, accounts, delete_orphans=True)
+    assert set(orphans) - set(actions) == {
+        Action(Service.GRAFANA, ActionKind.DELETE, "orphan@test.local", None, 70)
+    }
+
+
+def test_user_updates_merge_services_into_one_row_per_user():
+    """Исправления обоих сервисов дают одну строку UPDATE на пользователя."""
+
+    class Report:
+        def __init__(self, service, applied):
+            self.service = service
+            self.applied = applied
+
+    rows = user_updates(
+        [
+            Report(Service.GRAFANA, [Action(Service.GRAFANA, ActionKind.LINK, "a", 1, 10)]),
+            Report(
+                Service.SUPERSET,
+                [
+                    Action(Service.SUPERSET, ActionKind.DELETE, "a", 1, 7),
+                    Action(Service.SUPERSET, ActionKind.DELETE, "o", None, 8),
+                ],
+            ),
+        ]
+    )
+
+    assert rows == [{"id": 1, "grafana_user_id": 10, "superset_user_id": None}]
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_spaces_calls():
+    """Вызовы сверх частоты ждут своего слота."""
+    now = [0.0]
+    sleeps: list[float] = []
+
+    async def sleep(delay: float) -> None:
+        sleeps.append(delay)
+
+    limiter = RateLimiter(rate=10, clock=lambda: now[0], sleep=sleep)
+    for _ in range(3):
+        await limiter.acquire()
+    now[0] = 1.0
+    await limiter.acquire()
+
+    assert sleeps == pytest.approx([0.1, 0.2])
+
+
+class FakeExternalAuth:
+    """Сервисы с заданными учётками; считает запросы."""
+
+    def __init__(self, grafana: list[ExternalAccount], superset: list[ExternalAccount]) -> None:
+        self.grafana = grafana
+        self.superset = superset
+        self.pages: list[tuple[str, int]] = []
+        self.created: list[tuple[str, str]] = []
+        self.deleted: list[tuple[str, int]] = []
+        self.fail_superset_page: int | None = None
+
+    async def grafana_users_page(self, page: int, per_page: int):
+        self.pages.append(("grafana", page))
+        start = (page - 1) * per_page
+        return self.grafana[start : start + per_page], len(self.grafana)
+
+    async def superset_users_page(self, page: int, page_size: int):
+        self.pages.append(("superset", page))
+        if page == self.fail_superset_page:
+            return None
+        start = page * page_size
+        return self.superset[start : start + page_size], len(self.superset)
+
+    async def create_grafana_user(self, email: str, _password: str, _name: str) -> int | None:
+        self.created.append(("grafana", email))
+        return None if email.startswith("fail") else 10_000 + len(self.created)
+
+    async def create_superset_user(self, email: str, _password: str, _name: str) -> int | None:
+        self.created.append(("superset", email))
+        return 20_000 + len(self.created)
+
+    async def delete_grafana_user(self, user_id: int) -> bool:
+        self.deleted.append(("grafana", user_id))
+        return True
+
+    async def delete_superset_user(self, user_id: int) -> bool:
+        self.deleted.append(("superset", user_id))
+        return True
+
+
+@pytest.mark.asyncio
+async def test_thousands_of_accounts_in_one_pass():
+    """Все страницы выгружаются, исправления применяются одним проходом."""
+    users = [LocalUser(i, f"u{i}@test.local", f"U{i}", True, i, i) for i in range(1, 3001)]
+    users += [LocalUser(5000, "new@test.local", "New", True, None, None)]
+    users += [LocalUser(5001, "fail@test.local", "Fail", True, None, 5001)]
+    grafana = [account(i, f"u{i}@test.local") for i in range(1, 3001)]
+    superset = [account(i, f"u{i}@test.local") for i in range(1, 3001)]
+    superset += [account(5001, "fail@test.local")]
+    fake = FakeExternalAuth(grafana, superset)
+    reconciler = Reconciler(fake, concurrency=4, rate=1e9)
+
+    reports = [
+        await reconciler._reconcile(service, users, apply=True, delete_orphans=False)
+        for service in Service
+    ]
+
+    assert sorted(p for s, p in fake.pages if s == "grafana") == [1, 2, 3]
+    assert len([p for s, p in fake.pages if s == "superset"]) == 31
+    assert [r.accounts for r in reports] == [3000, 3001]
+    assert sorted(fake.created) == [
+        ("grafana", "fail@test.local"),
+        ("grafana", "new@test.local"),
+        ("superset", "new@test.local"),
+    ]
+    grafana_report, superset_report = reports
+    assert [a.email for a in grafana_report.failed] == ["fail@test.local"]
+    assert len(superset_report.applied) == 1
+
+    rows = user_updates(reports)
+    assert len(rows) == 1 and rows[0]["id"] == 5000
+    assert "ошибка" in format_report(reports, apply=True)
+
+
+@pytest.mark.asyncio
+async def test_incomplete_listing_skips_service():
+    """Если страница не выгрузилась, сервис не сверяется и ничего не удаляется."""
+    fake = FakeExternalAuth([], [account(i, f"o{i}@test.local") for i in range(250)])
+    fake.fail_superset_page = 2
+    reconciler = Reconciler(fake, rate=1e9)
+
+    report = await reconciler._reconcile(Service.SUPERSET, [], apply=True, delete_orphans=True)
+
+    assert report.error is not None
+    assert fake.deleted == []
+    assert "пропущен" in format_report([report], apply=True)
@@ -0,0 +1,163 @@
+"""
+Тесты подписанных токенов роботов.
+"""
+
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from fastapi import status
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Architecture, Robot, RobotStatus, User
+from app.services.robot_tokens import (
+    RobotTokenService,
+    is_current_token,
+    robot_tokens,
+    token_digest,
+)
+
+NOW = datetime(2026, 10, 19, 12, 0, 0, 500_000, tzinfo=UTC)
+
+
+def make_robot(robot_id: int = 7, **kwargs) -> Robot:
+    return Robot(id=robot_id, name="r", hostname="r", **kwargs)
+
+
+def test_assigned_token_verifies_and_is_reproducible():
+    """Выданный токен проверяется и воспроизводится по полям робота."""
+    service = RobotTokenService(keys={1: b"k1"})
+    robot = make_robot()
+
+    token = service.assign(robot, NOW)
+    claims = service.verify(token)
+
+    assert claims is not None
+    assert (claims.robot_id, claims.key_version) == (7, 1)
+    assert claims.issued_at == int(NOW.replace(microsecond=0).timestamp())
+    assert service.token_for(robot) == token
+    assert is_current_token(robot, claims)
+    assert robot.token_not_before is None
+
+
+@pytest.mark.parametrize(
+    "mutate",
+    [
+        lambda t: t.replace("wpr1.7.", "wpr1.8.", 1),
+        lambda t: t[:-2] + ("AA" if not t.endswith("AA") else "BB"),
+        lambda t: t.replace("wpr1.7.", "wpr1.+7.", 1),
+        lambda t: t.rsplit(".", 1)[0],
+        lambda t: "wpr2" + t[4:],
+    ],
+)
+def test_tampered_token_is_rejected(mutate):
+    """Изменённый токен не проходит проверку."""
+    service = RobotTokenService(keys={1: b"k1"})
+    token = service.assign(make_robot(), NOW)
+
+    assert service.verify(mutate(token)) is None
+
+
+def test_other_key_and_retired_version():
+    """Токен чужого ключа отклоняется; старая версия ключа проверяется, пока задана."""
+    old = RobotTokenService(keys={1: b"k1"})
+    token = old.assign(make_robot(), NOW)
+
+    assert RobotTokenService(keys={1: b"other"}).verify(token) is None
+
+    rotated = RobotTokenService(keys={1: b"k1", 2: b"k2"})
+    assert rotated.verify(token) is not None
+    assert rotated.verify(rotated.assign(make_robot(), NOW)).key_version == 2
+    assert RobotTokenService(keys={2: b"k2"}).verify(token) is None
+
+
+def test_reissue_revokes_previous_token():
+    """Перевыпуск в ту же секунду всё равно отзывает прежний токен."""
+    service = RobotTokenService(keys={1: b"k1"})
+    robot = make_robot()
+    first = service.assign(robot, NOW)
+
+    second = service.assign(robot, NOW)
+    service.revoke(robot.id, robot.token_not_before)
+
+    assert second != first
+    assert service.verify(first) is None
+    assert service.verify(second) is not None
+    assert robot.token_issued_at == NOW.replace(microsecond=0) + timedelta(seconds=1)
+
+
+def test_legacy_token_is_replaced_and_revoked():
+    """Робот со старым токеном переходит на подписанный, старый стирается."""
+    service = RobotTokenService(keys={1: b"k1"})
+    robot = make_robot(influxdb_token_digest=token_digest("legacy-random-token"))
+
+    assert service.token_for(robot) is None
+    token = service.assign(robot, NOW)
+
+    assert robot.influxdb_token_digest is None
+    assert robot.token_not_before == robot.token_issued_at
+    assert service.token_for(robot) == token
+
+
+def test_token_digest_is_fixed_width():
+    """Хэш токена — 32 байта и совпадает с sha256() в PostgreSQL."""
+    assert len(token_digest("legacy-random-token")) == 32
+    assert token_digest("abc").hex() == (
+        "ba7816bf8f01cfea414140de5dae2223b00361a396177a9cb410ff61f20015ad"
+    )
+
+
+def test_refresh_does_not_roll_back_local_revocation():
+    """Устаревшая выборка из БД не отменяет более свежий отзыв."""
+    service = RobotTokenService(keys={1: b"k1"})
+    service.revoke(7, NOW)
+
+    service.load_revocations([(7, NOW - timedelta(hours=1)), (8, NOW)])
+
+    assert service.revoked == 2
+    assert service._not_before[7] == int(NOW.timestamp())
+
+
+async def post_metrics(client: AsyncClient, token: str) -> int:
+    response = await client.post(
+        "/api/metrics",
+        content="cpu_usage,robot=test value=50.0 1234567890000000000",
+        headers={"Authorization": f"Bearer {token}", "Content-Type": "text/plain"},
+    )
+    return response.status_code
+
+
+@pytest.mark.asyncio
+async def test_legacy_token_keeps_working_until_reissue(
+    client: AsyncClient,
+    db_session: AsyncSession,
+    test_admin: User,
+    mock_influxdb,  # noqa: ARG001
+):
+    """Старый токен принимается; после перевыпуска работает только новый."""
+    robot = Robot(
+        name="legacy",
+        hostname="legacy",
+        architecture=Architecture.ARM64,
+        status=RobotStatus.ACTIVE,
+        influxdb_token_digest=token_digest("legacy-token-0123456789"),
+        owner_id=test_admin.id,
+    )
+    db_session.add(robot)
+    await db_session.commit()
+
+    assert await post_metrics(client, "legacy-token-0123456789") == status.HTTP_204_NO_CONTENT
+
+    response = await client.post(f"/api/robots/{robot.id}/token")
+    assert response.status_code == status.HTTP_200_OK
+    token = response.json()["influxdb_token"]
+
+    assert await post_metrics(client, "legacy-token-0123456789") == status.HTTP_401_UNAUTHORIZED
+    assert await post_metrics(client, token) == status.HTTP_204_NO_CONTENT
+
+    response = await client.post(f"/api/robots/{robot.id}/token")
+    assert await post_metrics(client, token) == status.HTTP_401_UNAUTHORIZED
+    assert await post_metrics(client, response.json()["influxdb_token"]) == (
+        status.HTTP_204_NO_CONTENT
+    )
+    robot_tokens._not_before.pop(robot.id, None)
@@ -0,0 +1,141 @@
+"""
+Тесты списка роботов.
+"""
+
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from fastapi import status
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Robot, RobotStatus
+from app.services.robot_queries import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    """Курсор кодирует позицию робота и разбирается обратно."""
+    created_at = datetime(2026, 5, 1, 12, 30, 15, 123456, tzinfo=UTC)
+
+    cursor = encode_cursor(Robot(id=42, created_at=created_at))
+
+    assert decode_cursor(cursor) == (created_at, 42)
+
+
+@pytest.mark.parametrize("cursor", ["", "not-base64!", "eyJjIjoxfQ"])
+def test_invalid_cursor_is_rejected(cursor: str):
+    """Повреждённый курсор вызывает ValueError."""
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+@pytest.fixture
+async def robots_page(db_session: AsyncSession) -> list[Robot]:
+    """Пять роботов; у двух одинаковое время создания."""
+    base = datetime(2026, 1, 1, tzinfo=UTC)
+    offsets = [0, 1, 1, 2, 3]
+    robots = [
+        Robot(
+            name=f"page-{i}",
+            hostname=f"page-{i}",
+            status=RobotStatus.ACTIVE,
+            created_at=base + timedelta(minutes=offset),
+        )
+        for i, offset in enumerate(offsets)
+    ]
+    db_session.add_all(robots)
+    await db_session.commit()
+    return robots
+
+
+@pytest.mark.asyncio
+async def test_keyset_pagination_walks_all_robots(client: AsyncClient, robots_page: list[Robot]):
+    """Обход по курсору возвращает каждого робота ровно один раз."""
+    seen: list[int] = []
+    params: dict = {"search": "page-", "limit": 2, "total_mode": "none"}
+
+    while True:
+        response = await client.get("/api/robots", params=params)
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["total"] is None
+        seen.extend(robot["id"] for robot in data["robots"])
+        if data["next_cursor"] is None:
+            break
+        params["cursor"] = data["next_cursor"]
+
+    expected = sorted(robots_page, key=lambda r: (r.created_at, r.id), reverse=True)
+    assert seen == [robot.id for robot in expected]
+
+
+@pytest.mark.asyncio
+async def test_total_modes(client: AsyncClient, robots_page: list[Robot]):  # noqa: ARG001
+    """Точный подсчёт совпадает с фильтром, оценка возвращает число."""
+    exact = await client.get("/api/robots", params={"search": "page-"})
+    estimate = await client.get("/api/robots", params={"search": "page-", "total_mode": "estimate"})
+
+    assert exact.json()["total"] == 5
+    assert isinstance(estimate.json()["total"], int)
+
+
+@pytest.mark.asyncio
+async def test_cursor_with_skip_is_rejected(client: AsyncClient):
+    """Курсор нельзя сочетать со skip."""
+    cursor = encode_cursor(Robot(id=1, created_at=datetime.now(UTC)))
+
+    response = await client.get("/api/robots", params={"cursor": cursor, "skip": 10})
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.fixture
+async def search_robots(db_session: AsyncSession) -> dict[str, Robot]:
+    """Роботы с разными именами для поиска."""
+    robots = {
+        name: Robot(name=name, hostname=f"{name}-host", status=RobotStatus.ACTIVE)
+        for name in ("warehouse-picker", "warehouse-loader", "delivery-rover")
+    }
+    robots["delivery-rover"].description = "Outdoor courier"
+    db_session.add_all(robots.values())
+    await db_session.commit()
+    return robots
+
+
+@pytest.mark.asyncio
+async def test_fuzzy_search_tolerates_typos(client: AsyncClient, search_robots: dict[str, Robot]):
+    """Нечёткий поиск находит имя с опечаткой и ставит лучшее совпадение первым."""
+    response = await client.get(
+        "/api/robots", params={"search": "warehouse-pickr", "search_mode": "fuzzy"}
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    ids = [robot["id"] for robot in response.json()["robots"]]
+    assert ids[0] == search_robots["warehouse-picker"].id
+    assert search_robots["delivery-rover"].id not in ids
+
+
+@pytest.mark.asyncio
+async def test_fuzzy_search_matches_prefix_and_description(
+    client: AsyncClient, search_robots: dict[str, Robot]
+):
+    """Нечёткий поиск находит совпадение по префиксу и по описанию."""
+    by_prefix = await client.get("/api/robots", params={"search": "deliv", "search_mode": "fuzzy"})
+    by_description = await client.get(
+        "/api/robots", params={"search": "courier", "search_mode": "fuzzy"}
+    )
+
+    rover_id = search_robots["delivery-rover"].id
+    assert [robot["id"] for robot in by_prefix.json()["robots"]] == [rover_id]
+    assert [robot["id"] for robot in by_description.json()["robots"]] == [rover_id]
+
+
+@pytest.mark.asyncio
+async def test_fuzzy_search_rejects_cursor(client: AsyncClient):
+    """Нечёткий поиск ранжирует результаты и не принимает курсор."""
+    cursor = encode_cursor(Robot(id=1, created_at=datetime.now(UTC)))
+
+    response = await client.get(
+        "/api/robots", params={"search": "rover", "search_mode": "fuzzy", "cursor": cursor}
+    )
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
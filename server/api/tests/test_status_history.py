@@ -0,0 +1,72 @@
+"""
+Тесты истории статусов роботов.
+"""
+
+from datetime import UTC, datetime
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import RobotStatus
+from app.services.events import RobotEventBus
+from app.services.status_history import (
+    StatusHistoryRecorder,
+    drop_expired_partitions,
+    ensure_partitions,
+    list_partitions,
+    partition_name,
+)
+
+
+def test_recorder_buffers_only_status_changes():
+    """В буфер попадают смены статуса и привязки, но не отметки активности."""
+    bus = RobotEventBus()
+    recorder = StatusHistoryRecorder()
+    bus.add_listener(recorder.record)
+    now = datetime.now(UTC)
+
+    bus.publish_status(10, None, RobotStatus.PENDING, None)
+    bus.publish_paired(10, 1, now)
+    bus.publish_last_seen(10, 1, now)
+    bus.publish_status(10, 1, RobotStatus.INACTIVE, RobotStatus.ACTIVE)
+
+    assert recorder.pending == 3
+    assert [(r[1], r[2]) for r in recorder._buffer] == [
+        ("pending", None),
+        ("active", "pending"),
+        ("inactive", "active"),
+    ]
+
+
+def test_requeue_drops_oldest_on_overflow():
+    """При переполнении буфера отбрасываются самые старые записи."""
+    recorder = StatusHistoryRecorder(max_pending=3)
+    now = datetime.now(UTC)
+    recorder._buffer = [(4, "active", None, now)]
+
+    recorder._requeue([(robot_id, "active", None, now) for robot_id in (1, 2, 3)])
+
+    assert [record[0] for record in recorder._buffer] == [2, 3, 4]
+
+
+def test_partition_name():
+    """Имя секции содержит год и месяц."""
+    assert partition_name(2026, 3) == "robot_status_events_2026_03"
+
+
+@pytest.mark.asyncio
+async def test_ensure_and_drop_partitions(db_session: AsyncSession):
+    """Секции создаются наперёд и удаляются по истечении срока хранения."""
+    created = await ensure_partitions(db_session, datetime(2026, 11, 15, tzinfo=UTC), 2)
+
+    assert created == [
+        "robot_status_events_2026_11",
+        "robot_status_events_2026_12",
+        "robot_status_events_2027_01",
+    ]
+    assert await ensure_partitions(db_session, datetime(2026, 11, 15, tzinfo=UTC), 2) == []
+
+    dropped = await drop_expired_partitions(db_session, datetime(2027, 12, 1, tzinfo=UTC), 12)
+
+    assert dropped == ["robot_status_events_2026_11"]
+    assert "robot_status_events_2026_12" in await list_partitions(db_session)
@@ -0,0 +1,118 @@
+"""
+Тесты фоновых задач и выбора лидера.
+"""
+
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from fastapi import status
+from httpx import AsyncClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import PairCode, PairCodeStatus, Robot, RobotStatus
+from app.services.leader import leader_elector
+from app.tasks import delete_abandoned_robots_batch, expire_pair_codes_batch, leader_only
+
+
+@pytest.fixture
+def calls() -> list[str]:
+    return []
+
+
+@pytest.mark.asyncio
+async def test_leader_only_skips_on_follower(calls: list[str], monkeypatch):
+    """Задача не выполняется в процессе, который не является лидером."""
+    monkeypatch.setattr(leader_elector, "_is_leader", False)
+
+    async def job() -> None:
+        calls.append("run")
+
+    await leader_only(job)()
+
+    assert calls == []
+
+
+@pytest.mark.asyncio
+async def test_leader_only_runs_on_leader(calls: list[str], monkeypatch):
+    """Задача выполняется в процессе-лидере."""
+    monkeypatch.setattr(leader_elector, "_is_leader", True)
+
+    async def job() -> None:
+        calls.append("run")
+
+    await leader_only(job)()
+
+    assert calls == ["run"]
+
+
+@pytest.mark.asyncio
+async def test_leader_status(client: AsyncClient):
+    """Эндпоинт лидерства возвращает идентификатор текущего процесса."""
+    response = await client.get("/health/leader")
+
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["instance_id"] == leader_elector.instance_id
+    assert data["is_leader"] is False
+    assert data["leader"] is None
+
+
+async def create_pending_robot(
+    db_session: AsyncSession, code: str, created_at: datetime, expires_at: datetime
+) -> Robot:
+    """Создаёт непривязанного робота с кодом привязки."""
+    robot = Robot(
+        name=code.lower(),
+        hostname=code.lower(),
+        status=RobotStatus.PENDING,
+        created_at=created_at,
+    )
+    db_session.add(robot)
+    await db_session.flush()
+    db_session.add(
+        PairCode(
+            code=code,
+            robot_id=robot.id,
+            status=PairCodeStatus.PENDING,
+            expires_at=expires_at,
+        )
+    )
+    await db_session.commit()
+    return robot
+
+
+@pytest.mark.asyncio
+async def test_expire_pair_codes_batch(db_session: AsyncSession):
+    """Просроченные коды истекают пачками не больше заданного размера."""
+    now = datetime.now(UTC)
+    for code in ("SWPA0001", "SWPA0002", "SWPA0003"):
+        await create_pending_robot(db_session, code, now, now - timedelta(minutes=1))
+    await create_pending_robot(db_session, "SWPA0004", now, now + timedelta(minutes=10))
+
+    assert await expire_pair_codes_batch(db_session, now, batch_size=2) == 2
+    assert await expire_pair_codes_batch(db_session, now, batch_size=2) == 1
+    assert await expire_pair_codes_batch(db_session, now, batch_size=2) == 0
+
+    result = await db_session.execute(
+        select(PairCode.code).where(PairCode.status == PairCodeStatus.PENDING)
+    )
+    assert result.scalars().all() == ["SWPA0004"]
+
+
+@pytest.mark.asyncio
+async def test_delete_abandoned_robots_batch(db_session: AsyncSession):
+    """Удаляются только старые непривязанные роботы без ожидающих кодов."""
+    now = datetime.now(UTC)
+    old = now - timedelta(days=2)
+    abandoned = await create_pending_robot(db_session, "SWPB0001", old, old)
+    waiting = await create_pending_robot(db_session, "SWPB0002", old, now + timedelta(minutes=5))
+    await expire_pair_codes_batch(db_session, now, batch_size=100)
+
+    robots, codes = await delete_abandoned_robots_batch(db_session, now - timedelta(days=1), 100)
+
+    assert (robots, codes) == (1, 1)
+    remaining = await db_session.execute(
+        select(Robot.id).where(Robot.id.in_([abandoned.id, waiting.id]))
+    )
+    assert remaining.scalars().all() == [waiting.id]
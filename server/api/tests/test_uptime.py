@@ -0,0 +1,149 @@
+"""
+Тесты расчёта доступности роботов.
+"""
+
+import time
+from datetime import UTC, datetime, timedelta
+
+import numpy as np
+import pytest
+from fastapi import status
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Robot, RobotStatus, RobotStatusEvent
+from app.services.status_history import ensure_partitions
+from app.services.uptime import STATE_CODES, UNKNOWN, compute_uptime
+
+UP = STATE_CODES[RobotStatus.ACTIVE]
+DOWN = STATE_CODES[RobotStatus.INACTIVE]
+PENDING = STATE_CODES[RobotStatus.PENDING]
+
+
+def test_availability_mtbf_mttr():
+    """Доступность, MTBF и MTTR считаются по интервалам статусов."""
+    # Робот 0: 0-60 ACTIVE, 60-70 INACTIVE, 70-90 ACTIVE, 90-100 INACTIVE
+    # Робот 1: всё окно без событий в ACTIVE
+    stats = compute_uptime(
+        100.0,
+        initial_states=np.array([UP, UP]),
+        start_offsets=np.zeros(2),
+        event_robots=np.array([0, 0, 0]),
+        event_offsets=np.array([60.0, 70.0, 90.0]),
+        event_states=np.array([DOWN, UP, DOWN]),
+    )
+
+    assert stats.up_seconds.tolist() == [80.0, 100.0]
+    assert stats.down_seconds.tolist() == [20.0, 0.0]
+    assert stats.failures.tolist() == [2, 0]
+    assert stats.availability[0] == pytest.approx(0.8)
+    assert stats.mtbf_seconds[0] == pytest.approx(40.0)
+    assert stats.mttr_seconds[0] == pytest.approx(10.0)
+    assert np.isnan(stats.mtbf_seconds[1])
+
+
+def test_pending_and_unknown_are_not_observed():
+    """Время в PENDING и до начала наблюдения не входит в наблюдаемое."""
+    stats = compute_uptime(
+        100.0,
+        initial_states=np.array([UNKNOWN, PENDING]),
+        start_offsets=np.array([50.0, 0.0]),
+        event_robots=np.array([0, 1]),
+        event_offsets=np.array([75.0, 40.0]),
+        event_states=np.array([DOWN, UP]),
+    )
+
+    # Робот 0 наблюдается с 50, но до 75 его состояние неизвестно
+    assert stats.observed_seconds.tolist() == [25.0, 60.0]
+    assert stats.availability.tolist() == [0.0, 1.0]
+    assert stats.failures.tolist() == [0, 0]
+
+
+def test_fleet_of_10k_robots_for_30_days_is_fast():
+    """10 тысяч роботов за 30 дней считаются быстрее секунды."""
+    rng = np.random.default_rng(42)
+    robots, events_per_robot = 10_000, 60
+    window = 30 * 24 * 3600.0
+    event_robots = np.repeat(np.arange(robots), events_per_robot)
+    event_offsets = np.sort(rng.uniform(0, window, (robots, events_per_robot)), axis=1).ravel()
+    event_states = np.tile([DOWN, UP], robots * events_per_robot // 2)
+
+    started = time.perf_counter()
+    stats = compute_uptime(
+        window,
+        np.full(robots, UP),
+        np.zeros(robots),
+        event_robots,
+        event_offsets,
+        event_states,
+    )
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < 1.0
+    assert np.allclose(stats.observed_seconds, window)
+    assert (stats.failures == events_per_robot // 2).all()
+
+
+@pytest.mark.asyncio
+async def test_robot_uptime_endpoint(client: AsyncClient, db_session: AsyncSession):
+    """Эндпоинт доступности робота учитывает историю статусов."""
+    end = datetime.now(UTC).replace(microsecond=0)
+    start = end - timedelta(hours=10)
+    await ensure_partitions(db_session, start)
+    await ensure_partitions(db_session, end)
+
+    robot = Robot(
+        name="uptime",
+        hostname="uptime",
+        status=RobotStatus.ACTIVE,
+        created_at=start - timedelta(days=1),
+    )
+    db_session.add(robot)
+    await db_session.flush()
+    db_session.add_all(
+        [
+            RobotStatusEvent(
+                robot_id=robot.id,
+                status=RobotStatus.ACTIVE,
+                previous_status=RobotStatus.PENDING,
+                occurred_at=start - timedelta(hours=1),
+            ),
+            RobotStatusEvent(
+                robot_id=robot.id,
+                status=RobotStatus.INACTIVE,
+                previous_status=RobotStatus.ACTIVE,
+                occurred_at=start + timedelta(hours=8),
+            ),
+            RobotStatusEvent(
+                robot_id=robot.id,
+                status=RobotStatus.ACTIVE,
+                previous_status=RobotStatus.INACTIVE,
+                occurred_at=start + timedelta(hours=9),
+            ),
+        ]
+    )
+    await db_session.commit()
+
+    response = await client.get(
+        f"/api/robots/{robot.id}/uptime",
+        params={"start": start.isoformat(), "end": end.isoformat()},
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["availability"] == pytest.approx(0.9)
+    assert data["failures"] == 1
+    assert data["mttr_seconds"] == pytest.approx(3600.0)
+
+
+@pytest.mark.asyncio
+async def test_uptime_rejects_inverted_window(client: AsyncClient):
+    """Окно с началом позже конца отклоняется."""
+    now = datetime.now(UTC)
+
+    response = await client.get(
+        "/api/robots/uptime",
+        params={"start": now.isoformat(), "end": (now - timedelta(hours=1)).isoformat()},
+    )
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
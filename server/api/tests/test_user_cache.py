@@ -0,0 +1,120 @@
+"""
+Тесты кэша пользователей для аутентификации.
+"""
+
+import pytest
+from fastapi import status
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import User, UserRole
+from app.services.user_cache import CurrentUser, UserCache, user_cache
+
+
+class FakeResult:
+    def __init__(self, row: tuple | None) -> None:
+        self._row = row
+
+    def one_or_none(self) -> tuple | None:
+        return self._row
+
+
+class FakeSession:
+    """Сессия, отдающая строки пользователей из словаря и считающая запросы."""
+
+    def __init__(self, rows: dict[int, tuple]) -> None:
+        self.rows = rows
+        self.queries = 0
+
+    async def execute(self, statement) -> FakeResult:
+        self.queries += 1
+        user_id = statement.compile().params["id_1"]
+        return FakeResult(self.rows.get(user_id))
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.mark.asyncio
+async def test_cache_hits_until_ttl_expires():
+    """В пределах TTL пользователь не перечитывается; после — перечитывается."""
+    clock = Clock()
+    cache = UserCache(ttl=30, clock=clock)
+    db = FakeSession({1: (1, "Alice", UserRole.USER, True)})
+
+    assert await cache.get(db, 1) == CurrentUser(1, "Alice", UserRole.USER, True)
+    clock.now = 29
+    await cache.get(db, 1)
+    assert db.queries == 1
+
+    db.rows[1] = (1, "Alice", UserRole.USER, False)
+    clock.now = 30
+    assert not (await cache.get(db, 1)).is_active
+    assert db.queries == 2
+
+
+@pytest.mark.asyncio
+async def test_missing_user_is_cached():
+    """Токен несуществующего пользователя не ходит в БД на каждый запрос."""
+    cache = UserCache(ttl=30, clock=Clock())
+    db = FakeSession({})
+
+    assert await cache.get(db, 7) is None
+    assert await cache.get(db, 7) is None
+    assert db.queries == 1
+
+
+@pytest.mark.asyncio
+async def test_invalidate_and_eviction():
+    """Сброшенная запись перечитывается; сверх размера вытесняются давние."""
+    cache = UserCache(ttl=30, max_size=2, clock=Clock())
+    db = FakeSession({i: (i, f"user-{i}", UserRole.USER, True) for i in (1, 2, 3)})
+
+    await cache.get(db, 1)
+    await cache.get(db, 2)
+    await cache.get(db, 1)
+    await cache.get(db, 3)
+    assert len(cache) == 2
+    assert db.queries == 3
+
+    await cache.get(db, 1)
+    assert db.queries == 3
+    await cache.get(db, 2)
+    assert db.queries == 4
+
+    cache.invalidate(1)
+    await cache.get(db, 1)
+    assert db.queries == 5
+
+
+@pytest.mark.asyncio
+async def test_zero_ttl_disables_cache():
+    """TTL 0 — каждый запрос читает БД."""
+    cache = UserCache(ttl=0, clock=Clock())
+    db = FakeSession({1: (1, "Alice", UserRole.USER, True)})
+
+    await cache.get(db, 1)
+    await cache.get(db, 1)
+    assert db.queries == 2
+    assert len(cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_orm_update_invalidates_cached_user(
+    client: AsyncClient, db_session: AsyncSession, test_admin: User
+):
+    """Деактивация через ORM действует сразу, не дожидаясь TTL."""
+    response = await client.get("/api/auth/me")
+    assert response.status_code == status.HTTP_200_OK
+    assert test_admin.id in user_cache._entries
+
+    test_admin.is_active = False
+    await db_session.commit()
+
+    response = await client.get("/api/auth/me")
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
@@ -0,0 +1,245 @@
+"""
+Тесты отправки уведомлений на вебхуки.
+"""
+
+import json
+from datetime import UTC, datetime, timedelta
+
+import httpx
+import pytest
+from fastapi import status
+from httpx import AsyncClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import (
+    RobotStatus,
+    User,
+    WebhookDelivery,
+    WebhookDeliveryStatus,
+    WebhookEndpoint,
+)
+from app.services.events import RobotEventBus
+from app.services.webhooks import (
+    BACKOFF_BASE_SECONDS,
+    BACKOFF_MAX_SECONDS,
+    SIGNATURE_HEADER,
+    DeliveryResult,
+    Notification,
+    NotificationType,
+    WebhookDispatcher,
+    backoff_delay,
+    build_payload,
+    enqueue_notifications,
+    pending_deliveries,
+    record_result,
+    send,
+    sign,
+)
+
+NOW = datetime(2026, 10, 19, 12, 0, tzinfo=UTC)
+
+
+def status_event(robot_id: int, robot_status: str = "inactive") -> dict:
+    return {
+        "type": NotificationType.ROBOT_STATUS.value,
+        "robot_id": robot_id,
+        "status": robot_status,
+        "occurred_at": (NOW + timedelta(seconds=robot_id)).isoformat(),
+    }
+
+
+def test_dispatcher_buffers_status_and_pairing_only():
+    """Отметки активности не рассылаются."""
+    bus = RobotEventBus()
+    dispatcher = WebhookDispatcher()
+    bus.add_listener(dispatcher.on_robot_event)
+
+    bus.publish_paired(1, 10, NOW)
+    bus.publish_last_seen(1, 10, NOW)
+    bus.publish_status(1, 10, RobotStatus.INACTIVE, RobotStatus.ACTIVE)
+
+    assert [(n.type, n.owner_id) for n in dispatcher._buffer] == [
+        (NotificationType.ROBOT_PAIRED, 10),
+        (NotificationType.ROBOT_STATUS, 10),
+    ]
+    assert dispatcher._buffer[1].payload["previous_status"] == "active"
+
+
+def test_small_batch_is_sent_as_events():
+    """Немного событий уходит списком."""
+    events = [status_event(1), status_event(2, "active")]
+
+    assert build_payload(events, digest_threshold=2) == {
+        "kind": "events",
+        "count": 2,
+        "events": events,
+    }
+
+
+def test_outage_is_sent_as_digest():
+    """Тысячи событий аварии сворачиваются в сводку по типам и статусам."""
+    events = [status_event(robot_id) for robot_id in range(3000, 0, -1)]
+    events.append({**status_event(5000), "type": NotificationType.ROBOT_PAIRED.value})
+
+    payload = build_payload(events, digest_threshold=50)
+
+    assert payload["kind"] == "digest"
+    assert payload["count"] == 3001
+    assert payload["first_occurred_at"] == events[0]["occurred_at"]
+    inactive, paired = payload["summary"]
+    assert inactive["status"] == "inactive"
+    assert inactive["count"] == 3000
+    assert inactive["robot_ids"] == list(range(1, 3001))
+    assert paired == {"type": "robot.paired", "count": 1, "robot_ids": [5000]}
+    assert len(json.dumps(payload)) < 30_000
+
+
+def test_backoff_grows_exponentially_with_cap():
+    """Задержка удваивается до потолка; случайна только вторая половина."""
+    assert backoff_delay(1, jitter=lambda: 0.0) == BACKOFF_BASE_SECONDS / 2
+    assert backoff_delay(1, jitter=lambda: 1.0) == BACKOFF_BASE_SECONDS
+    assert backoff_delay(4, jitter=lambda: 1.0) == BACKOFF_BASE_SECONDS * 8
+    assert backoff_delay(10_000, jitter=lambda: 1.0) == BACKOFF_MAX_SECONDS
+
+
+@pytest.mark.asyncio
+async def test_send_signs_body_and_classifies_responses():
+    """2xx — доставлено, 5xx и 429 — повтор, прочие 4xx — без повтора."""
+    responses = iter(
+        [
+            httpx.Response(204),
+            httpx.Response(503),
+            httpx.Response(429, headers={"Retry-After": "120"}),
+            httpx.Response(404),
+        ]
+    )
+    requests: list[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return next(responses)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        results = [
+            await send(client, "https://hooks.example/wolfpack", "s" * 16, {"kind": "events"})
+            for _ in range(4)
+        ]
+
+    assert results == [
+        DeliveryResult(delivered=True),
+        DeliveryResult(delivered=False, error="HTTP 503"),
+        DeliveryResult(delivered=False, error="HTTP 429", retry_after=120.0),
+        DeliveryResult(delivered=False, retryable=False, error="HTTP 404"),
+    ]
+    assert requests[0].headers[SIGNATURE_HEADER] == sign("s" * 16, requests[0].content)
+
+
+@pytest.mark.asyncio
+async def test_send_retries_network_errors():
+    """Сетевая ошибка — повторяемая."""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        raise httpx.ConnectError("connection refused", request=request)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        result = await send(client, "https://hooks.example/wolfpack", None, {})
+
+    assert not result.delivered
+    assert result.retryable
+    assert result.error.startswith("ConnectError")
+
+
+async def create_user(db_session: AsyncSession, email: str) -> User:
+    user = User(email=email, hashed_password="-", name=email)
+    db_session.add(user)
+    await db_session.commit()
+    return user
+
+
+@pytest.mark.asyncio
+async def test_enqueue_fans_out_to_owner_and_fleet_endpoints(db_session: AsyncSession):
+    """Адрес владельца получает его события, адрес парка — все."""
+    alice = await create_user(db_session, "hook-alice@test.local")
+    bob = await create_user(db_session, "hook-bob@test.local")
+    endpoints = [
+        WebhookEndpoint(owner_id=alice.id, url="https://alice.example/hook"),
+        WebhookEndpoint(owner_id=None, url="https://ops.example/hook"),
+        WebhookEndpoint(owner_id=bob.id, url="https://bob.example/hook", enabled=False),
+    ]
+    db_session.add_all(endpoints)
+    await db_session.commit()
+
+    notifications = [
+        Notification(NotificationType.ROBOT_STATUS, alice.id, status_event(1)),
+        Notification(NotificationType.ROBOT_STATUS, bob.id, status_event(2)),
+    ]
+    assert await enqueue_notifications(db_session, notifications) == 3
+
+    alice_hook, fleet_hook, bob_hook = endpoints
+    assert [p["robot_id"] for _, p in await pending_deliveries(db_session, alice_hook.id)] == [1]
+    assert [p["robot_id"] for _, p in await pending_deliveries(db_session, fleet_hook.id)] == [1, 2]
+    assert await pending_deliveries(db_session, bob_hook.id) == []
+
+
+@pytest.mark.asyncio
+async def test_record_result_backs_off_and_dead_letters(db_session: AsyncSession):
+    """Неудачи откладывают адрес, исчерпанные попытки уводят уведомления в DEAD."""
+    endpoint = WebhookEndpoint(owner_id=None, url="https://down.example/hook")
+    db_session.add(endpoint)
+    await db_session.commit()
+    await enqueue_notifications(
+        db_session, [Notification(NotificationType.ROBOT_STATUS, None, status_event(1))]
+    )
+    [(delivery_id, _)] = await pending_deliveries(db_session, endpoint.id)
+    failure = DeliveryResult(delivered=False, error="HTTP 503")
+
+    await record_result(db_session, endpoint, [delivery_id], failure, NOW, 2, jitter=lambda: 1.0)
+    await db_session.refresh(endpoint)
+    assert endpoint.failure_count == 1
+    assert endpoint.retry_after == NOW + timedelta(seconds=BACKOFF_BASE_SECONDS)
+    assert [d for d, _ in await pending_deliveries(db_session, endpoint.id)] == [delivery_id]
+
+    await record_result(db_session, endpoint, [delivery_id], failure, NOW, 2, jitter=lambda: 1.0)
+    delivery = await db_session.scalar(
+        select(WebhookDelivery).where(WebhookDelivery.id == delivery_id)
+    )
+    await db_session.refresh(delivery)
+    assert (delivery.status, delivery.attempts) == (WebhookDeliveryStatus.DEAD, 2)
+
+    await record_result(db_session, endpoint, [], DeliveryResult(delivered=True), NOW, 2)
+    await db_session.refresh(endpoint)
+    assert (endpoint.failure_count, endpoint.retry_after) == (0, None)
+
+
+@pytest.mark.asyncio
+async def test_webhook_crud_and_retry(client: AsyncClient, db_session: AsyncSession):
+    """Вебхук создаётся, его мёртвые уведомления возвращаются в очередь."""
+    response = await client.post(
+        "/api/webhooks",
+        json={"url": "https://ops.example/hook", "secret": "x" * 16, "fleet": True},
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    data = response.json()
+    assert data["owner_id"] is None
+    assert "secret" not in data
+
+    db_session.add(
+        WebhookDelivery(
+            endpoint_id=data["id"],
+            event_type="robot.status",
+            payload=status_event(1),
+            status=WebhookDeliveryStatus.DEAD,
+            attempts=10,
+        )
+    )
+    await db_session.commit()
+
+    response = await client.get(f"/api/webhooks/{data['id']}/deliveries", params={"status": "dead"})
+    assert [d["attempts"] for d in response.json()["deliveries"]] == [10]
+
+    response = await client.post(f"/api/webhooks/{data['id']}/deliveries/retry")
+    assert response.json() == {"requeued": 1}
+
+    response = await client.delete(f"/api/webhooks/{data['id']}")
+    assert response.status_code == status.HTTP_204_NO_CONTENT